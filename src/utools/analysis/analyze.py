@@ -2,27 +2,33 @@ from collections import OrderedDict
 from csv import DictWriter
 
 import matplotlib.pyplot as plt
-import numpy as np
 
-from utools.analysis.db import Session, VectorProcessingUnit, Catchment
+from utools.analysis import results
 
 
 def report(csv_path):
-    s = Session()
+    """
+    Write a CSV report with catchment statistics and timings for each vector processing unit. Statistics and timings
+    are read from the performance results store (see :mod:`utools.analysis.results`). Timings are empty if not loaded.
+    """
+
+    summary = results.get_catchment_summary()
+    create_weights = results.get_job_run_times('%weight-gen%')
+    apply_weights = results.get_phase_times('apply')
+
     records = []
-    for vpu in s.query(VectorProcessingUnit).order_by(VectorProcessingUnit.name):
+    for name, stats in summary.items():
         record = OrderedDict()
-        record['Vector Processing Unit'] = vpu.name
-        record['Elements'] = len(vpu.catchment)
-        record['Nodes'] = vpu.get_node_count()
-        record['Max Nodes in Element'] = vpu.get_max_node_count()
-        record['Area (km^2)'] = vpu.get_area() * 1e-6
-        if not vpu.name.startswith('13'):
-            record['Create Weights (Minutes, 256 Cores)'] = vpu.timing[0].create_weights / 60
-            record['Apply Weights (Seconds, 256 Cores)'] = vpu.timing[0].apply_weights_calculation
+        record['Vector Processing Unit'] = name
+        record['Elements'] = stats['elements']
+        record['Nodes'] = stats['nodes']
+        record['Max Nodes in Element'] = stats['max_nodes']
+        record['Area (km^2)'] = stats['area'] * 1e-6
+        if name in create_weights:
+            record['Create Weights (Minutes, 256 Cores)'] = create_weights[name] / 60
         else:
-            record['Apply Weights (Seconds, 256 Cores)'] = None
             record['Create Weights (Minutes, 256 Cores)'] = None
+        record['Apply Weights (Seconds, 256 Cores)'] = apply_weights.get(name)
         records.append(record)
 
     with open(csv_path, 'w') as f:
@@ -32,17 +38,18 @@ def report(csv_path):
 
 
 def boxplot_node_distribution():
-    """Create boxplot of node distribution."""
+    """Create boxplot of node distribution for each vector processing unit."""
 
-    s = Session()
-    nodes = np.array(s.query(Catchment.node_count).all()).squeeze()
-    n, bins, patches = plt.hist(nodes, bins=10, cumulative=True)  # , normed=1)#, facecolor='green', alpha=0.75)
-    # plt.boxplot(nodes, )
+    node_counts = results.get_node_counts()
+    plt.boxplot(node_counts.values(), labels=node_counts.keys(), vert=False)
+    plt.xscale('log')
+    plt.xlabel('Nodes in Element')
     plt.show()
-    s.close()
 
 
 if __name__ == '__main__':
+    # results.connect('/tmp/results.sqlite')
+    # results.load_catchment_census('/path/to/catchment_shapefiles')
     # report('/tmp/out.csv')
     # boxplot_node_distribution()
     # get_representative_nodes()
@@ -3,9 +3,7 @@ import os
 import re
 from os.path import join
 
-import numpy as np
 from ocgis import CoordinateReferenceSystem
-from ocgis.interface.base.dimension.spatial import SpatialGeometryPolygonDimension
 from shapely.geometry import MultiPolygon
 from sqlalchemy import ForeignKey, Float
 from sqlalchemy.engine import create_engine
@@ -16,6 +14,8 @@ from sqlalchemy.orm.session import sessionmaker
 from sqlalchemy.schema import MetaData, Column
 from sqlalchemy.types import Integer, String
 
+from utools.io.columnar import ColumnarGeometries
+
 # connstr = 'sqlite://'
 # connstr = 'postgresql://bkoziol:<password>@localhost/<database>'
 # connstr = 'postgresql://{user}:{password}@{host}/{database}'
@@ -212,9 +212,17 @@ def dump_model_to_csv(Session, Model, path):
 
 
 def get_area(geom, to_crs, from_crs=None):
+    """
+    :param geom: The polygon or multipolygon geometry.
+    :param to_crs: The coordinate system to compute the area in. Should be an equal-area projection.
+    :param from_crs: The coordinate system of ``geom``. Defaults to EPSG:4326.
+    :returns: The area in ``to_crs`` units.
+    :rtype: float
+    """
+
     from_crs = from_crs or CoordinateReferenceSystem(epsg=4326)
-    value = np.array([[0]], dtype=object)
-    value[0, 0] = geom
-    s = SpatialGeometryPolygonDimension(value=value)
-    s.update_crs(to_crs, from_crs)
-    return s.value[0, 0].area
+    columnar = ColumnarGeometries.from_shapely([geom])
+    # The transformation is cached for the coordinate system pair and applied to the whole coordinate buffer.
+    columnar.transform(to_crs, src_crs=from_crs)
+    areas, _ = columnar.get_areas_and_centroids()
+    return areas[0]
@@ -3,10 +3,11 @@ import re
 from os.path import join
 
 from ocgis import CoordinateReferenceSystem
-from ocgis.util.geom_cabinet import GeomCabinetIterator
 
 from utools.analysis.db import Session, VectorProcessingUnit, Shapefile, Catchment, Job, drop_create, get_or_create, \
     Timing
+from utools.analysis.results import get_catchment_statistics
+from utools.io.columnar import read_columnar
 from utools.logging import log
 
 SHAPEFILE_DIRECTORY = '/media/benkoziol/Extra Drive 1/data/nfie/storage/catchment_shapefiles'
@@ -27,10 +28,13 @@ def fill_database():
     to_crs = CoordinateReferenceSystem(epsg=3083)
     for shapefile in s.query(Shapefile):
         log.info('Loading shapefile: {}'.format(shapefile.vpu.name))
-        gi = GeomCabinetIterator(path=shapefile.fullpath)
-        for record in gi:
-            catchment = Catchment.create(shapefile.vpu, record, to_crs)
-            s.add(catchment)
+        columnar = read_columnar(shapefile.fullpath, fields=['GRIDCODE'], dest_crs=to_crs)
+        stats = get_catchment_statistics(columnar)
+        s.bulk_insert_mappings(Catchment, [{'gridcode': gridcode, 'vid': shapefile.vid, 'node_count': node_count,
+                                            'face_count': face_count, 'area': area}
+                                           for gridcode, node_count, face_count, area in
+                                           zip(stats['gridcode'].tolist(), stats['node_count'].tolist(),
+                                               stats['part_count'].tolist(), stats['area'].tolist())])
         s.commit()
 
     s.commit()
@@ -0,0 +1,436 @@
+"""
+Performance results store. One schema holds vector processing units, batch jobs, per-rank phase records written by
+:mod:`utools.instrument`, and catchment statistics. Loaders parse each file once and insert rows in bulk with
+``executemany``. Phase records are indexed by vector processing unit, job, and phase name.
+
+>>> engine = connect('sqlite:////path/to/results.sqlite')
+>>> load_instrumentation('/path/to/instrument', 'weighting-03N', vpu_name='03N', cores=256)
+>>> load_job_outputs(glob('/path/to/jobs/*.out'), cores=256, vpu_pattern='weight-gen-(.+)')
+>>> load_catchment_census('/path/to/catchment_shapefiles')
+>>> get_phase_times('apply')
+"""
+import json
+import os
+import re
+from collections import OrderedDict
+from glob import glob
+
+import numpy as np
+from sqlalchemy import ForeignKey, Float, func, select, bindparam
+from sqlalchemy.engine import create_engine
+from sqlalchemy.ext.declarative.api import declarative_base
+from sqlalchemy.orm.session import sessionmaker
+from sqlalchemy.schema import MetaData, Column, Index
+from sqlalchemy.types import Integer, String
+
+from utools import env
+from utools.logging import log
+
+connstr = 'sqlite://'
+# connstr = 'postgresql://{user}:{password}@{host}/{database}'
+## four slashes for absolute paths - three for relative
+
+engine = create_engine(connstr)
+metadata = MetaData()
+Base = declarative_base(metadata=metadata)
+Session = sessionmaker(bind=engine)
+
+#: Patterns for job metrics in LSF job output files. The first group is the value.
+JOB_PATTERNS = (('lsf_id', r'Subject: Job (.+):', str),
+                ('name', r'Job <(.+)> was submitted', str),
+                ('cpu_time', r'CPU time : +(.+) sec', float),
+                ('max_memory', r'Max Memory : +(.+) MB', float),
+                ('average_memory', r'Average Memory : +(.+) MB', float),
+                ('run_time', r'Run time : +(.+) sec', float),
+                ('turnaround_time', r'Turnaround time : +(.+) sec', float),
+                ('queue', r'queue <(.+)>, as', str),
+                ('cluster', r'cluster <(.+)>\.', str))
+
+#: Phase record metrics stored for each completed phase.
+PHASE_METRICS = ('wall', 'cpu', 'peak_rss', 'read_bytes', 'write_bytes')
+
+#: Equal-area coordinate system for catchment areas (NAD83 / Texas Centric Albers Equal Area).
+EQUAL_AREA_EPSG = 3083
+
+#: Number of catchment rows per insert statement.
+INSERT_BATCH_SIZE = 50000
+
+
+class VectorProcessingUnit(Base):
+    __tablename__ = 'vpu'
+    vid = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+
+
+class Job(Base):
+    __tablename__ = 'job'
+    jid = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    vid = Column(Integer, ForeignKey('vpu.vid'), index=True)
+    lsf_id = Column(String)
+    cores = Column(Integer)
+    queue = Column(String)
+    cluster = Column(String)
+    cpu_time = Column(Float)
+    max_memory = Column(Float)
+    average_memory = Column(Float)
+    run_time = Column(Float)
+    turnaround_time = Column(Float)
+
+
+class Phase(Base):
+    __tablename__ = 'phase'
+    pid = Column(Integer, primary_key=True)
+    jid = Column(Integer, ForeignKey('job.jid'), nullable=False, index=True)
+    vid = Column(Integer, ForeignKey('vpu.vid'), index=True)
+    rank = Column(Integer, nullable=False)
+    phase = Column(String, nullable=False, index=True)
+    wall = Column(Float, nullable=False)
+    cpu = Column(Float)
+    peak_rss = Column(Float)
+    read_bytes = Column(Float)
+    write_bytes = Column(Float)
+
+    __table_args__ = (Index('ix_phase_vid_phase', 'vid', 'phase'),)
+
+
+class Catchment(Base):
+    __tablename__ = 'catchment'
+    cid = Column(Integer, primary_key=True)
+    vid = Column(Integer, ForeignKey('vpu.vid'), nullable=False, index=True)
+    gridcode = Column(Integer, nullable=False, index=True)
+    # Exterior ring nodes including the closing node of each ring.
+    node_count = Column(Integer, nullable=False)
+    hole_count = Column(Integer, nullable=False)
+    part_count = Column(Integer, nullable=False)
+    # Area is in square meters.
+    area = Column(Float, nullable=False)
+
+
+def connect(path_or_connstr=None):
+    """
+    Bind the store to a database and create missing tables.
+
+    :param str path_or_connstr: An SQLAlchemy connection string or a path to an SQLite file. Defaults to
+     :attr:`~utools.analysis.results.connstr`.
+    :rtype: :class:`sqlalchemy.engine.Engine`
+    """
+
+    global engine
+
+    path_or_connstr = path_or_connstr or connstr
+    if '://' not in path_or_connstr:
+        path_or_connstr = 'sqlite:///{}'.format(os.path.abspath(path_or_connstr))
+    engine = create_engine(path_or_connstr)
+    metadata.create_all(engine)
+    Session.configure(bind=engine)
+    return engine
+
+
+def get_vpu_ids(conn, names):
+    """
+    Get vector processing unit identifiers creating missing units in bulk.
+
+    :param conn: An open connection.
+    :param names: Vector processing unit names.
+    :returns: Maps names to identifiers.
+    :rtype: dict
+    """
+
+    return _get_ids_(conn, VectorProcessingUnit.__table__, 'vid', [{'name': n} for n in set(names)])
+
+
+def get_job_ids(conn, jobs, update=False):
+    """
+    Get job identifiers creating missing jobs in bulk.
+
+    :param conn: An open connection.
+    :param jobs: Job rows with at least a ``name`` key. All rows must have the same keys.
+    :type jobs: sequence of dict
+    :param bool update: If ``True``, update columns of existing jobs with the rows' values. ``None`` values do not
+     overwrite existing values.
+    :returns: Maps names to identifiers.
+    :rtype: dict
+    """
+
+    ret = _get_ids_(conn, Job.__table__, 'jid', jobs)
+    if update and len(jobs) > 0:
+        table = Job.__table__
+        columns = [k for k in jobs[0].keys() if k != 'name']
+        # Bound parameter names may not match column names in an update statement.
+        values = dict([(k, func.coalesce(bindparam('_' + k), table.c[k])) for k in columns])
+        statement = table.update().where(table.c.jid == bindparam('_jid')).values(values)
+        conn.execute(statement, [dict([('_jid', ret[job['name']])] + [('_' + k, job[k]) for k in columns])
+                                 for job in jobs])
+    return ret
+
+
+def parse_job_output(path):
+    """
+    Parse job metrics from an LSF job output file in one pass.
+
+    :returns: Maps :class:`~utools.analysis.results.Job` column names to values. Metrics not found are ``None``.
+    :rtype: dict
+    """
+
+    patterns = [(key, re.compile(pattern), formatter) for key, pattern, formatter in JOB_PATTERNS]
+    ret = dict([(key, None) for key, _, _ in JOB_PATTERNS])
+    with open(path) as f:
+        for line in f:
+            for key, pattern, formatter in patterns:
+                if ret[key] is None:
+                    match = pattern.search(line)
+                    if match is not None:
+                        ret[key] = formatter(match.group(1))
+    return ret
+
+
+def load_job_outputs(paths, cores=None, vpu_pattern=None, bind=None):
+    """
+    Load LSF job output files. Metrics of existing jobs are updated.
+
+    :param paths: Paths to job output files.
+    :param int cores: The number of cores for each job.
+    :param str vpu_pattern: Regular expression applied to the job name. If it matches, the first group is the job's
+     vector processing unit name.
+    :param bind: The engine. Defaults to the engine from :func:`~utools.analysis.results.connect`.
+    :returns: Number of jobs parsed.
+    :rtype: int
+    """
+
+    jobs = [parse_job_output(path) for path in paths]
+    for job in jobs:
+        job['cores'] = cores
+        match = None if vpu_pattern is None else re.search(vpu_pattern, job['name'])
+        job['vpu_name'] = None if match is None else match.group(1)
+
+    with (bind or engine).begin() as conn:
+        vids = get_vpu_ids(conn, [j['vpu_name'] for j in jobs if j['vpu_name'] is not None])
+        for job in jobs:
+            job['vid'] = vids.get(job.pop('vpu_name'))
+        get_job_ids(conn, jobs, update=True)
+    return len(jobs)
+
+
+def load_instrumentation(paths, job_name, vpu_name=None, cores=None, bind=None):
+    """
+    Load per-rank phase records written by :class:`~utools.instrument.PhaseRecorder`. Summary lines are skipped.
+    Existing phase records for the job are replaced.
+
+    :param paths: A directory containing ``<prefix>-phases-rank-<rank>.jsonl`` files or a sequence of these files.
+    :param str job_name: The job name. The job is created if it does not exist.
+    :param str vpu_name: The vector processing unit name.
+    :param int cores: The number of cores for the job.
+    :param bind: The engine. Defaults to the engine from :func:`~utools.analysis.results.connect`.
+    :returns: Number of phase records loaded.
+    :rtype: int
+    """
+
+    if isinstance(paths, basestring):
+        paths = glob(os.path.join(paths, '{}-phases-rank-*.jsonl'.format(env.LOGGING_FILE_PREFIX)))
+
+    records = []
+    for path in paths:
+        rank = int(re.search(r'rank-(\d+)\.jsonl$', path).group(1))
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                if 'phase' not in record:
+                    continue
+                row = dict([(k, record.get(k)) for k in PHASE_METRICS])
+                row['rank'] = rank
+                row['phase'] = record['phase']
+                records.append(row)
+
+    with (bind or engine).begin() as conn:
+        vid = None if vpu_name is None else get_vpu_ids(conn, [vpu_name])[vpu_name]
+        jid = get_job_ids(conn, [{'name': job_name, 'vid': vid, 'cores': cores}])[job_name]
+        conn.execute(Phase.__table__.delete().where(Phase.__table__.c.jid == jid))
+        for row in records:
+            row['jid'] = jid
+            row['vid'] = vid
+        if len(records) > 0:
+            conn.execute(Phase.__table__.insert(), records)
+    return len(records)
+
+
+def get_catchment_statistics(columnar, name_uid='GRIDCODE'):
+    """
+    Compute catchment statistics for all geometries at once. Areas are computed in the coordinate system of
+    ``columnar`` which should be an equal-area projection. Invalid geometries are not repaired with ``buffer(0)``, so
+    areas of self-intersecting catchments may differ from :meth:`utools.analysis.db.Catchment.create`.
+
+    :param columnar: The catchment geometries.
+    :type columnar: :class:`~utools.io.columnar.ColumnarGeometries`
+    :param str name_uid: Name of the unique identifier property.
+    :returns: Maps :class:`~utools.analysis.results.Catchment` column names to arrays.
+    :rtype: :class:`collections.OrderedDict`
+    """
+
+    areas, _ = columnar.get_areas_and_centroids()
+    return OrderedDict([('gridcode', np.asarray(columnar.properties[name_uid])),
+                        ('node_count', columnar.get_node_counts(exterior_only=True)),
+                        ('hole_count', columnar.get_hole_counts()),
+                        ('part_count', columnar.get_part_counts()),
+                        ('area', np.abs(areas))])
+
+
+def load_catchments(path, vpu_name, name_uid='GRIDCODE', to_crs=EQUAL_AREA_EPSG, n_workers=None, bind=None):
+    """
+    Read a catchment file columnarly and replace the vector processing unit's catchment statistics.
+
+    :param str path: Path to the catchment vector file.
+    :param str vpu_name: The vector processing unit name.
+    :param str name_uid: Name of the unique identifier property.
+    :param to_crs: The equal-area coordinate system for areas. See :func:`~utools.io.crs.get_crs_wkt`.
+    :param int n_workers: See :func:`~utools.io.columnar.read_columnar`.
+    :param bind: The engine. Defaults to the engine from :func:`~utools.analysis.results.connect`.
+    :returns: Number of catchments loaded.
+    :rtype: int
+    """
+
+    from utools.io.columnar import read_columnar
+
+    columnar = read_columnar(path, fields=[name_uid], dest_crs=to_crs, n_workers=n_workers)
+    return add_catchments(vpu_name, get_catchment_statistics(columnar, name_uid=name_uid), bind=bind)
+
+
+def add_catchments(vpu_name, statistics, bind=None):
+    """
+    Replace the vector processing unit's catchment statistics with bulk inserts.
+
+    :param str vpu_name: The vector processing unit name.
+    :param dict statistics: Statistics from :func:`~utools.analysis.results.get_catchment_statistics`.
+    :param bind: The engine. Defaults to the engine from :func:`~utools.analysis.results.connect`.
+    :returns: Number of catchments added.
+    :rtype: int
+    """
+
+    c = Catchment.__table__
+    with (bind or engine).begin() as conn:
+        vid = get_vpu_ids(conn, [vpu_name])[vpu_name]
+        conn.execute(c.delete().where(c.c.vid == vid))
+        # Columns are converted to Python types once per column instead of once per value.
+        columns = [statistics[k].tolist() for k in statistics.keys()]
+        rows = [dict(zip(statistics.keys(), values), vid=vid) for values in zip(*columns)]
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            conn.execute(c.insert(), rows[start:start + INSERT_BATCH_SIZE])
+    return len(rows)
+
+
+def load_catchment_census(directory, name_uid='GRIDCODE', to_crs=EQUAL_AREA_EPSG, n_workers=None, bind=None):
+    """
+    Load catchment statistics for each vector processing unit. Each subdirectory of ``directory`` is a vector
+    processing unit containing a single shapefile.
+
+    :returns: Maps vector processing unit names to the number of catchments loaded.
+    :rtype: :class:`collections.OrderedDict`
+    """
+
+    ret = OrderedDict()
+    for vpu_name in sorted(os.listdir(directory)):
+        paths = []
+        for root, _, files in os.walk(os.path.join(directory, vpu_name)):
+            paths += [os.path.join(root, f) for f in files if f.endswith('.shp')]
+        if len(paths) == 0:
+            continue
+        log.info('Loading catchments: {}', vpu_name)
+        ret[vpu_name] = load_catchments(paths[0], vpu_name, name_uid=name_uid, to_crs=to_crs, n_workers=n_workers,
+                                        bind=bind)
+    return ret
+
+
+def get_catchment_summary(bind=None):
+    """
+    :param bind: The engine. Defaults to the engine from :func:`~utools.analysis.results.connect`.
+    :returns: Maps vector processing unit names to catchment count, total nodes, maximum nodes in a catchment, total
+     holes, and total area in square meters. Units are ordered by name.
+    :rtype: :class:`collections.OrderedDict`
+    """
+
+    c = Catchment.__table__
+    v = VectorProcessingUnit.__table__
+    query = select([v.c.name, func.count(c.c.cid), func.sum(c.c.node_count), func.max(c.c.node_count),
+                    func.sum(c.c.hole_count), func.sum(c.c.area)]).select_from(c.join(v, c.c.vid == v.c.vid)) \
+        .group_by(v.c.name).order_by(v.c.name)
+    keys = ('elements', 'nodes', 'max_nodes', 'holes', 'area')
+    with (bind or engine).connect() as conn:
+        return OrderedDict([(row[0], OrderedDict(zip(keys, row[1:]))) for row in conn.execute(query)])
+
+
+def get_node_counts(vpu_name=None, bind=None):
+    """
+    :param str vpu_name: If provided, only return node counts for this vector processing unit.
+    :param bind: The engine. Defaults to the engine from :func:`~utools.analysis.results.connect`.
+    :returns: Maps vector processing unit names to catchment node count arrays.
+    :rtype: :class:`collections.OrderedDict`
+    """
+
+    c = Catchment.__table__
+    v = VectorProcessingUnit.__table__
+    query = select([v.c.name, c.c.node_count]).select_from(c.join(v, c.c.vid == v.c.vid)).order_by(v.c.name)
+    if vpu_name is not None:
+        query = query.where(v.c.name == vpu_name)
+    with (bind or engine).connect() as conn:
+        rows = conn.execute(query).fetchall()
+    ret = OrderedDict()
+    for name, node_count in rows:
+        ret.setdefault(name, []).append(node_count)
+    return OrderedDict([(k, np.array(v, dtype=np.int64)) for k, v in ret.items()])
+
+
+def get_phase_times(phase, metric='wall', bind=None):
+    """
+    :param str phase: The phase name.
+    :param str metric: The summed metric. See :attr:`~utools.analysis.results.PHASE_METRICS`.
+    :param bind: The engine. Defaults to the engine from :func:`~utools.analysis.results.connect`.
+    :returns: Maps vector processing unit names to the maximum across ranks of the summed metric. With several jobs
+     for a unit, the maximum across jobs is used.
+    :rtype: dict
+    """
+
+    p = Phase.__table__
+    v = VectorProcessingUnit.__table__
+    per_rank = select([p.c.vid, p.c.jid, p.c.rank, func.sum(getattr(p.c, metric)).label('total')]) \
+        .where(p.c.phase == phase).group_by(p.c.vid, p.c.jid, p.c.rank).alias('per_rank')
+    query = select([v.c.name, func.max(per_rank.c.total)]).select_from(
+        per_rank.join(v, per_rank.c.vid == v.c.vid)).group_by(v.c.name)
+    with (bind or engine).connect() as conn:
+        return dict(conn.execute(query).fetchall())
+
+
+def get_job_run_times(name_pattern, bind=None):
+    """
+    :param str name_pattern: An SQL ``LIKE`` pattern for job names.
+    :param bind: The engine. Defaults to the engine from :func:`~utools.analysis.results.connect`.
+    :returns: Maps vector processing unit names to the maximum run time in seconds of matching jobs.
+    :rtype: dict
+    """
+
+    j = Job.__table__
+    v = VectorProcessingUnit.__table__
+    query = select([v.c.name, func.max(j.c.run_time)]).select_from(j.join(v, j.c.vid == v.c.vid)) \
+        .where(j.c.name.like(name_pattern)).group_by(v.c.name)
+    with (bind or engine).connect() as conn:
+        return dict(conn.execute(query).fetchall())
+
+
+def _get_ids_(conn, table, id_name, rows):
+    names = [r['name'] for r in rows]
+    ret = {}
+    # Bounded batches keep the number of bound parameters below database limits.
+    for start in range(0, len(names), 500):
+        batch = names[start:start + 500]
+        query = select([table.c.name, getattr(table.c, id_name)]).where(table.c.name.in_(batch))
+        ret.update(dict(conn.execute(query).fetchall()))
+
+    missing = []
+    seen = set(ret.keys())
+    for row in rows:
+        if row['name'] not in seen:
+            missing.append(row)
+            seen.add(row['name'])
+    if len(missing) > 0:
+        conn.execute(table.insert(), missing)
+        return _get_ids_(conn, table, id_name, rows)
+    return ret
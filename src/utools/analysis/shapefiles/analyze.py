@@ -1,10 +1,8 @@
-import numpy as np
 from ocgis.interface.base.crs import CoordinateReferenceSystem
-from ocgis.interface.base.dimension.spatial import SpatialGeometryPolygonDimension
-from ocgis.util.geom_cabinet import GeomCabinetIterator
-from shapely.geometry import MultiPolygon
 
+from utools.analysis.results import get_catchment_statistics
 from utools.analysis.shapefiles.db import metadata, Session, get_or_create, Shapefile, Catchment
+from utools.io.columnar import read_columnar
 
 
 def setup_database():
@@ -15,40 +13,17 @@ def analyze_shapefile(path, key, to_crs_epsg):
     s = Session()
     to_crs = CoordinateReferenceSystem(epsg=to_crs_epsg)
     shapefile = get_or_create(s, Shapefile, fullpath=path, key=key)
-    gi = GeomCabinetIterator(path=path)
-    for row in gi:
-        geom = row['geom']
-        if not geom.is_valid:
-            geom = geom.buffer(0)
-            assert geom.is_valid
-        if isinstance(geom, MultiPolygon):
-            itr = geom
-            face_count = len(geom)
-        else:
-            itr = [geom]
-            face_count = 1
-        node_count = 0
-        for element in itr:
-            node_count += len(element.exterior.coords)
-        catchment = Catchment(gridcode=row['properties']['GRIDCODE'],
-                              node_count=node_count,
-                              face_count=face_count,
-                              shapefile=shapefile,
-                              area=get_area(geom, to_crs))
-        s.add(catchment)
+    columnar = read_columnar(path, fields=['GRIDCODE'], dest_crs=to_crs)
+    stats = get_catchment_statistics(columnar)
+    s.bulk_insert_mappings(Catchment, [{'gridcode': gridcode, 'sid': shapefile.sid, 'node_count': node_count,
+                                        'face_count': face_count, 'area': area}
+                                       for gridcode, node_count, face_count, area in
+                                       zip(stats['gridcode'].tolist(), stats['node_count'].tolist(),
+                                           stats['part_count'].tolist(), stats['area'].tolist())])
     s.commit()
     s.close()
 
 
-def get_area(geom, to_crs, from_crs=None):
-    from_crs = from_crs or CoordinateReferenceSystem(epsg=4326)
-    value = np.array([[0]], dtype=object)
-    value[0, 0] = geom
-    s = SpatialGeometryPolygonDimension(value=value)
-    s.update_crs(to_crs, from_crs)
-    return s.value[0, 0].area
-
-
 if __name__ == '__main__':
     # setup_database()
     # path = '/home/benkoziol/Dropbox/NESII/project/pmesh/bin/NHDPlusTX/NHDPlus12/NHDPlusCatchment/Catchment.shp'
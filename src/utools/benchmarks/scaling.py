@@ -0,0 +1,211 @@
+"""
+Strong and weak scaling studies. :func:`~utools.benchmarks.scaling.run_scaling` launches a benchmark once per process
+count with ``mpirun`` and collects the per-rank phase totals of the best run. Each job runs:
+
+    mpirun -n <processes> python -m utools.benchmarks.scaling <config.json>
+
+Without a launcher, only a single process is run and :class:`~utools.io.mpi.DummyMPIComm` is used if :mod:`mpi4py` is
+not installed.
+"""
+import os
+import shlex
+import subprocess
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+from utools.benchmarks.suite import CASES, create_inputs, run_benchmark, get_metadata, load_results, write_results
+from utools.instrument import RECORDER
+from utools.io.mpi import MPI_COMM, MPI_RANK, MPI_SIZE
+from utools.logging import log, flush_logs
+
+#: Benchmarks supported by scaling studies. Merging runs on a single process.
+STAGES = ('convert', 'connectivity', 'apply', 'apply-partitioned')
+
+#: Name of the phase holding the total benchmark time in scaling tables.
+TOTAL = 'total'
+
+# Environment variables set by a parent MPI launcher. Removed so nested launches are not treated as part of the
+# parent's job.
+_LAUNCHER_PREFIXES = ('OMPI_', 'PMIX_', 'PMI_', 'HYDRA_', 'MPIR_')
+
+
+def get_process_counts(max_processes):
+    """
+    :returns: Powers of two up to and including ``max_processes``. ``max_processes`` is appended if it is not a power
+     of two.
+    :rtype: list of int
+    """
+
+    ret = [1]
+    while ret[-1] * 2 <= max_processes:
+        ret.append(ret[-1] * 2)
+    if ret[-1] != max_processes:
+        ret.append(max_processes)
+    return ret
+
+
+def run_scaling(stage, directory, process_counts=(1, 2, 4), mode='strong', case='small', inputs=None, params=None,
+                repeat=1, mpirun='mpirun'):
+    """
+    Run a scaling study. Each process count is launched as a separate job.
+
+    :param str stage: The benchmark name. See :attr:`~utools.benchmarks.scaling.STAGES`.
+    :param str directory: The working directory for inputs, outputs, and per-job results.
+    :param process_counts: Number of processes for each job.
+    :type process_counts: sequence of int
+    :param str mode: ``'strong'`` uses the same inputs for each job. ``'weak'`` scales the synthetic mesh rows with the
+     number of processes.
+    :param str case: The synthetic case name. See :attr:`~utools.benchmarks.suite.CASES`.
+    :param dict inputs: Paths to existing inputs with keys used by the benchmark (``shapefile`` for conversions or
+     ``mesh``, ``source``, and ``weights`` for weight application). If provided, synthetic inputs are not created.
+    :param dict params: Parameters overloading the case parameters.
+    :param int repeat: Number of timed runs per job. The best run is reported.
+    :param str mpirun: The MPI launcher command with any arguments. If ``None``, jobs are run without a launcher and
+     only one process is supported.
+    :returns: Scaling results with keys ``metadata``, ``stage``, ``mode``, ``parameters``, and ``runs``. Each run has
+     the number of processes, the run times, and per-rank phase totals for the best run.
+    :rtype: :class:`collections.OrderedDict`
+    :raises: ValueError
+    """
+
+    if stage not in STAGES:
+        raise ValueError('Stage not supported by scaling studies: {}'.format(stage))
+    if mode not in ('strong', 'weak'):
+        raise ValueError('Scaling mode must be "strong" or "weak": {}'.format(mode))
+    if mode == 'weak' and inputs is not None:
+        raise ValueError('Weak scaling requires synthetic inputs.')
+    if mpirun is None and any([n != 1 for n in process_counts]):
+        raise ValueError('More than one process requires an MPI launcher.')
+
+    base_params = CASES[case].copy()
+    base_params.update(params or {})
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    runs = []
+    for n in process_counts:
+        run_params = base_params.copy()
+        if inputs is None:
+            if mode == 'weak':
+                run_params['nrow'] = base_params['nrow'] * n
+                input_directory = os.path.join(directory, 'weak-{}'.format(n))
+            else:
+                input_directory = os.path.join(directory, 'strong')
+            run_inputs = create_inputs(input_directory, run_params)
+        else:
+            run_inputs = inputs
+
+        path_config = os.path.join(directory, '{}-{}-{}.json'.format(stage, mode, n))
+        config = OrderedDict([('benchmark', stage), ('inputs', run_inputs), ('params', run_params),
+                              ('path_out', os.path.join(directory, 'out_{}_{}_{}.nc'.format(stage, mode, n))),
+                              ('path_results', os.path.join(directory, 'results_{}_{}_{}.json'.format(stage, mode, n))),
+                              ('repeat', repeat)])
+        write_results(path_config, config)
+
+        log.info('Starting scaling job: stage={}, mode={}, processes={}'.format(stage, mode, n))
+        launch(path_config, n, mpirun)
+        runs.append(load_results(config['path_results']))
+
+    return OrderedDict([('metadata', get_metadata()), ('stage', stage), ('mode', mode), ('parameters', base_params),
+                        ('runs', runs)])
+
+
+def launch(path_config, processes, mpirun):
+    """
+    Run the per-process entry point as a separate job.
+
+    :raises: :class:`subprocess.CalledProcessError`
+    """
+
+    cmd = [sys.executable, '-m', 'utools.benchmarks.scaling', path_config]
+    if mpirun is not None:
+        cmd = shlex.split(mpirun) + ['-n', str(processes)] + cmd
+    job_env = dict([(k, v) for k, v in os.environ.items() if not k.startswith(_LAUNCHER_PREFIXES)])
+    log.debug('launching: {}'.format(' '.join(cmd)))
+    subprocess.check_call(cmd, env=job_env)
+
+
+def run_job(path_config):
+    """
+    Per-process entry point. Runs the configured benchmark and writes the run times and per-rank phase totals of the
+    best run on the root rank. This is a collective operation.
+
+    :param str path_config: Path to the JSON job configuration written by
+     :func:`~utools.benchmarks.scaling.run_scaling`.
+    """
+
+    config = load_results(path_config)
+    times = []
+    best_ranks = None
+    for _ in range(config['repeat']):
+        elapsed = run_benchmark(config['benchmark'], config['inputs'], config['params'], config['path_out'])
+        ranks = MPI_COMM.gather(RECORDER.totals, root=0)
+        if len(times) == 0 or elapsed < min(times):
+            best_ranks = ranks
+        times.append(elapsed)
+    RECORDER.clear()
+    flush_logs()
+
+    if MPI_RANK == 0:
+        write_results(config['path_results'], OrderedDict([('processes', MPI_SIZE), ('times', times),
+                                                           ('best', min(times)), ('ranks', best_ranks)]))
+
+
+def get_scaling_table(results):
+    """
+    Compute scaling metrics relative to the run with the fewest processes. Phase times are the maximum across ranks.
+
+    :param dict results: Results from :func:`~utools.benchmarks.scaling.run_scaling`.
+    :returns: A row for each process count and phase with keys ``processes``, ``phase``, ``time``, ``speedup``,
+     ``efficiency``, and ``imbalance`` (maximum over mean rank time). Strong scaling efficiency is
+     ``speedup * n_base / n``. Weak scaling efficiency is ``time_base / time``. The ``total`` phase is the benchmark
+     wall time and has no imbalance.
+    :rtype: list of :class:`collections.OrderedDict`
+    """
+
+    runs = sorted(results['runs'], key=lambda r: r['processes'])
+    phases = []
+    for run in runs:
+        for totals in run['ranks']:
+            for name in totals.keys():
+                if name not in phases:
+                    phases.append(name)
+
+    def get_phase_times(run, name):
+        if name == TOTAL:
+            return np.array([run['best']])
+        return np.array([totals[name]['wall'] if name in totals else 0. for totals in run['ranks']])
+
+    ret = []
+    base = runs[0]
+    for run in runs:
+        for name in [TOTAL] + phases:
+            base_time = get_phase_times(base, name).max()
+            times = get_phase_times(run, name)
+            time = times.max()
+            speedup = base_time / time if time > 0 else float('nan')
+            if results['mode'] == 'strong':
+                efficiency = speedup * base['processes'] / run['processes']
+            else:
+                efficiency = speedup
+            mean = times.mean()
+            imbalance = time / mean if name != TOTAL and mean > 0 else float('nan')
+            ret.append(OrderedDict([('processes', run['processes']), ('phase', name), ('time', time),
+                                    ('speedup', speedup), ('efficiency', efficiency), ('imbalance', imbalance)]))
+    return ret
+
+
+def log_scaling_table(table, mode='strong'):
+    log.info('{} scaling'.format(mode))
+    log.info('{:>10}{:>14}{:>14}{:>10}{:>12}{:>11}'.format('processes', 'phase', 'time', 'speedup', 'efficiency',
+                                                          'imbalance'))
+    for row in table:
+        log.info('{:>10}{:>14}{:>14.6f}{:>10.2f}{:>12.2f}{:>11.3f}'.format(row['processes'], row['phase'], row['time'],
+                                                                        row['speedup'], row['efficiency'],
+                                                                        row['imbalance']))
+
+
+if __name__ == '__main__':
+    run_job(sys.argv[1])
@@ -0,0 +1,131 @@
+"""
+Command line startup and import time benchmarks. Each measurement runs in a fresh interpreter. On shared filesystems,
+imports dominate the startup of many-rank jobs.
+"""
+import os
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+from utools.logging import log
+
+#: Maps command line arguments to the startup time budget in seconds.
+STARTUP_BUDGETS = OrderedDict([(('--help',), 1.0),
+                               (('convert', '--help'), 1.0),
+                               (('subset', '--help'), 1.0),
+                               (('merge', '--help'), 1.0),
+                               (('apply', '--help'), 1.0),
+                               (('bench', '--help'), 1.0),
+                               (('bench-scaling', '--help'), 1.0)])
+
+#: Modules timed by :func:`~utools.benchmarks.startup.get_import_time`.
+IMPORT_MODULES = ('utools_cli', 'utools.logging', 'utools.io.mpi', 'utools.io.helpers', 'utools.regrid.core_esmf',
+                  'utools.prep.prep_shapefiles')
+
+# Prints the import time of a module in the child interpreter.
+_IMPORT_TEMPLATE = 'import time; t = time.time(); import {}; print(time.time() - t)'
+
+
+def get_command_time(args, repeat=3):
+    """
+    :param args: Arguments to the ``utools`` command line interface.
+    :type args: sequence of str
+    :returns: The best wall time in seconds to run the command including interpreter startup.
+    :rtype: float
+    :raises: :class:`subprocess.CalledProcessError`
+    """
+
+    cmd = [sys.executable, '-m', 'utools_cli'] + list(args)
+    ret = None
+    for _ in range(repeat):
+        t1 = time.time()
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(cmd, stdout=devnull)
+        elapsed = time.time() - t1
+        ret = elapsed if ret is None else min(ret, elapsed)
+    return ret
+
+
+def get_import_time(module, repeat=3):
+    """
+    :param str module: The module name.
+    :returns: The best time in seconds to import the module and its dependencies excluding interpreter startup.
+     ``None`` if the module cannot be imported.
+    :rtype: float
+    """
+
+    cmd = [sys.executable, '-c', _IMPORT_TEMPLATE.format(module)]
+    ret = None
+    for _ in range(repeat):
+        try:
+            with open(os.devnull, 'w') as devnull:
+                elapsed = float(subprocess.check_output(cmd, stderr=devnull).strip().splitlines()[-1])
+        except subprocess.CalledProcessError:
+            return None
+        ret = elapsed if ret is None else min(ret, elapsed)
+    return ret
+
+
+def get_import_profile(module):
+    """
+    Per-module import times from ``python -X importtime``. Requires Python 3.7 or later.
+
+    :param str module: The module name.
+    :returns: Tuples of module name, self time, and cumulative time in seconds in import order. ``None`` if not
+     supported by the interpreter or the module cannot be imported.
+    :rtype: list of tuple
+    """
+
+    if sys.version_info < (3, 7):
+        return None
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        return None
+
+    ret = []
+    for line in stderr.decode('utf-8').splitlines():
+        # Format: "import time: <self us> | <cumulative us> | <indented module name>"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        ret.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return ret
+
+
+def run_startup_benchmarks(budgets=None, modules=IMPORT_MODULES, repeat=3):
+    """
+    Time command line startup against budgets and module imports. This is not a collective operation. Run it on one
+    rank.
+
+    :param dict budgets: Maps command line arguments to budgets in seconds. Defaults to
+     :attr:`~utools.benchmarks.startup.STARTUP_BUDGETS`.
+    :param modules: Module names to time.
+    :type modules: sequence of str
+    :param int repeat: Number of runs per measurement. The best time is reported.
+    :returns: Results with keys ``commands``, ``imports``, and ``importtime``. Commands have a ``within_budget`` flag.
+     ``importtime`` is the ``-X importtime`` profile of the command line module or ``None``.
+    :rtype: :class:`collections.OrderedDict`
+    """
+
+    if budgets is None:
+        budgets = STARTUP_BUDGETS
+
+    commands = []
+    for args, budget in budgets.items():
+        elapsed = get_command_time(args, repeat=repeat)
+        within_budget = elapsed <= budget
+        msg = 'startup: utools {}, time={:.3f}, budget={:.3f}'.format(' '.join(args), elapsed, budget)
+        if within_budget:
+            log.info(msg)
+        else:
+            log.warn(msg + ' OVER BUDGET')
+        commands.append(OrderedDict([('command', ' '.join(args)), ('time', elapsed), ('budget', budget),
+                                     ('within_budget', within_budget)]))
+
+    imports = [OrderedDict([('module', m), ('time', get_import_time(m, repeat=repeat))]) for m in modules]
+
+    return OrderedDict([('commands', commands), ('imports', imports),
+                        ('importtime', get_import_profile('utools_cli'))])
@@ -0,0 +1,279 @@
+"""
+Parameterized benchmarks on synthetic inputs. Run with ``mpirun`` for parallel timings:
+
+    mpirun -n 4 python -m utools.benchmarks.suite
+
+Results are written to JSON with the commit and environment so runs can be compared between commits with
+:func:`~utools.benchmarks.suite.compare_results`. Inputs are generated once per case in the working directory and
+reused by later runs. The working directory must be shared by all ranks.
+"""
+import json
+import os
+import platform
+import socket
+import subprocess
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+import utools
+from utools.benchmarks import synthetic
+from utools.instrument import RECORDER
+from utools.io.mpi import MPI_COMM, MPI_RANK, MPI_SIZE
+from utools.logging import log
+
+#: Name of the element unique identifier in synthetic inputs.
+NAME_UID = 'GRIDCODE'
+
+#: Name of the source variable in synthetic grids.
+VARIABLE_NAME = 'pr'
+
+#: Benchmark cases. Mesh parameters are passed to :func:`~utools.benchmarks.synthetic.get_tessellated_polygons`.
+CASES = OrderedDict([
+    ('small', OrderedDict([('ncol', 10), ('nrow', 10), ('node_count', 20), ('hole_fraction', 0.1),
+                           ('multipart_fraction', 0.05), ('node_threshold', None), ('resolution', 0.25),
+                           ('ntime', 4), ('nnz', 8), ('nparts', 2)])),
+    ('medium', OrderedDict([('ncol', 40), ('nrow', 40), ('node_count', 200), ('hole_fraction', 0.1),
+                            ('multipart_fraction', 0.05), ('node_threshold', None), ('resolution', 0.1),
+                            ('ntime', 24), ('nnz', 16), ('nparts', 4)])),
+    ('large', OrderedDict([('ncol', 100), ('nrow', 100), ('node_count', 1000), ('hole_fraction', 0.1),
+                           ('multipart_fraction', 0.05), ('node_threshold', None), ('resolution', 0.05),
+                           ('ntime', 48), ('nnz', 32), ('nparts', 8)])),
+])
+
+#: Parameters passed to the mesh generator.
+_MESH_PARAMETERS = ('ncol', 'nrow', 'node_count', 'hole_fraction', 'multipart_fraction')
+
+
+def run_convert(inputs, params, path_out):
+    from utools.prep.prep_shapefiles import convert_to_esmf_format
+
+    convert_to_esmf_format(path_out, inputs['shapefile'], params.get('name_uid', NAME_UID),
+                           node_threshold=params['node_threshold'])
+
+
+def run_connectivity(inputs, params, path_out):
+    from utools.prep.prep_shapefiles import convert_to_esmf_format
+
+    convert_to_esmf_format(path_out, inputs['shapefile'], params.get('name_uid', NAME_UID),
+                           node_threshold=params['node_threshold'], with_connectivity=True)
+
+
+def run_merge(inputs, params, path_out):
+    from utools.regrid.core_ocgis import create_merged_weights
+
+    create_merged_weights(inputs['part_weights'], inputs['part_meshes'], path_out)
+
+
+def run_apply(inputs, params, path_out):
+    from utools.regrid.core_esmf import create_weighted_output
+
+    create_weighted_output(inputs['mesh'], inputs['source'], inputs['weights'], path_out,
+                           params.get('variable_name', VARIABLE_NAME))
+
+
+def run_apply_partitioned(inputs, params, path_out):
+    from utools.regrid.core_esmf import create_weighted_output
+
+    create_weighted_output(inputs['mesh'], inputs['source'], inputs['weights'], path_out,
+                           params.get('variable_name', VARIABLE_NAME), partitioned=True)
+
+
+#: Maps benchmark names to the benchmark callable and ``True`` if the callable is a collective operation. Other
+#: benchmarks run on the root rank only. Callables take the inputs from :func:`~utools.benchmarks.suite.create_inputs`,
+#: the case parameters, and the output path. For other inputs, parameters may set ``name_uid`` and ``variable_name``.
+BENCHMARKS = OrderedDict([('convert', (run_convert, True)),
+                          ('connectivity', (run_connectivity, True)),
+                          ('merge', (run_merge, False)),
+                          ('apply', (run_apply, True)),
+                          ('apply-partitioned', (run_apply_partitioned, True))])
+
+
+def create_inputs(directory, params, seed=1):
+    """
+    Create the synthetic inputs for a case if they do not exist. This is a collective operation.
+
+    :param str directory: The case input directory.
+    :param dict params: The case parameters. See :attr:`~utools.benchmarks.suite.CASES`.
+    :returns: Maps input names to paths.
+    :rtype: dict
+    """
+
+    inputs = {'shapefile': os.path.join(directory, 'catchments.shp'),
+              'mesh': os.path.join(directory, 'catchments_esmf.nc'),
+              'source': os.path.join(directory, 'source.nc'),
+              'weights': os.path.join(directory, 'weights.nc'),
+              'part_meshes': [os.path.join(directory, 'catchments_esmf_{}.nc'.format(ii))
+                              for ii in range(params['nparts'])],
+              'part_weights': [os.path.join(directory, 'weights_{}.nc'.format(ii)) for ii in range(params['nparts'])]}
+
+    if MPI_RANK == 0 and not os.path.exists(inputs['weights']):
+        log.info('Creating benchmark inputs: {}'.format(directory))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        geoms = synthetic.get_tessellated_polygons(seed=seed, **dict([(k, params[k]) for k in _MESH_PARAMETERS]))
+        synthetic.write_shapefile(inputs['shapefile'], geoms, name_uid=NAME_UID)
+        synthetic.write_esmf_mesh(inputs['mesh'], geoms, face_uid_name=NAME_UID)
+        src_grid_dims = synthetic.create_source_grid(inputs['source'], params['resolution'], params['ntime'],
+                                                     variable_name=VARIABLE_NAME)
+
+        start = 0
+        for ii, section in enumerate(np.array_split(np.arange(len(geoms)), params['nparts'])):
+            synthetic.write_esmf_mesh(inputs['part_meshes'][ii], geoms[start:start + section.shape[0]],
+                                      face_uid_name=NAME_UID, start=start + 1)
+            synthetic.create_weights(inputs['part_weights'][ii], section.shape[0], src_grid_dims, nnz=params['nnz'],
+                                     seed=seed + ii + 1)
+            start += section.shape[0]
+        # Written last so an interrupted run is regenerated.
+        synthetic.create_weights(inputs['weights'], len(geoms), src_grid_dims, nnz=params['nnz'], seed=seed)
+    MPI_COMM.Barrier()
+    return inputs
+
+
+def run_benchmarks(directory, names=None, cases=None, repeat=3):
+    """
+    Run benchmarks for each case. This is a collective operation.
+
+    :param str directory: The working directory for inputs and outputs.
+    :param names: Benchmark names. Defaults to all :attr:`~utools.benchmarks.suite.BENCHMARKS`.
+    :type names: sequence of str
+    :param cases: Maps case names to parameters. Defaults to the ``small`` case from
+     :attr:`~utools.benchmarks.suite.CASES`.
+    :type cases: dict
+    :param int repeat: Number of timed runs per benchmark and case.
+    :returns: Results with keys ``metadata`` and ``results``. Each result contains the wall times of each run in seconds
+     (the maximum across ranks), the best and median times, and the reduced phase summary of the best run.
+    :rtype: :class:`collections.OrderedDict`
+    """
+
+    names = names or BENCHMARKS.keys()
+    if cases is None:
+        cases = OrderedDict([('small', CASES['small'])])
+
+    results = []
+    for case_name, params in cases.items():
+        inputs = create_inputs(os.path.join(directory, case_name), params)
+        for name in names:
+            path_out = os.path.join(directory, case_name, 'out_{}.nc'.format(name))
+            times = []
+            best_phases = None
+            for _ in range(repeat):
+                elapsed = run_benchmark(name, inputs, params, path_out)
+                phases = RECORDER.get_summary()
+                if len(times) == 0 or elapsed < min(times):
+                    best_phases = phases
+                times.append(elapsed)
+
+            log.info('benchmark={}, case={}, best={:.6f}'.format(name, case_name, min(times)))
+            results.append(OrderedDict([('benchmark', name), ('case', case_name), ('parameters', params),
+                                        ('times', times), ('best', min(times)), ('median', float(np.median(times))),
+                                        ('phases', best_phases)]))
+    RECORDER.clear()
+
+    return OrderedDict([('metadata', get_metadata()), ('results', results)])
+
+
+def run_benchmark(name, inputs, params, path_out):
+    """
+    Run a benchmark once. Phase records from the run are left in :attr:`~utools.instrument.RECORDER`. This is a
+    collective operation.
+
+    :param str name: The benchmark name. See :attr:`~utools.benchmarks.suite.BENCHMARKS`.
+    :returns: The wall time in seconds. This is the maximum across ranks.
+    :rtype: float
+    """
+
+    func, collective = BENCHMARKS[name]
+    if MPI_RANK == 0 and os.path.exists(path_out):
+        os.remove(path_out)
+    RECORDER.clear()
+    MPI_COMM.Barrier()
+    t1 = time.time()
+    if collective or MPI_RANK == 0:
+        func(inputs, params, path_out)
+    elapsed = time.time() - t1
+    all_elapsed = MPI_COMM.gather(elapsed, root=0)
+    return MPI_COMM.bcast(None if all_elapsed is None else max(all_elapsed), root=0)
+
+
+def get_metadata():
+    """
+    :returns: The commit, host, and software versions for a benchmark run.
+    :rtype: :class:`collections.OrderedDict`
+    """
+
+    return OrderedDict([('commit', get_commit()), ('time', datetime.now().isoformat()),
+                        ('host', socket.gethostname()), ('mpi_size', MPI_SIZE),
+                        ('python', platform.python_version()), ('numpy', np.__version__),
+                        ('utools', utools.__version__)])
+
+
+def get_commit():
+    """
+    :returns: The ``git`` commit of the source tree. ``None`` if not available.
+    :rtype: str
+    """
+
+    try:
+        with open(os.devnull, 'w') as devnull:
+            ret = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(utools.__file__),
+                                          stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        ret = None
+    else:
+        ret = ret.strip()
+    return ret
+
+
+def write_results(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def compare_results(baseline, current, tolerance=0.1):
+    """
+    Compare best times of matching benchmarks and cases.
+
+    :param dict baseline: Results from :func:`~utools.benchmarks.suite.run_benchmarks`.
+    :param dict current: Results from :func:`~utools.benchmarks.suite.run_benchmarks`.
+    :param float tolerance: Relative slowdown allowed before a benchmark is a regression.
+    :returns: Comparisons with keys ``benchmark``, ``case``, ``baseline``, ``current``, ``ratio`` (current over
+     baseline), and ``regression``.
+    :rtype: list of :class:`collections.OrderedDict`
+    """
+
+    baseline_best = dict([((r['benchmark'], r['case']), r['best']) for r in baseline['results']])
+    ret = []
+    for result in current['results']:
+        key = (result['benchmark'], result['case'])
+        if key not in baseline_best:
+            continue
+        ratio = result['best'] / baseline_best[key] if baseline_best[key] > 0 else 1.0
+        ret.append(OrderedDict([('benchmark', key[0]), ('case', key[1]), ('baseline', baseline_best[key]),
+                                ('current', result['best']), ('ratio', ratio), ('regression', ratio > 1 + tolerance)]))
+    return ret
+
+
+def log_comparison(comparison):
+    log.info('{:<20}{:>10}{:>14}{:>14}{:>10}'.format('benchmark', 'case', 'baseline', 'current', 'ratio'))
+    for c in comparison:
+        msg = '{:<20}{:>10}{:>14.6f}{:>14.6f}{:>10.2f}'.format(c['benchmark'], c['case'], c['baseline'], c['current'],
+                                                             c['ratio'])
+        if c['regression']:
+            log.warn(msg + ' REGRESSION')
+        else:
+            log.info(msg)
+
+
+if __name__ == '__main__':
+    directory = os.path.join(os.getcwd(), 'utools-benchmarks')
+    results = run_benchmarks(directory)
+    if MPI_RANK == 0:
+        write_results(os.path.join(directory, 'results.json'), results)
@@ -0,0 +1,189 @@
+"""
+Synthetic inputs for benchmarks. All generators are seeded and return identical inputs for identical arguments.
+"""
+from collections import OrderedDict
+
+import fiona
+import netCDF4 as nc
+import numpy as np
+from fiona.crs import from_epsg
+from shapely.geometry import Polygon, MultiPolygon, mapping
+
+from utools.io.esmf_stream import EsmfStreamWriter
+from utools.prep.create_netcdf_data import create_source_netcdf_data
+
+#: Default extent of synthetic meshes and grids ``(minx, miny, maxx, maxy)``.
+DEFAULT_BBOX = (-100., 30., -90., 40.)
+
+#: Nodes in synthetic hole and island rings.
+RING_NODE_COUNT = 8
+
+
+def get_tessellated_polygons(ncol, nrow, node_count=4, hole_fraction=0., multipart_fraction=0., bbox=DEFAULT_BBOX,
+                             jitter=0.25, seed=1):
+    """
+    Create polygons tessellating ``bbox``. Grid corners are randomly displaced and cell edges are densified with
+    randomly displaced nodes. Neighboring polygons share edge nodes exactly.
+
+    :param int ncol: Number of polygon columns.
+    :param int nrow: Number of polygon rows.
+    :param int node_count: Approximate number of exterior nodes per polygon. The minimum is four.
+    :param float hole_fraction: Fraction of polygons with a hole.
+    :param float multipart_fraction: Fraction of polygons with a hole containing a second part. Multipart polygons are
+     selected from polygons with holes.
+    :param bbox: The extent ``(minx, miny, maxx, maxy)``.
+    :param float jitter: Maximum corner displacement as a fraction of the cell size. Must be at most ``0.25`` so holes
+     fit inside their polygon.
+    :param int seed: The random seed.
+    :returns: Row-major polygons.
+    :rtype: list of :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+    """
+
+    rs = np.random.RandomState(seed)
+    minx, miny, maxx, maxy = bbox
+    dx = float(maxx - minx) / ncol
+    dy = float(maxy - miny) / nrow
+
+    # Displace interior corners only so the tessellation covers the extent.
+    x = np.linspace(minx, maxx, ncol + 1)
+    y = np.linspace(miny, maxy, nrow + 1)
+    cx, cy = np.meshgrid(x, y)
+    cx[1:-1, 1:-1] += rs.uniform(-jitter, jitter, (nrow - 1, ncol - 1)) * dx
+    cy[1:-1, 1:-1] += rs.uniform(-jitter, jitter, (nrow - 1, ncol - 1)) * dy
+
+    # Nodes between corners on each edge. Displacement is perpendicular to the edge and zero on the boundary.
+    nedge = max(0, (node_count - 4) // 4)
+    fractions = np.linspace(0., 1., nedge + 2)[1:-1]
+    wiggle = 0.05
+    hx = cx[:, :-1, None] + (cx[:, 1:, None] - cx[:, :-1, None]) * fractions
+    hy = cy[:, :-1, None] + (cy[:, 1:, None] - cy[:, :-1, None]) * fractions
+    hy[1:-1] += rs.uniform(-wiggle, wiggle, hy[1:-1].shape) * dy
+    vx = cx[:-1, :, None] + (cx[1:, :, None] - cx[:-1, :, None]) * fractions
+    vy = cy[:-1, :, None] + (cy[1:, :, None] - cy[:-1, :, None]) * fractions
+    vx[:, 1:-1] += rs.uniform(-wiggle, wiggle, vx[:, 1:-1].shape) * dx
+
+    nfeatures = ncol * nrow
+    has_hole = rs.uniform(size=nfeatures) < hole_fraction
+    multipart_ratio = multipart_fraction / hole_fraction if hole_fraction > 0 else 0.
+    is_multipart = np.logical_and(has_hole, rs.uniform(size=nfeatures) < multipart_ratio)
+
+    ret = []
+    for idx in range(nfeatures):
+        r, c = divmod(idx, ncol)
+        # Counter-clockwise: bottom, right, top (reversed), and left (reversed).
+        xs = [[cx[r, c]], hx[r, c], [cx[r, c + 1]], vx[r, c + 1], [cx[r + 1, c + 1]], hx[r + 1, c][::-1],
+              [cx[r + 1, c]], vx[r, c][::-1]]
+        ys = [[cy[r, c]], hy[r, c], [cy[r, c + 1]], vy[r, c + 1], [cy[r + 1, c + 1]], hy[r + 1, c][::-1],
+              [cy[r + 1, c]], vy[r, c][::-1]]
+        exterior = np.column_stack((np.hstack(xs), np.hstack(ys)))
+
+        if has_hole[idx]:
+            center = (minx + (c + 0.5) * dx, miny + (r + 0.5) * dy)
+            hole = get_ring(center, 0.15 * dx, 0.15 * dy)[::-1]
+            geom = Polygon(exterior, [hole])
+            if is_multipart[idx]:
+                geom = MultiPolygon([geom, Polygon(get_ring(center, 0.05 * dx, 0.05 * dy))])
+        else:
+            geom = Polygon(exterior)
+        ret.append(geom)
+    return ret
+
+
+def get_ring(center, rx, ry, node_count=RING_NODE_COUNT):
+    """
+    :returns: Counter-clockwise elliptical ring coordinates with shape ``(node_count, 2)``.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    theta = np.linspace(0., 2 * np.pi, node_count, endpoint=False)
+    return np.column_stack((center[0] + rx * np.cos(theta), center[1] + ry * np.sin(theta)))
+
+
+def write_shapefile(path, geoms, name_uid='GRIDCODE', start=1):
+    """
+    Write polygons to a shapefile with consecutive integer unique identifiers.
+
+    :param str path: The output path.
+    :param geoms: The polygons to write.
+    :type geoms: sequence of :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+    :param str name_uid: Name of the unique identifier property.
+    :param int start: The first unique identifier.
+    """
+
+    schema = {'geometry': 'Polygon', 'properties': OrderedDict([(name_uid, 'int')])}
+    with fiona.open(path, mode='w', driver='ESRI Shapefile', schema=schema, crs=from_epsg(4326)) as sink:
+        for uid, geom in enumerate(geoms, start=start):
+            sink.write({'geometry': mapping(geom), 'properties': {name_uid: uid}})
+
+
+def create_source_grid(path, resolution, ntime, bbox=DEFAULT_BBOX, variable_name='pr'):
+    """
+    Create a ``(time, lat, lon)`` source grid covering ``bbox`` with
+    :func:`~utools.prep.create_netcdf_data.create_source_netcdf_data`.
+
+    :param float resolution: Grid spacing in degrees.
+    :param int ntime: Number of time steps.
+    :returns: The source grid dimensions ``(nlon, nlat)`` in ESMF ``src_grid_dims`` order.
+    :rtype: tuple of int
+    """
+
+    minx, miny, maxx, maxy = bbox
+    lon = np.arange(minx + 0.5 * resolution, maxx, resolution)
+    lat = np.arange(miny + 0.5 * resolution, maxy, resolution)
+    create_source_netcdf_data(path, lon, lat, np.arange(ntime), variable_name=variable_name)
+    return lon.shape[0], lat.shape[0]
+
+
+def create_weights(path, n_b, src_grid_dims, nnz=4, seed=1):
+    """
+    Create a sparse ESMF weight file with ``nnz`` source cells per destination element. Rows are one-based and sorted.
+    Weights for each destination element sum to one.
+
+    :param int n_b: Number of destination elements.
+    :param src_grid_dims: Source grid dimensions ``(nlon, nlat)``.
+    :param int nnz: Number of weights per destination element.
+    :param int seed: The random seed.
+    """
+
+    rs = np.random.RandomState(seed)
+    n_a = int(np.prod(src_grid_dims))
+    nnz = min(nnz, n_a)
+    row = np.repeat(np.arange(1, n_b + 1, dtype=np.int32), nnz)
+    # Neighboring destination elements map to neighboring source cells like a conservative regrid.
+    anchor = (np.arange(n_b, dtype=np.int64) * n_a) // max(n_b, 1)
+    col = (anchor[:, None] + np.arange(nnz) + rs.randint(0, nnz + 1, (n_b, 1))) % n_a + 1
+    S = rs.uniform(0.1, 1., (n_b, nnz))
+    S /= S.sum(axis=1)[:, None]
+
+    ds = nc.Dataset(path, 'w', format='NETCDF3_64BIT')
+    try:
+        ds.title = 'Synthetic ESMF weights'
+        ds.createDimension('n_a', n_a)
+        ds.createDimension('n_b', n_b)
+        ds.createDimension('n_s', row.shape[0])
+        ds.createDimension('src_grid_rank', 2)
+        ds.createDimension('dst_grid_rank', 1)
+        ds.createVariable('src_grid_dims', np.int32, ('src_grid_rank',))[:] = src_grid_dims
+        ds.createVariable('dst_grid_dims', np.int32, ('dst_grid_rank',))[:] = n_b
+        ds.createVariable('row', np.int32, ('n_s',))[:] = row
+        ds.createVariable('col', np.int32, ('n_s',))[:] = col.flatten()
+        ds.createVariable('S', np.float64, ('n_s',))[:] = S.flatten()
+    finally:
+        ds.close()
+
+
+def write_esmf_mesh(path, geoms, face_uid_name='GRIDCODE', start=1):
+    """
+    Write polygons directly to an ESMF unstructured file with
+    :class:`~utools.io.esmf_stream.EsmfStreamWriter`. Polygons are not split.
+
+    :param str path: The output path.
+    :param geoms: The polygons to write.
+    :type geoms: sequence of :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+    :param str face_uid_name: Name of the element unique identifier variable.
+    :param int start: The first unique identifier.
+    """
+
+    with EsmfStreamWriter(path, face_uid_name=face_uid_name) as writer:
+        for uid, geom in enumerate(geoms, start=start):
+            writer.add(uid, geom)
@@ -0,0 +1,231 @@
+"""
+Per-feature cost model for pipeline stages. The time for a feature is modeled as ``c0 + a * x ** b`` where ``x`` is the
+feature's node count (``convert`` and ``weights``) or area (``apply``). ``c0`` is a fixed cost per polygon part, which
+makes splitting large elements with a node threshold a trade-off when ``b > 1``.
+
+>>> model = CostModel()
+>>> model.fit(get_samples_from_timing_data() + get_samples_from_benchmarks(load_results('results.json')))
+>>> model.predict_vpu(node_counts, areas=areas)
+>>> model.recommend_node_threshold(node_counts)
+
+Samples are aggregated runs: ``count`` features with mean node count ``node_count`` and mean area ``area`` took
+``time`` seconds in total. Areas must use the same units for fitting and prediction.
+"""
+import json
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+#: Pipeline stages in execution order.
+STAGES = ('convert', 'weights', 'apply')
+
+#: The feature used to model each stage.
+STAGE_FEATURES = {'convert': 'node_count', 'weights': 'node_count', 'apply': 'area'}
+
+#: Maps instrumentation phase names to pipeline stages. See :attr:`utools.instrument.PHASES`. Phases nested in another
+#: phase (``split`` and ``connectivity`` are included in ``read``) map to ``None`` so they are not counted twice.
+PHASE_STAGES = {'read': 'convert', 'split': None, 'connectivity': None, 'write': 'convert',
+                'weight-load': 'apply', 'apply': 'apply', 'write-output': 'apply'}
+
+#: Maps benchmark names to pipeline stages. See :attr:`utools.benchmarks.suite.BENCHMARKS`.
+BENCHMARK_STAGES = {'convert': 'convert', 'connectivity': 'convert', 'apply': 'apply', 'apply-partitioned': 'apply'}
+
+#: Exponents searched when fitting a stage.
+EXPONENTS = np.linspace(1., 3., 201)
+
+Sample = namedtuple('Sample', ['stage', 'node_count', 'area', 'time', 'count'])
+
+
+class CostModel(object):
+    """
+    :param dict coefficients: Maps stage names to ``(c0, a, b)``. Stages without coefficients are not predicted.
+    """
+
+    def __init__(self, coefficients=None):
+        self.coefficients = OrderedDict()
+        for stage in STAGES:
+            if coefficients is not None and stage in coefficients:
+                self.coefficients[stage] = tuple(coefficients[stage])
+
+    def fit(self, samples, exponents=None):
+        """
+        Fit stage coefficients by minimizing the relative error of per-feature times. Stages without samples keep their
+        coefficients.
+
+        :param samples: Timing samples.
+        :type samples: sequence of :class:`~utools.cost_model.Sample`
+        :param exponents: Candidate exponents. Defaults to :attr:`~utools.cost_model.EXPONENTS`.
+        :returns: This model.
+        """
+
+        if exponents is None:
+            exponents = EXPONENTS
+        for stage in STAGES:
+            stage_samples = [s for s in samples if s.stage == stage and getattr(s, STAGE_FEATURES[stage]) is not None]
+            if len(stage_samples) == 0:
+                continue
+            x = np.array([getattr(s, STAGE_FEATURES[stage]) for s in stage_samples], dtype=float)
+            y = np.array([float(s.time) / s.count for s in stage_samples])
+            self.coefficients[stage] = fit_power(x, y, exponents=exponents)
+        return self
+
+    def predict(self, stage, values, node_threshold=None):
+        """
+        :param str stage: The stage name.
+        :param values: The stage feature for each feature. See :attr:`~utools.cost_model.STAGE_FEATURES`.
+        :param int node_threshold: If provided, node counts above the threshold are split into equal parts. Only
+         applies to node count features.
+        :returns: Predicted seconds for each feature.
+        :rtype: :class:`numpy.ndarray`
+        :raises: ValueError
+        """
+
+        try:
+            c0, a, b = self.coefficients[stage]
+        except KeyError:
+            raise ValueError('Stage is not fitted: {}'.format(stage))
+        values = np.asarray(values, dtype=float)
+        if node_threshold is not None and STAGE_FEATURES[stage] == 'node_count':
+            parts = get_part_counts(values, node_threshold)
+        else:
+            parts = np.ones(values.shape)
+        return parts * (c0 + a * (values / parts) ** b)
+
+    def predict_vpu(self, node_counts, areas=None, node_threshold=None):
+        """
+        :param node_counts: Node count for each feature in the vector processing unit.
+        :param areas: Area for each feature. Required to predict ``apply``.
+        :param int node_threshold: See :meth:`~utools.cost_model.CostModel.predict`.
+        :returns: Predicted seconds for each fitted stage and the ``total``.
+        :rtype: :class:`collections.OrderedDict`
+        """
+
+        ret = OrderedDict()
+        for stage in self.coefficients.keys():
+            values = areas if STAGE_FEATURES[stage] == 'area' else node_counts
+            if values is None:
+                continue
+            ret[stage] = float(self.predict(stage, values, node_threshold=node_threshold).sum())
+        ret['total'] = sum(ret.values())
+        return ret
+
+    def recommend_node_threshold(self, node_counts, areas=None, candidates=None):
+        """
+        :param node_counts: Node counts of the features to process.
+        :param areas: See :meth:`~utools.cost_model.CostModel.predict_vpu`.
+        :param candidates: Node thresholds to evaluate. Defaults to 50 thresholds spaced logarithmically between 100
+         and the maximum node count.
+        :returns: The node threshold minimizing the total predicted time. ``None`` if no threshold is faster than not
+         splitting.
+        :rtype: int
+        """
+
+        node_counts = np.asarray(node_counts, dtype=float)
+        if candidates is None:
+            candidates = np.unique(np.logspace(2, np.log10(max(node_counts.max(), 100)), 50).astype(int))
+        best_threshold = None
+        best_time = self.predict_vpu(node_counts, areas=areas)['total']
+        for threshold in candidates:
+            total = self.predict_vpu(node_counts, areas=areas, node_threshold=threshold)['total']
+            if total < best_time:
+                best_threshold, best_time = int(threshold), total
+        return best_threshold
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.coefficients, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(coefficients=json.load(f))
+
+
+def fit_power(x, y, exponents=EXPONENTS):
+    """
+    Fit ``y = c0 + a * x ** b`` with non-negative ``c0`` and ``a``. For each exponent, ``c0`` and ``a`` are the
+    weighted least squares solution minimizing relative error.
+
+    :returns: ``(c0, a, b)``
+    :rtype: tuple
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = y > 0
+    x, y = x[keep], y[keep]
+    best = None
+    for b in exponents:
+        A = np.vstack([np.ones(x.shape), x ** b]).T / y[:, None]
+        c = np.linalg.lstsq(A, np.ones(y.shape), rcond=-1)[0]
+        if c[0] < 0:
+            c = np.array([0., np.linalg.lstsq(A[:, 1:], np.ones(y.shape), rcond=-1)[0][0]])
+        elif c[1] < 0:
+            c = np.array([np.linalg.lstsq(A[:, :1], np.ones(y.shape), rcond=-1)[0][0], 0.])
+        sse = ((A.dot(c) - 1) ** 2).sum()
+        if best is None or sse < best[0]:
+            best = (sse, float(c[0]), float(c[1]), float(b))
+    return best[1:]
+
+
+def get_part_counts(node_counts, node_threshold):
+    """
+    :returns: Number of parts for each feature after splitting with the node threshold.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    return np.maximum(np.ceil(np.asarray(node_counts, dtype=float) / node_threshold), 1)
+
+
+def get_samples_from_timing_data(data=None):
+    """
+    :param data: Single-element weight generation timings with keys ``node_count`` and ``time``. Defaults to
+     :mod:`utools.profile.timing_data`.
+    :rtype: list of :class:`~utools.cost_model.Sample`
+    """
+
+    if data is None:
+        from utools.profile.timing_data import data
+    return [Sample('weights', d['node_count'], None, d['time'], 1) for d in data]
+
+
+def get_samples_from_benchmarks(results):
+    """
+    :param dict results: Results from :func:`~utools.benchmarks.suite.run_benchmarks`. Features are the synthetic mesh
+     cells of each case. Areas are in squared degrees.
+    :rtype: list of :class:`~utools.cost_model.Sample`
+    """
+
+    from utools.benchmarks.synthetic import DEFAULT_BBOX
+
+    bbox_area = (DEFAULT_BBOX[2] - DEFAULT_BBOX[0]) * (DEFAULT_BBOX[3] - DEFAULT_BBOX[1])
+    ret = []
+    for result in results['results']:
+        stage = BENCHMARK_STAGES.get(result['benchmark'])
+        if stage is None:
+            continue
+        params = result['parameters']
+        count = params['ncol'] * params['nrow']
+        ret.append(Sample(stage, params['node_count'], bbox_area / count, result['best'], count))
+    return ret
+
+
+def get_samples_from_instrumentation(path, node_count, count, area=None):
+    """
+    Sum instrumented phase records by stage for one run.
+
+    :param str path: A JSON lines file written by :class:`~utools.instrument.PhaseRecorder`.
+    :param float node_count: Mean node count of the run's features.
+    :param int count: Number of features in the run.
+    :param float area: Mean area of the run's features.
+    :rtype: list of :class:`~utools.cost_model.Sample`
+    """
+
+    totals = OrderedDict()
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            stage = PHASE_STAGES.get(record.get('phase'))
+            if stage is not None:
+                totals[stage] = totals.get(stage, 0.) + record['wall']
+    return [Sample(stage, node_count, area, wall, count) for stage, wall in totals.items()]
@@ -4,7 +4,6 @@ from importlib import import_module
 import logbook
 
 from utools.constants import UgridToolsConstants
-from utools.helpers import get_iter
 
 
 class Environment(object):
@@ -16,6 +15,17 @@ class Environment(object):
         self.LOGGING_LEVEL = EnvParm('LOGGING_LEVEL', logbook.INFO)
         self.LOGGING_STDOUT = EnvParm('LOGGING_STDOUT', False, formatter=self._format_bool_)
         self.LOGGING_TOFILE = EnvParm('LOGGING_TOFILE', False, formatter=self._format_bool_)
+        self.LOGGING_ASYNC = EnvParm('LOGGING_ASYNC', False, formatter=self._format_bool_)
+        self.LOGGING_AGGREGATE = EnvParm('LOGGING_AGGREGATE', False, formatter=self._format_bool_)
+        self.LOGGING_FLUSH_INTERVAL = EnvParm('LOGGING_FLUSH_INTERVAL', 1.0, formatter=float)
+        self.INSTRUMENT_DIR = EnvParm('INSTRUMENT_DIR', None, formatter=self._format_file_path_)
+        self.THREADS = EnvParm('THREADS', 1, formatter=int)
+        self.PROFILE = EnvParm('PROFILE', False, formatter=self._format_bool_)
+        self.PROFILE_DIR = EnvParm('PROFILE_DIR', os.getcwd(), formatter=self._format_file_path_)
+        self.PROFILE_INTERVAL = EnvParm('PROFILE_INTERVAL', 0.01, formatter=float)
+        self.PROGRESS = EnvParm('PROGRESS', None)
+        self.PROGRESS_DIR = EnvParm('PROGRESS_DIR', os.getcwd(), formatter=self._format_file_path_)
+        self.PROGRESS_INTERVAL = EnvParm('PROGRESS_INTERVAL', 5.0, formatter=float)
         self.TEST_ESMF_EXE = EnvParm('TEST_ESMF_EXE',
                                      '/home/benkoziol/anaconda2/envs/ugrid-tools/bin/ESMF_RegridWeightGen')
         self.TEST_MPIRUN_EXE = EnvParm('TEST_MPIRUN_EXE',
@@ -139,6 +149,9 @@ class EnvParmImport(EnvParm):
         self._value = value
 
     def _get_module_available_(self):
+        # Imported here since the helpers import netCDF4 and Shapely.
+        from utools.helpers import get_iter
+
         results = []
         for m in get_iter(self.module_names):
             try:
@@ -0,0 +1,297 @@
+"""
+Per-phase timing and memory instrumentation.
+
+Named phases record wall time, CPU time, peak resident set size, and bytes read and written by the process. Phases
+with the same name are accumulated. Nested phases are inclusive: a ``read`` phase containing ``split`` phases includes
+their time.
+
+>>> with phase('read'):
+>>>     load()
+>>>
+>>> @phase('apply')
+>>> def apply():
+>>>     ...
+
+Phases entered once per feature in hot loops use :class:`~utools.instrument.PhaseAccumulator` which records one record
+per loop instead of one record per entry.
+
+If :attr:`utools.env.INSTRUMENT_DIR` is set, each rank appends a JSON line per completed phase to
+``<prefix>-phases-rank-<rank>.jsonl`` in that directory.
+"""
+import functools
+import json
+import os
+import resource
+import sys
+import thread
+import time
+from collections import OrderedDict
+
+from utools import env
+from utools.io.mpi import MPI_COMM, MPI_RANK
+from utools.logging import log, flush_logs, log_entry_exit
+
+#: Names of the standard pipeline phases.
+PHASES = ('read', 'split', 'connectivity', 'write', 'weight-load', 'apply', 'write-output')
+
+# Maps thread identifiers to the names of entered phases. Read by the sampling profiler.
+_ACTIVE_PHASES = {}
+
+#: Metrics summed across calls of a phase.
+SUM_METRICS = ('count', 'wall', 'cpu', 'read_bytes', 'write_bytes')
+
+#: Metrics reported in summaries.
+SUMMARY_METRICS = ('wall', 'cpu', 'peak_rss', 'read_bytes', 'write_bytes')
+
+
+class PhaseRecorder(object):
+    """
+    Accumulate phase records for this rank.
+
+    :param str path: If provided, append a JSON line for each record to this file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.totals = OrderedDict()
+
+    def add(self, record):
+        """
+        :param dict record: A phase record with keys ``phase``, ``wall``, ``cpu``, ``peak_rss``, ``read_bytes``, and
+         ``write_bytes``. I/O counters may be ``None`` if unavailable. An optional ``count`` is the number of entries
+         accumulated in the record.
+        """
+
+        try:
+            total = self.totals[record['phase']]
+        except KeyError:
+            total = OrderedDict([(k, 0) for k in SUM_METRICS])
+            total['peak_rss'] = 0
+            self.totals[record['phase']] = total
+        total['count'] += record.get('count', 1)
+        for key in SUM_METRICS[1:]:
+            total[key] += record[key] or 0
+        total['peak_rss'] = max(total['peak_rss'], record['peak_rss'])
+
+        if self.path is not None:
+            self.write(record)
+
+    def clear(self):
+        self.totals = OrderedDict()
+
+    def get_summary(self, comm=None):
+        """
+        Reduce phase totals across ranks. Ranks without a phase contribute zeros. This is a collective operation.
+
+        :param comm: The communicator. Defaults to :attr:`~utools.io.mpi.MPI_COMM`.
+        :returns: On the root rank, maps phase names to metrics. Each metric maps to ``min``, ``max``, ``mean``, and
+         ``imbalance`` (``max / mean``). ``None`` on other ranks.
+        :rtype: :class:`collections.OrderedDict`
+        """
+
+        comm = comm or MPI_COMM
+        all_totals = comm.gather(self.totals, root=0)
+        if all_totals is None:
+            return None
+
+        names = []
+        for totals in all_totals:
+            for name in totals.keys():
+                if name not in names:
+                    names.append(name)
+
+        ret = OrderedDict()
+        for name in names:
+            metrics = OrderedDict()
+            for metric in SUMMARY_METRICS:
+                values = [totals[name][metric] if name in totals else 0 for totals in all_totals]
+                mean = float(sum(values)) / len(values)
+                metrics[metric] = OrderedDict([('min', min(values)), ('max', max(values)), ('mean', mean),
+                                               ('imbalance', max(values) / mean if mean > 0 else 1.0)])
+            ret[name] = metrics
+        return ret
+
+    def log_summary(self, comm=None):
+        """
+        Log the reduced phase summary on the root rank and append it to the root rank's JSON lines file. This is a
+        collective operation.
+
+        :rtype: :class:`collections.OrderedDict`
+        """
+
+        summary = self.get_summary(comm=comm)
+        if summary is not None:
+            for name, metrics in summary.items():
+                msg = ['phase={}'.format(name)]
+                for metric, stats in metrics.items():
+                    msg.append('{}(min={:.6g}, max={:.6g}, mean={:.6g}, imbalance={:.3f})'.format(
+                        metric, stats['min'], stats['max'], stats['mean'], stats['imbalance']))
+                log.info(', '.join(msg))
+            if self.path is not None:
+                self.write({'summary': summary})
+        return summary
+
+    def write(self, record):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+class phase(object):
+    """
+    Context manager and decorator recording a named phase. As a decorator, the phase is wrapped by
+    :class:`utools.logging.log_entry_exit`.
+
+    :param str name: The phase name. See :attr:`~utools.instrument.PHASES` for standard names.
+    :param bool io: If ``False``, do not read the process I/O counters. For phases entered many times, use
+     :class:`~utools.instrument.PhaseAccumulator`.
+    :param recorder: The destination recorder. Defaults to :attr:`~utools.instrument.RECORDER`.
+    :type recorder: :class:`~utools.instrument.PhaseRecorder`
+    :param comm: If provided, all ranks in this communicator enter the phase and aggregated log records are gathered
+     on exit. See :func:`utools.logging.flush_logs`.
+    """
+
+    def __init__(self, name, io=True, recorder=None, comm=None):
+        self.name = name
+        self.io = io
+        self.recorder = recorder
+        self.comm = comm
+        self._start = None
+
+    def __call__(self, f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with phase(self.name, io=self.io, recorder=self.recorder, comm=self.comm):
+                return f(*args, **kwargs)
+
+        return log_entry_exit(wrapper)
+
+    def __enter__(self):
+        _ACTIVE_PHASES.setdefault(thread.get_ident(), []).append(self.name)
+        io = get_io_counters() if self.io else None
+        self._start = (time.time(), time.clock(), io)
+        return self
+
+    def __exit__(self, *args):
+        _ACTIVE_PHASES[thread.get_ident()].pop()
+        wall_start, cpu_start, io_start = self._start
+        wall = time.time() - wall_start
+        cpu = time.clock() - cpu_start
+        read_bytes = write_bytes = None
+        if io_start is not None:
+            io_stop = get_io_counters()
+            read_bytes = io_stop[0] - io_start[0]
+            write_bytes = io_stop[1] - io_start[1]
+
+        record = OrderedDict([('phase', self.name), ('rank', MPI_RANK), ('time', wall_start), ('wall', wall),
+                              ('cpu', cpu), ('peak_rss', get_peak_rss()), ('read_bytes', read_bytes),
+                              ('write_bytes', write_bytes)])
+        (self.recorder or RECORDER).add(record)
+        if self.comm is not None:
+            flush_logs(comm=self.comm)
+
+
+class PhaseAccumulator(object):
+    """
+    Context manager accumulating wall and CPU time of a fine-grained phase entered many times. Entering only reads the
+    clocks. :meth:`~utools.instrument.PhaseAccumulator.record` adds one record for all entries. I/O counters are not
+    read.
+
+    >>> split = PhaseAccumulator('split')
+    >>> for record in records:
+    >>>     with split:
+    >>>         split_record(record)
+    >>> split.record()
+
+    :param str name: The phase name.
+    :param recorder: See :class:`~utools.instrument.phase`.
+    """
+
+    def __init__(self, name, recorder=None):
+        self.name = name
+        self.recorder = recorder
+        self.count = 0
+        self.wall = 0.
+        self.cpu = 0.
+        self._time = None
+        self._start = None
+
+    def __enter__(self):
+        _ACTIVE_PHASES.setdefault(thread.get_ident(), []).append(self.name)
+        self._start = (time.time(), time.clock())
+        if self._time is None:
+            self._time = self._start[0]
+        return self
+
+    def __exit__(self, *args):
+        _ACTIVE_PHASES[thread.get_ident()].pop()
+        self.wall += time.time() - self._start[0]
+        self.cpu += time.clock() - self._start[1]
+        self.count += 1
+
+    def record(self):
+        """Add the accumulated record and reset. Does nothing if the phase was not entered."""
+
+        if self.count == 0:
+            return
+        record = OrderedDict([('phase', self.name), ('rank', MPI_RANK), ('time', self._time), ('wall', self.wall),
+                              ('cpu', self.cpu), ('peak_rss', get_peak_rss()), ('read_bytes', None),
+                              ('write_bytes', None), ('count', self.count)])
+        (self.recorder or RECORDER).add(record)
+        self.count = 0
+        self.wall = self.cpu = 0.
+        self._time = None
+
+
+def get_current_phase(ident=None):
+    """
+    :param int ident: The thread identifier. Defaults to the current thread.
+    :returns: Name of the innermost phase entered by the thread. ``None`` if no phase is entered.
+    :rtype: str
+    """
+
+    if ident is None:
+        ident = thread.get_ident()
+    try:
+        return _ACTIVE_PHASES[ident][-1]
+    except (KeyError, IndexError):
+        return None
+
+
+def get_io_counters():
+    """
+    :returns: Tuple of bytes read and written by the process including cached I/O. ``None`` if the counters are not
+     available on this platform.
+    :rtype: tuple of int
+    """
+
+    try:
+        with open('/proc/self/io') as f:
+            lines = f.readlines()
+    except IOError:
+        return None
+    counters = dict([line.split(':') for line in lines])
+    return int(counters['rchar']), int(counters['wchar'])
+
+
+def get_peak_rss():
+    """
+    :returns: Peak resident set size of the process in bytes.
+    :rtype: int
+    """
+
+    ret = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes. macOS reports bytes.
+    if sys.platform != 'darwin':
+        ret *= 1024
+    return ret
+
+
+def get_recorder_path():
+    directory = env.INSTRUMENT_DIR
+    if directory is None:
+        return None
+    return os.path.join(directory, '{}-phases-rank-{}.jsonl'.format(env.LOGGING_FILE_PREFIX, MPI_RANK))
+
+
+#: The process phase recorder.
+RECORDER = PhaseRecorder(path=get_recorder_path())
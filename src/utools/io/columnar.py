@@ -0,0 +1,265 @@
+"""
+Columnar (ragged array) storage and reading for polygon geometries.
+
+Coordinates for all rings are stored in a single ``(n, 2)`` array. Offset vectors map geometries to parts, parts to
+rings, and rings to coordinates following the GeoArrow layout. Rings are closed (the first coordinate is repeated).
+"""
+from collections import OrderedDict
+
+import numpy as np
+from osgeo import ogr
+from shapely.geometry import Polygon, MultiPolygon
+
+from utools.helpers import get_iter
+from utools.io.crs import get_transformer
+from utools.io.geom_cabinet import GeomCabinet, DATASET_POOL
+from utools.io.geom_metrics import get_face_areas_and_centroids, get_geodesic_face_areas, \
+    get_offsets
+
+ogr.UseExceptions()
+
+
+class ColumnarGeometries(object):
+    """
+    :param coordinates: Ring coordinates with shape ``(n, 2)``.
+    :type coordinates: :class:`numpy.ndarray`
+    :param ring_offsets: Coordinate offsets for each ring with length ``n_rings + 1``.
+    :param part_offsets: Ring offsets for each polygon part with length ``n_parts + 1``. The first ring of a part is its
+     exterior.
+    :param geometry_offsets: Part offsets for each geometry with length ``n_geometries + 1``.
+    :param dict properties: Maps property names to value arrays with length ``n_geometries``.
+    :param crs: The coordinate system WKT.
+    :type crs: str
+    """
+
+    def __init__(self, coordinates, ring_offsets, part_offsets, geometry_offsets, properties=None, crs=None):
+        self.coordinates = coordinates
+        self.ring_offsets = np.asarray(ring_offsets, dtype=np.int64)
+        self.part_offsets = np.asarray(part_offsets, dtype=np.int64)
+        self.geometry_offsets = np.asarray(geometry_offsets, dtype=np.int64)
+        self.properties = properties or OrderedDict()
+        self.crs = crs
+
+    def __len__(self):
+        return self.geometry_offsets.shape[0] - 1
+
+    @classmethod
+    def from_shapely(cls, geoms, properties=None, crs=None):
+        """
+        :param geoms: Sequence of polygon or multipolygon geometries.
+        :rtype: :class:`~utools.io.columnar.ColumnarGeometries`
+        """
+
+        builder = ColumnarGeometriesBuilder()
+        for geom in geoms:
+            parts = []
+            for element in get_iter(geom, dtype=Polygon):
+                rings = [np.array(element.exterior.coords)[:, 0:2]]
+                rings += [np.array(interior.coords)[:, 0:2] for interior in element.interiors]
+                parts.append(rings)
+            builder.add(parts)
+        return builder.finalize(properties=properties, crs=crs)
+
+    @property
+    def ring_starts(self):
+        return self.ring_offsets[:-1]
+
+    @property
+    def ring_lengths(self):
+        return np.diff(self.ring_offsets)
+
+    @property
+    def ring_is_interior(self):
+        ret = np.ones(self.ring_offsets.shape[0] - 1, dtype=bool)
+        ret[self.part_offsets[:-1]] = False
+        return ret
+
+    @property
+    def ring_geometry_index(self):
+        part_geometry = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.geometry_offsets))
+        return np.repeat(part_geometry, np.diff(self.part_offsets))
+
+    def get_areas_and_centroids(self):
+        """
+        :returns: A tuple containing geometry areas and centroids in native coordinate units.
+        :rtype: tuple (:class:`numpy.ndarray`, :class:`numpy.ndarray`)
+        """
+
+        return get_face_areas_and_centroids(self.coordinates, self.ring_starts, self.ring_geometry_index, len(self),
+                                            ring_is_interior=self.ring_is_interior)
+
+    def get_geodesic_areas(self):
+        """
+        :returns: Ellipsoidal geometry areas in square meters. Coordinates must be longitude/latitude.
+        :rtype: :class:`numpy.ndarray`
+        """
+
+        return get_geodesic_face_areas(self.coordinates, self.ring_starts, self.ring_geometry_index, len(self),
+                                       ring_is_interior=self.ring_is_interior)
+
+    def get_geometry(self, idx):
+        """
+        :param int idx: The geometry index.
+        :rtype: :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+        """
+
+        polygons = []
+        for part_idx in range(self.geometry_offsets[idx], self.geometry_offsets[idx + 1]):
+            rings = [self.coordinates[self.ring_offsets[ring_idx]:self.ring_offsets[ring_idx + 1]]
+                     for ring_idx in range(self.part_offsets[part_idx], self.part_offsets[part_idx + 1])]
+            polygons.append(Polygon(rings[0], holes=rings[1:]))
+        if len(polygons) == 1:
+            ret = polygons[0]
+        else:
+            ret = MultiPolygon(polygons)
+        return ret
+
+    def get_hole_counts(self):
+        ring_is_interior = self.ring_is_interior
+        return np.bincount(self.ring_geometry_index[ring_is_interior], minlength=len(self))
+
+    def get_node_counts(self, exterior_only=True):
+        """
+        :param bool exterior_only: If ``True``, only count exterior ring nodes.
+        :returns: Node count for each geometry including the repeated closing node of each ring.
+        :rtype: :class:`numpy.ndarray`
+        """
+
+        ring_lengths = self.ring_lengths
+        if exterior_only:
+            ring_lengths = np.where(self.ring_is_interior, 0, ring_lengths)
+        return np.bincount(self.ring_geometry_index, weights=ring_lengths, minlength=len(self)).astype(np.int64)
+
+    def get_part_counts(self):
+        return np.diff(self.geometry_offsets)
+
+    def iter_geometries(self):
+        for idx in range(len(self)):
+            yield self.get_geometry(idx)
+
+    def transform(self, dst_crs, src_crs=None, n_workers=None):
+        """
+        Transform coordinates in-place as a single buffer.
+
+        :param dst_crs: The destination coordinate system. See :func:`~utools.io.crs.get_crs_wkt`.
+        :param src_crs: The source coordinate system. Defaults to :attr:`crs`.
+        :param int n_workers: Number of worker processes to use for the transformation.
+        """
+
+        src_crs = src_crs or self.crs
+        if src_crs is None:
+            raise ValueError('A source coordinate system is required.')
+        transformer = get_transformer(src_crs, dst_crs)
+        self.coordinates = transformer.transform_coordinates(self.coordinates, n_workers=n_workers)
+        self.crs = transformer.dst_wkt
+
+
+class ColumnarGeometriesBuilder(object):
+    """Incrementally collect polygon rings into columnar storage."""
+
+    def __init__(self):
+        self.rings = []
+        self.ring_lengths = []
+        self.part_ring_counts = []
+        self.geometry_part_counts = []
+
+    def add(self, parts):
+        """
+        :param parts: Sequence of polygon parts. Each part is a sequence of coordinate arrays with the exterior first.
+        """
+
+        for rings in parts:
+            for ring in rings:
+                self.rings.append(ring)
+                self.ring_lengths.append(ring.shape[0])
+            self.part_ring_counts.append(len(rings))
+        self.geometry_part_counts.append(len(parts))
+
+    def finalize(self, properties=None, crs=None):
+        if len(self.rings) == 0:
+            coordinates = np.zeros((0, 2), dtype=np.float64)
+        else:
+            coordinates = np.concatenate(self.rings).astype(np.float64)
+        ret = ColumnarGeometries(coordinates, get_offsets(self.ring_lengths), get_offsets(self.part_ring_counts),
+                                 get_offsets(self.geometry_part_counts), properties=properties, crs=crs)
+        self.__init__()
+        return ret
+
+
+def read_columnar(path, fields=None, driver_kwargs=None, select_sql_where=None, dest_crs=None, n_workers=None):
+    """
+    Read polygon geometries and properties from a vector file into columnar storage. Coordinates are transformed as a
+    single buffer when a destination coordinate system is provided.
+
+    :param str path: Path to the vector file.
+    :param fields: Property names to read. If ``None``, read all properties.
+    :type fields: sequence of str
+    :param dict driver_kwargs: See :meth:`utools.io.geom_cabinet.GeomCabinet._get_features_object_`.
+    :param str select_sql_where: A SQL WHERE statement used to select features.
+    :param dest_crs: The destination coordinate system. See :func:`~utools.io.crs.get_crs_wkt`.
+    :param int n_workers: Number of worker processes to use for coordinate transformation.
+    :rtype: :class:`~utools.io.columnar.ColumnarGeometries`
+    :raises: ValueError
+    """
+
+    builder = ColumnarGeometriesBuilder()
+
+    ds = DATASET_POOL.checkout(path)
+    features = None
+    try:
+        features = GeomCabinet._get_features_object_(ds, select_sql_where=select_sql_where,
+                                                     driver_kwargs=driver_kwargs)
+        layer_defn = features.GetLayerDefn()
+        if fields is None:
+            fields = [layer_defn.GetFieldDefn(ii).GetName() for ii in range(layer_defn.GetFieldCount())]
+        field_indices = [layer_defn.GetFieldIndex(f) for f in fields]
+        values = OrderedDict([(f, []) for f in fields])
+
+        sr = features.GetSpatialRef()
+        src_crs = None if sr is None else sr.ExportToWkt()
+
+        for feature in features:
+            for f, fidx in zip(fields, field_indices):
+                values[f].append(feature.GetField(fidx))
+            builder.add(get_ogr_polygon_parts(feature.GetGeometryRef()))
+    finally:
+        if features is not None and select_sql_where is not None:
+            ds.ReleaseResultSet(features)
+        DATASET_POOL.release(path, ds)
+
+    properties = OrderedDict([(k, np.array(v)) for k, v in values.items()])
+    ret = builder.finalize(properties=properties, crs=src_crs)
+    if dest_crs is not None:
+        ret.transform(dest_crs, n_workers=n_workers)
+    return ret
+
+
+def get_ogr_polygon_parts(ogr_geom):
+    """
+    :param ogr_geom: An OGR polygon or multipolygon geometry.
+    :returns: A list of parts. Each part is a list of ring coordinate arrays with the exterior first.
+    :rtype: list
+    :raises: ValueError
+    """
+
+    if ogr_geom is None:
+        return []
+
+    geom_type = ogr.GT_Flatten(ogr_geom.GetGeometryType())
+    if geom_type == ogr.wkbPolygon:
+        polygons = [ogr_geom]
+    elif geom_type == ogr.wkbMultiPolygon:
+        polygons = [ogr_geom.GetGeometryRef(ii) for ii in range(ogr_geom.GetGeometryCount())]
+    else:
+        raise ValueError('Only polygon geometries are supported: {}'.format(ogr_geom.GetGeometryName()))
+
+    parts = []
+    for polygon in polygons:
+        rings = []
+        for ii in range(polygon.GetGeometryCount()):
+            points = polygon.GetGeometryRef(ii).GetPoints()
+            if points:
+                rings.append(np.array(points, dtype=np.float64)[:, 0:2])
+        if len(rings) > 0:
+            parts.append(rings)
+    return parts
@@ -2,13 +2,14 @@ from utools.constants import UgridToolsConstants
 from utools.logging import log
 
 
-def from_geometry_manager(gm, mesh_name='mesh', use_ragged_arrays=False, with_connectivity=True):
-    return get_flexible_mesh(gm, mesh_name, use_ragged_arrays, with_connectivity=with_connectivity)
+def from_geometry_manager(gm, mesh_name='mesh', use_ragged_arrays=False, with_connectivity=True, geodesic_area=False):
+    return get_flexible_mesh(gm, mesh_name, use_ragged_arrays, with_connectivity=with_connectivity,
+                             geodesic_area=geodesic_area)
 
 
 def from_shapefile(path, name_uid, mesh_name='mesh', path_rtree=None, use_ragged_arrays=False, with_connectivity=True,
                    allow_multipart=False, node_threshold=None, driver_kwargs=None, debug=False, dest_crs=None,
-                   split_interiors=True):
+                   split_interiors=True, geodesic_area=False):
     """
     Create a flexible mesh from a target shapefile.
 
@@ -26,6 +27,7 @@ def from_shapefile(path, name_uid, mesh_name='mesh', path_rtree=None, use_ragged
     :param path_rtree: Path to a serialized spatial index object created using ``rtree``. Use :func:`pyugrid.flexible_mesh.helpers.create_rtree_file`
      to create a persistent ``rtree`` spatial index file.
     :type path_rtree: str
+    :param bool geodesic_area: If ``True``, also compute element areas on the WGS84 ellipsoid in square meters.
     :rtype: :class:`pyugrid.flexible_mesh.core.FlexibleMesh`
     """
     # tdk: update doc
@@ -43,19 +45,22 @@ def from_shapefile(path, name_uid, mesh_name='mesh', path_rtree=None, use_ragged
                          split_interiors=split_interiors)
     log.debug('geometry manager created')
 
-    ret = get_flexible_mesh(gm, mesh_name, use_ragged_arrays, with_connectivity=with_connectivity)
+    ret = get_flexible_mesh(gm, mesh_name, use_ragged_arrays, with_connectivity=with_connectivity,
+                            geodesic_area=geodesic_area)
     log.debug('mesh collection returned')
 
     return ret
 
 
-def get_flexible_mesh(gm, mesh_name, use_ragged_arrays, with_connectivity=True):
+def get_flexible_mesh(gm, mesh_name, use_ragged_arrays, with_connectivity=True, geodesic_area=False):
     from helpers import get_variables
 
-    result = get_variables(gm, use_ragged_arrays=use_ragged_arrays, with_connectivity=with_connectivity)
+    result = get_variables(gm, use_ragged_arrays=use_ragged_arrays, with_connectivity=with_connectivity,
+                           geodesic_area=geodesic_area)
 
     ret = {}
-    face_nodes, face_edges, edge_nodes, nodes, face_links, face_ids, face_coordinates, face_areas, section = result
+    face_nodes, face_edges, edge_nodes, nodes, face_links, face_ids, face_coordinates, face_areas, section, \
+        face_areas_geodesic = result
     ret['face'] = face_nodes
     ret['face_edges'] = face_edges
     ret['edge_nodes'] = edge_nodes
@@ -66,6 +71,8 @@ def get_flexible_mesh(gm, mesh_name, use_ragged_arrays, with_connectivity=True):
     ret[gm.name_uid] = face_ids
     if face_links is not None:
         ret['face_links'] = face_links
+    if face_areas_geodesic is not None:
+        ret['face_areas_geodesic'] = face_areas_geodesic
 
     return ret
 
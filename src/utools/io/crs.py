@@ -0,0 +1,173 @@
+"""
+Bulk coordinate reference system transformations for flat coordinate buffers.
+
+Transformations are cached per source/destination CRS pair. ``pyproj`` is used when installed with GDAL/OSR as the
+fallback. Axis order is always longitude/x first.
+"""
+import multiprocessing
+
+import numpy as np
+from osgeo import osr
+
+try:
+    import pyproj
+except ImportError:
+    pyproj = None
+
+osr.UseExceptions()
+
+#: Default number of coordinates transformed per call into the projection library.
+DEFAULT_CHUNK_SIZE = 1000000
+
+_TRANSFORMERS = {}
+
+
+def get_crs_wkt(crs):
+    """
+    :param crs: The coordinate system as an OSR spatial reference, WKT string, integer EPSG code, or an object with an
+     ``sr`` attribute (i.e. :class:`ocgis.CoordinateReferenceSystem`).
+    :rtype: str
+    """
+
+    if isinstance(crs, basestring):
+        return crs
+    if isinstance(crs, (int, long)):
+        sr = osr.SpatialReference()
+        sr.ImportFromEPSG(crs)
+        return sr.ExportToWkt()
+    if not isinstance(crs, osr.SpatialReference):
+        sr = getattr(crs, 'sr', None)
+        if sr is None:
+            sr = osr.SpatialReference()
+            sr.ImportFromProj4(crs.proj4)
+        crs = sr
+    return crs.ExportToWkt()
+
+
+def get_transformer(src_crs, dst_crs, use_pyproj=None):
+    """
+    Return a cached transformer for a coordinate system pair. See :func:`~utools.io.crs.get_crs_wkt` for accepted
+    coordinate system types.
+
+    :param bool use_pyproj: If ``None``, use ``pyproj`` if it is installed.
+    :rtype: :class:`~utools.io.crs.BulkTransformer`
+    """
+
+    src_wkt = get_crs_wkt(src_crs)
+    dst_wkt = get_crs_wkt(dst_crs)
+    if use_pyproj is None:
+        use_pyproj = pyproj is not None
+    key = (src_wkt, dst_wkt, use_pyproj)
+    try:
+        ret = _TRANSFORMERS[key]
+    except KeyError:
+        ret = BulkTransformer(src_wkt, dst_wkt, use_pyproj=use_pyproj)
+        _TRANSFORMERS[key] = ret
+    return ret
+
+
+class BulkTransformer(object):
+    """
+    Transform whole coordinate buffers between two coordinate systems.
+
+    :param str src_wkt: Source coordinate system WKT.
+    :param str dst_wkt: Destination coordinate system WKT.
+    :param bool use_pyproj: If ``True``, use ``pyproj``. Otherwise, use an OSR coordinate transformation.
+    :param int chunk_size: Number of coordinates passed to the projection library per call.
+    """
+
+    def __init__(self, src_wkt, dst_wkt, use_pyproj=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        if use_pyproj and pyproj is None:
+            raise ValueError('"pyproj" is not installed.')
+
+        self.src_wkt = src_wkt
+        self.dst_wkt = dst_wkt
+        self.use_pyproj = use_pyproj
+        self.chunk_size = chunk_size
+
+        self._transformation = None
+
+    @property
+    def transformation(self):
+        if self._transformation is None:
+            if self.use_pyproj:
+                self._transformation = pyproj.Transformer.from_crs(pyproj.CRS.from_wkt(self.src_wkt),
+                                                                   pyproj.CRS.from_wkt(self.dst_wkt), always_xy=True)
+            else:
+                srs = []
+                for wkt in (self.src_wkt, self.dst_wkt):
+                    sr = osr.SpatialReference()
+                    sr.ImportFromWkt(wkt)
+                    # GDAL 3+ honors authority axis order by default.
+                    if hasattr(sr, 'SetAxisMappingStrategy'):
+                        sr.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+                    srs.append(sr)
+                self._transformation = osr.CoordinateTransformation(*srs)
+        return self._transformation
+
+    def __getstate__(self):
+        # Projection objects are not picklable. They are recreated in worker processes.
+        state = self.__dict__.copy()
+        state['_transformation'] = None
+        return state
+
+    def transform(self, x, y, n_workers=None):
+        """
+        :param x: Vector of x-coordinates.
+        :type x: :class:`numpy.ndarray`
+        :param y: Vector of y-coordinates.
+        :type y: :class:`numpy.ndarray`
+        :param int n_workers: If greater than one, split the buffers across this many worker processes.
+        :returns: A tuple of transformed x- and y-coordinate vectors.
+        :rtype: tuple (:class:`numpy.ndarray`, :class:`numpy.ndarray`)
+        """
+
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        n = x.shape[0]
+
+        if n_workers is not None and n_workers > 1 and n > 1:
+            bounds = np.linspace(0, n, min(n_workers, n) + 1).astype(int)
+            chunks = [(self, x[bounds[ii]:bounds[ii + 1]], y[bounds[ii]:bounds[ii + 1]])
+                      for ii in range(len(bounds) - 1)]
+            pool = multiprocessing.Pool(len(chunks))
+            try:
+                results = pool.map(_transform_chunk_, chunks)
+            finally:
+                pool.close()
+                pool.join()
+            return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+        new_x = np.empty_like(x)
+        new_y = np.empty_like(y)
+        for start in range(0, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            new_x[start:stop], new_y[start:stop] = self._transform_(x[start:stop], y[start:stop])
+        return new_x, new_y
+
+    def transform_coordinates(self, coordinates, n_workers=None):
+        """
+        :param coordinates: Coordinate array with shape ``(n, 2)``.
+        :type coordinates: :class:`numpy.ndarray`
+        :returns: A new coordinate array with shape ``(n, 2)``.
+        :rtype: :class:`numpy.ndarray`
+        """
+
+        ret = np.empty((coordinates.shape[0], 2), dtype=np.float64)
+        ret[:, 0], ret[:, 1] = self.transform(coordinates[:, 0], coordinates[:, 1], n_workers=n_workers)
+        return ret
+
+    def _transform_(self, x, y):
+        if self.use_pyproj:
+            new_x, new_y = self.transformation.transform(x, y)
+            ret = np.asarray(new_x), np.asarray(new_y)
+        else:
+            points = np.column_stack((x, y)).tolist()
+            transformed = np.array(self.transformation.TransformPoints(points), dtype=np.float64)
+            ret = transformed[:, 0], transformed[:, 1]
+        return ret
+
+
+def _transform_chunk_(args):
+    transformer, x, y = args
+    return transformer.transform(x, y)
@@ -0,0 +1,379 @@
+"""
+Lazy, random access reader for ESMF unstructured mesh files.
+
+Contiguous and uncompressed ``nodeCoords``, ``elementConn``, and ``numElementConn`` variables are memory-mapped. NetCDF
+classic (CDF-1, CDF-2, and CDF-5) offsets are parsed from the file header. NetCDF-4 offsets require the optional
+``h5py`` package. All other variables are read in chunks through :mod:`netCDF4`.
+"""
+import struct
+from collections import OrderedDict
+
+import netCDF4 as nc
+import numpy as np
+from shapely.geometry import Polygon, MultiPolygon, mapping
+
+from utools.io.helpers import get_split_array
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+#: Number of values read per call when a variable cannot be memory-mapped.
+DEFAULT_CHUNK_SIZE = 1000000
+
+#: Selected rows separated by more unselected rows than this are read with separate calls.
+ROW_READ_GAP = 4096
+
+# NetCDF classic header tags and external type sizes.
+_NC_VARIABLE = 11
+_NC_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 4, 6: 8, 7: 1, 8: 2, 9: 4, 10: 8, 11: 8}
+
+
+class EsmfMesh(object):
+    """
+    Read an ESMF unstructured mesh file without loading it into memory.
+
+    >>> with EsmfMesh('/path/to/esmf_format.nc') as mesh:
+    >>>     coords = mesh.get_element_coordinates(500)
+
+    :param str path: Path to the ESMF format file.
+    :param bool use_mmap: If ``False``, always use chunked reads.
+    :param int chunk_size: Number of values read per call when a variable is not memory-mapped.
+    """
+
+    def __init__(self, path, use_mmap=True, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.use_mmap = use_mmap
+        self.chunk_size = chunk_size
+
+        self._ds = nc.Dataset(path)
+        self._ds.set_auto_mask(False)
+        self._offsets = None
+        self._arrays = {}
+        self._element_offsets = None
+
+        element_conn = self._ds.variables['elementConn']
+        self.polygon_break_value = getattr(element_conn, 'polygon_break_value', None)
+        self.start_index = getattr(element_conn, 'start_index', 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.get_element_coordinates(idx)
+
+    def __len__(self):
+        return len(self._ds.dimensions['elementCount'])
+
+    @property
+    def attrs(self):
+        """
+        :returns: The global attributes.
+        :rtype: :class:`collections.OrderedDict`
+        """
+
+        return OrderedDict([(k, self._ds.getncattr(k)) for k in self._ds.ncattrs()])
+
+    @property
+    def dimensions(self):
+        return self._ds.dimensions
+
+    @property
+    def element_conn(self):
+        return self.get_array('elementConn')
+
+    @property
+    def element_offsets(self):
+        """
+        Offsets into ``elementConn`` for each element with length ``elementCount + 1``.
+
+        :rtype: :class:`numpy.ndarray`
+        """
+
+        if self._element_offsets is None:
+            num_element_conn = self.num_element_conn
+            ret = np.zeros(len(self) + 1, dtype=np.int64)
+            for start in range(0, len(self), self.chunk_size):
+                stop = min(start + self.chunk_size, len(self))
+                np.cumsum(num_element_conn[start:stop], out=ret[start + 1:stop + 1])
+                ret[start + 1:stop + 1] += ret[start]
+            self._element_offsets = ret
+        return self._element_offsets
+
+    @property
+    def is_memory_mapped(self):
+        """
+        :returns: Maps the connectivity variable names to ``True`` if the variable is memory-mapped.
+        :rtype: dict
+        """
+
+        ret = OrderedDict()
+        for name in ('nodeCoords', 'elementConn', 'numElementConn'):
+            ret[name] = isinstance(self.get_array(name), np.memmap)
+        return ret
+
+    @property
+    def node_coords(self):
+        return self.get_array('nodeCoords')
+
+    @property
+    def num_element_conn(self):
+        return self.get_array('numElementConn')
+
+    @property
+    def variables(self):
+        return self._ds.variables
+
+    def close(self):
+        self._arrays = {}
+        self._element_offsets = None
+        if self._ds is not None:
+            self._ds.close()
+            self._ds = None
+
+    def get_array(self, name):
+        """
+        Return an array-like object for a variable. The object is a memory-map if the variable is stored contiguously.
+        Otherwise, the :class:`netCDF4.Variable` is returned and slices are read from disk.
+
+        :param str name: The variable name.
+        """
+
+        try:
+            ret = self._arrays[name]
+        except KeyError:
+            ret = None
+            if self.use_mmap:
+                ret = self._get_memmap_(name)
+            if ret is None:
+                ret = self._ds.variables[name]
+            self._arrays[name] = ret
+        return ret
+
+    def get_element_connectivity(self, idx):
+        """
+        :param int idx: Zero-based element index.
+        :returns: Raw ``elementConn`` values for the element including any polygon break values. The start index is not
+         removed.
+        :rtype: :class:`numpy.ndarray`
+        """
+
+        element_offsets = self.element_offsets
+        return np.asarray(self.element_conn[element_offsets[idx]:element_offsets[idx + 1]])
+
+    def get_element_coordinates(self, idx):
+        """
+        :param int idx: Zero-based element index.
+        :returns: Coordinate arrays with shape ``(n, 2)`` for each element part. Parts whose node indices are
+         sequential are returned as views into ``nodeCoords``.
+        :rtype: list of :class:`numpy.ndarray`
+        """
+
+        conn = self.get_element_connectivity(idx)
+        if self.polygon_break_value is not None and self.polygon_break_value in conn:
+            parts = get_split_array(conn, self.polygon_break_value)
+        else:
+            parts = [conn]
+
+        node_coords = self.node_coords
+        ret = []
+        for part in parts:
+            first = int(part[0]) - self.start_index
+            if part.shape[0] == 1 or np.all(np.diff(part) == 1):
+                ret.append(np.asarray(node_coords[first:first + part.shape[0]]))
+            else:
+                ret.append(get_indexed_rows(node_coords, part - self.start_index))
+        return ret
+
+    def get_element_bounds(self):
+        """
+        :returns: Element bounds with shape ``(elementCount, 4)`` ordered ``(minx, miny, maxx, maxy)``. Connectivity is
+         read in chunks of ``chunk_size`` elements.
+        :rtype: :class:`numpy.ndarray`
+        """
+
+        element_offsets = self.element_offsets
+        node_coords = self.node_coords
+        ret = np.empty((len(self), 4), dtype=np.float64)
+        for start in range(0, len(self), self.chunk_size):
+            stop = min(start + self.chunk_size, len(self))
+            conn = np.asarray(self.element_conn[element_offsets[start]:element_offsets[stop]])
+            starts = element_offsets[start:stop] - element_offsets[start]
+            if self.polygon_break_value is None:
+                is_node = np.ones(conn.shape, dtype=bool)
+            else:
+                is_node = conn != self.polygon_break_value
+            nodes = conn[is_node] - self.start_index
+            unique_nodes, inverse = np.unique(nodes, return_inverse=True)
+            coords = get_indexed_rows(node_coords, unique_nodes)[inverse]
+            for axis, func, fill in [(0, np.minimum, np.inf), (1, np.minimum, np.inf), (2, np.maximum, -np.inf),
+                                     (3, np.maximum, -np.inf)]:
+                values = np.empty(conn.shape, dtype=np.float64)
+                values.fill(fill)
+                values[is_node] = coords[:, axis % 2]
+                ret[start:stop, axis] = func.reduceat(values, starts)
+        return ret
+
+    def get_element_geometry(self, idx):
+        """
+        :param int idx: Zero-based element index.
+        :rtype: :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+        """
+
+        polygons = [Polygon(c) for c in self.get_element_coordinates(idx)]
+        if len(polygons) == 1:
+            ret = polygons[0]
+        else:
+            ret = MultiPolygon(polygons)
+        return ret
+
+    def iter_records(self, data_variables=None, indices_to_load=None, shapely_only=False):
+        """
+        Yield record dictionaries. See :func:`utools.io.helpers.iter_records`.
+
+        :param data_variables: Names of element variables to add as record properties.
+        :type data_variables: sequence of str
+        :param indices_to_load: Zero-based element indices to yield. If ``None``, yield all elements.
+        :type indices_to_load: sequence of int
+        :param bool shapely_only: If ``True``, yield a Shapely geometry with key ``'geom'``.
+        :rtype: dict
+        """
+
+        if indices_to_load is None:
+            indices_to_load = range(len(self))
+        data_variables = data_variables or []
+        arrays = [self.get_array(d) for d in data_variables]
+
+        for idx in indices_to_load:
+            properties = OrderedDict()
+            for name, arr in zip(data_variables, arrays):
+                properties[name] = arr[idx]
+            polygon = self.get_element_geometry(idx)
+            record = {'id': idx, 'properties': properties}
+            if shapely_only:
+                record['geom'] = polygon
+            else:
+                record['geometry'] = mapping(polygon)
+            yield record
+
+    def _get_memmap_(self, name):
+        var = self._ds.variables[name]
+        if var.size == 0:
+            return None
+
+        if self._ds.file_format.startswith('NETCDF3'):
+            if any(self._ds.dimensions[d].isunlimited() for d in var.dimensions):
+                # Record variables are interleaved.
+                return None
+            if self._offsets is None:
+                self._offsets = get_classic_variable_offsets(self.path)
+            offset = self._offsets[name]
+            dtype = np.dtype(var.dtype).newbyteorder('>')
+        else:
+            if h5py is None or var.chunking() != 'contiguous':
+                return None
+            with h5py.File(self.path, 'r') as f:
+                offset = f[name].id.get_offset()
+                dtype = f[name].dtype
+            if offset is None:
+                return None
+
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=var.shape)
+
+
+def get_classic_variable_offsets(path):
+    """
+    Parse a NetCDF classic format header.
+
+    :param str path: Path to a CDF-1, CDF-2, or CDF-5 file.
+    :returns: Maps variable names to the byte offset of their data.
+    :rtype: dict
+    :raises: ValueError
+    """
+
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+        if magic[0:3] != b'CDF':
+            raise ValueError('Not a NetCDF classic file: {}'.format(path))
+        version = ord(magic[3:4])
+        if version not in (1, 2, 5):
+            raise ValueError('Unsupported NetCDF classic version: {}'.format(version))
+
+        size_fmt = '>q' if version == 5 else '>i'
+        offset_fmt = '>i' if version == 1 else '>q'
+
+        def read(fmt):
+            return struct.unpack(fmt, f.read(struct.calcsize(fmt)))[0]
+
+        def read_name():
+            length = read(size_fmt)
+            ret = f.read(length)
+            f.read(-length % 4)
+            return ret.decode('utf-8')
+
+        def read_tag():
+            return read('>i'), read(size_fmt)
+
+        def skip_attributes():
+            _, n_attributes = read_tag()
+            for _ in range(n_attributes):
+                read_name()
+                nc_type = read('>i')
+                n_bytes = read(size_fmt) * _NC_TYPE_SIZES[nc_type]
+                f.read(n_bytes + (-n_bytes % 4))
+
+        read(size_fmt)  # Number of records.
+
+        _, n_dimensions = read_tag()
+        for _ in range(n_dimensions):
+            read_name()
+            read(size_fmt)
+
+        skip_attributes()
+
+        ret = {}
+        tag, n_variables = read_tag()
+        assert n_variables == 0 or tag == _NC_VARIABLE
+        for _ in range(n_variables):
+            name = read_name()
+            n_dimids = read(size_fmt)
+            for _ in range(n_dimids):
+                read(size_fmt)
+            skip_attributes()
+            read('>i')  # Type.
+            read(size_fmt)  # Variable size.
+            ret[name] = read(offset_fmt)
+    return ret
+
+
+def get_indexed_rows(arr, indices):
+    """
+    Read rows from an array or :class:`netCDF4.Variable`. Variables only support increasing indices so rows are read as
+    bounding slices of runs. Runs are split where more than :attr:`~utools.io.esmf_mesh.ROW_READ_GAP` rows are not
+    selected so sparse selections do not read the whole variable.
+    """
+
+    if isinstance(arr, np.ndarray):
+        return arr[indices]
+    indices = np.asarray(indices)
+    unique = np.unique(indices)
+    breaks = np.nonzero(np.diff(unique) > ROW_READ_GAP)[0] + 1
+    starts = unique[np.hstack([[0], breaks])].astype(np.int64)
+    stops = unique[np.hstack([breaks - 1, [unique.shape[0] - 1]])].astype(np.int64) + 1
+    if starts.shape[0] == 1:
+        return arr[starts[0]:stops[0]][indices - starts[0]]
+
+    blocks = [arr[start:stop] for start, stop in zip(starts, stops)]
+    if any([isinstance(b, np.ma.MaskedArray) for b in blocks]):
+        rows = np.ma.concatenate(blocks)
+    else:
+        rows = np.concatenate(blocks)
+    # Position of each index in the concatenated runs.
+    run = np.searchsorted(starts, indices, side='right') - 1
+    offsets = np.hstack([[0], np.cumsum(stops - starts)[:-1]])
+    return rows[offsets[run] + indices - starts[run]]
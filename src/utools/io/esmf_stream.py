@@ -0,0 +1,347 @@
+"""
+Streaming conversion of geometry records to ESMF unstructured format.
+
+Records are converted and written in fixed-size batches along unlimited dimensions so peak memory is bounded by the
+batch size. In parallel, each rank streams its section to a temporary file that is merged by the root rank.
+"""
+import os
+
+import netCDF4 as nc
+import numpy as np
+
+from utools.constants import UgridToolsConstants
+from utools.instrument import phase
+from utools.io.geom_metrics import get_face_metrics
+from utools.io.helpers import get_coordinates_list_and_update_n_coords, get_interior_coordinates_list
+from utools.io.layout import get_layout
+from utools.io.mpi import MPI_COMM, MPI_RANK, MPI_SIZE, create_sections
+from utools.logging import log
+from utools.profiler import set_uid
+
+#: Default number of elements buffered before writing.
+DEFAULT_BATCH_SIZE = 10000
+
+_NODE_DIMENSIONS = ('nodeCount', 'coordDim')
+_CONNECTION_DIMENSIONS = ('connectionCount',)
+_ELEMENT_DIMENSIONS = ('elementCount',)
+
+
+class EsmfStreamWriter(object):
+    """
+    Write an ESMF unstructured file incrementally.
+
+    >>> with EsmfStreamWriter('/path/to/out.nc', face_uid_name='GRIDCODE') as writer:
+    >>>     for uid, record in gm.iter_records(return_uid=True):
+    >>>         writer.add(uid, record['geom'])
+
+    :param str path: Path to the output file. The file is created in ``NETCDF4`` format since more than one unlimited
+     dimension is required.
+    :param str face_uid_name: Name of the element unique identifier variable. If ``None``, unique identifiers are not
+     written.
+    :param int polygon_break_value: Value separating element parts in ``elementConn``.
+    :param int start_index: Node index start value.
+    :param int batch_size: Number of elements buffered before writing.
+    :param bool geodesic_area: If ``True``, also write ``elementAreaGeodesic``.
+    :param dict dataset_kwargs: Additional arguments to :class:`netCDF4.Dataset`.
+    :param layout: The output storage layout. See :func:`utools.io.layout.get_layout`. Unlimited dimensions are always
+     chunked.
+    :param uid_dtype: The unique identifier data type. If ``None``, use the data type of the first written batch of
+     unique identifiers.
+    """
+
+    def __init__(self, path, face_uid_name=None, polygon_break_value=UgridToolsConstants.POLYGON_BREAK_VALUE,
+                 start_index=0, batch_size=DEFAULT_BATCH_SIZE, geodesic_area=False, dataset_kwargs=None,
+                 layout=None, uid_dtype=None):
+        dataset_kwargs = get_layout(layout).get_dataset_kwargs(dataset_kwargs)
+        if dataset_kwargs.setdefault('format', 'NETCDF4') != 'NETCDF4':
+            raise ValueError('Streaming conversion requires the "NETCDF4" format.')
+
+        self.path = path
+        self.face_uid_name = face_uid_name
+        self.polygon_break_value = polygon_break_value
+        self.start_index = start_index
+        self.batch_size = batch_size
+        self.geodesic_area = geodesic_area
+        self.layout = layout
+
+        self.n_nodes = 0
+        self.n_elements = 0
+        self.n_connections = 0
+
+        self._ds = nc.Dataset(path, 'w', **dataset_kwargs)
+        create_esmf_variables(self._ds, polygon_break_value=polygon_break_value, start_index=start_index,
+                              geodesic_area=geodesic_area, layout=layout)
+        if face_uid_name is not None and uid_dtype is not None:
+            create_uid_variable(self._ds, face_uid_name, uid_dtype, layout=layout)
+        self._reset_buffers_()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, uid, geom):
+        """
+        Add a polygon or multipolygon element. Exterior rings are oriented counter-clockwise.
+
+        :param int uid: The element unique identifier.
+        :param geom: The element geometry.
+        :type geom: :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+        """
+
+        face_idx = len(self._uids)
+        coordinates_list, _ = get_coordinates_list_and_update_n_coords({'geom': geom}, 0)
+
+        node_start = self.n_nodes + self._n_buffered_nodes
+        conn = []
+        for ctr, coordinates in enumerate(coordinates_list):
+            if ctr > 0:
+                conn.append(np.array([self.polygon_break_value]))
+            conn.append(np.arange(node_start, node_start + coordinates.shape[0]) + self.start_index)
+            node_start += coordinates.shape[0]
+            self._nodes.append(coordinates)
+            self._rings.append(coordinates)
+            self._ring_face.append(face_idx)
+            self._ring_is_interior.append(False)
+            self._n_buffered_nodes += coordinates.shape[0]
+        for interior in get_interior_coordinates_list(geom):
+            self._rings.append(interior)
+            self._ring_face.append(face_idx)
+            self._ring_is_interior.append(True)
+
+        conn = np.hstack(conn)
+        self._conn.append(conn)
+        self._num_conn.append(conn.shape[0])
+        self._uids.append(uid)
+
+        if len(self._uids) >= self.batch_size:
+            self.flush()
+
+    def close(self):
+        if self._ds is not None:
+            try:
+                self.flush()
+                # Files without elements still have a unique identifier variable.
+                if self.face_uid_name is not None and self.face_uid_name not in self._ds.variables:
+                    create_uid_variable(self._ds, self.face_uid_name, np.int32, layout=self.layout)
+            finally:
+                self._ds.close()
+                self._ds = None
+
+    @phase('write')
+    def flush(self):
+        """Write buffered elements."""
+
+        n = len(self._uids)
+        if n == 0:
+            return
+
+        areas, centers, areas_geodesic = get_face_metrics(self._rings, self._ring_face, self._ring_is_interior, n,
+                                                          geodesic_area=self.geodesic_area)
+        nodes = np.vstack(self._nodes)
+        conn = np.hstack(self._conn)
+        element_values = {'numElementConn': np.array(self._num_conn), 'centerCoords': centers, 'elementArea': areas}
+        if self.face_uid_name is not None:
+            element_values[self.face_uid_name] = np.array(self._uids)
+            if self.face_uid_name not in self._ds.variables:
+                create_uid_variable(self._ds, self.face_uid_name, element_values[self.face_uid_name].dtype,
+                                    layout=self.layout)
+        if areas_geodesic is not None:
+            element_values['elementAreaGeodesic'] = areas_geodesic
+
+        variables = self._ds.variables
+        variables['nodeCoords'][self.n_nodes:self.n_nodes + nodes.shape[0]] = nodes
+        variables['elementConn'][self.n_connections:self.n_connections + conn.shape[0]] = conn
+        for name, value in element_values.items():
+            variables[name][self.n_elements:self.n_elements + n] = value
+
+        self.n_nodes += nodes.shape[0]
+        self.n_connections += conn.shape[0]
+        self.n_elements += n
+        log.debug('flushed elements={}', self.n_elements)
+        self._reset_buffers_()
+
+    def _reset_buffers_(self):
+        self._nodes = []
+        self._conn = []
+        self._num_conn = []
+        self._uids = []
+        self._rings = []
+        self._ring_face = []
+        self._ring_is_interior = []
+        self._n_buffered_nodes = 0
+
+
+def create_esmf_variables(ds, face_uid_name=None, polygon_break_value=None, start_index=0, geodesic_area=False,
+                          uid_dtype=np.int32, layout=None):
+    """
+    Create ESMF unstructured dimensions, variables, and attributes using unlimited dimensions.
+
+    :param ds: The dataset open for writing.
+    :type ds: :class:`netCDF4.Dataset`
+    :param layout: The output storage layout. See :func:`utools.io.layout.get_layout`.
+    """
+
+    layout = get_layout(layout)
+
+    ds.createDimension('nodeCount', None)
+    ds.createDimension('elementCount', None)
+    ds.createDimension('coordDim', 2)
+    ds.createDimension('connectionCount', None)
+
+    node_coords = layout.create_variable(ds, 'nodeCoords', np.float64, _NODE_DIMENSIONS)
+    node_coords.units = 'degrees'
+
+    element_conn = layout.create_variable(ds, 'elementConn', np.int32, _CONNECTION_DIMENSIONS)
+    element_conn.long_name = 'Node indices that define the element connectivity.'
+    if polygon_break_value is not None:
+        element_conn.polygon_break_value = polygon_break_value
+    element_conn.start_index = start_index
+
+    num_element_conn = layout.create_variable(ds, 'numElementConn', np.int32, _ELEMENT_DIMENSIONS)
+    num_element_conn.long_name = 'Number of nodes per element.'
+
+    center_coords = layout.create_variable(ds, 'centerCoords', np.float64, ('elementCount', 'coordDim'))
+    center_coords.units = 'degrees'
+
+    if face_uid_name is not None:
+        create_uid_variable(ds, face_uid_name, uid_dtype, layout=layout)
+
+    element_area = layout.create_variable(ds, 'elementArea', np.float64, _ELEMENT_DIMENSIONS)
+    element_area.units = 'degrees'
+    element_area.long_name = 'Element area in native units.'
+
+    if geodesic_area:
+        element_area_geodesic = layout.create_variable(ds, 'elementAreaGeodesic', np.float64,
+                                                        _ELEMENT_DIMENSIONS)
+        element_area_geodesic.units = 'm^2'
+        element_area_geodesic.long_name = 'Element area on the WGS84 ellipsoid.'
+
+    ds.gridType = 'unstructured'
+    ds.version = '0.9'
+    ds.coordDim = 'longitude latitude'
+
+
+def create_uid_variable(ds, face_uid_name, uid_dtype, layout=None):
+    uid = get_layout(layout).create_variable(ds, face_uid_name, uid_dtype, _ELEMENT_DIMENSIONS)
+    uid.long_name = 'Element unique identifier.'
+    return uid
+
+
+def convert_to_esmf_format_streaming(gm, path, batch_size=DEFAULT_BATCH_SIZE, geodesic_area=False,
+                                     dataset_kwargs=None, layout=None, uid_dtype=None):
+    """
+    Convert geometry manager records to an ESMF unstructured file with memory bounded by ``batch_size``. This is a
+    collective operation.
+
+    :param gm: The source geometries.
+    :type gm: :class:`utools.io.geom_manager.GeometryManager`
+    :param str path: Path to the output file.
+    :param int batch_size: Number of elements buffered before writing.
+    :param bool geodesic_area: If ``True``, also write ``elementAreaGeodesic``.
+    :param dict dataset_kwargs: Additional arguments to :class:`netCDF4.Dataset`.
+    :param layout: The output storage layout. See :func:`utools.io.layout.get_layout`.
+    :param uid_dtype: See :class:`~utools.io.esmf_stream.EsmfStreamWriter`.
+    :raises: ValueError
+    """
+
+    n_face = gm.get_length()
+    if n_face < MPI_SIZE:
+        raise ValueError('The number of geometries must be greater than or equal to the number of processes.')
+
+    if MPI_RANK == 0:
+        sections = create_sections(n_face)
+    else:
+        sections = None
+    section = MPI_COMM.scatter(sections, root=0)
+
+    if MPI_SIZE == 1:
+        path_rank = path
+    else:
+        path_rank = get_rank_path(path, MPI_RANK)
+
+    with EsmfStreamWriter(path_rank, face_uid_name=gm.name_uid, batch_size=batch_size, geodesic_area=geodesic_area,
+                          dataset_kwargs=dataset_kwargs, layout=layout, uid_dtype=uid_dtype) as writer:
+        for uid, record in gm.iter_records(return_uid=True, slc=section, progress=True, comm=MPI_COMM):
+            # Attach profiler samples to this feature until the next feature is loaded.
+            set_uid(uid)
+            writer.add(uid, record['geom'])
+        set_uid(None)
+
+    if MPI_SIZE > 1:
+        MPI_COMM.Barrier()
+        if MPI_RANK == 0:
+            merge_esmf_files([get_rank_path(path, rank) for rank in range(MPI_SIZE)], path,
+                             face_uid_name=gm.name_uid, batch_size=batch_size, geodesic_area=geodesic_area,
+                             dataset_kwargs=dataset_kwargs, layout=layout)
+            for rank in range(MPI_SIZE):
+                os.remove(get_rank_path(path, rank))
+        MPI_COMM.Barrier()
+
+
+def get_rank_path(path, rank):
+    return '{}.rank-{}'.format(path, rank)
+
+
+def merge_esmf_files(paths, path_out, face_uid_name=None, batch_size=DEFAULT_BATCH_SIZE, geodesic_area=False,
+                     dataset_kwargs=None, layout=None):
+    """
+    Concatenate ESMF unstructured files written with zero-based node indices. Node indices in ``elementConn`` are
+    offset by the node count of preceding files. Values are copied in chunks of ``batch_size`` elements.
+
+    :param paths: Input file paths in merge order.
+    :type paths: sequence of str
+    :param str path_out: Path to the merged output file.
+    """
+
+    dataset_kwargs = get_layout(layout).get_dataset_kwargs(dataset_kwargs)
+    dataset_kwargs.setdefault('format', 'NETCDF4')
+
+    element_names = ['numElementConn', 'centerCoords', 'elementArea']
+    if face_uid_name is not None:
+        element_names.append(face_uid_name)
+    if geodesic_area:
+        element_names.append('elementAreaGeodesic')
+
+    with nc.Dataset(path_out, 'w', **dataset_kwargs) as out:
+        first = True
+        offsets = {'nodeCount': 0, 'connectionCount': 0, 'elementCount': 0}
+        for path in paths:
+            with nc.Dataset(path) as ds:
+                ds.set_auto_mask(False)
+                if first:
+                    element_conn = ds.variables['elementConn']
+                    polygon_break_value = getattr(element_conn, 'polygon_break_value', None)
+                    uid_dtype = None if face_uid_name is None else ds.variables[face_uid_name].dtype
+                    create_esmf_variables(out, face_uid_name=face_uid_name, polygon_break_value=polygon_break_value,
+                                          start_index=element_conn.start_index, geodesic_area=geodesic_area,
+                                          uid_dtype=uid_dtype, layout=layout)
+                    first = False
+
+                node_offset = offsets['nodeCount']
+                _copy_chunked_(ds, out, 'nodeCoords', offsets['nodeCount'], batch_size)
+
+                def shift(conn):
+                    if polygon_break_value is None:
+                        return conn + node_offset
+                    return np.where(conn == polygon_break_value, conn, conn + node_offset)
+
+                _copy_chunked_(ds, out, 'elementConn', offsets['connectionCount'], batch_size, func=shift)
+                for name in element_names:
+                    _copy_chunked_(ds, out, name, offsets['elementCount'], batch_size)
+
+                for dimension_name in offsets.keys():
+                    offsets[dimension_name] += len(ds.dimensions[dimension_name])
+
+
+def _copy_chunked_(source, sink, name, offset, chunk_size, func=None):
+    source_var = source.variables[name]
+    sink_var = sink.variables[name]
+    n = source_var.shape[0]
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        value = source_var[start:stop]
+        if func is not None:
+            value = func(value)
+        sink_var[offset + start:offset + stop] = value
@@ -0,0 +1,155 @@
+"""
+Subset ESMF unstructured mesh files by bounding box, polygon, or unique identifier without reconverting from the source
+geometry container.
+"""
+import netCDF4 as nc
+import numpy as np
+from shapely.prepared import prep
+
+from utools.io.esmf_mesh import EsmfMesh, get_indexed_rows
+from utools.io.layout import get_layout
+from utools.io.packed_index import PackedIndex
+from utools.logging import log
+
+# Dimensions remapped by the subset. Element variables are copied. Other node and connection variables are not.
+_SUBSET_DIMENSIONS = ('elementCount', 'nodeCount', 'connectionCount')
+
+
+def get_subset_indices(mesh, bbox=None, geom=None, uids=None, face_uid_name=None, index=None):
+    """
+    Select elements from a mesh. If more than one selection is provided, elements must satisfy all of them.
+
+    :param mesh: The source mesh.
+    :type mesh: :class:`utools.io.esmf_mesh.EsmfMesh`
+    :param bbox: Select elements whose bounds intersect ``(minx, miny, maxx, maxy)``.
+    :type bbox: sequence of float
+    :param geom: Select elements intersecting the geometry.
+    :type geom: :class:`shapely.geometry.base.BaseGeometry`
+    :param uids: Select elements with these unique identifiers.
+    :type uids: sequence
+    :param str face_uid_name: Name of the element unique identifier variable. Required with ``uids``.
+    :param index: A spatial index over the mesh element bounds. Created if needed and not provided.
+    :type index: :class:`utools.io.packed_index.PackedIndex`
+    :returns: Sorted element indices.
+    :rtype: :class:`numpy.ndarray`
+    :raises: ValueError
+    """
+
+    if bbox is None and geom is None and uids is None:
+        raise ValueError('A bounding box, geometry, or unique identifiers are required.')
+
+    ret = np.arange(len(mesh))
+
+    if uids is not None:
+        if face_uid_name is None:
+            raise ValueError('"face_uid_name" is required when selecting by unique identifier.')
+        uid_values = np.asarray(mesh.get_array(face_uid_name)[:])
+        uids = np.asarray(uids).astype(uid_values.dtype)
+        missing = np.setdiff1d(uids, uid_values)
+        if missing.shape[0] > 0:
+            raise ValueError('Unique identifiers not found in mesh: {}'.format(missing.tolist()))
+        ret = ret[np.in1d(uid_values, uids)]
+
+    if bbox is not None or geom is not None:
+        if index is None:
+            index = PackedIndex(mesh.get_element_bounds())
+        if bbox is not None:
+            ret = np.intersect1d(ret, index.query(bbox))
+        if geom is not None:
+            candidates = np.intersect1d(ret, index.query(geom.bounds))
+            prepared = prep(geom)
+            ret = np.array([idx for idx in candidates if prepared.intersects(mesh.get_element_geometry(idx))],
+                           dtype=ret.dtype)
+
+    return ret
+
+
+def subset_esmf_mesh(path_in, path_out, bbox=None, geom=None, uids=None, face_uid_name=None, layout=None,
+                     dataset_kwargs=None):
+    """
+    Write a subset of an ESMF unstructured mesh file. See :func:`~utools.io.esmf_subset.get_subset_indices` for
+    selection parameters.
+
+    :param str path_in: Path to the source ESMF format file.
+    :param str path_out: Path to the output ESMF format file.
+    :param layout: The output storage layout. See :func:`utools.io.layout.get_layout`.
+    :param dict dataset_kwargs: Additional arguments to :class:`netCDF4.Dataset`.
+    :returns: Indices of the selected elements in the source mesh.
+    :rtype: :class:`numpy.ndarray`
+    :raises: ValueError
+    """
+
+    with EsmfMesh(path_in) as mesh:
+        indices = get_subset_indices(mesh, bbox=bbox, geom=geom, uids=uids, face_uid_name=face_uid_name)
+        if indices.shape[0] == 0:
+            raise ValueError('No elements selected.')
+        log.debug('Subset selected {} of {} elements', indices.shape[0], len(mesh))
+        write_esmf_subset(mesh, indices, path_out, layout=layout, dataset_kwargs=dataset_kwargs)
+    return indices
+
+
+def write_esmf_subset(mesh, indices, path, layout=None, dataset_kwargs=None):
+    """
+    Write elements from a mesh to a new ESMF format file. Connectivity is remapped to the compacted set of nodes
+    referenced by the selected elements.
+
+    :param mesh: The source mesh.
+    :type mesh: :class:`utools.io.esmf_mesh.EsmfMesh`
+    :param indices: Sorted element indices to write.
+    :type indices: :class:`numpy.ndarray`
+    :param str path: Path to the output file.
+    """
+
+    layout = get_layout(layout)
+    dataset_kwargs = layout.get_dataset_kwargs(dataset_kwargs)
+
+    element_conn, num_element_conn = get_element_connectivity_subset(mesh, indices)
+    if mesh.polygon_break_value is None:
+        is_node = np.ones(element_conn.shape, dtype=bool)
+    else:
+        is_node = element_conn != mesh.polygon_break_value
+    unique_nodes, inverse = np.unique(element_conn[is_node] - mesh.start_index, return_inverse=True)
+    element_conn[is_node] = inverse + mesh.start_index
+
+    values = {'nodeCoords': get_indexed_rows(mesh.node_coords, unique_nodes),
+              'elementConn': element_conn,
+              'numElementConn': num_element_conn}
+    sizes = {'elementCount': indices.shape[0], 'nodeCount': unique_nodes.shape[0],
+             'connectionCount': element_conn.shape[0]}
+
+    source = mesh.variables
+    with nc.Dataset(path, 'w', **dataset_kwargs) as ds:
+        for name in _SUBSET_DIMENSIONS:
+            ds.createDimension(name, sizes[name])
+        for var in source.values():
+            if var.name not in values and (len(var.dimensions) == 0 or var.dimensions[0] != 'elementCount'):
+                log.debug('Variable not subset: {}', var.name)
+                continue
+            for dimension_name in var.dimensions[1:]:
+                if dimension_name not in ds.dimensions:
+                    ds.createDimension(dimension_name, len(mesh.dimensions[dimension_name]))
+            fill_value = var.getncattr('_FillValue') if '_FillValue' in var.ncattrs() else None
+            out = layout.create_variable(ds, var.name, var.dtype, var.dimensions, fill_value=fill_value)
+            out.setncatts({k: var.getncattr(k) for k in var.ncattrs() if k != '_FillValue'})
+            if var.name in values:
+                out[:] = values[var.name]
+            else:
+                out[:] = get_indexed_rows(mesh.get_array(var.name), indices)
+        ds.setncatts(mesh.attrs)
+
+
+def get_element_connectivity_subset(mesh, indices):
+    """
+    :returns: Tuple of raw ``elementConn`` values and ``numElementConn`` values for the selected elements.
+    :rtype: tuple of :class:`numpy.ndarray`
+    """
+
+    element_offsets = mesh.element_offsets
+    num_element_conn = get_indexed_rows(mesh.num_element_conn, indices).astype(np.int64)
+    # Positions in the source connectivity array for each selected connectivity value.
+    starts = element_offsets[indices]
+    new_starts = np.zeros(indices.shape[0], dtype=np.int64)
+    np.cumsum(num_element_conn[:-1], out=new_starts[1:])
+    positions = np.repeat(starts - new_starts, num_element_conn) + np.arange(num_element_conn.sum())
+    element_conn = np.array(get_indexed_rows(mesh.element_conn, positions))
+    return element_conn, num_element_conn
@@ -1,10 +1,79 @@
 import os
 from collections import OrderedDict
+from contextlib import contextmanager
 from copy import deepcopy
 
+import numpy as np
 import ogr
+import osr
 from shapely import wkb
 
+#: Maximum number of idle OGR dataset handles kept open by the dataset pool.
+DEFAULT_DATASET_POOL_SIZE = 16
+
+_FEATURE_COUNTS = {}
+_UID_INDEXES = {}
+_KEY_INDEXES = {}
+_META = {}
+_COORDINATE_TRANSFORMATIONS = {}
+
+
+class DatasetPool(object):
+    """
+    A bounded least-recently-used pool of open OGR datasets. A checked out handle is used exclusively by its caller
+    since OGR layers keep reading state. A new handle is opened if all pooled handles for a path are checked out.
+
+    >>> with DATASET_POOL.open('/path/to/shapefile.shp') as ds:
+    >>>     lyr = ds.GetLayerByIndex(0)
+
+    :param int max_size: Maximum number of idle handles to keep open.
+    """
+
+    def __init__(self, max_size=DEFAULT_DATASET_POOL_SIZE):
+        self.max_size = max_size
+        self._idle = OrderedDict()
+
+    def __len__(self):
+        return len(self._idle)
+
+    def checkout(self, path):
+        """
+        :param str path: Path to the vector dataset.
+        :returns: An open dataset. Return it to the pool with :meth:`~utools.io.geom_cabinet.DatasetPool.release`.
+        :rtype: :class:`osgeo.ogr.DataSource`
+        """
+
+        key = get_path_key(path)
+        for idle_key, (handle_key, ds) in self._idle.items():
+            if handle_key == key:
+                self._idle.pop(idle_key)
+                return ds
+        return ogr.Open(path)
+
+    def clear(self):
+        self._idle.clear()
+
+    @contextmanager
+    def open(self, path):
+        ds = self.checkout(path)
+        try:
+            yield ds
+        finally:
+            self.release(path, ds)
+
+    def release(self, path, ds):
+        """
+        :param str path: Path used to check out the dataset.
+        :param ds: The dataset returned by :meth:`~utools.io.geom_cabinet.DatasetPool.checkout`.
+        """
+
+        self._idle[id(ds)] = (get_path_key(path), ds)
+        while len(self._idle) > self.max_size:
+            self._idle.popitem(last=False)
+
+
+DATASET_POOL = DatasetPool()
+
 
 class GeomCabinet(object):
     """
@@ -22,14 +91,16 @@ class GeomCabinet(object):
 
         :rtype: list of str
         """
-        ret = []
-        for dirpath, dirnames, filenames in os.walk(self.path):
-            for fn in filenames:
-                if fn.endswith('shp'):
-                    ret.append(os.path.splitext(fn)[0])
-        return ret
+        return [k for k, _ in self._get_key_index_('shp')]
 
     def get_meta(self, key=None, path=None):
+        """
+        Return Fiona-style metadata for a vector file. Metadata is cached by path and modification time. A copy is
+        returned.
+
+        :rtype: dict
+        """
+
         try:
             import fiona
         except ImportError:
@@ -37,8 +108,14 @@ class GeomCabinet(object):
             return {}
         else:
             path = path or self.get_shp_path(key)
-            with fiona.open(path, 'r') as source:
-                return source.meta
+            path_key = get_path_key(path)
+            try:
+                meta = _META[path_key]
+            except KeyError:
+                with fiona.open(path, 'r') as source:
+                    meta = source.meta
+                _META[path_key] = meta
+            return deepcopy(meta)
 
     def get_shp_path(self, key):
         return self._get_path_(key, ext='shp')
@@ -46,16 +123,31 @@ class GeomCabinet(object):
     def get_cfg_path(self, key):
         return self._get_path_(key, ext='cfg')
 
+    def _get_key_index_(self, ext, rebuild=False):
+        """
+        :returns: Key and path pairs for files with extension ``ext`` in directory walk order. The index is built once
+         per directory.
+        :rtype: list of tuple
+        """
+
+        index_key = (os.path.abspath(self.path), ext)
+        if rebuild or index_key not in _KEY_INDEXES:
+            index = []
+            for dirpath, dirnames, filenames in os.walk(self.path):
+                for filename in filenames:
+                    if filename.endswith(ext):
+                        index.append((os.path.splitext(filename)[0], os.path.join(dirpath, filename)))
+            _KEY_INDEXES[index_key] = index
+        return _KEY_INDEXES[index_key]
+
     def _get_path_(self, key, ext='shp'):
-        ret = None
-        for dirpath, dirnames, filenames in os.walk(self.path):
-            for filename in filenames:
-                if filename.endswith(ext) and os.path.splitext(filename)[0] == key:
-                    ret = os.path.join(dirpath, filename)
-                    return ret
-        if ret is None:
-            msg = 'a shapefile with key "{0}" was not found under the directory: {1}'.format(key, self.path)
-            raise ValueError(msg)
+        # Rebuild the index once in case the file was added after the index was built.
+        for rebuild in (False, True):
+            for index_key, path in self._get_key_index_(ext, rebuild=rebuild):
+                if index_key == key:
+                    return path
+        msg = 'a shapefile with key "{0}" was not found under the directory: {1}'.format(key, self.path)
+        raise ValueError(msg)
 
     def iter_geoms(self, key=None, select_uid=None, path=None, load_geoms=True, uid=None, select_sql_where=None,
                    slc=None, dest_crs=None, driver_kwargs=None):
@@ -76,13 +168,32 @@ class GeomCabinet(object):
         # get the source CRS
         meta = self.get_meta(path=shp_path)
 
+        # Selections by unique identifier are fetched by feature identifier using a cached index instead of SQL.
+        use_uid_index = select_uid is not None and uid is not None and select_sql_where is None
+
         # open the target shapefile
-        ds = ogr.Open(shp_path)
+        ds = DATASET_POOL.checkout(shp_path)
+        features = None
         try:
             # return the features iterator
-            features = self._get_features_object_(ds, uid=uid, select_uid=select_uid, select_sql_where=select_sql_where,
-                                                  driver_kwargs=driver_kwargs)
-            for ctr, feature in enumerate(features):
+            if use_uid_index:
+                lyr = self._get_layer_(ds, driver_kwargs=driver_kwargs)
+                fids = get_uid_index(shp_path, uid, driver_kwargs=driver_kwargs).get_fids(select_uid, strict=False)
+                features = lyr
+                feature_iterator = (lyr.GetFeature(int(fid)) for fid in np.sort(fids))
+            else:
+                features = self._get_features_object_(ds, uid=uid, select_uid=select_uid,
+                                                      select_sql_where=select_sql_where, driver_kwargs=driver_kwargs)
+                feature_iterator = features
+
+            # Create the coordinate transformation once. "TransformTo" creates a new transformation for each feature.
+            coordinate_transformation = None
+            if dest_crs is not None:
+                src_crs = features.GetSpatialRef()
+                if src_crs is not None:
+                    coordinate_transformation = get_coordinate_transformation(src_crs, dest_crs)
+
+            for ctr, feature in enumerate(feature_iterator):
                 # With a slice passed, ...
                 if slc is not None:
                     # ... iterate until start is reached.
@@ -92,17 +203,9 @@ class GeomCabinet(object):
                     elif ctr == slc[1]:
                         raise StopIteration
 
-                ogr_geom = feature.GetGeometryRef()
-                if dest_crs is not None:
-                    ogr_geom.TransformTo(dest_crs)
-
-                if load_geoms:
-                    yld = {'geom': wkb.loads(ogr_geom.ExportToWkb())}
-                else:
-                    yld = {}
-                items = feature.items()
-                properties = OrderedDict([(key, items[key]) for key in feature.keys()])
-                yld.update({'properties': properties})
+                yld = get_record_from_feature(feature, load_geoms=load_geoms,
+                                              coordinate_transformation=coordinate_transformation, dest_crs=dest_crs)
+                properties = yld['properties']
 
                 if ctr == 0:
                     uid, add_uid = get_uid_from_properties(properties, uid)
@@ -127,9 +230,81 @@ class GeomCabinet(object):
                 msg = 'No features returned from target shapefile. Were features appropriately selected?'
                 raise ValueError(msg)
         finally:
-            # close the dataset object
-            ds.Destroy()
-            ds = None
+            # return the dataset object to the pool
+            if features is not None and not use_uid_index and \
+                    (select_uid is not None or select_sql_where is not None):
+                ds.ReleaseResultSet(features)
+            DATASET_POOL.release(shp_path, ds)
+
+    def get_geoms_by_uid(self, uids, uid, key=None, path=None, load_geoms=True, dest_crs=None, driver_kwargs=None,
+                         store=None):
+        """
+        Fetch records by unique identifier using a unique identifier to feature identifier index. The index is built
+        once per file and unique identifier name.
+
+        >>> records = GeomCabinet().get_geoms_by_uid([5, 2], 'GRIDCODE', path='/path/to/shapefile.shp')
+        >>> records[2]['geom']
+
+        :param uids: Unique identifiers to fetch. Order does not matter.
+        :type uids: sequence of int
+        :param str uid: The name of the unique identifier attribute.
+        :param store: An optional in-memory record store mapping unique identifiers to records. Records found in the
+         store are not read from file and fetched records are added to it. A store should only be reused with the same
+         ``load_geoms`` and ``dest_crs`` arguments.
+        :type store: dict
+        :returns: Records as yielded by :meth:`~utools.io.geom_cabinet.GeomCabinet.iter_geoms` keyed by unique
+         identifier in the order of ``uids``.
+        :rtype: :class:`collections.OrderedDict`
+        :raises: ValueError
+        """
+
+        if store is None:
+            store = {}
+        uids = [int(u) for u in uids]
+        to_fetch = sorted(set([u for u in uids if u not in store]))
+
+        if len(to_fetch) > 0:
+            shp_path = self._get_path_by_key_or_direct_path_(key=key, path=path)
+            fids = get_uid_index(shp_path, uid, driver_kwargs=driver_kwargs).get_fids(to_fetch)
+            # Read in feature identifier order to keep reads sequential.
+            order = np.argsort(fids)
+
+            ds = DATASET_POOL.checkout(shp_path)
+            try:
+                lyr = self._get_layer_(ds, driver_kwargs=driver_kwargs)
+                coordinate_transformation = None
+                if dest_crs is not None:
+                    src_crs = lyr.GetSpatialRef()
+                    if src_crs is not None:
+                        coordinate_transformation = get_coordinate_transformation(src_crs, dest_crs)
+                for idx in order:
+                    record = get_record_from_feature(lyr.GetFeature(int(fids[idx])), load_geoms=load_geoms,
+                                                     coordinate_transformation=coordinate_transformation,
+                                                     dest_crs=dest_crs)
+                    record['properties'][uid] = int(record['properties'][uid])
+                    store[to_fetch[idx]] = record
+            finally:
+                DATASET_POOL.release(shp_path, ds)
+
+        return OrderedDict([(u, store[u]) for u in uids])
+
+    def get_geoms_by_uid_sets(self, uid_sets, uid, **kwargs):
+        """
+        Fetch records for many unique identifier query sets in one call. Each distinct record is read once.
+
+        :param uid_sets: Sequence of unique identifier sequences.
+        :param str uid: The name of the unique identifier attribute.
+        :param kwargs: See :meth:`~utools.io.geom_cabinet.GeomCabinet.get_geoms_by_uid`.
+        :returns: A list of record lists in the order of ``uid_sets``. Records are shared between sets.
+        :rtype: list
+        """
+
+        uid_sets = [list(u) for u in uid_sets]
+        all_uids = set()
+        for u in uid_sets:
+            all_uids.update(u)
+        records = self.get_geoms_by_uid(sorted(all_uids), uid, **kwargs)
+        return [[records[int(u)] for u in uid_set] for uid_set in uid_sets]
 
     def _get_path_by_key_or_direct_path_(self, key=None, path=None):
         """
@@ -151,6 +326,21 @@ class GeomCabinet(object):
             raise RuntimeError(msg)
         return shp_path
 
+    @staticmethod
+    def _get_layer_(ds, driver_kwargs=None):
+        # Get geometries by selecting the appropriate layer. Only single layer shapefiles are supported. For file
+        # geodatabases, this is selected by the feature class name.
+        if get_gdal_driver(ds) == 'OpenFileGDB':
+            feature_class = driver_kwargs['feature_class']
+            if feature_class is None:
+                raise ValueError('For file geodatabases, the feature class may not be None.')
+            lyr = ds.GetLayerByName(str(feature_class))
+        else:
+            lyr = ds.GetLayerByIndex(0)
+
+        lyr.ResetReading()
+        return lyr
+
     @staticmethod
     def _get_features_object_(ds, uid=None, select_uid=None, select_sql_where=None, driver_kwargs=None):
         """
@@ -175,17 +365,7 @@ class GeomCabinet(object):
         :rtype: :class:`osgeo.ogr.Layer`
         """
 
-        # Get geometries by selecting the appropriate layer. Only single layer shapefiles are supported. For file
-        # geodatabases, this is selected by the feature class name.
-        if get_gdal_driver(ds) == 'OpenFileGDB':
-            feature_class = driver_kwargs['feature_class']
-            if feature_class is None:
-                raise ValueError('For file geodatabases, the feature class may not be None.')
-            lyr = ds.GetLayerByName(str(feature_class))
-        else:
-            lyr = ds.GetLayerByIndex(0)
-
-        lyr.ResetReading()
+        lyr = GeomCabinet._get_layer_(ds, driver_kwargs=driver_kwargs)
         if select_uid is not None or select_sql_where is not None:
             lyr_name = lyr.GetName()
             if select_sql_where is not None:
@@ -280,17 +460,199 @@ class GeomCabinetIterator(object):
         elif self.select_uid is not None:
             ret = len(self.select_uid)
         else:
-            # get the geometries
-            ds = ogr.Open(shp_path)
+            ret = get_feature_count(shp_path, select_sql_where=self.select_sql_where,
+                                    driver_kwargs=self.driver_kwargs)
+        return ret
+
+
+def clear_feature_count_cache():
+    _FEATURE_COUNTS.clear()
+
+
+def get_feature_count(path, select_sql_where=None, driver_kwargs=None):
+    """
+    Return the number of features in a vector file layer. Drivers that store a feature count (i.e. shapefiles) are
+    answered without scanning features. Counts are cached for the session by path, layer, filter, and file
+    modification time.
+
+    :param str path: Path to the vector file.
+    :param str select_sql_where: See :meth:`~utools.io.geom_cabinet.GeomCabinet._get_features_object_`.
+    :param dict driver_kwargs: See :meth:`~utools.io.geom_cabinet.GeomCabinet._get_features_object_`.
+    :rtype: int
+    """
+
+    feature_class = (driver_kwargs or {}).get('feature_class')
+    key = (get_path_key(path), feature_class, select_sql_where)
+
+    try:
+        ret = _FEATURE_COUNTS[key]
+    except KeyError:
+        ds = DATASET_POOL.checkout(path)
+        features = None
+        try:
+            features = GeomCabinet._get_features_object_(ds, select_sql_where=select_sql_where,
+                                                         driver_kwargs=driver_kwargs)
+            # A negative count indicates the driver cannot provide a count without scanning features.
+            ret = features.GetFeatureCount(force=0)
+            if ret < 0:
+                ret = features.GetFeatureCount(force=1)
+        finally:
+            if features is not None and select_sql_where is not None:
+                ds.ReleaseResultSet(features)
+            DATASET_POOL.release(path, ds)
+        _FEATURE_COUNTS[key] = ret
+    return ret
+
+
+def get_coordinate_transformation(src_crs, dest_crs):
+    """
+    :param src_crs: Source spatial reference.
+    :type src_crs: :class:`osgeo.osr.SpatialReference`
+    :param dest_crs: Destination spatial reference.
+    :type dest_crs: :class:`osgeo.osr.SpatialReference`
+    :returns: A cached coordinate transformation for the spatial reference pair.
+    :rtype: :class:`osgeo.osr.CoordinateTransformation`
+    """
+
+    key = (src_crs.ExportToWkt(), dest_crs.ExportToWkt())
+    try:
+        ret = _COORDINATE_TRANSFORMATIONS[key]
+    except KeyError:
+        ret = osr.CoordinateTransformation(src_crs, dest_crs)
+        _COORDINATE_TRANSFORMATIONS[key] = ret
+    return ret
+
+
+def get_path_key(path):
+    """
+    :returns: A cache key for a file path that changes when the file is modified.
+    :rtype: tuple
+    """
+
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    return os.path.abspath(path), mtime
+
+
+class UidIndex(object):
+    """
+    Maps integer unique identifiers to OGR feature identifiers using sorted arrays.
+
+    :param uids: Unique identifier for each feature.
+    :type uids: :class:`numpy.ndarray`
+    :param fids: Feature identifier for each feature.
+    :type fids: :class:`numpy.ndarray`
+    :raises: ValueError
+    """
+
+    def __init__(self, uids, fids):
+        sorter = np.argsort(uids, kind='mergesort')
+        self.uids = np.asarray(uids, dtype=np.int64)[sorter]
+        self.fids = np.asarray(fids, dtype=np.int64)[sorter]
+        if self.uids.shape[0] > 1 and np.any(self.uids[1:] == self.uids[:-1]):
+            raise ValueError('Unique identifier values are not unique.')
+
+    def __len__(self):
+        return self.uids.shape[0]
+
+    def get_fids(self, uids, strict=True):
+        """
+        :param uids: Unique identifiers to look up.
+        :type uids: sequence of int
+        :param bool strict: If ``True``, raise an exception for unique identifiers not in the index. Otherwise, missing
+         unique identifiers are skipped.
+        :returns: Feature identifiers in the order of ``uids``.
+        :rtype: :class:`numpy.ndarray`
+        :raises: ValueError
+        """
+
+        uids = np.asarray(uids, dtype=np.int64)
+        if self.uids.shape[0] == 0:
+            found = np.zeros(uids.shape[0], dtype=bool)
+            positions = np.zeros(uids.shape[0], dtype=np.int64)
+        else:
+            positions = np.searchsorted(self.uids, uids)
+            positions[positions == self.uids.shape[0]] = 0
+            found = self.uids[positions] == uids
+        if not found.all():
+            if strict:
+                raise ValueError('Unique identifiers not found: {}'.format(uids[~found].tolist()))
+            positions = positions[found]
+        return self.fids[positions]
+
+
+def clear_uid_index_cache():
+    _UID_INDEXES.clear()
+
+
+def get_uid_index(path, uid, driver_kwargs=None):
+    """
+    Return a cached unique identifier index for a vector file. The index is built with a single attribute-only scan.
+
+    :param str path: Path to the vector file.
+    :param str uid: Name of the unique identifier attribute.
+    :param dict driver_kwargs: See :meth:`~utools.io.geom_cabinet.GeomCabinet._get_features_object_`.
+    :rtype: :class:`~utools.io.geom_cabinet.UidIndex`
+    """
+
+    feature_class = (driver_kwargs or {}).get('feature_class')
+    key = (get_path_key(path), feature_class, uid)
+    try:
+        ret = _UID_INDEXES[key]
+    except KeyError:
+        uids = []
+        fids = []
+        ds = DATASET_POOL.checkout(path)
+        try:
+            lyr = GeomCabinet._get_layer_(ds, driver_kwargs=driver_kwargs)
+            layer_defn = lyr.GetLayerDefn()
+            field_index = layer_defn.GetFieldIndex(uid)
+            if field_index < 0:
+                raise ValueError('The unique identifier "{0}" was not found in: {1}'.format(uid, path))
+            # Skip reading geometries and other attributes.
+            ignored = [layer_defn.GetFieldDefn(ii).GetName() for ii in range(layer_defn.GetFieldCount())
+                       if ii != field_index]
+            lyr.SetIgnoredFields(ignored + ['OGR_GEOMETRY', 'OGR_STYLE'])
             try:
-                features = self.sc._get_features_object_(ds, uid=self.uid, select_uid=self.select_uid,
-                                                         select_sql_where=self.select_sql_where,
-                                                         driver_kwargs=self.driver_kwargs)
-                ret = len(features)
+                for feature in lyr:
+                    uids.append(feature.GetField(field_index))
+                    fids.append(feature.GetFID())
             finally:
-                ds.Destroy()
-                ds = None
-        return ret
+                lyr.SetIgnoredFields([])
+                lyr.ResetReading()
+        finally:
+            DATASET_POOL.release(path, ds)
+        ret = UidIndex(np.array(uids, dtype=np.int64), np.array(fids, dtype=np.int64))
+        _UID_INDEXES[key] = ret
+    return ret
+
+
+def get_record_from_feature(feature, load_geoms=True, coordinate_transformation=None, dest_crs=None):
+    """
+    :param feature: The OGR feature.
+    :param bool load_geoms: If ``False``, exclude the ``'geom'`` key.
+    :param coordinate_transformation: Coordinate transformation applied to the feature geometry in-place.
+    :param dest_crs: Destination spatial reference used if ``coordinate_transformation`` is ``None``.
+    :returns: A record dictionary with ``'geom'`` and ``'properties'`` keys.
+    :rtype: dict
+    """
+
+    ogr_geom = feature.GetGeometryRef()
+    if coordinate_transformation is not None:
+        ogr_geom.Transform(coordinate_transformation)
+    elif dest_crs is not None:
+        ogr_geom.TransformTo(dest_crs)
+
+    if load_geoms:
+        ret = {'geom': wkb.loads(ogr_geom.ExportToWkb())}
+    else:
+        ret = {}
+    items = feature.items()
+    properties = OrderedDict([(key, items[key]) for key in feature.keys()])
+    ret.update({'properties': properties})
+    return ret
 
 
 def get_gdal_driver(ds):
@@ -7,8 +7,11 @@ from shapely.geometry.base import BaseMultipartGeometry
 
 from utools.exc import NoInteriorsError
 from utools.helpers import GeometrySplitter
+from utools.instrument import PhaseAccumulator
 from utools.io.geom_cabinet import GeomCabinetIterator, GeomCabinet
 from utools.io.helpers import get_node_count, get_split_polygon_by_node_threshold
+from utools.io.mpi import MPI_COMM
+from utools.progress import get_progress
 
 ogr.UseExceptions()
 osr.UseExceptions()
@@ -45,6 +48,22 @@ class GeometryManager(object):
             ret = len(self.records)
         return ret
 
+    def get_length(self, comm=None):
+        """
+        Return the geometry count computed on the root rank. This is a collective operation and must be called by all
+        ranks in ``comm``.
+
+        :param comm: The MPI communicator. Defaults to :attr:`utools.io.mpi.MPI_COMM`.
+        :rtype: int
+        """
+
+        comm = comm or MPI_COMM
+        if comm.Get_rank() == 0:
+            ret = len(self)
+        else:
+            ret = None
+        return comm.bcast(ret, root=0)
+
     @property
     def meta(self):
         return GeomCabinet(path=self.path).get_meta(path=self.path)
@@ -59,13 +78,35 @@ class GeometryManager(object):
                 si.add(uid, record['geom'])
         return si
 
-    def iter_records(self, return_uid=False, select_uid=None, slc=None, dest_crs=None):
+    def iter_records(self, return_uid=False, select_uid=None, slc=None, dest_crs=None, progress=False, comm=None):
+        """
+        :param bool progress: If ``True``, report progress. Only use for top-level loops. See :mod:`utools.progress`.
+        :param comm: If provided, progress is reduced across this communicator and all of its ranks must iterate to
+         the end.
+        """
+
         # Use records attached to the object or load records from source data.
         to_iter = self.records or self._get_records_(select_uid=select_uid, slc=slc, dest_crs=dest_crs)
 
         if self.records is not None and slc is not None:
             to_iter = to_iter[slc[0]:slc[1]]
 
+        if slc is not None:
+            total = slc[1] - slc[0]
+        elif self.records is not None and select_uid is None:
+            total = len(self.records)
+        else:
+            total = None
+        if progress:
+            progress = get_progress('records', total=total, work_unit='nodes', comm=comm)
+        else:
+            progress = None
+        # Only time the split phase if geometries may be modified.
+        if self.split_interiors or self.node_threshold is not None:
+            split = PhaseAccumulator('split')
+        else:
+            split = None
+
         for ctr, record in enumerate(to_iter):
             if self._has_provided_records and 'geom' not in record:
                 record['geom'] = shape(record['geometry'])
@@ -73,17 +114,12 @@ class GeometryManager(object):
                 record.pop('geometry')
             self._validate_record_(record)
 
-            # Split interiors if the current record has them. Only applicable for polygons.
-            if self.split_interiors:
-                try:
-                    record['geom'] = GeometrySplitter(record['geom']).split()
-                except NoInteriorsError:
-                    pass
+            if split is not None:
+                with split:
+                    self._split_record_(record)
 
-            # Modify the geometry if a node threshold is provided. This breaks the polygon object into pieces with the
-            # approximate node count.
-            if self.node_threshold is not None and get_node_count(record['geom']) > self.node_threshold:
-                record['geom'] = get_split_polygon_by_node_threshold(record['geom'], self.node_threshold)
+            if progress is not None:
+                progress.update(work=get_node_count(record['geom']))
 
             if return_uid:
                 uid = record['properties'][self.name_uid]
@@ -92,6 +128,11 @@ class GeometryManager(object):
                 yld = record
             yield yld
 
+        if progress is not None:
+            progress.close()
+        if split is not None:
+            split.record()
+
     def _get_records_(self, select_uid=None, slc=None, dest_crs=None):
         slc = slc or self.slc
         dest_crs = dest_crs or self.dest_crs
@@ -100,6 +141,19 @@ class GeometryManager(object):
                                  driver_kwargs=self.driver_kwargs)
         return gi
 
+    def _split_record_(self, record):
+        # Split interiors if the current record has them. Only applicable for polygons.
+        if self.split_interiors:
+            try:
+                record['geom'] = GeometrySplitter(record['geom']).split()
+            except NoInteriorsError:
+                pass
+
+        # Modify the geometry if a node threshold is provided. This breaks the polygon object into pieces with the
+        # approximate node count.
+        if self.node_threshold is not None and get_node_count(record['geom']) > self.node_threshold:
+            record['geom'] = get_split_polygon_by_node_threshold(record['geom'], self.node_threshold)
+
     def _validate_record_(self, record):
         geom = record['geom']
 
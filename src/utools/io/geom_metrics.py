@@ -0,0 +1,299 @@
+"""
+Vectorized polygon metrics computed over flat ring coordinate buffers.
+
+Rings are stored end-to-end in a single two-dimensional coordinate array with a companion vector of ring start
+indices. Rings may or may not repeat their first coordinate at the end. Ring-to-face mappings must be sorted in
+ascending order (i.e. all rings for a face are contiguous).
+"""
+import numpy as np
+from shapely.geometry import Polygon, MultiPolygon, Point
+
+#: Semi-major axis of the WGS84 ellipsoid in meters.
+WGS84_SEMI_MAJOR_AXIS = 6378137.0
+#: Flattening of the WGS84 ellipsoid.
+WGS84_FLATTENING = 1 / 298.257223563
+
+
+def get_ring_buffer(rings):
+    """
+    :param rings: Sequence of coordinate arrays each with shape ``(n, 2)``.
+    :returns: A tuple containing the concatenated coordinate array and the integer start index for each ring.
+    :rtype: tuple (:class:`numpy.ndarray`, :class:`numpy.ndarray`)
+    :raises: ValueError
+    """
+
+    ring_lengths = np.array([r.shape[0] for r in rings], dtype=np.int64)
+    if np.any(ring_lengths == 0):
+        raise ValueError('Rings must contain at least one coordinate.')
+    ring_starts = np.zeros(ring_lengths.shape[0], dtype=np.int64)
+    np.cumsum(ring_lengths[:-1], out=ring_starts[1:])
+    if len(rings) == 0:
+        coordinates = np.zeros((0, 2), dtype=float)
+    else:
+        coordinates = np.concatenate(rings)
+    return coordinates, ring_starts
+
+
+def get_offsets(counts):
+    """
+    :param counts: Number of elements in each group.
+    :returns: Start offset of each group followed by the total count.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    ret = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=ret[1:])
+    return ret
+
+
+def get_ring_lengths(ring_starts, n_coordinates):
+    return np.diff(np.append(ring_starts, n_coordinates))
+
+
+def get_next_vertex_index(ring_starts, n_coordinates):
+    """
+    :returns: Index of the next vertex for each vertex in the buffer. The last vertex in a ring wraps to the first.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    ret = np.arange(1, n_coordinates + 1, dtype=np.int64)
+    ring_stops = np.append(ring_starts[1:], n_coordinates)
+    ret[ring_stops - 1] = ring_starts
+    return ret
+
+
+def get_ring_areas_and_centroids(coordinates, ring_starts):
+    """
+    Shoelace areas and area-weighted centroids for each ring. Coordinates are shifted to the first vertex of their ring
+    before accumulating to limit cancellation error.
+
+    :param coordinates: Ring coordinate buffer with shape ``(n, 2)``.
+    :type coordinates: :class:`numpy.ndarray`
+    :param ring_starts: Start index for each ring in ``coordinates``.
+    :type ring_starts: :class:`numpy.ndarray`
+    :returns: A tuple containing the signed ring areas (counter-clockwise is positive) and the ring centroids with
+     shape ``(n_rings, 2)``.
+    :rtype: tuple (:class:`numpy.ndarray`, :class:`numpy.ndarray`)
+    """
+
+    n_coordinates = coordinates.shape[0]
+    ring_lengths = get_ring_lengths(ring_starts, n_coordinates)
+    origin = coordinates[ring_starts]
+    local = coordinates - np.repeat(origin, ring_lengths, axis=0)
+    nxt = get_next_vertex_index(ring_starts, n_coordinates)
+
+    x0 = local[:, 0]
+    y0 = local[:, 1]
+    x1 = x0[nxt]
+    y1 = y0[nxt]
+    cross = x0 * y1 - x1 * y0
+
+    twice_area = np.add.reduceat(cross, ring_starts)
+    cx = np.add.reduceat((x0 + x1) * cross, ring_starts)
+    cy = np.add.reduceat((y0 + y1) * cross, ring_starts)
+
+    centroids = np.zeros((ring_starts.shape[0], 2), dtype=float)
+    has_area = twice_area != 0
+    centroids[has_area, 0] = cx[has_area] / (3.0 * twice_area[has_area])
+    centroids[has_area, 1] = cy[has_area] / (3.0 * twice_area[has_area])
+    # Degenerate rings use the vertex mean.
+    if not np.all(has_area):
+        means = np.add.reduceat(local, ring_starts, axis=0) / ring_lengths.reshape(-1, 1)
+        centroids[~has_area] = means[~has_area]
+    centroids += origin
+
+    return 0.5 * twice_area, centroids
+
+
+def get_face_areas_and_centroids(coordinates, ring_starts, ring_face, n_faces, ring_is_interior=None):
+    """
+    Combine ring metrics into face areas and centroids. Exterior rings add area and interior rings (holes) subtract
+    area regardless of their stored orientation.
+
+    :param ring_face: Face index for each ring.
+    :type ring_face: :class:`numpy.ndarray`
+    :param int n_faces: The total number of faces.
+    :param ring_is_interior: Boolean vector flagging interior rings. If ``None``, all rings are exteriors.
+    :type ring_is_interior: :class:`numpy.ndarray`
+    :returns: A tuple containing face areas and face centroids with shape ``(n_faces, 2)``.
+    :rtype: tuple (:class:`numpy.ndarray`, :class:`numpy.ndarray`)
+    """
+
+    ring_areas, ring_centroids = get_ring_areas_and_centroids(coordinates, ring_starts)
+    ring_areas = get_oriented_ring_values(np.abs(ring_areas), ring_is_interior)
+
+    areas = np.bincount(ring_face, weights=ring_areas, minlength=n_faces)
+    centroids = np.zeros((n_faces, 2), dtype=float)
+    for idx in range(2):
+        centroids[:, idx] = np.bincount(ring_face, weights=ring_areas * ring_centroids[:, idx], minlength=n_faces)
+
+    has_area = areas != 0
+    centroids[has_area] /= areas[has_area].reshape(-1, 1)
+    # Faces without area use the vertex mean of their rings.
+    if not np.all(has_area):
+        ring_lengths = get_ring_lengths(ring_starts, coordinates.shape[0])
+        vertex_face = np.repeat(ring_face, ring_lengths)
+        counts = np.bincount(vertex_face, minlength=n_faces).astype(float)
+        for idx in range(2):
+            sums = np.bincount(vertex_face, weights=coordinates[:, idx], minlength=n_faces)
+            centroids[~has_area, idx] = sums[~has_area] / counts[~has_area]
+
+    return areas, centroids
+
+
+def get_geodesic_face_areas(coordinates, ring_starts, ring_face, n_faces, ring_is_interior=None,
+                            semi_major_axis=WGS84_SEMI_MAJOR_AXIS, flattening=WGS84_FLATTENING):
+    """
+    Ellipsoidal face areas in square meters for longitude/latitude coordinates in degrees. Latitudes are mapped to
+    authalic (equal-area) latitudes and areas are accumulated on the authalic sphere. Edges are integrated with the
+    trapezoidal rule which is accurate for the short edges found in catchment boundaries. Rings must not enclose a pole.
+
+    :param float semi_major_axis: Ellipsoid semi-major axis in meters.
+    :param float flattening: Ellipsoid flattening.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    e2 = flattening * (2 - flattening)
+    e = np.sqrt(e2)
+
+    def _q_(sin_phi):
+        return (1 - e2) * (sin_phi / (1 - e2 * sin_phi ** 2) -
+                           (1 / (2 * e)) * np.log((1 - e * sin_phi) / (1 + e * sin_phi)))
+
+    q_pole = _q_(1.0)
+    authalic_radius = semi_major_axis * np.sqrt(q_pole / 2)
+
+    lam = np.radians(coordinates[:, 0])
+    sin_xi = _q_(np.sin(np.radians(coordinates[:, 1]))) / q_pole
+
+    nxt = get_next_vertex_index(ring_starts, coordinates.shape[0])
+    d_lam = lam[nxt] - lam
+    # Account for edges crossing the antimeridian.
+    d_lam = (d_lam + np.pi) % (2 * np.pi) - np.pi
+    terms = d_lam * (sin_xi + sin_xi[nxt])
+    ring_areas = np.abs(np.add.reduceat(terms, ring_starts)) * 0.5 * authalic_radius ** 2
+    ring_areas = get_oriented_ring_values(ring_areas, ring_is_interior)
+
+    return np.bincount(ring_face, weights=ring_areas, minlength=n_faces)
+
+
+def get_oriented_ring_values(values, ring_is_interior):
+    if ring_is_interior is None:
+        return values
+    return np.where(ring_is_interior, -values, values)
+
+
+def get_points_in_faces(points, coordinates, ring_starts, ring_face):
+    """
+    Even-odd (ray casting) point-in-polygon test with one point per face. Points exactly on a boundary may be classified
+    either way.
+
+    :param points: Point coordinates with shape ``(n_faces, 2)``.
+    :type points: :class:`numpy.ndarray`
+    :returns: Boolean vector that is ``True`` where the face's point falls inside the face.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    n_faces = points.shape[0]
+    ring_lengths = get_ring_lengths(ring_starts, coordinates.shape[0])
+    vertex_face = np.repeat(ring_face, ring_lengths)
+    nxt = get_next_vertex_index(ring_starts, coordinates.shape[0])
+
+    px = points[vertex_face, 0]
+    py = points[vertex_face, 1]
+    xi = coordinates[:, 0]
+    yi = coordinates[:, 1]
+    xj = xi[nxt]
+    yj = yi[nxt]
+
+    straddles = (yi > py) != (yj > py)
+    dy = np.where(straddles, yj - yi, 1.0)
+    x_cross = xi + (py - yi) * (xj - xi) / dy
+    crossings = straddles & (px < x_cross)
+
+    counts = np.bincount(vertex_face[crossings], minlength=n_faces)
+    return counts % 2 == 1
+
+
+def get_face_geometry(coordinates, ring_starts, ring_is_interior, ring_indices):
+    """
+    Rebuild a Shapely geometry for a single face from its rings. Holes are assigned to the exterior containing their
+    first vertex.
+
+    :param ring_indices: Index of each ring belonging to the face.
+    :type ring_indices: sequence of int
+    :rtype: :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+    """
+
+    ring_stops = np.append(ring_starts[1:], coordinates.shape[0])
+    exteriors = []
+    interiors = []
+    for ii in ring_indices:
+        ring = coordinates[ring_starts[ii]:ring_stops[ii]]
+        if ring_is_interior is not None and ring_is_interior[ii]:
+            interiors.append(ring)
+        else:
+            exteriors.append(ring)
+
+    holes = [[] for _ in exteriors]
+    shells = [Polygon(ext) for ext in exteriors]
+    for interior in interiors:
+        first = Point(interior[0])
+        for idx, shell in enumerate(shells):
+            if shell.contains(first):
+                holes[idx].append(interior)
+                break
+
+    polygons = [Polygon(ext, holes=h) for ext, h in zip(exteriors, holes)]
+    if len(polygons) == 1:
+        ret = polygons[0]
+    else:
+        ret = MultiPolygon(polygons)
+    return ret
+
+
+def get_face_metrics(rings, ring_face, ring_is_interior, n_faces, geodesic_area=False):
+    """
+    Compute face areas and center coordinates for all faces at once. Centers are area-weighted centroids. If a centroid
+    falls outside its face (i.e. concave or multipart faces), the face's representative point is used instead.
+
+    :param rings: Sequence of ring coordinate arrays.
+    :param ring_face: Face index for each ring. Must be sorted in ascending order.
+    :param ring_is_interior: Boolean flags indicating interior rings (holes).
+    :param int n_faces: The total number of faces.
+    :param bool geodesic_area: If ``True``, also compute ellipsoidal areas in square meters. Coordinates must be
+     longitude/latitude in degrees.
+    :returns: A tuple containing face areas in native units, face center coordinates, and ellipsoidal face areas (or
+     ``None`` if ``geodesic_area`` is ``False``).
+    :rtype: tuple
+    """
+
+    ring_face = np.asarray(ring_face, dtype=np.int64)
+    ring_is_interior = np.asarray(ring_is_interior, dtype=bool)
+
+    if len(rings) == 0:
+        empty = np.zeros(n_faces, dtype=float)
+        return empty, np.zeros((n_faces, 2), dtype=float), empty.copy() if geodesic_area else None
+
+    coordinates, ring_starts = get_ring_buffer(rings)
+
+    areas, centers = get_face_areas_and_centroids(coordinates, ring_starts, ring_face, n_faces,
+                                                  ring_is_interior=ring_is_interior)
+
+    inside = get_points_in_faces(centers, coordinates, ring_starts, ring_face)
+    if not np.all(inside):
+        face_ring_starts = np.searchsorted(ring_face, np.arange(n_faces + 1))
+        for face_idx in np.where(~inside)[0].flat:
+            ring_indices = range(face_ring_starts[face_idx], face_ring_starts[face_idx + 1])
+            if len(ring_indices) == 0:
+                continue
+            geom = get_face_geometry(coordinates, ring_starts, ring_is_interior, ring_indices)
+            centers[face_idx] = np.array(geom.representative_point())
+
+    if geodesic_area:
+        areas_geodesic = get_geodesic_face_areas(coordinates, ring_starts, ring_face, n_faces,
+                                                 ring_is_interior=ring_is_interior)
+    else:
+        areas_geodesic = None
+
+    return areas, centers, areas_geodesic
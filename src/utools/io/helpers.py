@@ -8,10 +8,27 @@ from shapely.geometry import shape, mapping, Polygon, MultiPolygon
 from shapely.geometry.base import BaseMultipartGeometry
 from shapely.geometry.polygon import orient
 
-from mpi import MPI_RANK, create_sections, MPI_COMM, MPI_SIZE, dgather
+from geom_metrics import get_face_metrics, get_offsets
+from layout import get_layout
+from mpi import MPI_RANK, create_sections, MPI_COMM, MPI_SIZE, dgather, get_global_offset
 from utools.addict import Dict
 from utools.constants import UgridToolsConstants
+from utools.instrument import PhaseAccumulator
 from utools.logging import log
+from utools.profiler import set_uid
+
+try:
+    import shapely
+
+    if hasattr(shapely, 'from_ragged_array'):
+        shapely_vectorized = shapely
+    else:
+        shapely_vectorized = None
+except ImportError:
+    shapely_vectorized = None
+
+#: Number of faces constructed per batch when exporting geometries.
+DEFAULT_EXPORT_BATCH_SIZE = 10000
 
 
 def convert_multipart_to_singlepart(path_in, path_out, new_uid_name=UgridToolsConstants.LINK_ATTRIBUTE_NAME, start=0):
@@ -69,6 +86,20 @@ def get_coordinates_list_and_update_n_coords(record, n_coords):
     return coordinates_list, n_coords
 
 
+def get_interior_coordinates_list(geom):
+    """
+    :param geom: The polygon or multipolygon geometry.
+    :returns: A list of interior (hole) coordinate arrays. The repeated closing coordinate is removed.
+    :rtype: list
+    """
+
+    ret = []
+    for element in get_iter(geom, dtype=Polygon):
+        for interior in element.interiors:
+            ret.append(np.array(interior.coords)[0:-1, :])
+    return ret
+
+
 def get_coordinate_dict_variables(cdict, n_coords, polygon_break_value=None, idx_start=0):
     """
     :param dict cdict: Dictionary mapping unique element identifiers to a sequence containing unique element coordinates
@@ -126,7 +157,7 @@ def get_edge_nodes(face_nodes):
     return edge_nodes
 
 
-def get_variables(gm, use_ragged_arrays=False, with_connectivity=True):
+def get_variables(gm, use_ragged_arrays=False, with_connectivity=True, geodesic_area=False):
     """
     :param gm: The geometry manager containing geometries to convert to mesh variables.
     :type gm: :class:`pyugrid.flexible_mesh.helpers.GeometryManager`
@@ -134,18 +165,20 @@ def get_variables(gm, use_ragged_arrays=False, with_connectivity=True):
     :type pack: bool
     :returns: A tuple of arrays with index locations corresponding to:
 
-    ===== ================ =============================
-    Index Name             Type
-    ===== ================ =============================
-    0     face_nodes       :class:`numpy.ma.MaskedArray`
-    1     face_edges       :class:`numpy.ma.MaskedArray`
-    2     edge_nodes       :class:`numpy.ndarray`
-    3     node_x           :class:`numpy.ndarray`
-    4     node_y           :class:`numpy.ndarray`
-    5     face_links       :class:`numpy.ndarray`
-    6     face_ids         :class:`numpy.ndarray`
-    7     face_coordinates :class:`numpy.ndarray`
-    ===== ================ =============================
+    ===== =================== =============================
+    Index Name                Type
+    ===== =================== =============================
+    0     face_nodes          :class:`numpy.ma.MaskedArray`
+    1     face_edges          :class:`numpy.ma.MaskedArray`
+    2     edge_nodes          :class:`numpy.ndarray`
+    3     nodes               :class:`numpy.ndarray`
+    4     face_links          :class:`numpy.ndarray`
+    5     face_ids            :class:`numpy.ndarray`
+    6     face_coordinates    :class:`numpy.ndarray`
+    7     face_areas          :class:`numpy.ndarray`
+    8     section             list
+    9     face_areas_geodesic :class:`numpy.ndarray` or None
+    ===== =================== =============================
 
     Information on individual variables may be found here: https://github.com/ugrid-conventions/ugrid-conventions/blob/9b6540405b940f0a9299af9dfb5e7c04b5074bf7/ugrid-conventions.md#2d-flexible-mesh-mixed-triangles-quadrilaterals-etc-topology
 
@@ -153,27 +186,18 @@ def get_variables(gm, use_ragged_arrays=False, with_connectivity=True):
     :raises: ValueError
     """
     # tdk: update doc
-    if len(gm) < MPI_SIZE:
+    if gm.get_length() < MPI_SIZE:
         raise ValueError('The number of geometries must be greater than or equal to the number of processes.')
 
     pbv = UgridToolsConstants.POLYGON_BREAK_VALUE
 
-    result = get_face_variables(gm, with_connectivity=with_connectivity)
-    face_links, nmax_face_nodes, face_ids, face_coordinates, cdict, n_coords, face_areas, section = result
+    result = get_face_variables(gm, with_connectivity=with_connectivity, geodesic_area=geodesic_area)
+    face_links, nmax_face_nodes, face_ids, face_coordinates, cdict, n_coords, face_areas, section, \
+        face_areas_geodesic = result
 
     # Find the start index for each rank.
-    all_n_coords = MPI_COMM.gather(n_coords)
-    if MPI_RANK == 0:
-        all_idx_start = [0] * MPI_SIZE
-        for idx in range(len(all_n_coords)):
-            if idx == 0:
-                continue
-            else:
-                all_idx_start[idx] = all_n_coords[idx - 1] + all_idx_start[idx - 1]
-    else:
-        all_idx_start = None
-    idx_start = MPI_COMM.scatter(all_idx_start)
-    log.debug(('idx_start', idx_start))
+    idx_start = get_global_offset(n_coords)
+    log.debug('idx_start={}', idx_start)
 
     face_nodes, coordinates, edge_nodes = get_coordinate_dict_variables(cdict, n_coords, polygon_break_value=pbv,
                                                                         idx_start=idx_start)
@@ -186,7 +210,8 @@ def get_variables(gm, use_ragged_arrays=False, with_connectivity=True):
             new_arrays.append(get_rectangular_array_from_object_array(a, (a.shape[0], nmax_face_nodes)))
         face_links, face_nodes, face_edges = new_arrays
 
-    return face_nodes, face_edges, edge_nodes, coordinates, face_links, face_ids, face_coordinates, face_areas, section
+    return face_nodes, face_edges, edge_nodes, coordinates, face_links, face_ids, face_coordinates, face_areas, \
+           section, face_areas_geodesic
 
 
 def get_rectangular_array_from_object_array(target, shape):
@@ -206,11 +231,16 @@ def iter_touching(si, gm, shapely_object):
             yield uid_target
 
 
-def get_face_variables(gm, with_connectivity=False):
+def get_face_variables(gm, with_connectivity=False, geodesic_area=False):
+    """
+    Face variables are returned for this rank's section and are not gathered. Use
+    :func:`~utools.io.mpi.gatherv_array` to collect them on the root rank.
+    """
+
     if with_connectivity and MPI_SIZE > 1:
         raise ValueError('Connectivity not enabled for parallel conversion.')
 
-    n_face = len(gm)
+    n_face = gm.get_length()
 
     if MPI_RANK == 0:
         sections = create_sections(n_face)
@@ -222,28 +252,40 @@ def get_face_variables(gm, with_connectivity=False):
     # Create a spatial index to find touching faces.
     if with_connectivity:
         si = gm.get_spatial_index()
+        connectivity = PhaseAccumulator('connectivity')
 
     face_ids = np.zeros(section[1] - section[0], dtype=np.int32)
     assert face_ids.shape[0] > 0
 
     face_links = {}
     max_face_nodes = 0
-    face_coordinates = deque()
-    face_areas = deque()
+
+    # Ring buffers used to compute face areas and center coordinates in a single batch.
+    rings = deque()
+    ring_face = deque()
+    ring_is_interior = deque()
 
     cdict = OrderedDict()
     n_coords = 0
 
-    for ctr, (uid_source, record_source) in enumerate(gm.iter_records(return_uid=True, slc=section)):
+    for ctr, (uid_source, record_source) in enumerate(gm.iter_records(return_uid=True, slc=section, progress=True,
+                                                                      comm=MPI_COMM)):
+        # Attach profiler samples to this face until the next face is loaded. Neighbor queries are charged to it.
+        set_uid(uid_source)
         coordinates_list, n_coords = get_coordinates_list_and_update_n_coords(record_source, n_coords)
         cdict[uid_source] = coordinates_list
 
         face_ids[ctr] = uid_source
         ref_object = record_source['geom']
 
-        # Get representative points for each polygon.
-        face_coordinates.append(np.array(ref_object.representative_point()))
-        face_areas.append(ref_object.area)
+        for ring in coordinates_list:
+            rings.append(ring)
+            ring_face.append(ctr)
+            ring_is_interior.append(False)
+        for ring in get_interior_coordinates_list(ref_object):
+            rings.append(ring)
+            ring_face.append(ctr)
+            ring_is_interior.append(True)
 
         # For polygon geometries the first coordinate is repeated at the end of the sequence. UGRID clients do not want
         # repeated coordinates (i.e. ESMF).
@@ -258,40 +300,30 @@ def get_face_variables(gm, with_connectivity=False):
             max_face_nodes = ncoords
 
         if with_connectivity:
-            touching = deque()
-            for uid_target in iter_touching(si, gm, ref_object):
-                # If the objects only touch they are neighbors and may share nodes.
-                touching.append(uid_target)
-            # If nothing touches the faces, indicate this with a flag value.
-            if len(touching) == 0:
-                touching.append(-1)
-            face_links[uid_source] = touching
-
-    # face_ids = MPI_COMM.gather(face_ids, root=0)
-    # max_face_nodes = MPI_COMM.gather(max_face_nodes, root=0)
-    # face_links = MPI_COMM.gather(face_links, root=0)
-    # face_coordinates = MPI_COMM.gather(np.array(face_coordinates), root=0)
-    # cdict = MPI_COMM.gather(cdict, root=0)
-    # n_coords = MPI_COMM.gather(n_coords, root=0)
-    # face_areas = MPI_COMM.gather(np.array(face_areas), root=0)
-
-    # if MPI_RANK == 0:
-    #     face_ids = hgather(face_ids)
-    #     face_coordinates = vgather(face_coordinates)
-    #     cdict = dgather(cdict)
-    #     n_coords = sum(n_coords)
-    #     face_areas = hgather(face_areas)
-    #
-    #     max_face_nodes = max(max_face_nodes)
+            with connectivity:
+                touching = deque()
+                for uid_target in iter_touching(si, gm, ref_object):
+                    # If the objects only touch they are neighbors and may share nodes.
+                    touching.append(uid_target)
+                # If nothing touches the faces, indicate this with a flag value.
+                if len(touching) == 0:
+                    touching.append(-1)
+                face_links[uid_source] = touching
+    set_uid(None)
+    if with_connectivity:
+        connectivity.record()
 
     if with_connectivity:
         face_links = get_mapped_face_links(face_ids, face_links)
     else:
         face_links = None
 
-    face_coordinates = np.array(face_coordinates)
-    face_areas = np.array(face_areas)
-    return face_links, max_face_nodes, face_ids, face_coordinates, cdict, n_coords, face_areas, section
+    # Face centers are area-weighted centroids falling back to representative points for centroids outside the face.
+    face_areas, face_coordinates, face_areas_geodesic = get_face_metrics(rings, ring_face, ring_is_interior,
+                                                                         face_ids.shape[0],
+                                                                         geodesic_area=geodesic_area)
+    return face_links, max_face_nodes, face_ids, face_coordinates, cdict, n_coords, face_areas, section, \
+           face_areas_geodesic
 
 
 def get_mapped_face_links(face_ids, face_links):
@@ -321,74 +353,212 @@ def get_mapped_face_links(face_ids, face_links):
 
 
 def flexible_mesh_to_fiona(out_path, face_nodes, node_x, node_y, crs=None, driver='ESRI Shapefile',
-                           indices_to_load=None, face_uid=None):
+                           indices_to_load=None, face_uid=None, batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+    """
+    Write faces to a vector file. Features are constructed and written in batches.
+
+    :param int batch_size: Number of features constructed and written per call to the output collection.
+    """
     import fiona
 
     if face_uid is None:
         properties = {}
+        datasets = None
     else:
         properties = {face_uid.name: 'int'}
+        datasets = [face_uid]
 
     schema = {'geometry': 'Polygon', 'properties': properties}
     with fiona.open(out_path, 'w', driver=driver, crs=crs, schema=schema) as f:
-        for feature in iter_records(face_nodes, node_x, node_y, indices_to_load=indices_to_load, datasets=[face_uid],
-                                    polygon_break_value=UgridToolsConstants.POLYGON_BREAK_VALUE):
-            feature['properties'][face_uid.name] = int(feature['properties'][face_uid.name])
-            f.write(feature)
+        batch = []
+        for feature in iter_records(face_nodes, node_x, node_y, indices_to_load=indices_to_load, datasets=datasets,
+                                    polygon_break_value=UgridToolsConstants.POLYGON_BREAK_VALUE,
+                                    batch_size=batch_size):
+            if face_uid is not None:
+                feature['properties'][face_uid.name] = int(feature['properties'][face_uid.name])
+            batch.append(feature)
+            if len(batch) == batch_size:
+                f.writerecords(batch)
+                batch = []
+        if len(batch) > 0:
+            f.writerecords(batch)
     return out_path
 
 
 def iter_records(face_nodes, node_x, node_y, indices_to_load=None, datasets=None, shapely_only=False,
-                 polygon_break_value=None):
+                 polygon_break_value=None, batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+    """
+    Yield record dictionaries for faces. Geometries are constructed in batches from flat coordinate buffers.
+
+    :param int batch_size: Number of faces whose geometries are constructed at once.
+    """
+
     if indices_to_load is None:
-        feature_indices = range(face_nodes.shape[0])
+        feature_indices = np.arange(face_nodes.shape[0])
     else:
-        feature_indices = indices_to_load
+        feature_indices = np.asarray(indices_to_load)
 
-    for feature_idx in feature_indices:
-        try:
-            current_face_node = face_nodes[feature_idx, :]
-        except IndexError:
-            # Likely an object array.
-            assert face_nodes.dtype == object
-            current_face_node = face_nodes[feature_idx]
+    for start in range(0, feature_indices.shape[0], batch_size):
+        batch_indices = feature_indices[start:start + batch_size]
+        coordinates, ring_offsets, geometry_offsets = get_face_ragged_arrays(face_nodes, node_x, node_y,
+                                                                             batch_indices,
+                                                                             polygon_break_value=polygon_break_value)
+        if shapely_only:
+            geometries = get_geometries_from_ragged_arrays(coordinates, ring_offsets, geometry_offsets)
+        else:
+            geometries = iter_geojson_from_ragged_arrays(coordinates, ring_offsets, geometry_offsets)
 
-        try:
-            nodes = current_face_node.compressed()
-        except AttributeError:
-            # Likely not a masked array.
-            nodes = current_face_node.flatten()
+        for feature_idx, geometry in itertools.izip(batch_indices, geometries):
+            feature_idx = int(feature_idx)
+
+            # Collect properties if datasets are passed.
+            properties = OrderedDict()
+            if datasets is not None:
+                for ds in datasets:
+                    properties[ds.name] = ds.data[feature_idx]
+            feature = {'id': feature_idx, 'properties': properties}
+
+            # Add coordinates or shapely objects depending on parameters.
+            if shapely_only:
+                feature['geom'] = geometry
+            else:
+                feature['geometry'] = geometry
 
-        # Construct the geometry object by collecting node coordinates using indices stored in "nodes".
-        if polygon_break_value is not None and polygon_break_value in nodes:
-            itr = get_split_array(nodes, polygon_break_value)
-            has_multipart = True
+            yield feature
+
+
+def get_face_ragged_arrays(face_nodes, node_x, node_y, indices, polygon_break_value=None):
+    """
+    Convert face node connectivity to closed ring coordinates and offsets. Each part separated by a polygon break value
+    becomes a ring.
+
+    :param face_nodes: Face node connectivity as a two-dimensional (masked) array or a ragged object array.
+    :param indices: Face indices to convert.
+    :type indices: :class:`numpy.ndarray`
+    :returns: A tuple ``(coordinates, ring_offsets, geometry_offsets)``. Coordinates have shape ``(n, 2)`` with the
+     first coordinate of each ring repeated. ``ring_offsets`` indexes coordinates by ring and ``geometry_offsets``
+     indexes rings by face.
+    :rtype: tuple
+    """
+
+    flat, counts = get_flat_face_nodes(face_nodes, indices)
+    n_faces = counts.shape[0]
+    face_offsets = get_offsets(counts)
+
+    if polygon_break_value is None:
+        is_break = np.zeros(flat.shape[0], dtype=bool)
+    else:
+        is_break = flat == polygon_break_value
+
+    # A ring starts at each non-empty face and after each break value.
+    ring_starts = np.zeros(flat.shape[0] + 1, dtype=bool)
+    ring_starts[face_offsets[:-1][counts > 0]] = True
+    ring_starts[np.where(is_break)[0] + 1] = True
+    ring_starts = ring_starts[:-1]
+    is_node = np.invert(is_break)
+    ring_ids = np.cumsum(ring_starts)[is_node] - 1
+    n_rings = int(ring_starts.sum())
+    node_ids = flat[is_node]
+
+    face_ids = np.repeat(np.arange(n_faces), counts)
+    part_counts = np.bincount(face_ids[is_break], minlength=n_faces) + 1
+    part_counts[counts == 0] = 0
+
+    # Repeat the first node of each ring to close it.
+    ring_lengths = np.bincount(ring_ids, minlength=n_rings)
+    ring_offsets = get_offsets(ring_lengths + 1)
+    src = np.arange(ring_offsets[-1]) - np.repeat(np.arange(n_rings), ring_lengths + 1)
+    src[ring_offsets[1:] - 1] = get_offsets(ring_lengths)[:-1]
+    closed_node_ids = node_ids[src]
+
+    coordinates = np.empty((closed_node_ids.shape[0], 2), dtype=np.float64)
+    coordinates[:, 0] = np.asarray(node_x)[closed_node_ids]
+    coordinates[:, 1] = np.asarray(node_y)[closed_node_ids]
+
+    return coordinates, ring_offsets, get_offsets(part_counts)
+
+
+def get_flat_face_nodes(face_nodes, indices):
+    """
+    :returns: A tuple containing the concatenated node indices for each face and the number of values for each face.
+     Break values are retained.
+    :rtype: tuple (:class:`numpy.ndarray`, :class:`numpy.ndarray`)
+    """
+
+    if face_nodes.dtype == object:
+        faces = [np.ma.compressed(face_nodes[idx]) for idx in indices]
+        counts = np.array([f.shape[0] for f in faces], dtype=np.int64)
+        if len(faces) == 0:
+            flat = np.zeros(0, dtype=np.int64)
         else:
-            itr = [nodes]
-            has_multipart = False
-        polygons = []
-        for sub in itr:
-            coordinates = [(node_x[ni], node_y[ni]) for ni in sub.flat]
-            polygons.append(Polygon(coordinates))
-        if has_multipart:
-            polygon = MultiPolygon(polygons)
+            flat = np.concatenate(faces)
+    else:
+        faces = face_nodes[indices]
+        if isinstance(faces, MaskedArray):
+            keep = np.invert(np.ma.getmaskarray(faces))
+            flat = faces.data[keep]
+            counts = keep.sum(axis=1)
         else:
-            polygon = polygons[0]
+            flat = faces.ravel()
+            counts = np.ones(faces.shape[0], dtype=np.int64) * faces.shape[1]
+    return flat.astype(np.int64), counts
 
-        # Collect properties if datasets are passed.
-        properties = OrderedDict()
-        if datasets is not None:
-            for ds in datasets:
-                properties[ds.name] = ds.data[feature_idx]
-        feature = {'id': feature_idx, 'properties': properties}
 
-        # Add coordinates or shapely objects depending on parameters.
-        if shapely_only:
-            feature['geom'] = polygon
-        else:
-            feature['geometry'] = mapping(polygon)
+def get_geometries_from_ragged_arrays(coordinates, ring_offsets, geometry_offsets):
+    """
+    Construct Shapely geometries where each ring is a polygon part. Faces with more than one ring become multipolygons.
+    Shapely 2 constructs geometries in vectorized calls.
 
-        yield feature
+    :rtype: :class:`numpy.ndarray` of :class:`shapely.geometry.Polygon` or :class:`shapely.geometry.MultiPolygon`
+    """
+
+    part_counts = np.diff(geometry_offsets)
+    n_geometries = part_counts.shape[0]
+    ret = np.empty(n_geometries, dtype=object)
+
+    if shapely_vectorized is not None:
+        n_rings = ring_offsets.shape[0] - 1
+        ring_ids = np.repeat(np.arange(n_rings), np.diff(ring_offsets))
+        polygons = shapely_vectorized.polygons(shapely_vectorized.linearrings(coordinates, indices=ring_ids))
+        is_single = part_counts == 1
+        ret[is_single] = polygons[geometry_offsets[:-1][is_single]]
+        is_multi = part_counts > 1
+        if is_multi.any():
+            ring_geometry = np.repeat(np.arange(n_geometries), part_counts)
+            multi_position = np.cumsum(is_multi) - 1
+            ring_select = is_multi[ring_geometry]
+            ret[is_multi] = shapely_vectorized.multipolygons(polygons[ring_select],
+                                                            indices=multi_position[ring_geometry[ring_select]])
+        for idx in np.where(part_counts == 0)[0]:
+            ret[idx] = Polygon()
+    else:
+        for idx in range(n_geometries):
+            polygons = [Polygon(coordinates[ring_offsets[ii]:ring_offsets[ii + 1]])
+                        for ii in range(geometry_offsets[idx], geometry_offsets[idx + 1])]
+            if len(polygons) == 1:
+                ret[idx] = polygons[0]
+            elif len(polygons) == 0:
+                ret[idx] = Polygon()
+            else:
+                ret[idx] = MultiPolygon(polygons)
+    return ret
+
+
+def iter_geojson_from_ragged_arrays(coordinates, ring_offsets, geometry_offsets):
+    """
+    Yield GeoJSON-like geometry mappings directly from coordinate buffers without constructing Shapely geometries.
+    Each ring is a polygon part.
+
+    :rtype: dict
+    """
+
+    for idx in range(geometry_offsets.shape[0] - 1):
+        rings = [tuple(map(tuple, coordinates[ring_offsets[ii]:ring_offsets[ii + 1]].tolist()))
+                 for ii in range(geometry_offsets[idx], geometry_offsets[idx + 1])]
+        if len(rings) == 1:
+            yield {'type': 'Polygon', 'coordinates': (rings[0],)}
+        else:
+            yield {'type': 'MultiPolygon', 'coordinates': tuple((ring,) for ring in rings)}
 
 
 def create_rtree_file(gm, path):
@@ -435,7 +605,7 @@ def get_oriented_and_valid_geometry(geom):
 
 
 def convert_collection_to_esmf_format(fmobj, filename, polygon_break_value=None, start_index=0, face_uid_name=None,
-                                      dataset_kwargs=None):
+                                      dataset_kwargs=None, layout=None):
     """
     Convert to an ESMF format NetCDF files. Only supports ragged arrays.
 
@@ -443,9 +613,12 @@ def convert_collection_to_esmf_format(fmobj, filename, polygon_break_value=None,
     :type fm: :class:`pyugrid.flexible_mesh.core.FlexibleMesh`
     :param ds: An open netCDF4 dataset object.
     :type ds: :class:`netCDF4.Dataset`
+    :param layout: The output storage layout. See :func:`utools.io.layout.get_layout`.
+    :type layout: str or :class:`~utools.io.layout.OutputLayout`
     """
 
-    dataset_kwargs = dataset_kwargs or {}
+    layout = get_layout(layout)
+    dataset_kwargs = layout.get_dataset_kwargs(dataset_kwargs)
 
     # tdk: doc
     # face_areas = fmobj.face_areas
@@ -458,6 +631,7 @@ def convert_collection_to_esmf_format(fmobj, filename, polygon_break_value=None,
     # nodes = fmobj.nodes
 
     face_areas = fmobj['face_areas']
+    face_areas_geodesic = fmobj.get('face_areas_geodesic')
     face_coordinates = fmobj['face_coordinates']
     if face_uid_name is not None:
         face_uid_value = fmobj[face_uid_name]
@@ -534,30 +708,37 @@ def convert_collection_to_esmf_format(fmobj, filename, polygon_break_value=None,
 
             # Variables ------------------------------------------------------------------------------------------------
 
-            node_coords = ds.createVariable('nodeCoords', nodes.dtype, (node_count.name, coord_dim.name))
+            node_coords = layout.create_variable(ds, 'nodeCoords', nodes.dtype, (node_count.name, coord_dim.name))
             node_coords.units = 'degrees'
 
-            element_conn = ds.createVariable('elementConn', element_conn_data.dtype, (connection_count.name,))
+            element_conn = layout.create_variable(ds, 'elementConn', element_conn_data.dtype,
+                                                  (connection_count.name,))
             element_conn.long_name = 'Node indices that define the element connectivity.'
             if polygon_break_value is not None:
                 element_conn.polygon_break_value = polygon_break_value
             element_conn.start_index = start_index
 
-            num_element_conn = ds.createVariable('numElementConn', np.int32, (element_count.name,))
+            num_element_conn = layout.create_variable(ds, 'numElementConn', np.int32, (element_count.name,))
             num_element_conn.long_name = 'Number of nodes per element.'
 
-            center_coords = ds.createVariable('centerCoords', face_coordinates.dtype, (element_count.name,
-                                                                                       coord_dim.name))
+            center_coords = layout.create_variable(ds, 'centerCoords', face_coordinates.dtype,
+                                                   (element_count.name, coord_dim.name))
             center_coords.units = 'degrees'
 
             if face_uid_value is not None:
-                uid = ds.createVariable(face_uid_name, face_uid_value.dtype, dimensions=(element_count.name,))
+                uid = layout.create_variable(ds, face_uid_name, face_uid_value.dtype, (element_count.name,))
                 uid.long_name = 'Element unique identifier.'
 
-            element_area = ds.createVariable('elementArea', nodes.dtype, (element_count.name,))
+            element_area = layout.create_variable(ds, 'elementArea', np.float64, (element_count.name,))
             element_area.units = 'degrees'
             element_area.long_name = 'Element area in native units.'
 
+            if face_areas_geodesic is not None:
+                element_area_geodesic = layout.create_variable(ds, 'elementAreaGeodesic', np.float64,
+                                                                (element_count.name,))
+                element_area_geodesic.units = 'm^2'
+                element_area_geodesic.long_name = 'Element area on the WGS84 ellipsoid.'
+
             # Global Attributes ----------------------------------------------------------------------------------------
 
             ds.gridType = 'unstructured'
@@ -577,7 +758,7 @@ def convert_collection_to_esmf_format(fmobj, filename, polygon_break_value=None,
     element_conn_stop = None
 
     for rank_to_write in range(MPI_SIZE):
-        log.debug(('node_coords_start', node_coords_start))
+        log.debug('node_coords_start={}', node_coords_start)
         if MPI_RANK == rank_to_write:
             ds = nc.Dataset(filename, mode='a')
             try:
@@ -592,13 +773,15 @@ def convert_collection_to_esmf_format(fmobj, filename, polygon_break_value=None,
                 node_coords_stop = node_coords_start + nodes.shape[0]
                 element_conn_stop = element_conn_start + element_conn_data.shape[0]
                 node_coords[node_coords_start:node_coords_stop] = nodes
-                log.debug(('element_conn indices', element_conn_start, element_conn_stop))
+                log.debug('element_conn indices=({}, {})', element_conn_start, element_conn_stop)
                 element_conn[element_conn_start:element_conn_stop] = element_conn_data
 
                 start, stop = fmobj['section']
                 num_element_conn[start:stop] = num_element_conn_data
                 center_coords[start:stop] = face_coordinates
                 element_area[start:stop] = face_areas
+                if face_areas_geodesic is not None:
+                    ds.variables['elementAreaGeodesic'][start:stop] = face_areas_geodesic
                 if face_uid_value is not None:
                     uid[start:stop] = face_uid_value
             finally:
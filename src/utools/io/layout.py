@@ -0,0 +1,124 @@
+"""
+Storage layout policies for ESMF unstructured output files.
+
+ESMF_RegridWeightGen reads mesh variables sequentially from start to end. Chunked layouts use large chunks along the
+leading dimension so each read request maps to few chunks.
+"""
+import numpy as np
+
+#: Default number of values along the leading dimension in a chunk.
+DEFAULT_CHUNK_LENGTH = 262144
+
+# Variables holding coordinates. These may be stored as single precision.
+_COORDINATE_VARIABLES = ('nodeCoords', 'centerCoords')
+
+
+class OutputLayout(object):
+    """
+    :param str name: The layout name.
+    :param str file_format: The NetCDF file format. If ``None``, use the :class:`netCDF4.Dataset` default.
+    :param bool contiguous: If ``True``, store variables without chunking. Contiguous storage allows memory-mapped
+     reads. NetCDF-4 files require ``h5py`` for this. See :class:`utools.io.esmf_mesh.EsmfMesh`.
+    :param bool zlib: If ``True``, compress variables with deflate.
+    :param int complevel: The deflate compression level.
+    :param bool shuffle: If ``True``, apply the HDF5 shuffle filter before compression.
+    :param coordinate_dtype: If not ``None``, store coordinate variables with this data type.
+    :param int chunk_length: Number of values along the leading dimension in a chunk.
+    """
+
+    def __init__(self, name, file_format=None, contiguous=False, zlib=False, complevel=4, shuffle=False,
+                 coordinate_dtype=None, chunk_length=DEFAULT_CHUNK_LENGTH):
+        self.name = name
+        self.file_format = file_format
+        self.contiguous = contiguous
+        self.zlib = zlib
+        self.complevel = complevel
+        self.shuffle = shuffle
+        self.coordinate_dtype = coordinate_dtype
+        self.chunk_length = chunk_length
+
+    def create_variable(self, ds, name, dtype, dimensions, fill_value=None):
+        """
+        Create a variable applying the layout's data type, chunking, and compression settings.
+
+        :param ds: The dataset open for writing.
+        :type ds: :class:`netCDF4.Dataset`
+        :param str name: The variable name.
+        :param dtype: The variable data type before layout conversion.
+        :param dimensions: The variable dimension names.
+        :type dimensions: tuple of str
+        :param fill_value: The variable fill value. If ``None``, use the NetCDF default.
+        :rtype: :class:`netCDF4.Variable`
+        """
+
+        if self.coordinate_dtype is not None and name in _COORDINATE_VARIABLES:
+            dtype = self.coordinate_dtype
+
+        kwargs = {}
+        if fill_value is not None:
+            kwargs['fill_value'] = fill_value
+        if ds.data_model.startswith('NETCDF4'):
+            has_unlimited = any(ds.dimensions[d].isunlimited() for d in dimensions)
+            if self.contiguous and not has_unlimited:
+                kwargs['contiguous'] = True
+            elif self.zlib or has_unlimited:
+                kwargs['chunksizes'] = self.get_chunksizes(ds, dimensions)
+            if self.zlib:
+                kwargs.update({'zlib': True, 'complevel': self.complevel, 'shuffle': self.shuffle})
+
+        return ds.createVariable(name, dtype, dimensions, **kwargs)
+
+    def get_chunksizes(self, ds, dimensions):
+        """
+        :returns: Chunk sizes spanning the whole trailing dimensions and ``chunk_length`` along the leading dimension.
+        :rtype: tuple of int
+        """
+
+        ret = []
+        for idx, dimension_name in enumerate(dimensions):
+            dimension = ds.dimensions[dimension_name]
+            if idx == 0:
+                size = self.chunk_length
+                if not dimension.isunlimited():
+                    size = min(size, max(len(dimension), 1))
+            else:
+                size = max(len(dimension), 1)
+            ret.append(size)
+        return tuple(ret)
+
+    def get_dataset_kwargs(self, dataset_kwargs=None):
+        """
+        :param dict dataset_kwargs: Arguments to :class:`netCDF4.Dataset` that take precedence over the layout.
+        :rtype: dict
+        """
+
+        ret = {}
+        if self.file_format is not None:
+            ret['format'] = self.file_format
+        ret.update(dataset_kwargs or {})
+        return ret
+
+
+LAYOUTS = {'default': OutputLayout('default'),
+           'contiguous': OutputLayout('contiguous', file_format='NETCDF4', contiguous=True),
+           'chunked': OutputLayout('chunked', file_format='NETCDF4', zlib=True, shuffle=True),
+           'quantized': OutputLayout('quantized', file_format='NETCDF4', zlib=True, shuffle=True,
+                                     coordinate_dtype=np.float32)}
+
+
+def get_layout(layout):
+    """
+    :param layout: A layout name in :attr:`~utools.io.layout.LAYOUTS`, a layout object, or ``None`` for the default.
+    :type layout: str or :class:`~utools.io.layout.OutputLayout`
+    :rtype: :class:`~utools.io.layout.OutputLayout`
+    :raises: ValueError
+    """
+
+    if layout is None:
+        layout = 'default'
+    if isinstance(layout, OutputLayout):
+        return layout
+    try:
+        return LAYOUTS[layout]
+    except KeyError:
+        raise ValueError('Layout not recognized: {}. Options are: {}'.format(layout, sorted(LAYOUTS.keys())))
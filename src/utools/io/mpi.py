@@ -12,9 +12,16 @@ class DummyMPIComm(object):
     def Barrier(self):
         pass
 
+    def allgather(self, *args, **kwargs):
+        return [args[0]]
+
     def bcast(self, *args, **kwargs):
         return args[0]
 
+    def exscan(self, *args, **kwargs):
+        # Matches MPI: the exclusive scan is undefined on the first rank.
+        return None
+
     def gather(self, *args, **kwargs):
         return [args[0]]
 
@@ -35,6 +42,9 @@ else:
 MPI_SIZE = MPI_COMM.Get_size()
 MPI_RANK = MPI_COMM.Get_rank()
 
+# Communicator for processes on the same node. Created on first use.
+_NODE_COMM = None
+
 
 def create_sections(length, size=MPI_SIZE):
     step = int(np.ceil(float(length) / size))
@@ -50,6 +60,168 @@ def create_sections(length, size=MPI_SIZE):
     return indexes
 
 
+def get_node_comm():
+    """
+    :returns: A communicator for the processes sharing a node with this process. ``None`` if :mod:`mpi4py` is not
+     installed.
+    """
+
+    global _NODE_COMM
+
+    if not MPI_ENABLED:
+        return None
+    if _NODE_COMM is None:
+        _NODE_COMM = MPI_COMM.Split_type(MPI.COMM_TYPE_SHARED)
+    return _NODE_COMM
+
+
+def get_displacements(counts):
+    """
+    :param counts: Number of values for each rank.
+    :type counts: sequence of int
+    :returns: Offsets of each rank's values in the concatenated buffer.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    counts = np.asarray(counts, dtype=np.int64)
+    ret = np.zeros(counts.shape[0], dtype=np.int64)
+    np.cumsum(counts[:-1], out=ret[1:])
+    return ret
+
+
+def get_global_offset(value, comm=None):
+    """
+    Exclusive prefix sum of ``value`` across ranks. Use to find a rank's start index in a global array. This is a
+    collective operation.
+
+    :param int value: The local count.
+    :param comm: The communicator. Defaults to :attr:`~utools.io.mpi.MPI_COMM`.
+    :returns: The sum of ``value`` on lower ranks. Zero on the first rank.
+    :rtype: int
+    """
+
+    comm = comm or MPI_COMM
+    ret = comm.exscan(int(value))
+    if ret is None:
+        ret = 0
+    return ret
+
+
+def gatherv_array(arr, root=0, comm=None):
+    """
+    Concatenate arrays along the first axis on the root rank using buffer-based ``Gatherv``. Trailing dimensions and
+    data types must match across ranks. This is a collective operation.
+
+    :param arr: The local array.
+    :type arr: :class:`numpy.ndarray`
+    :param int root: The rank receiving the concatenated array.
+    :param comm: The communicator. Defaults to :attr:`~utools.io.mpi.MPI_COMM`.
+    :returns: The concatenated array on the root rank. ``None`` on other ranks.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    comm = comm or MPI_COMM
+    if comm.Get_size() == 1:
+        return arr
+
+    arr = np.ascontiguousarray(arr)
+    counts = comm.gather(arr.shape[0], root=root)
+    if comm.Get_rank() == root:
+        ret = np.empty((sum(counts),) + arr.shape[1:], dtype=arr.dtype)
+        recvbuf = _get_vector_buffer_(ret, counts)
+    else:
+        ret = None
+        recvbuf = None
+    comm.Gatherv(_get_send_buffer_(arr), recvbuf, root=root)
+    return ret
+
+
+def allgatherv_array(arr, comm=None):
+    """
+    Same as :func:`~utools.io.mpi.gatherv_array` but every rank receives the concatenated array.
+    """
+
+    comm = comm or MPI_COMM
+    if comm.Get_size() == 1:
+        return arr
+
+    arr = np.ascontiguousarray(arr)
+    counts = comm.allgather(arr.shape[0])
+    ret = np.empty((sum(counts),) + arr.shape[1:], dtype=arr.dtype)
+    comm.Allgatherv(_get_send_buffer_(arr), _get_vector_buffer_(ret, counts))
+    return ret
+
+
+def scatterv_array(arr, counts=None, root=0, comm=None):
+    """
+    Distribute rows of an array from the root rank using buffer-based ``Scatterv``. This is a collective operation.
+
+    :param arr: The array to distribute. Only used on the root rank.
+    :type arr: :class:`numpy.ndarray`
+    :param counts: Number of rows for each rank. Defaults to the sections from :func:`~utools.io.mpi.create_sections`.
+    :type counts: sequence of int
+    :param int root: The rank holding the array.
+    :param comm: The communicator. Defaults to :attr:`~utools.io.mpi.MPI_COMM`.
+    :returns: The local rows.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    comm = comm or MPI_COMM
+    if comm.Get_size() == 1:
+        return arr
+
+    if comm.Get_rank() == root:
+        arr = np.ascontiguousarray(arr)
+        if counts is None:
+            counts = [stop - start for start, stop in create_sections(arr.shape[0], size=comm.Get_size())]
+        meta = (arr.dtype.str, arr.shape[1:], list(counts))
+    else:
+        meta = None
+    dtype, trailing_shape, counts = comm.bcast(meta, root=root)
+
+    ret = np.empty((counts[comm.Get_rank()],) + tuple(trailing_shape), dtype=np.dtype(dtype))
+    if comm.Get_rank() == root:
+        sendbuf = _get_vector_buffer_(arr, counts)
+    else:
+        sendbuf = None
+    comm.Scatterv(sendbuf, _get_send_buffer_(ret), root=root)
+    return ret
+
+
+def gatherv_csr(values, offsets, root=0, comm=None):
+    """
+    Gather a ragged array in compressed sparse row form on the root rank. This is a collective operation.
+
+    :param values: The flat local values.
+    :type values: :class:`numpy.ndarray`
+    :param offsets: Local row offsets into ``values`` with length ``rows + 1`` starting at zero.
+    :type offsets: :class:`numpy.ndarray`
+    :returns: Tuple of global values and global row offsets on the root rank. ``None`` on other ranks.
+    :rtype: tuple of :class:`numpy.ndarray`
+    """
+
+    comm = comm or MPI_COMM
+    offsets = np.asarray(offsets, dtype=np.int64)
+    values = gatherv_array(values, root=root, comm=comm)
+    lengths = gatherv_array(np.diff(offsets), root=root, comm=comm)
+    if comm.Get_rank() != root:
+        return None
+    ret_offsets = np.zeros(lengths.shape[0] + 1, dtype=np.int64)
+    np.cumsum(lengths, out=ret_offsets[1:])
+    return values, ret_offsets
+
+
+def _get_send_buffer_(arr):
+    return [arr, MPI._typedict[arr.dtype.char]]
+
+
+def _get_vector_buffer_(arr, counts):
+    # Counts and displacements are in elements of the base data type.
+    row_size = int(np.prod(arr.shape[1:], dtype=np.int64))
+    counts = np.asarray(counts, dtype=np.int64) * row_size
+    return [arr, (counts.tolist(), get_displacements(counts).tolist()), MPI._typedict[arr.dtype.char]]
+
+
 def dgather(elements):
     grow = elements[0]
     for idx in range(1, len(elements)):
@@ -89,3 +261,27 @@ def vgather(elements):
         fill[start:stop, :] = e
         start = stop
     return fill
+
+
+def get_parallel_dataset_kwargs(path):
+    """
+    :param str path: Path to an existing NetCDF file.
+    :returns: Arguments to :class:`netCDF4.Dataset` for parallel I/O on ``path``. ``None`` if parallel I/O is not
+     available for the file: there is one process, :mod:`mpi4py` is not installed, or the NetCDF library lacks parallel
+     support for the file format.
+    :rtype: dict
+    """
+
+    import netCDF4 as nc
+
+    if not MPI_ENABLED or MPI_SIZE == 1:
+        return None
+    with nc.Dataset(path) as ds:
+        file_format = ds.file_format
+    if file_format.startswith('NETCDF4'):
+        supported = getattr(nc, '__has_parallel4_support__', False)
+    else:
+        supported = getattr(nc, '__has_pnetcdf_support__', False)
+    if not supported:
+        return None
+    return {'parallel': True, 'comm': MPI_COMM, 'info': MPI.Info()}
@@ -0,0 +1,138 @@
+"""
+Static, packed spatial index over bounding boxes. Items are sorted along a Hilbert curve and grouped into fixed-size
+nodes level by level. Construction and queries use array operations only.
+"""
+import numpy as np
+
+#: Number of children per index node.
+DEFAULT_NODE_SIZE = 16
+
+# Number of bits per axis used to compute Hilbert codes.
+_HILBERT_ORDER = 16
+
+
+class PackedIndex(object):
+    """
+    >>> bounds = np.array([[0., 0., 1., 1.], [5., 5., 6., 6.]])
+    >>> index = PackedIndex(bounds)
+    >>> index.query((0.5, 0.5, 2., 2.))
+    array([0])
+
+    :param bounds: Item bounds with shape ``(n, 4)`` ordered ``(minx, miny, maxx, maxy)``.
+    :type bounds: :class:`numpy.ndarray`
+    :param int node_size: Number of children per index node.
+    """
+
+    def __init__(self, bounds, node_size=DEFAULT_NODE_SIZE):
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        if node_size < 2:
+            raise ValueError('Node size must be greater than one.')
+        self.node_size = node_size
+
+        self._order = get_hilbert_order(bounds)
+        self._levels = [bounds[self._order]]
+        while self._levels[-1].shape[0] > 1:
+            self._levels.append(get_node_bounds(self._levels[-1], node_size))
+
+    def __len__(self):
+        return self._order.shape[0]
+
+    @property
+    def bounds(self):
+        """
+        :returns: The bounds of all indexed items. ``None`` if the index is empty.
+        :rtype: tuple
+        """
+
+        if len(self) == 0:
+            return None
+        return tuple(self._levels[-1][0])
+
+    def query(self, bbox):
+        """
+        :param bbox: The query bounds ``(minx, miny, maxx, maxy)``.
+        :type bbox: sequence of float
+        :returns: Sorted indices of items whose bounds intersect the query bounds. Touching bounds intersect.
+        :rtype: :class:`numpy.ndarray`
+        """
+
+        minx, miny, maxx, maxy = bbox
+        candidates = np.zeros(min(len(self), 1), dtype=np.int64)
+        for level_index in range(len(self._levels) - 1, -1, -1):
+            level = self._levels[level_index]
+            boxes = level[candidates]
+            select = (boxes[:, 0] <= maxx) & (boxes[:, 2] >= minx) & (boxes[:, 1] <= maxy) & (boxes[:, 3] >= miny)
+            candidates = candidates[select]
+            if level_index > 0:
+                children = candidates[:, None] * self.node_size + np.arange(self.node_size)
+                children = children.ravel()
+                candidates = children[children < self._levels[level_index - 1].shape[0]]
+        return np.sort(self._order[candidates])
+
+
+def get_hilbert_codes(x, y, order=_HILBERT_ORDER):
+    """
+    :param x: Integer grid coordinates in ``[0, 2 ** order)``.
+    :type x: :class:`numpy.ndarray`
+    :param y: Integer grid coordinates in ``[0, 2 ** order)``.
+    :type y: :class:`numpy.ndarray`
+    :returns: Distances along the Hilbert curve.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    n = 2 ** order
+    x = np.array(x, dtype=np.int64)
+    y = np.array(y, dtype=np.int64)
+    ret = np.zeros(x.shape, dtype=np.int64)
+    s = n // 2
+    while s > 0:
+        rx = ((x & s) > 0).astype(np.int64)
+        ry = ((y & s) > 0).astype(np.int64)
+        ret += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant.
+        rotate = ry == 0
+        flip = rotate & (rx == 1)
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        x, y = np.where(rotate, y, x), np.where(rotate, x, y)
+        s //= 2
+    return ret
+
+
+def get_hilbert_order(bounds, order=_HILBERT_ORDER):
+    """
+    :returns: Indices sorting the bounds by the Hilbert code of their centers.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    if bounds.shape[0] == 0:
+        return np.zeros(0, dtype=np.int64)
+    cx = (bounds[:, 0] + bounds[:, 2]) / 2.
+    cy = (bounds[:, 1] + bounds[:, 3]) / 2.
+    scale = 2 ** order - 1
+    gx = _get_grid_coordinates_(cx, scale)
+    gy = _get_grid_coordinates_(cy, scale)
+    return np.argsort(get_hilbert_codes(gx, gy, order=order), kind='mergesort')
+
+
+def get_node_bounds(bounds, node_size):
+    """
+    :returns: Bounds for each group of ``node_size`` consecutive rows.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    starts = np.arange(0, bounds.shape[0], node_size)
+    ret = np.empty((starts.shape[0], 4), dtype=bounds.dtype)
+    ret[:, 0] = np.minimum.reduceat(bounds[:, 0], starts)
+    ret[:, 1] = np.minimum.reduceat(bounds[:, 1], starts)
+    ret[:, 2] = np.maximum.reduceat(bounds[:, 2], starts)
+    ret[:, 3] = np.maximum.reduceat(bounds[:, 3], starts)
+    return ret
+
+
+def _get_grid_coordinates_(values, scale):
+    vmin = values.min()
+    extent = values.max() - vmin
+    if extent == 0:
+        return np.zeros(values.shape, dtype=np.int64)
+    return np.floor((values - vmin) / extent * scale).astype(np.int64)
@@ -1,32 +1,180 @@
+"""
+Logging configured from :mod:`utools.env`. Messages in hot loops should pass arguments to the log call instead of
+formatting them (``log.debug('section={}', section)``) so nothing is formatted for filtered levels.
+
+With :attr:`utools.env.LOGGING_ASYNC`, formatted records are buffered and written in batches by a background thread.
+With :attr:`utools.env.LOGGING_AGGREGATE`, file records are held on each rank and written by rank 0 to a single file
+when :func:`~utools.logging.flush_logs` is called at a collective point. Collective phases (see
+:class:`utools.instrument.phase`) call it on exit and the command line interface calls it after every command.
+"""
+import atexit
 import functools
 import os
 import sys
+import threading
 import time
+from collections import deque
 
-from logbook import Logger, StreamHandler, FileHandler
-from mpi4py import MPI
+from logbook import Logger, StreamHandler, FileHandler, Handler, NOTSET
 
 import utools
 from utools import env
 
-MPI_COMM = MPI.COMM_WORLD
-MPI_RANK = MPI_COMM.Get_rank()
-
 
 def formatter(record, handler):
-    msg = '[{} {}]: {} (rank={}, time={}): {}'.format(record.channel, record.time, record.level_name, MPI_RANK,
+    msg = '[{} {}]: {} (rank={}, time={}): {}'.format(record.channel, record.time, record.level_name, get_rank(),
                                                       time.time(), record.message)
     if record.level_name == 'ERROR':
         msg += '\n' + record.formatted_exception
     return msg
 
 
+def get_rank():
+    """
+    :returns: The MPI rank. MPI is initialized on first call so importing this module does not initialize MPI.
+    :rtype: int
+    """
+
+    from utools.io.mpi import MPI_RANK
+
+    return MPI_RANK
+
+
+class BufferedHandler(Handler):
+    """
+    Format records in the logging thread and write them to a stream in batches from a background thread.
+
+    :param stream: The destination file-like object.
+    :param float flush_interval: Seconds between background writes. Defaults to
+     :attr:`utools.env.LOGGING_FLUSH_INTERVAL`.
+    :param int capacity: Number of buffered records that triggers a write in the logging thread.
+    """
+
+    def __init__(self, stream, level=NOTSET, bubble=False, flush_interval=None, capacity=10000):
+        Handler.__init__(self, level=level, bubble=bubble)
+        if flush_interval is None:
+            flush_interval = env.LOGGING_FLUSH_INTERVAL
+        self.stream = stream
+        self.flush_interval = flush_interval
+        self.capacity = capacity
+        self.closed = False
+
+        # Appending to and popping from a deque are atomic so the logging thread does not take the lock.
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run_, name='utools-logging')
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, record):
+        self._buffer.append(self.format(record))
+        if len(self._buffer) >= self.capacity:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            lines = []
+            while True:
+                try:
+                    lines.append(self._buffer.popleft())
+                except IndexError:
+                    break
+            if len(lines) > 0 and not self.stream.closed:
+                self.stream.write('\n'.join(lines) + '\n')
+                self.stream.flush()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.flush()
+
+    def _run_(self):
+        # Python 2 timed event waits poll. Sleeping keeps the writer thread idle between batches.
+        while not self.closed:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+class RankAggregatingHandler(Handler):
+    """
+    Hold formatted records in memory until :meth:`~utools.logging.RankAggregatingHandler.gather` writes the records
+    from all ranks to a single file on rank 0. Records not gathered before the interpreter exits or exceeding the
+    capacity are written to a per-rank file.
+
+    :param str path: Path to the aggregated log file.
+    :param str path_rank: Path to the per-rank log file for records not gathered.
+    :param str mode: File mode for the first write to each file.
+    :param int capacity: Number of held records that triggers a write to the per-rank file.
+    """
+
+    def __init__(self, path, path_rank, mode='a', level=NOTSET, bubble=False, capacity=10000):
+        Handler.__init__(self, level=level, bubble=bubble)
+        self.path = path
+        self.path_rank = path_rank
+        self.capacity = capacity
+        self.records = []
+        self._modes = {}
+        self._mode = mode
+        atexit.register(self.close)
+
+    def emit(self, record):
+        self.records.append(self.format(record))
+        if len(self.records) >= self.capacity:
+            self.close()
+
+    def gather(self, comm=None):
+        """
+        Write the records of all ranks to the aggregated log file ordered by rank. This is a collective operation.
+
+        :param comm: The communicator. Defaults to :attr:`~utools.io.mpi.MPI_COMM`.
+        """
+
+        if comm is None:
+            from utools.io.mpi import MPI_COMM as comm
+
+        records, self.records = self.records, []
+        all_records = comm.gather(records, root=0)
+        if comm.Get_rank() == 0:
+            self._write_(self.path, [r for rank_records in all_records for r in rank_records])
+
+    def close(self):
+        records, self.records = self.records, []
+        self._write_(self.path_rank, records)
+
+    def _write_(self, path, records):
+        if len(records) == 0:
+            return
+        with open(path, self._modes.get(path, self._mode)) as f:
+            f.write('\n'.join(records) + '\n')
+        self._modes[path] = 'a'
+
+
+def flush_logs(comm=None):
+    """
+    Write buffered records. This is a collective operation if :attr:`utools.env.LOGGING_AGGREGATE` is enabled.
+
+    :param comm: The communicator for aggregated records. Defaults to :attr:`~utools.io.mpi.MPI_COMM`.
+    """
+
+    for handler in log.handlers:
+        if isinstance(handler, RankAggregatingHandler):
+            handler.gather(comm=comm)
+        elif isinstance(handler, BufferedHandler):
+            handler.flush()
+
+
 level = env.LOGGING_LEVEL
 log = Logger(env.LOGGING_FILE_PREFIX, level=level)
+# Without handlers, records are not created.
+log.disabled = not env.LOGGING_ENABLED
 
 if env.LOGGING_ENABLED:
     if env.LOGGING_STDOUT:
-        sh = StreamHandler(sys.stdout, bubble=True)
+        if env.LOGGING_ASYNC:
+            sh = BufferedHandler(sys.stdout, bubble=True)
+        else:
+            sh = StreamHandler(sys.stdout, bubble=True)
         sh.formatter = formatter
         # sh.format_string += ' (rank={})'.format(MPI_RANK)
         log.handlers.append(sh)
@@ -35,8 +183,15 @@ if env.LOGGING_ENABLED:
     if env.LOGGING_TOFILE:
         fh_directory = env.LOGGING_DIR
         fh_file_prefix = env.LOGGING_FILE_PREFIX
-        fh = FileHandler(os.path.join(fh_directory, '{}-rank-{}.log'.format(fh_file_prefix, MPI_RANK)), bubble=True,
-                         mode=env.LOGGING_FILEMODE.lower())
+        fh_path = os.path.join(fh_directory, '{}-rank-{}.log'.format(fh_file_prefix, get_rank()))
+        fh_mode = env.LOGGING_FILEMODE.lower()
+        if env.LOGGING_AGGREGATE:
+            fh = RankAggregatingHandler(os.path.join(fh_directory, '{}.log'.format(fh_file_prefix)), fh_path,
+                                        mode=fh_mode, bubble=True)
+        elif env.LOGGING_ASYNC:
+            fh = BufferedHandler(open(fh_path, fh_mode), bubble=True)
+        else:
+            fh = FileHandler(fh_path, bubble=True, mode=fh_mode)
         fh.formatter = formatter
         # fh.format_string += ' (rank={})'.format(MPI_RANK)
         log.handlers.append(fh)
@@ -48,13 +203,14 @@ if env.LOGGING_ENABLED:
 class log_entry_exit(object):
     def __init__(self, f):
         self.f = f
+        functools.update_wrapper(self, f)
 
     def __call__(self, *args, **kwargs):
-        log.debug("entering callable {0}".format(self.f.__name__))
+        log.debug("entering callable {0}", self.f.__name__)
         try:
             return self.f(*args, **kwargs)
         finally:
-            log.debug("exited callable {0}".format(self.f.__name__))
+            log.debug("exited callable {0}", self.f.__name__)
 
     def __get__(self, obj, _):
         """Support instance methods."""
@@ -63,5 +219,5 @@ class log_entry_exit(object):
 
 
 def log_entry(level, msg, rank='all'):
-    if rank != 'all' and MPI_RANK == rank:
+    if rank != 'all' and get_rank() == rank:
         getattr(log, level)(msg)
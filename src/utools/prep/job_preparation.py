@@ -1,37 +1,116 @@
-"""Helps make job variables for supercomputer runs."""
+"""
+Helps make job variables for supercomputer runs. Jobs are ordered largest-first by the cost model's predicted run time:
+
+    python job_preparation.py <cost model JSON> <results store>
+
+Without arguments, jobs are ordered by the measured minutes in :attr:`~utools.prep.job_preparation.JOBS_CSV`.
+"""
+import heapq
+import sys
 from csv import DictReader
 
 import numpy as np
 
+from utools.cost_model import CostModel
+
 JOBS_CSV = '/home/benkoziol/Dropbox/NESII/project/pmesh/office/Applying Weights.csv'
 
-job_name = []
-wall_times = []
-
-with open(JOBS_CSV) as f:
-    d = DictReader(f)
-    for row in d:
-        if row['Active'] == '1':
-            job_name.append(row['Name'])
-            wall_time = float(row['Create Weights (Minutes, 128 Cores)'])
-            wall_time += 2.5
-            wall_time = int(np.ceil(wall_time))
-            if wall_time < 60:
-                len_wall_time = len(str(wall_time))
-                if len_wall_time == 1:
-                    template = '00:0{}'
-                elif len_wall_time == 2:
-                    template = '00:{}'
-                wall_time = template.format(wall_time)
-            else:
-                hours = int(np.floor(int(wall_time) / 60.))
-                minutes = int(wall_time) - (hours * 60)
-                wall_time = '0{hours}:{minutes}'.format(hours=hours, minutes=minutes)
-            wall_times.append(wall_time)
-
-assert len(job_name) == len(wall_times)
-
-for arr in [job_name, wall_times]:
-    joined = ' '.join(arr)
-    joined = '( {} )'.format(joined)
-    print joined
+
+def get_wall_time(minutes, padding=2.5):
+    """
+    :param float minutes: The expected run time in minutes.
+    :param float padding: Minutes added to the expected run time.
+    :returns: The wall time formatted as ``HH:MM``.
+    :rtype: str
+    """
+
+    wall_time = int(np.ceil(minutes + padding))
+    return '{:02d}:{:02d}'.format(wall_time // 60, wall_time % 60)
+
+
+def order_jobs(jobs, model, node_threshold=None):
+    """
+    Order jobs largest-first by predicted run time.
+
+    :param dict jobs: Maps job names to ``(node_counts, areas)`` of the job's features. ``areas`` may be ``None``.
+    :param model: The cost model.
+    :type model: :class:`~utools.cost_model.CostModel`
+    :param int node_threshold: See :meth:`~utools.cost_model.CostModel.predict_vpu`.
+    :returns: Tuples of job name and predicted seconds in descending order of predicted seconds.
+    :rtype: list of tuple
+    """
+
+    predictions = []
+    for name, (node_counts, areas) in jobs.items():
+        total = model.predict_vpu(node_counts, areas=areas, node_threshold=node_threshold)['total']
+        predictions.append((name, total))
+    return sorted(predictions, key=lambda x: x[1], reverse=True)
+
+
+def assign_jobs(predictions, workers):
+    """
+    Assign jobs to workers with the longest processing time first rule. Each job goes to the least loaded worker.
+
+    :param predictions: Tuples of job name and predicted seconds. See :func:`~utools.prep.job_preparation.order_jobs`.
+    :param int workers: The number of workers.
+    :returns: Job names assigned to each worker and the predicted seconds for each worker.
+    :rtype: tuple
+    """
+
+    assignments = [[] for _ in range(workers)]
+    loads = [0.] * workers
+    heap = [(0., worker) for worker in range(workers)]
+    for name, seconds in sorted(predictions, key=lambda x: x[1], reverse=True):
+        load, worker = heapq.heappop(heap)
+        assignments[worker].append(name)
+        loads[worker] = load + seconds
+        heapq.heappush(heap, (loads[worker], worker))
+    return assignments, loads
+
+
+def get_jobs_from_results(bind=None):
+    """
+    :param bind: The results store engine. See :func:`utools.analysis.results.connect`.
+    :returns: Maps vector processing unit names to ``(node_counts, None)`` for
+     :func:`~utools.prep.job_preparation.order_jobs`. Catchment areas are in square meters and are not used since
+     ``apply`` is fit with areas in squared degrees.
+    :rtype: dict
+    """
+
+    from utools.analysis.results import get_node_counts
+
+    return dict([(name, (node_counts, None)) for name, node_counts in get_node_counts(bind=bind).items()])
+
+
+def get_jobs_from_csv(path=JOBS_CSV):
+    """
+    :returns: Tuples of job name and create weights time in minutes for active jobs.
+    :rtype: list of tuple
+    """
+
+    ret = []
+    with open(path) as f:
+        d = DictReader(f)
+        for row in d:
+            if row['Active'] == '1':
+                ret.append((row['Name'], float(row['Create Weights (Minutes, 128 Cores)'])))
+    return ret
+
+
+if __name__ == '__main__':
+    # Longest jobs are submitted first so they do not extend the end of the run.
+    if len(sys.argv) == 3:
+        from utools.analysis.results import connect
+
+        predictions = order_jobs(get_jobs_from_results(bind=connect(sys.argv[2])), CostModel.load(sys.argv[1]))
+        jobs = [(name, seconds / 60.) for name, seconds in predictions]
+    else:
+        jobs = get_jobs_from_csv()
+        jobs.sort(key=lambda x: x[1], reverse=True)
+    job_name = [j[0] for j in jobs]
+    wall_times = [get_wall_time(j[1]) for j in jobs]
+
+    for arr in [job_name, wall_times]:
+        joined = ' '.join(arr)
+        joined = '( {} )'.format(joined)
+        print joined
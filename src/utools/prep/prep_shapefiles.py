@@ -5,9 +5,12 @@ import numpy as np
 from logbook import DEBUG
 
 from utools.constants import UgridToolsConstants
+from utools.instrument import phase
 from utools.io.core import from_shapefile
+from utools.io.esmf_stream import convert_to_esmf_format_streaming, DEFAULT_BATCH_SIZE
 from utools.io.geom_manager import GeometryManager
 from utools.io.helpers import convert_multipart_to_singlepart, convert_collection_to_esmf_format
+from utools.io.mpi import MPI_COMM
 from utools.logging import log_entry_exit, log
 
 
@@ -21,16 +24,41 @@ def convert_to_singlepart():
 
 @log_entry_exit
 def convert_to_esmf_format(path_out_nc, path_in_shp, name_uid, node_threshold=None, debug=False, driver_kwargs=None,
-                           dest_crs=None, with_connectivity=False, dataset_kwargs=None, split_interiors=True):
+                           dest_crs=None, with_connectivity=False, dataset_kwargs=None, split_interiors=True,
+                           geodesic_area=False, stream=False, batch_size=DEFAULT_BATCH_SIZE, layout=None):
+    """
+    :param bool stream: If ``True``, convert and write elements in batches of ``batch_size`` so memory is bounded by
+     the batch size. The output uses ``NETCDF4`` unlimited dimensions. Connectivity is not supported.
+    :param int batch_size: Number of elements buffered before writing when streaming.
+    :param layout: The output storage layout. See :func:`utools.io.layout.get_layout`.
+    :raises: ValueError
+    """
+
     polygon_break_value = UgridToolsConstants.POLYGON_BREAK_VALUE
 
+    if stream:
+        if with_connectivity:
+            raise ValueError('Connectivity is not supported when streaming.')
+        log.debug('streaming flexible mesh')
+        gm = GeometryManager(name_uid, path=path_in_shp, allow_multipart=True, node_threshold=node_threshold,
+                             slc=[0, 1] if debug else None, driver_kwargs=driver_kwargs, dest_crs=dest_crs,
+                             split_interiors=split_interiors)
+        convert_to_esmf_format_streaming(gm, path_out_nc, batch_size=batch_size, geodesic_area=geodesic_area,
+                                         dataset_kwargs=dataset_kwargs, layout=layout)
+        log.debug('success')
+        return
+
     log.debug('loading flexible mesh')
-    coll = from_shapefile(path_in_shp, name_uid, use_ragged_arrays=True, with_connectivity=with_connectivity,
-                          allow_multipart=True, node_threshold=node_threshold, debug=debug,
-                          driver_kwargs=driver_kwargs, dest_crs=dest_crs, split_interiors=split_interiors)
+    # The read phase includes the split and connectivity phases.
+    with phase('read', comm=MPI_COMM):
+        coll = from_shapefile(path_in_shp, name_uid, use_ragged_arrays=True, with_connectivity=with_connectivity,
+                              allow_multipart=True, node_threshold=node_threshold, debug=debug,
+                              driver_kwargs=driver_kwargs, dest_crs=dest_crs, split_interiors=split_interiors,
+                              geodesic_area=geodesic_area)
     log.debug('writing flexible mesh')
-    convert_collection_to_esmf_format(coll, path_out_nc, polygon_break_value=polygon_break_value,
-                                      face_uid_name=name_uid, dataset_kwargs=dataset_kwargs)
+    with phase('write', comm=MPI_COMM):
+        convert_collection_to_esmf_format(coll, path_out_nc, polygon_break_value=polygon_break_value,
+                                          face_uid_name=name_uid, dataset_kwargs=dataset_kwargs, layout=layout)
     # validate_esmf_format(ds, name_uid, path_in_shp)
     log.debug('success')
 
@@ -0,0 +1,82 @@
+"""Compare per-feature and bulk coordinate system transformation throughput."""
+import os
+import time
+
+from osgeo import ogr, osr
+
+from utools.io.columnar import read_columnar
+from utools.logging import log
+
+PATH_SHAPEFILE = os.path.join(os.path.split(__file__)[0], '..', 'test', 'bin', 'nhd_catchments_texas',
+                              'nhd_catchments_texas.shp')
+DEST_CRS_WKT = 'PROJCS["Sphere_Lambert_Conformal_Conic",GEOGCS["WGS 84",DATUM["unknown",SPHEROID["WGS84",6378137,298.257223563]],PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433]],PROJECTION["Lambert_Conformal_Conic_2SP"],PARAMETER["standard_parallel_1",30],PARAMETER["standard_parallel_2",60],PARAMETER["latitude_of_origin",40.0000076294],PARAMETER["central_meridian",-97],PARAMETER["false_easting",0],PARAMETER["false_northing",0],UNIT["Meter",1]]'
+
+
+def run_per_feature(path, dest_crs):
+    """Transform each feature with ``TransformTo`` as done historically by ``GeomCabinet.iter_geoms``."""
+
+    n_features = 0
+    n_coordinates = 0
+    ds = ogr.Open(path)
+    try:
+        for feature in ds.GetLayerByIndex(0):
+            ogr_geom = feature.GetGeometryRef()
+            ogr_geom.TransformTo(dest_crs)
+            n_features += 1
+            n_coordinates += get_point_count(ogr_geom)
+    finally:
+        ds = None
+    return n_features, n_coordinates
+
+
+def get_point_count(ogr_geom):
+    """
+    :param ogr_geom: An OGR polygon or multipolygon geometry.
+    :returns: Number of points in every ring of every part. See :func:`utools.io.columnar.get_ogr_polygon_parts`.
+    :rtype: int
+    """
+
+    if ogr.GT_Flatten(ogr_geom.GetGeometryType()) == ogr.wkbMultiPolygon:
+        polygons = [ogr_geom.GetGeometryRef(ii) for ii in range(ogr_geom.GetGeometryCount())]
+    else:
+        polygons = [ogr_geom]
+    return sum([polygon.GetGeometryRef(ii).GetPointCount() for polygon in polygons
+                for ii in range(polygon.GetGeometryCount())])
+
+
+def run_bulk(path, dest_crs, n_workers=None):
+    """Read features into columnar storage and transform the coordinate buffer at once."""
+
+    columnar = read_columnar(path, fields=[], dest_crs=dest_crs, n_workers=n_workers)
+    return len(columnar), columnar.coordinates.shape[0]
+
+
+def run_benchmark(path=PATH_SHAPEFILE, dest_crs_wkt=DEST_CRS_WKT, repeat=3, n_workers=None):
+    """
+    :returns: Dictionary mapping method name to the best features per second and coordinates per second.
+    :rtype: dict
+    """
+
+    dest_crs = osr.SpatialReference()
+    dest_crs.ImportFromWkt(dest_crs_wkt)
+
+    methods = {'per-feature': lambda: run_per_feature(path, dest_crs),
+               'bulk': lambda: run_bulk(path, dest_crs, n_workers=n_workers)}
+
+    ret = {}
+    for name, method in methods.items():
+        best = None
+        for _ in range(repeat):
+            t1 = time.time()
+            n_features, n_coordinates = method()
+            elapsed = time.time() - t1
+            if best is None or elapsed < best:
+                best = elapsed
+        ret[name] = {'seconds': best, 'features_per_second': n_features / best,
+                     'coordinates_per_second': n_coordinates / best}
+        log.info('{}: {}'.format(name, ret[name]))
+    return ret
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,106 @@
+"""
+Benchmark ESMF unstructured output layouts. For each layout, report the file size, write time, sequential read time
+for the mesh variables, and ``ESMF.Mesh`` creation time when ESMPy is installed.
+"""
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+import netCDF4 as nc
+import numpy as np
+
+from utools.io.helpers import convert_collection_to_esmf_format
+from utools.io.layout import LAYOUTS
+from utools.logging import log
+
+PATH_ESMF_FORMAT = os.path.join(os.path.split(__file__)[0], '..', 'test', 'bin', 'test_esmf_format.nc')
+
+# Read size used to emulate ESMF_RegridWeightGen's sequential reads.
+READ_CHUNK_LENGTH = 1000000
+
+
+def get_collection(path, name_uid='GRIDCODE'):
+    """
+    Load an ESMF unstructured file into the collection format used by
+    :func:`~utools.io.helpers.convert_collection_to_esmf_format`.
+    """
+
+    with nc.Dataset(path) as ds:
+        ds.set_auto_mask(False)
+        element_conn = ds.variables['elementConn'][:]
+        num_element_conn = ds.variables['numElementConn'][:]
+        ret = {'nodes': ds.variables['nodeCoords'][:],
+               'face_coordinates': ds.variables['centerCoords'][:],
+               name_uid: ds.variables[name_uid][:],
+               'section': [0, num_element_conn.shape[0]]}
+        if 'elementArea' in ds.variables:
+            ret['face_areas'] = ds.variables['elementArea'][:]
+        else:
+            ret['face_areas'] = np.zeros(num_element_conn.shape[0])
+    faces = np.zeros(num_element_conn.shape[0], dtype=object)
+    for idx, face in enumerate(np.split(element_conn, np.cumsum(num_element_conn)[:-1])):
+        faces[idx] = face
+    ret['face'] = faces
+    return ret
+
+
+def read_sequential(path):
+    t1 = time.time()
+    with nc.Dataset(path) as ds:
+        for name in ('nodeCoords', 'elementConn', 'numElementConn'):
+            var = ds.variables[name]
+            for start in range(0, var.shape[0], READ_CHUNK_LENGTH):
+                var[start:start + READ_CHUNK_LENGTH]
+    return time.time() - t1
+
+
+def read_esmf(path):
+    try:
+        import ESMF
+    except ImportError:
+        return None
+    t1 = time.time()
+    ESMF.Mesh(filename=path, filetype=ESMF.FileFormat.ESMFMESH)
+    return time.time() - t1
+
+
+def run_benchmark(path=PATH_ESMF_FORMAT, name_uid='GRIDCODE', layouts=None, repeat=3):
+    """
+    :returns: Maps layout names to result dictionaries. Times are the best of ``repeat`` runs in seconds.
+    :rtype: :class:`collections.OrderedDict`
+    """
+
+    layouts = layouts or sorted(LAYOUTS.keys())
+    coll = get_collection(path, name_uid=name_uid)
+    with nc.Dataset(path) as ds:
+        polygon_break_value = ds.variables['elementConn'].polygon_break_value
+
+    ret = OrderedDict()
+    directory = tempfile.mkdtemp(prefix='utools_layout_')
+    for layout in layouts:
+        path_out = os.path.join(directory, 'esmf_format_{}.nc'.format(layout))
+        write_times = []
+        for _ in range(repeat):
+            t1 = time.time()
+            convert_collection_to_esmf_format(coll, path_out, polygon_break_value=polygon_break_value,
+                                              face_uid_name=name_uid, layout=layout)
+            write_times.append(time.time() - t1)
+        read_times = [read_sequential(path_out) for _ in range(repeat)]
+        esmf_time = read_esmf(path_out)
+        ret[layout] = OrderedDict([('size_bytes', os.path.getsize(path_out)), ('write_seconds', min(write_times)),
+                                   ('read_seconds', min(read_times)), ('esmf_mesh_seconds', esmf_time)])
+        os.remove(path_out)
+    os.rmdir(directory)
+
+    log.info('{:<12}{:>14}{:>14}{:>14}{:>14}'.format('layout', 'size_bytes', 'write_seconds', 'read_seconds',
+                                                    'esmf_seconds'))
+    for layout, result in ret.items():
+        log.info('{:<12}{:>14}{:>14.4f}{:>14.4f}{:>14}'.format(layout, result['size_bytes'], result['write_seconds'],
+                                                              result['read_seconds'],
+                                                              result['esmf_mesh_seconds']))
+    return ret
+
+
+if __name__ == '__main__':
+    run_benchmark()
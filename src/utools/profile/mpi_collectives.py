@@ -0,0 +1,57 @@
+"""
+Compare pickle-based gathers with buffer-based ``Gatherv`` for mesh arrays. Run with ``mpirun``:
+
+    mpirun -n 8 python -m utools.profile.mpi_collectives
+"""
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utools.io.mpi import MPI_COMM, MPI_RANK, hgather, vgather, gatherv_array
+from utools.logging import log
+
+#: Number of local rows gathered from each rank.
+SIZES = (1000, 100000, 1000000)
+
+
+def gather_pickle(arr):
+    elements = MPI_COMM.gather(arr, root=0)
+    if MPI_RANK == 0:
+        if arr.ndim == 1:
+            return hgather(elements)
+        return vgather(elements)
+
+
+def run_benchmark(sizes=SIZES, repeat=5):
+    """
+    :returns: On the root rank, maps ``(dtype name, local rows)`` to the best pickle and ``Gatherv`` times in seconds.
+     ``None`` on other ranks.
+    :rtype: :class:`collections.OrderedDict`
+    """
+
+    ret = OrderedDict()
+    for size in sizes:
+        for arr in [np.arange(size, dtype=np.int32), np.random.rand(size, 2)]:
+            times = OrderedDict()
+            for name, func in [('pickle', gather_pickle), ('gatherv', gatherv_array)]:
+                best = None
+                for _ in range(repeat):
+                    MPI_COMM.Barrier()
+                    t1 = time.time()
+                    func(arr)
+                    elapsed = MPI_COMM.bcast(time.time() - t1, root=0)
+                    best = elapsed if best is None else min(best, elapsed)
+                times[name] = best
+            ret[(arr.dtype.name, size)] = times
+
+    if MPI_RANK == 0:
+        log.info('{:<10}{:>12}{:>14}{:>14}{:>10}'.format('dtype', 'rows', 'pickle', 'gatherv', 'speedup'))
+        for (dtype, size), times in ret.items():
+            log.info('{:<10}{:>12}{:>14.6f}{:>14.6f}{:>10.2f}'.format(dtype, size, times['pickle'], times['gatherv'],
+                                                                     times['pickle'] / times['gatherv']))
+        return ret
+
+
+if __name__ == '__main__':
+    run_benchmark()
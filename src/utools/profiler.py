@@ -0,0 +1,191 @@
+"""
+Low-overhead statistical profiler. A background thread samples the call stack of the profiled thread every
+:attr:`utools.env.PROFILE_INTERVAL` seconds. Samples are keyed by the current phase (see :mod:`utools.instrument`) and
+the current feature unique identifier set with :func:`~utools.profiler.set_uid`.
+
+>>> with Sampler() as sampler:
+>>>     convert()
+>>> sampler.dump()
+
+Each rank writes collapsed stacks for each phase to ``<prefix>-profile-<phase>-rank-<rank>.folded`` and sample counts
+by feature unique identifier to ``<prefix>-profile-uids-rank-<rank>.json`` in :attr:`utools.env.PROFILE_DIR`. Collapsed
+stacks are the input format of ``flamegraph.pl``. The unique identifiers with the most samples are candidates for
+:mod:`utools.profile.large_elements`.
+"""
+import json
+import os
+import sys
+import thread
+import threading
+import time
+from collections import OrderedDict
+
+from utools import env
+from utools.instrument import get_current_phase
+from utools.io.mpi import MPI_RANK
+from utools.logging import log
+
+#: Maximum number of frames recorded per sample. Outer frames are dropped.
+MAX_DEPTH = 128
+
+#: Phase name for samples outside any phase.
+NO_PHASE = 'other'
+
+# The running sampler. Feature unique identifiers are only stored while a sampler is running.
+_SAMPLER = None
+
+
+class Sampler(object):
+    """
+    Sample the call stack of a thread from a background thread.
+
+    :param float interval: Seconds between samples. Defaults to :attr:`utools.env.PROFILE_INTERVAL`.
+    :param int ident: Identifier of the thread to sample. Defaults to the thread calling
+     :meth:`~utools.profiler.Sampler.start`.
+    """
+
+    def __init__(self, interval=None, ident=None):
+        if interval is None:
+            interval = env.PROFILE_INTERVAL
+        self.interval = interval
+        self.ident = ident
+        self.uid = None
+        #: Maps ``(phase, uid, stack)`` to a sample count. Stack frames are ``(filename, first line, name)``.
+        self.samples = {}
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def is_running(self):
+        return self._thread is not None
+
+    def start(self):
+        global _SAMPLER
+
+        if self.ident is None:
+            self.ident = thread.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_, name='utools-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+        _SAMPLER = self
+
+    def stop(self):
+        global _SAMPLER
+
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if _SAMPLER is self:
+            _SAMPLER = None
+
+    def sample(self):
+        """Record one sample of the profiled thread."""
+
+        frame = sys._current_frames().get(self.ident)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None and len(stack) < MAX_DEPTH:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        stack.reverse()
+
+        key = (get_current_phase(self.ident) or NO_PHASE, self.uid, tuple(stack))
+        self.samples[key] = self.samples.get(key, 0) + 1
+
+    def get_collapsed(self, phase=None, uid=None):
+        """
+        :param str phase: If provided, only include samples from this phase.
+        :param uid: If provided, only include samples for this feature unique identifier.
+        :returns: Maps semicolon-separated stacks (outermost first) to sample counts.
+        :rtype: dict
+        """
+
+        ret = {}
+        for (sample_phase, sample_uid, stack), count in self.samples.items():
+            if (phase is not None and sample_phase != phase) or (uid is not None and sample_uid != uid):
+                continue
+            key = ';'.join(['{}:{}:{}'.format(name, os.path.basename(filename), line)
+                            for filename, line, name in stack])
+            ret[key] = ret.get(key, 0) + count
+        return ret
+
+    def get_phases(self):
+        return sorted(set([key[0] for key in self.samples.keys()]))
+
+    def get_uid_counts(self):
+        """
+        :returns: Sample counts by feature unique identifier in descending order. Samples without a unique identifier
+         are excluded.
+        :rtype: :class:`collections.OrderedDict`
+        """
+
+        counts = {}
+        for (_, uid, _), count in self.samples.items():
+            if uid is not None:
+                counts[uid] = counts.get(uid, 0) + count
+        return OrderedDict(sorted(counts.items(), key=lambda x: x[1], reverse=True))
+
+    def dump(self, directory=None):
+        """
+        Write collapsed stacks for each phase and feature unique identifier sample counts for this rank.
+
+        :param str directory: The output directory. Defaults to :attr:`utools.env.PROFILE_DIR`.
+        :returns: The written paths.
+        :rtype: list of str
+        """
+
+        directory = directory or env.PROFILE_DIR
+        prefix = os.path.join(directory, '{}-profile'.format(env.LOGGING_FILE_PREFIX))
+        ret = []
+        for phase in self.get_phases():
+            path = '{}-{}-rank-{}.folded'.format(prefix, phase, MPI_RANK)
+            with open(path, 'w') as f:
+                for stack, count in sorted(self.get_collapsed(phase=phase).items()):
+                    f.write('{} {}\n'.format(stack, count))
+            ret.append(path)
+
+        path = '{}-uids-rank-{}.json'.format(prefix, MPI_RANK)
+        uid_counts = self.get_uid_counts()
+        with open(path, 'w') as f:
+            json.dump({'interval': self.interval,
+                       'uids': [{'uid': uid, 'samples': count, 'seconds': count * self.interval}
+                                for uid, count in uid_counts.items()]}, f, indent=2)
+        ret.append(path)
+        log.debug('wrote profile: {}'.format(ret))
+        return ret
+
+    def _run_(self):
+        # Python 2 timed event waits poll. Sleeping keeps the sampler thread idle between samples.
+        while not self._stop.is_set():
+            time.sleep(self.interval)
+            self.sample()
+
+
+def get_sampler():
+    """
+    :returns: The running sampler. ``None`` if the profiler is not running.
+    :rtype: :class:`~utools.profiler.Sampler`
+    """
+
+    return _SAMPLER
+
+
+def set_uid(uid):
+    """
+    Set the feature unique identifier attached to subsequent samples. Does nothing if the profiler is not running.
+    """
+
+    if _SAMPLER is not None:
+        _SAMPLER.uid = uid
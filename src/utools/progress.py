@@ -0,0 +1,262 @@
+"""
+Progress and throughput reporting for long loops. Enable with :attr:`utools.env.PROGRESS` set to ``'stderr'`` (a
+progress bar), ``'json'`` (JSON lines written to :attr:`utools.env.PROGRESS_DIR`), or ``'log'``.
+
+>>> progress = get_progress('convert', total=len(records), work_unit='nodes', comm=MPI_COMM)
+>>> for record in records:
+>>>     ...
+>>>     if progress is not None:
+>>>         progress.update(work=get_node_count(record['geom']))
+>>> if progress is not None:
+>>>     progress.close()
+
+:func:`~utools.progress.get_progress` returns ``None`` when reporting is disabled so loops only pay for a comparison.
+With a communicator, ranks post their state to the root rank with non-blocking sends at most every
+:attr:`utools.env.PROGRESS_INTERVAL` seconds. The root rank reports the totals and the lag between the most and least
+advanced ranks. Ranks never wait on each other until :meth:`~utools.progress.Progress.close`.
+"""
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+from utools import env
+from utools.io.mpi import MPI_RANK
+from utools.logging import log
+
+#: Message tag for progress states sent to the root rank.
+PROGRESS_TAG = 4701
+
+#: Width of the stderr progress bar in characters.
+BAR_WIDTH = 30
+
+
+class Progress(object):
+    """
+    Track progress of a loop and report events to a sink.
+
+    :param str name: The loop name used in events.
+    :param int total: The number of units on this rank. If ``None``, events have no ETA.
+    :param str unit: Name of the counted units.
+    :param str work_unit: Name of the work amount used for throughput (for example ``'nodes'`` or ``'nonzeros'``). If
+     ``None``, throughput is in units per second.
+    :param comm: If provided, states are reduced to the root rank of this communicator and
+     :meth:`~utools.progress.Progress.close` is a collective operation. Otherwise, each rank reports its own progress.
+    :param float interval: Minimum seconds between events. Defaults to :attr:`utools.env.PROGRESS_INTERVAL`.
+    :param sink: The event destination. Defaults to the sink for :attr:`utools.env.PROGRESS`.
+    """
+
+    def __init__(self, name, total=None, unit='features', work_unit=None, comm=None, interval=None, sink=None):
+        if interval is None:
+            interval = env.PROGRESS_INTERVAL
+        if sink is None:
+            sink = get_sink(env.PROGRESS)
+        if comm is not None and comm.Get_size() == 1:
+            comm = None
+        self.name = name
+        self.total = total
+        self.unit = unit
+        self.work_unit = work_unit
+        self.comm = comm
+        self.interval = interval
+        self.sink = sink
+
+        self.rank = MPI_RANK if comm is None else comm.Get_rank()
+        self.size = 1 if comm is None else comm.Get_size()
+        self.done = 0
+        self.work = 0
+        self.closed = False
+        #: Maps ranks to their last received state.
+        self.states = {}
+
+        self._start = time.time()
+        self._next = self._start + interval
+        self._requests = []
+
+    def update(self, count=1, work=0):
+        """
+        :param int count: Number of units completed since the last update.
+        :param work: Amount of work completed since the last update.
+        """
+
+        self.done += count
+        self.work += work
+        now = time.time()
+        if now >= self._next:
+            self._next = now + self.interval
+            self._report_(now)
+
+    def close(self):
+        """Report the final event. This is a collective operation if a communicator was provided."""
+
+        if self.closed:
+            return
+        self.closed = True
+        now = time.time()
+        state = self.get_state(now, final=True)
+        if self.comm is None:
+            self.sink.emit(self.get_event({0: state}, now, final=True))
+        elif self.rank == 0:
+            from utools.io.mpi import MPI
+
+            self.states[0] = state
+            status = MPI.Status()
+            while not all([self.states.get(r, {}).get('final', False) for r in range(self.size)]):
+                received = self.comm.recv(source=MPI.ANY_SOURCE, tag=PROGRESS_TAG, status=status)
+                self.states[status.Get_source()] = received
+            self.sink.emit(self.get_event(self.states, now, final=True))
+        else:
+            self._requests.append(self.comm.isend(state, dest=0, tag=PROGRESS_TAG))
+            from utools.io.mpi import MPI
+
+            MPI.Request.Waitall(self._requests)
+            self._requests = []
+
+    def get_state(self, now, final=False):
+        return {'done': self.done, 'total': self.total, 'work': self.work, 'elapsed': now - self._start,
+                'final': final}
+
+    def get_event(self, states, now, final=False):
+        """
+        :param dict states: Maps ranks to states from :meth:`~utools.progress.Progress.get_state`. Ranks without a
+         state have not reported.
+        :returns: The event with the units done, total, fraction, work, throughput per second, elapsed seconds, ETA in
+         seconds, and ``lag`` (the completed fraction of the most advanced rank minus the least advanced rank).
+        :rtype: :class:`collections.OrderedDict`
+        """
+
+        elapsed = now - self._start
+        done = sum([s['done'] for s in states.values()])
+        work = sum([s['work'] for s in states.values()])
+        totals = [s['total'] for s in states.values()]
+        if len(states) == self.size and None not in totals:
+            total = sum(totals)
+        else:
+            total = None
+
+        fraction = eta = lag = None
+        if total is not None:
+            fraction = float(done) / total if total > 0 else 1.
+            if done > 0:
+                eta = elapsed * (total - done) / done
+            fractions = [float(states[r]['done']) / states[r]['total'] if states[r]['total'] > 0 else 1.
+                         for r in range(self.size)]
+            lag = max(fractions) - min(fractions)
+        rate = (work if self.work_unit is not None else done) / elapsed if elapsed > 0 else 0.
+
+        return OrderedDict([('name', self.name), ('time', now), ('rank', self.rank if self.comm is None else None),
+                            ('ranks', len(states)), ('unit', self.unit), ('done', done), ('total', total),
+                            ('fraction', fraction), ('work_unit', self.work_unit), ('work', work), ('rate', rate),
+                            ('elapsed', elapsed), ('eta', eta), ('lag', lag), ('final', final)])
+
+    def _report_(self, now):
+        state = self.get_state(now)
+        if self.comm is None:
+            self.sink.emit(self.get_event({0: state}, now))
+        elif self.rank == 0:
+            from utools.io.mpi import MPI
+
+            self.states[0] = state
+            status = MPI.Status()
+            while self.comm.Iprobe(source=MPI.ANY_SOURCE, tag=PROGRESS_TAG, status=status):
+                self.states[status.Get_source()] = self.comm.recv(source=status.Get_source(), tag=PROGRESS_TAG)
+            self.sink.emit(self.get_event(self.states, now))
+        else:
+            self._requests = [r for r in self._requests if not r.Test()]
+            self._requests.append(self.comm.isend(state, dest=0, tag=PROGRESS_TAG))
+
+
+class StderrSink(object):
+    """Write a single-line progress bar to standard error."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+
+    def emit(self, event):
+        self.stream.write('\r' + format_event(event, bar=True))
+        if event['final']:
+            self.stream.write('\n')
+        self.stream.flush()
+
+
+class JSONSink(object):
+    """
+    Append events as JSON lines.
+
+    :param str path: The output path. Defaults to ``<prefix>-progress-rank-<rank>.jsonl`` in
+     :attr:`utools.env.PROGRESS_DIR`.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(env.PROGRESS_DIR, '{}-progress-rank-{}.jsonl'.format(env.LOGGING_FILE_PREFIX,
+                                                                                      MPI_RANK))
+        self.path = path
+
+    def emit(self, event):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+
+class LogSink(object):
+    """Write events to the :mod:`utools.logging` logger."""
+
+    def emit(self, event):
+        log.info(format_event(event))
+
+
+#: Maps :attr:`utools.env.PROGRESS` values to sink classes.
+SINKS = {'stderr': StderrSink, 'json': JSONSink, 'log': LogSink}
+
+
+def get_sink(name):
+    """
+    :param str name: The sink name. See :attr:`~utools.progress.SINKS`.
+    :raises: ValueError
+    """
+
+    try:
+        return SINKS[name]()
+    except KeyError:
+        raise ValueError('Progress sink not recognized: {}'.format(name))
+
+
+def get_progress(name, total=None, unit='features', work_unit=None, comm=None):
+    """
+    :returns: A progress tracker. ``None`` if :attr:`utools.env.PROGRESS` is not set. See
+     :class:`~utools.progress.Progress` for parameters.
+    :rtype: :class:`~utools.progress.Progress`
+    """
+
+    if not env.PROGRESS or env.PROGRESS == 'none':
+        return None
+    return Progress(name, total=total, unit=unit, work_unit=work_unit, comm=comm)
+
+
+def format_event(event, bar=False):
+    """
+    :param dict event: The event from :meth:`~utools.progress.Progress.get_event`.
+    :param bool bar: If ``True``, start with a progress bar.
+    :rtype: str
+    """
+
+    msg = []
+    prefix = ''
+    if event['total'] is not None:
+        if bar:
+            filled = int(round(event['fraction'] * BAR_WIDTH))
+            prefix = '[{}{}] '.format('#' * filled, '-' * (BAR_WIDTH - filled))
+        msg.append('{}: {}/{} {} ({:.1%})'.format(event['name'], event['done'], event['total'], event['unit'],
+                                                  event['fraction']))
+    else:
+        msg.append('{}: {} {}'.format(event['name'], event['done'], event['unit']))
+    msg.append('{:.1f} {}/s'.format(event['rate'], event['work_unit'] or event['unit']))
+    msg.append('elapsed={:.1f}s'.format(event['elapsed']))
+    if event['eta'] is not None:
+        msg.append('eta={:.1f}s'.format(event['eta']))
+    if event['lag'] is not None and event['ranks'] > 1:
+        msg.append('lag={:.1%}'.format(event['lag']))
+    if event['rank'] is not None:
+        msg.append('rank={}'.format(event['rank']))
+    return prefix + ', '.join(msg)
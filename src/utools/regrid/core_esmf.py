@@ -1,12 +1,19 @@
 import os
 import shutil
 import subprocess
+from functools import partial
+from multiprocessing.pool import ThreadPool
 
+import netCDF4 as nc
 import numpy as np
 
+from utools import env
 from utools.helpers import nc_scope
-from utools.io.mpi import MPI_RANK, create_sections, MPI_COMM, MPI_SIZE
+from utools.instrument import phase
+from utools.io.mpi import MPI_RANK, create_sections, MPI_COMM, MPI_SIZE, get_parallel_dataset_kwargs, \
+    get_node_comm, gatherv_array
 from utools.logging import log, log_entry_exit
+from utools.progress import get_progress
 
 
 @log_entry_exit
@@ -28,11 +35,38 @@ def create_weights_file(mpirun_exe_path, esmf_exe_path, path_in_source, path_in_
     subprocess.check_call(cmd)
 
 
+#: Number of time steps weighted per source read in partitioned weight application.
+DEFAULT_TIME_BATCH_SIZE = 32
+
+#: Number of weights read per call when searching or scanning weight variables.
+DEFAULT_WEIGHTS_CHUNK_SIZE = 1000000
+
+#: Approximate number of values in a weighted output chunk.
+DEFAULT_OUTPUT_CHUNK_VALUES = 1000000
+
+
 @log_entry_exit
-def create_weighted_output(path_in_esmf_format, path_in_source, path_out_weights_nc, path_output_data, variable_name):
+def create_weighted_output(path_in_esmf_format, path_in_source, path_out_weights_nc, path_output_data, variable_name,
+                           partitioned=False, time_batch_size=DEFAULT_TIME_BATCH_SIZE, threads=None):
+    """
+    Apply weights to a source variable with dimensions ``(time, y, x)`` writing the weighted values to a copy of the
+    ESMF unstructured file. This is a collective operation.
+
+    :param bool partitioned: If ``True``, use :func:`~utools.regrid.core_esmf.create_weighted_output_partitioned`.
+    :param int time_batch_size: See :func:`~utools.regrid.core_esmf.create_weighted_output_partitioned`.
+    :param int threads: See :func:`~utools.regrid.core_esmf.create_weighted_output_partitioned`. More than one thread
+     enables partitioned mode.
+    """
+
+    if threads is None:
+        threads = env.THREADS
+    if partitioned or threads > 1:
+        return create_weighted_output_partitioned(path_in_esmf_format, path_in_source, path_out_weights_nc,
+                                                  path_output_data, variable_name, time_batch_size=time_batch_size,
+                                                  threads=threads)
+
     if MPI_RANK == 0:
-        log.info('Copying/creating output file')
-        shutil.copy2(path_in_esmf_format, path_output_data)
+        create_output_file(path_in_esmf_format, path_in_source, path_output_data, variable_name)
 
         with nc_scope(path_out_weights_nc) as ds:
             length = len(ds.dimensions['n_b'])
@@ -42,44 +76,340 @@ def create_weighted_output(path_in_esmf_format, path_in_source, path_out_weights
 
     log.info('Applying weights')
     section = MPI_COMM.scatter(slices, root=0)
-    log.debug('section={}'.format(section))
+    log.debug('section={}', section)
 
-    with nc_scope(path_in_source) as source:
+    with phase('weight-load'):
         with nc_scope(path_out_weights_nc) as ds:
             row = ds.variables['row'][:]
             col = ds.variables['col'][:]
             S = ds.variables['S'][:]
+
+    with phase('apply'):
+        with nc_scope(path_in_source) as source:
             ntime = len(source.dimensions['time'])
             voutput = np.zeros((ntime, section[1] - section[0]), dtype=float)
+            progress = get_progress('apply', total=section[1] - section[0], unit='elements', work_unit='nonzeros',
+                                    comm=MPI_COMM)
             for idx_voutput, idx_dst in enumerate(range(*section)):
                 select = row == idx_dst + 1
-                idx_src = col[select]
+                # Weight indices are one-based.
+                idx_src = col[select] - 1
                 s = S[select]
                 # assert np.isclose(s.sum(), 1.0)
                 for idx_time in range(len(source.dimensions['time'])):
                     source_data = source.variables[variable_name][idx_time, :, :].flatten()[idx_src]
                     weighted_data = np.dot(s, source_data)
                     voutput[idx_time, idx_voutput] = weighted_data
+                if progress is not None:
+                    progress.update(work=s.shape[0] * ntime)
+            if progress is not None:
+                progress.close()
+
+    MPI_COMM.Barrier()
+    write_weighted_output(path_output_data, variable_name, section, voutput)
+
+
+@log_entry_exit
+def create_weighted_output_partitioned(path_in_esmf_format, path_in_source, path_out_weights_nc, path_output_data,
+                                       variable_name, sorted_rows=True, time_batch_size=DEFAULT_TIME_BATCH_SIZE,
+                                       threads=None):
+    """
+    Apply weights partitioned by destination block. Each rank reads only the weights for its destination elements and
+    the bounding hyperslab of the source grid covering their source indices. Memory per rank is proportional to the
+    local block. This is a collective operation.
+
+    :param str path_in_esmf_format: Path to the destination ESMF unstructured file.
+    :param str path_in_source: Path to the source data file. The source variable has dimensions ``(time, y, x)``.
+    :param str path_out_weights_nc: Path to the ESMF weights file.
+    :param str path_output_data: Path to the output file.
+    :param str variable_name: Name of the source variable to weight.
+    :param bool sorted_rows: If ``True``, the weights ``row`` variable is sorted and weight blocks are found by binary
+     search. ESMF_RegridWeightGen writes sorted rows. If ``False``, the weights are scanned in chunks.
+    :param int time_batch_size: Number of time steps read and weighted together.
+    :param int threads: Number of threads weighting destination elements. Threads share the weights and source
+     buffers, so a hybrid run uses one process per node or socket. Source reads stay on the calling thread and overlap
+     with weighting of the previous time batch. Defaults to :attr:`utools.env.THREADS`.
+    """
+
+    if threads is None:
+        threads = env.THREADS
 
-    log.info('Writing output file')
     if MPI_RANK == 0:
-        log.info('Creating time dimension in output file')
-        with nc_scope(path_output_data, 'a') as output:
-            with nc_scope(path_in_source) as source:
-                output.createDimension('time')
-                vtime = output.createVariable('time', source.variables['time'].dtype, dimensions=('time',))
-                vtime.__dict__.update(source.variables['time'].__dict__)
-                vtime[:] = source.variables['time'][:]
-                output.createVariable(variable_name, float, dimensions=('time', 'elementCount'))
-
-    log.info('Fill output file by rank')
-    for rank in range(MPI_SIZE):
+        create_output_file(path_in_esmf_format, path_in_source, path_output_data, variable_name)
+        with nc_scope(path_out_weights_nc) as ds:
+            sections = create_sections(len(ds.dimensions['n_b']))
+    else:
+        sections = None
+    section = MPI_COMM.scatter(sections, root=0)
+    log.debug('section={}', section)
+
+    with phase('weight-load'):
+        with nc_scope(path_out_weights_nc) as ds:
+            row, col, S = get_weights_block(ds, section, sorted_rows=sorted_rows)
+    log.debug('weight count={}', row.shape[0])
+
+    voutput = get_weighted_values(path_in_source, variable_name, section, row, col, S,
+                                  time_batch_size=time_batch_size, threads=threads)
+
+    MPI_COMM.Barrier()
+    write_weighted_output(path_output_data, variable_name, section, voutput)
+
+
+@phase('apply')
+def get_weighted_values(path_in_source, variable_name, section, row, col, S, time_batch_size=DEFAULT_TIME_BATCH_SIZE,
+                        threads=1):
+    """
+    Weight the source hyperslab covering a destination block. See
+    :func:`~utools.regrid.core_esmf.create_weighted_output_partitioned`. This is a collective operation if progress
+    reporting is enabled (see :mod:`utools.progress`).
+
+    :param section: Zero-based destination index range ``[start, stop)``.
+    :type section: sequence of int
+    :param row: One-based destination indices of the block's weights.
+    :param col: One-based source indices of the block's weights.
+    :param S: Weight values.
+    :returns: Weighted values with shape ``(time, section length)``.
+    :rtype: :class:`numpy.ndarray`
+    """
+
+    with nc_scope(path_in_source) as source:
+        var = source.variables[variable_name]
+        ntime = var.shape[0]
+        voutput = np.zeros((ntime, section[1] - section[0]), dtype=float)
+        progress = get_progress('apply', total=row.shape[0] * ntime, unit='nonzeros', comm=MPI_COMM)
+        if row.shape[0] > 0:
+            # Source indices are one-based and flattened over the source grid's (y, x) dimensions.
+            iy, ix = np.divmod(col.astype(np.int64) - 1, var.shape[-1])
+            y_start, y_stop = iy.min(), iy.max() + 1
+            x_start, x_stop = ix.min(), ix.max() + 1
+            idx_src = (iy - y_start) * (x_stop - x_start) + (ix - x_start)
+            log.debug('source hyperslab=({}:{}, {}:{})', y_start, y_stop, x_start, x_stop)
+
+            order = np.argsort(row, kind='mergesort')
+            idx_dst = row[order].astype(np.int64) - 1 - section[0]
+            idx_src = idx_src[order]
+            S = S[order]
+            starts = np.flatnonzero(np.concatenate(([True], idx_dst[1:] != idx_dst[:-1])))
+
+            group_sections = create_sections(starts.shape[0], size=threads)
+            pool = ThreadPool(threads) if threads > 1 else None
+            try:
+                pending = None
+                for time_start in range(0, ntime, time_batch_size):
+                    time_stop = min(time_start + time_batch_size, ntime)
+                    # NetCDF reads are not thread-safe and stay on this thread.
+                    slab = np.asarray(var[time_start:time_stop, y_start:y_stop, x_start:x_stop])
+                    values = slab.reshape(time_stop - time_start, -1)
+                    out = voutput[time_start:time_stop]
+                    if pending is not None:
+                        pending.get()
+                        if progress is not None:
+                            progress.update(count=row.shape[0] * pending_ntime)
+                    func = partial(apply_weights, values, idx_src, S, idx_dst, starts, out)
+                    if pool is None:
+                        func([0, starts.shape[0]])
+                        if progress is not None:
+                            progress.update(count=row.shape[0] * (time_stop - time_start))
+                    else:
+                        pending = pool.map_async(func, group_sections)
+                        pending_ntime = time_stop - time_start
+                if pending is not None:
+                    pending.get()
+                    if progress is not None:
+                        progress.update(count=row.shape[0] * pending_ntime)
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+        if progress is not None:
+            progress.close()
+
+    return voutput
+
+
+def apply_weights(values, idx_src, S, idx_dst, starts, out, group_section):
+    """
+    Weight source values for a range of destination elements. Weights are grouped by destination.
+
+    :param values: Source values with shape ``(time, source)``.
+    :type values: :class:`numpy.ndarray`
+    :param idx_src: Zero-based source index for each weight.
+    :param S: Weight values.
+    :param idx_dst: Zero-based output column for each weight.
+    :param starts: Index of the first weight in each destination group.
+    :param out: Output array with shape ``(time, destination)``. Only the group columns are written.
+    :type out: :class:`numpy.ndarray`
+    :param group_section: The destination group range ``[start, stop)`` to weight.
+    :type group_section: sequence of int
+    """
+
+    group_start, group_stop = group_section
+    if group_stop <= group_start:
+        return
+    weight_start = starts[group_start]
+    weight_stop = starts[group_stop] if group_stop < starts.shape[0] else idx_src.shape[0]
+    weighted = values[:, idx_src[weight_start:weight_stop]] * S[weight_start:weight_stop]
+    group_starts = starts[group_start:group_stop]
+    out[:, idx_dst[group_starts]] = np.add.reduceat(weighted, group_starts - weight_start, axis=1)
+
+
+def create_output_file(path_in_esmf_format, path_in_source, path_output_data, variable_name,
+                       chunk_values=DEFAULT_OUTPUT_CHUNK_VALUES):
+    """
+    Copy the ESMF unstructured file and create the time and weighted variables. For NetCDF-4 output, the weighted
+    variable is chunked along time with chunk boundaries matching the rank sections from
+    :func:`~utools.io.mpi.create_sections`.
+
+    :param int chunk_values: Approximate number of values in an output chunk.
+    """
+
+    log.info('Copying/creating output file')
+    shutil.copy2(path_in_esmf_format, path_output_data)
+
+    log.info('Creating time dimension in output file')
+    with nc_scope(path_output_data, 'a') as output:
+        with nc_scope(path_in_source) as source:
+            output.createDimension('time')
+            vtime = output.createVariable('time', source.variables['time'].dtype, dimensions=('time',))
+            vtime.__dict__.update(source.variables['time'].__dict__)
+            vtime[:] = source.variables['time'][:]
+
+            kwargs = {}
+            if output.data_model.startswith('NETCDF4'):
+                kwargs['chunksizes'] = get_output_chunksizes(len(source.dimensions['time']),
+                                                             len(output.dimensions['elementCount']),
+                                                             chunk_values=chunk_values)
+            output.createVariable(variable_name, float, dimensions=('time', 'elementCount'), **kwargs)
+
+
+def get_output_chunksizes(ntime, nelement, size=MPI_SIZE, chunk_values=DEFAULT_OUTPUT_CHUNK_VALUES):
+    """
+    :returns: Output chunk sizes ``(time, elementCount)``. The element chunk length is the rank section length.
+    :rtype: tuple of int
+    """
+
+    nelement_chunk = max(create_sections(nelement, size=size)[0][1], 1)
+    ntime_chunk = min(max(chunk_values // nelement_chunk, 1), max(ntime, 1))
+    return ntime_chunk, nelement_chunk
+
+
+def get_weights_block(ds, section, sorted_rows=True, chunk_size=DEFAULT_WEIGHTS_CHUNK_SIZE):
+    """
+    :param ds: The open weights file.
+    :type ds: :class:`netCDF4.Dataset`
+    :param section: Zero-based destination index range ``[start, stop)``.
+    :type section: sequence of int
+    :param bool sorted_rows: See :func:`~utools.regrid.core_esmf.create_weighted_output_partitioned`.
+    :param int chunk_size: Number of weights read per call.
+    :returns: Tuple of ``row``, ``col``, and ``S`` values for the destination range.
+    :rtype: tuple of :class:`numpy.ndarray`
+    """
+
+    vrow = ds.variables['row']
+    names = ['row', 'col', 'S']
+    if sorted_rows:
+        start = search_sorted_variable(vrow, section[0] + 1, chunk_size=chunk_size)
+        stop = search_sorted_variable(vrow, section[1] + 1, chunk_size=chunk_size)
+        return tuple([np.asarray(ds.variables[n][start:stop]) for n in names])
+
+    ret = [[], [], []]
+    for start in range(0, vrow.shape[0], chunk_size):
+        stop = min(start + chunk_size, vrow.shape[0])
+        row = np.asarray(vrow[start:stop])
+        select = np.where((row >= section[0] + 1) & (row < section[1] + 1))[0]
+        if select.shape[0] > 0:
+            for idx, n in enumerate(names):
+                ret[idx].append(np.asarray(ds.variables[n][start:stop])[select])
+    return tuple([np.concatenate(r) if len(r) > 0 else np.zeros(0, dtype=ds.variables[n].dtype)
+                  for r, n in zip(ret, names)])
+
+
+def search_sorted_variable(var, value, chunk_size=DEFAULT_WEIGHTS_CHUNK_SIZE):
+    """
+    Find the first index with a value greater than or equal to ``value`` in a sorted one-dimensional variable reading at
+    most ``chunk_size`` values at a time.
+
+    :rtype: int
+    """
+
+    lower = 0
+    upper = var.shape[0]
+    while upper - lower > chunk_size:
+        mid = (lower + upper) // 2
+        if var[mid] < value:
+            lower = mid + 1
+        else:
+            upper = mid
+    return lower + int(np.searchsorted(np.asarray(var[lower:upper]), value, side='left'))
+
+
+@phase('write-output', comm=MPI_COMM)
+def write_weighted_output(path_output_data, variable_name, section, voutput):
+    """
+    Write a rank's weighted values to the output file. This is a collective operation. Parallel I/O is used if
+    available. Otherwise, values are gathered to one aggregator rank per node and aggregators write in order.
+    """
+
+    log.info('Writing output file')
+    kwargs = get_parallel_dataset_kwargs(path_output_data)
+    if kwargs is None:
+        write_weighted_output_aggregated(path_output_data, variable_name, section, voutput)
+    else:
+        with nc.Dataset(path_output_data, 'a', **kwargs) as output:
+            var = output.variables[variable_name]
+            # Writes extending the unlimited time dimension must be collective.
+            var.set_collective(True)
+            var[:, section[0]:section[1]] = voutput
+
+
+def write_weighted_output_aggregated(path_output_data, variable_name, section, voutput):
+    """
+    Gather weighted values to the lowest rank on each node. Aggregators merge adjacent sections and write each
+    contiguous block with one call. This is a collective operation.
+    """
+
+    node_comm = get_node_comm()
+    if node_comm is None:
+        blocks = [(section, voutput)]
+        is_aggregator = True
+    else:
+        sections = node_comm.gather(section, root=0)
+        # Gather element-major values so each rank's block is contiguous in the receive buffer.
+        values = gatherv_array(np.ascontiguousarray(voutput.T), comm=node_comm)
+        is_aggregator = node_comm.Get_rank() == 0
+        if is_aggregator:
+            splits = np.cumsum([stop - start for start, stop in sections])[:-1]
+            blocks = [(sn, v.T) for sn, v in zip(sections, np.split(values, splits))]
+    aggregators = [rank for rank, a in enumerate(MPI_COMM.allgather(is_aggregator)) if a]
+    log.debug('aggregator count={}', len(aggregators))
+
+    for rank in aggregators:
         if rank == MPI_RANK:
             with nc_scope(path_output_data, 'a') as output:
-                output.variables[variable_name][:, section[0]:section[1]] = voutput
+                var = output.variables[variable_name]
+                for start, stop, value in get_contiguous_blocks(blocks):
+                    var[:, start:stop] = value
         MPI_COMM.Barrier()
 
 
+def get_contiguous_blocks(blocks):
+    """
+    :param blocks: Sequence of ``(section, value)`` tuples where ``value`` has shape ``(time, section length)``.
+    :returns: Tuples of ``(start, stop, value)`` with adjacent sections merged. Empty sections are removed.
+    :rtype: list of tuple
+    """
+
+    blocks = sorted([b for b in blocks if b[0][1] > b[0][0]], key=lambda b: b[0][0])
+    ret = []
+    for (start, stop), value in blocks:
+        if len(ret) > 0 and ret[-1][1] == start:
+            ret[-1][1] = stop
+            ret[-1][2].append(value)
+        else:
+            ret.append([start, stop, [value]])
+    return [(start, stop, np.hstack(values)) for start, stop, values in ret]
+
+
 @log_entry_exit
 def validate_weighted_output(path_output_data):
     with nc_scope(path_output_data) as output:
@@ -1,4 +1,6 @@
 import re
+from collections import OrderedDict
+from itertools import izip
 from os import listdir
 from os.path import expanduser, join
 from subprocess import check_output
@@ -8,23 +10,86 @@ import numpy as np
 from logbook import INFO
 
 from utools.addict import Dict
-from utools.helpers import nc_scope
+from utools.helpers import nc_scope, get_iter
 from utools.io.mpi import MPI_RANK, MPI_COMM, create_sections
 from utools.logging import log
+from utools.progress import get_progress
 
 
-def create_linked_shapefile(name_uid, output_variable, path_in_shp, path_linked_shp, path_output_data):
+def create_linked_shapefile(name_uid, output_variable, path_in_shp, path_linked_shp, path_output_data,
+                            time_indices=None, field_name_template='{variable}_{time}', batch_size=10000):
+    """
+    Copy a shapefile and add weighted output values as attributes. Output arrays are loaded once and shapefile records
+    are linked to output elements using a sorted unique identifier index.
+
+    :param str name_uid: Name of the unique identifier in the shapefile and weighted output.
+    :param output_variable: Name or names of the weighted output variables with dimensions ``(time, elementCount)``
+     or ``(elementCount,)``.
+    :type output_variable: str or sequence of str
+    :param time_indices: Time indices to link. If ``None``, link the first time index only.
+    :type time_indices: sequence of int
+    :param str field_name_template: Attribute name template used when more than one time index is linked. The single
+     time index attribute uses the variable name. Note shapefile attribute names are truncated to ten characters.
+    :param int batch_size: Number of records written per call to the output collection.
+    :raises: ValueError
+    """
+
+    output_variables = list(get_iter(output_variable))
+    if time_indices is None:
+        time_indices = [0]
+    time_indices = list(time_indices)
+
+    with nc_scope(path_output_data) as output:
+        output_uid = output.variables[name_uid][:]
+        linked = OrderedDict()
+        for variable in output_variables:
+            var = output.variables[variable]
+            if var.ndim == 1:
+                values = var[:].reshape(1, -1)
+                variable_time_indices = [0]
+            else:
+                values = var[time_indices, :]
+                variable_time_indices = time_indices
+            for ctr, time_index in enumerate(variable_time_indices):
+                if len(variable_time_indices) == 1:
+                    field_name = variable
+                else:
+                    field_name = field_name_template.format(variable=variable, time=time_index)
+                linked[field_name] = np.ma.filled(values[ctr, :].astype(float), np.nan)
+
+    sorter = np.argsort(output_uid)
+    sorted_uid = output_uid[sorter]
+
     with fiona.open(path_in_shp) as source:
         sink_meta = source.meta.copy()
-        sink_meta['schema']['properties'][output_variable] = 'float'
+        for field_name in linked.keys():
+            sink_meta['schema']['properties'][field_name] = 'float'
         with fiona.open(path_linked_shp, mode='w', **sink_meta) as sink:
-            with nc_scope(path_output_data) as output:
-                for record in source:
-                    uid = record['properties'][name_uid]
-                    select = output.variables[name_uid][:] == uid
-                    target_value = float(output.variables[output_variable][0, select][0])
-                    record['properties'][output_variable] = target_value
-                    sink.write(record)
+            batch = []
+            for record in source:
+                batch.append(record)
+                if len(batch) == batch_size:
+                    _write_linked_records_(sink, batch, name_uid, sorted_uid, sorter, linked)
+                    batch = []
+            if len(batch) > 0:
+                _write_linked_records_(sink, batch, name_uid, sorted_uid, sorter, linked)
+
+
+def _write_linked_records_(sink, records, name_uid, sorted_uid, sorter, linked):
+    uids = np.array([record['properties'][name_uid] for record in records])
+    if sorted_uid.shape[0] == 0:
+        raise ValueError('Unique identifiers not found in weighted output: {}'.format(uids.tolist()))
+    positions = np.searchsorted(sorted_uid, uids)
+    positions[positions == sorted_uid.shape[0]] = 0
+    found = sorted_uid[positions] == uids
+    if not found.all():
+        raise ValueError('Unique identifiers not found in weighted output: {}'.format(uids[~found].tolist()))
+    element_indices = sorter[positions]
+
+    for field_name, values in linked.items():
+        for record, value in izip(records, values[element_indices].tolist()):
+            record['properties'][field_name] = value
+    sink.writerecords(records)
 
 
 def create_merged_weights(weight_files, esmf_unstructured, master_weights):
@@ -46,6 +111,7 @@ def create_merged_weights(weight_files, esmf_unstructured, master_weights):
                            'centerCoords': ('elementCount', 'coordDim')})
     new_dtype = {'row': np.int32, 'col': np.int32, 'S': np.float64}
 
+    progress = get_progress('merge', total=len(weight_files), unit='files', work_unit='nonzeros')
     for uid, (w, e) in enumerate(zip(weight_files, esmf_unstructured)):
         log.info('Merge is processing weight file: {}'.format(w))
         log.info('Merge is processing ESMF unstructured file: {}'.format(e))
@@ -67,6 +133,11 @@ def create_merged_weights(weight_files, esmf_unstructured, master_weights):
         new_weight_file.GRIDCODE += e['GRIDCODE'].value.tolist()
         new_weight_file.centerCoords = np.vstack((new_weight_file.centerCoords, e['centerCoords'].value))
 
+        if progress is not None:
+            progress.update(work=w['row'].value.size)
+    if progress is not None:
+        progress.close()
+
     vc = VariableCollection()
     for k, v in new_weight_file.items():
         new_var = Variable(name=k, value=v, dimensions=new_dimensions[k], dtype=new_dtype.get(k))
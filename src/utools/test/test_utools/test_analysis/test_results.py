@@ -0,0 +1,161 @@
+import json
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+from nose.plugins.skip import SkipTest
+from shapely.geometry import box, Polygon, MultiPolygon
+
+from utools.test.base import AbstractUToolsTest
+
+try:
+    from utools.analysis import results
+except ImportError:
+    results = None
+
+JOB_OUTPUT = """Sender: LSF System <lsfadmin@ys0101>
+Subject: Job 123456: <weight-gen-03N> in cluster <yellowstone> Done
+
+Job <weight-gen-03N> was submitted from host <yslogin1> by user <user> in cluster <yellowstone>.
+Job was executed on host(s) <16*ys0101>, in queue <regular>, as user <user> in cluster <yellowstone>.
+
+Resource usage summary:
+
+    CPU time :                                   5120.50 sec.
+    Max Memory :                                 2048.00 MB
+    Average Memory :                             1024.50 MB
+    Run time :                                   600.25 sec.
+    Turnaround time :                            700.00 sec.
+"""
+
+
+class TestResults(AbstractUToolsTest):
+    def setUp(self):
+        if results is None:
+            raise SkipTest('SQLAlchemy is not installed.')
+        super(TestResults, self).setUp()
+        self.engine = results.connect(self.get_temporary_file_path('results.sqlite'))
+
+    def tearDown(self):
+        self.engine.dispose()
+        super(TestResults, self).tearDown()
+
+    def write_instrumentation(self, directory, ranks, records_per_rank=1):
+        os.mkdir(directory)
+        for rank in range(ranks):
+            path = os.path.join(directory, 'utools-phases-rank-{}.jsonl'.format(rank))
+            with open(path, 'w') as f:
+                for ii in range(records_per_rank):
+                    for name, wall in [('read', 1.), ('apply', rank + 1.)]:
+                        f.write(json.dumps({'phase': name, 'wall': wall, 'cpu': wall, 'peak_rss': 100,
+                                            'read_bytes': None, 'write_bytes': 10}) + '\n')
+                f.write(json.dumps({'summary': {}}) + '\n')
+
+    def test_load_instrumentation(self):
+        directory = self.get_temporary_file_path('instrument')
+        self.write_instrumentation(directory, 4, records_per_rank=2)
+        actual = results.load_instrumentation(directory, 'weighting-03N', vpu_name='03N', cores=4)
+        self.assertEqual(actual, 16)
+        directory = self.get_temporary_file_path('instrument2')
+        self.write_instrumentation(directory, 2)
+        results.load_instrumentation(directory, 'weighting-03S', vpu_name='03S', cores=2)
+
+        # Maximum across ranks of the per-rank sum.
+        self.assertEqual(results.get_phase_times('apply'), {'03N': 8., '03S': 2.})
+        # Loading again replaces the job's phase records.
+        results.load_instrumentation(directory, 'weighting-03S', vpu_name='03S', cores=2)
+        self.assertEqual(results.get_phase_times('apply'), {'03N': 8., '03S': 2.})
+        self.assertEqual(results.get_phase_times('read', metric='peak_rss'), {'03N': 200., '03S': 100.})
+
+        s = results.Session()
+        try:
+            self.assertEqual(s.query(results.VectorProcessingUnit).count(), 2)
+            job = s.query(results.Job).filter_by(name='weighting-03N').one()
+            self.assertEqual(job.cores, 4)
+            self.assertEqual(s.query(results.Phase).filter_by(jid=job.jid, rank=3, phase='apply').count(), 2)
+        finally:
+            s.close()
+
+    def test_load_job_outputs(self):
+        path = self.get_temporary_file_path('weight-gen-03N.out')
+        with open(path, 'w') as f:
+            f.write(JOB_OUTPUT)
+        actual = results.parse_job_output(path)
+        self.assertEqual(actual['lsf_id'], '123456')
+        self.assertEqual(actual['name'], 'weight-gen-03N')
+        self.assertEqual(actual['cpu_time'], 5120.5)
+        self.assertEqual(actual['run_time'], 600.25)
+        self.assertEqual(actual['queue'], 'regular')
+        self.assertEqual(actual['cluster'], 'yellowstone')
+
+        self.assertEqual(results.load_job_outputs([path], cores=256, vpu_pattern='weight-gen-(.+)'), 1)
+        # Loading again does not duplicate jobs.
+        results.load_job_outputs([path], cores=256, vpu_pattern='weight-gen-(.+)')
+        self.assertEqual(results.get_job_run_times('%weight-gen%'), {'03N': 600.25})
+        self.assertEqual(results.get_job_run_times('%apply%'), {})
+
+    def test_load_job_outputs_existing_job(self):
+        # Test metrics are added to a job created by loading instrumentation.
+        directory = self.get_temporary_file_path('instrument')
+        self.write_instrumentation(directory, 2)
+        results.load_instrumentation(directory, 'weight-gen-03N', vpu_name='03N', cores=2)
+        path = self.get_temporary_file_path('weight-gen-03N.out')
+        with open(path, 'w') as f:
+            f.write(JOB_OUTPUT)
+        results.load_job_outputs([path])
+        self.assertEqual(results.get_job_run_times('%weight-gen%'), {'03N': 600.25})
+
+        s = results.Session()
+        try:
+            job = s.query(results.Job).one()
+            self.assertEqual(job.cores, 2)
+            self.assertEqual(job.queue, 'regular')
+        finally:
+            s.close()
+
+    def test_load_many_ranks(self):
+        directory = self.get_temporary_file_path('instrument')
+        self.write_instrumentation(directory, 256, records_per_rank=20)
+        t1 = time.time()
+        actual = results.load_instrumentation(directory, 'weighting-03N', vpu_name='03N', cores=256)
+        self.assertEqual(actual, 256 * 40)
+        self.assertLess(time.time() - t1, 30.)
+        self.assertEqual(results.get_phase_times('apply'), {'03N': 256. * 20})
+
+    def test_catchments(self):
+        statistics = OrderedDict([('gridcode', np.array([1, 2, 3])), ('node_count', np.array([5, 100, 20])),
+                                  ('hole_count', np.array([0, 1, 0])), ('part_count', np.array([1, 2, 1])),
+                                  ('area', np.array([1e6, 2e6, 3e6]))])
+        self.assertEqual(results.add_catchments('03N', statistics), 3)
+        # Adding again replaces the unit's catchments.
+        results.add_catchments('03N', statistics)
+        results.add_catchments('03S', OrderedDict([(k, v[:1]) for k, v in statistics.items()]))
+
+        summary = results.get_catchment_summary()
+        self.assertEqual(summary.keys(), ['03N', '03S'])
+        self.assertEqual(summary['03N'], OrderedDict([('elements', 3), ('nodes', 125), ('max_nodes', 100),
+                                                      ('holes', 1), ('area', 6e6)]))
+        self.assertEqual(summary['03S']['elements'], 1)
+
+        node_counts = results.get_node_counts()
+        self.assertEqual(node_counts['03N'].tolist(), [5, 100, 20])
+        self.assertEqual(results.get_node_counts(vpu_name='03S').keys(), ['03S'])
+
+    def test_get_catchment_statistics(self):
+        try:
+            from utools.io.columnar import ColumnarGeometries
+        except ImportError:
+            raise SkipTest('GDAL is not installed.')
+
+        square = box(0, 0, 10, 10)
+        with_hole = Polygon(square.exterior.coords, holes=[box(2, 2, 4, 4).exterior.coords])
+        multipart = MultiPolygon([box(0, 0, 1, 1), box(2, 2, 3, 4)])
+        columnar = ColumnarGeometries.from_shapely([square, with_hole, multipart],
+                                                   properties={'GRIDCODE': np.array([7, 8, 9])})
+        actual = results.get_catchment_statistics(columnar)
+        self.assertEqual(actual['gridcode'].tolist(), [7, 8, 9])
+        self.assertEqual(actual['node_count'].tolist(), [5, 5, 10])
+        self.assertEqual(actual['hole_count'].tolist(), [0, 1, 0])
+        self.assertEqual(actual['part_count'].tolist(), [1, 1, 2])
+        self.assertNumpyAllClose(actual['area'], np.array([100., 96., 3.]))
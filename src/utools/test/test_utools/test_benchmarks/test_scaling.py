@@ -0,0 +1,51 @@
+import os
+from collections import OrderedDict
+
+from utools.benchmarks.scaling import get_process_counts, get_scaling_table, run_scaling
+from utools.test.base import AbstractUToolsTest
+
+
+class Test(AbstractUToolsTest):
+    def test_get_process_counts(self):
+        self.assertEqual(get_process_counts(1), [1])
+        self.assertEqual(get_process_counts(8), [1, 2, 4, 8])
+        self.assertEqual(get_process_counts(6), [1, 2, 4, 6])
+
+    def test_get_scaling_table(self):
+        def get_run(processes, best, apply_times):
+            ranks = [OrderedDict([('apply', {'wall': t})]) for t in apply_times]
+            return {'processes': processes, 'best': best, 'ranks': ranks}
+
+        results = {'mode': 'strong', 'runs': [get_run(2, 5.0, [3.0, 3.0]), get_run(1, 8.0, [6.0]),
+                                              get_run(4, 4.0, [2.0, 1.0, 1.0, 0.0])]}
+        table = get_scaling_table(results)
+        self.assertEqual([(r['processes'], r['phase']) for r in table],
+                         [(1, 'total'), (1, 'apply'), (2, 'total'), (2, 'apply'), (4, 'total'), (4, 'apply')])
+        row = table[-1]
+        self.assertAlmostEqual(row['time'], 2.0)
+        self.assertAlmostEqual(row['speedup'], 3.0)
+        self.assertAlmostEqual(row['efficiency'], 0.75)
+        self.assertAlmostEqual(row['imbalance'], 2.0)
+        self.assertAlmostEqual(table[2]['efficiency'], 0.8)
+
+        results['mode'] = 'weak'
+        self.assertAlmostEqual(get_scaling_table(results)[2]['efficiency'], 1.6)
+
+    def test_run_scaling(self):
+        directory = self.get_temporary_file_path('scaling')
+        params = {'ncol': 4, 'nrow': 3}
+        results = run_scaling('apply-partitioned', directory, process_counts=[1], mode='weak', params=params,
+                              mpirun=None)
+        self.assertEqual(results['parameters']['ncol'], 4)
+        self.assertEqual(len(results['runs']), 1)
+        run = results['runs'][0]
+        self.assertEqual(run['processes'], 1)
+        self.assertEqual(len(run['ranks']), 1)
+        self.assertEqual(run['ranks'][0].keys(), ['weight-load', 'apply', 'write-output'])
+        with self.nc_scope(os.path.join(directory, 'out_apply-partitioned_weak_1.nc')) as ds:
+            self.assertEqual(ds.variables['pr'].shape[1], 12)
+
+        with self.assertRaises(ValueError):
+            run_scaling('merge', directory)
+        with self.assertRaises(ValueError):
+            run_scaling('apply', directory, process_counts=[1, 2], mpirun=None)
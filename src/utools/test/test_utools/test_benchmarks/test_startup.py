@@ -0,0 +1,25 @@
+import subprocess
+import sys
+from collections import OrderedDict
+
+from utools.benchmarks.startup import run_startup_benchmarks, get_import_time
+from utools.test.base import AbstractUToolsTest
+
+
+class Test(AbstractUToolsTest):
+    def test_lazy_imports(self):
+        # Importing the command line interface must not import subcommand dependencies or initialize MPI.
+        code = 'import sys, utools_cli; print(" ".join(sorted(sys.modules.keys())))'
+        modules = subprocess.check_output([sys.executable, '-c', code]).split()
+        for name in ['numpy', 'mpi4py', 'osgeo', 'netCDF4', 'shapely', 'fiona', 'rtree', 'utools.io.mpi']:
+            self.assertNotIn(name, modules)
+
+    def test_run_startup_benchmarks(self):
+        budgets = OrderedDict([(('--help',), 1e6), (('apply', '--help'), 0.)])
+        actual = run_startup_benchmarks(budgets=budgets, modules=['utools.logging', 'utools.does_not_exist'],
+                                        repeat=1)
+        self.assertEqual([c['command'] for c in actual['commands']], ['--help', 'apply --help'])
+        self.assertEqual([c['within_budget'] for c in actual['commands']], [True, False])
+        self.assertGreater(actual['imports'][0]['time'], 0)
+        self.assertIsNone(actual['imports'][1]['time'])
+        self.assertIsNone(get_import_time('utools.does_not_exist'))
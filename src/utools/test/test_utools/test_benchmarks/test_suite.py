@@ -0,0 +1,59 @@
+import os
+from collections import OrderedDict
+
+from utools.benchmarks.suite import CASES, run_benchmarks, write_results, load_results, compare_results, create_inputs
+from utools.io.mpi import MPI_RANK, MPI_SIZE, MPI_COMM
+from utools.test.base import AbstractUToolsTest, attr
+
+
+class Test(AbstractUToolsTest):
+    @attr('mpi')
+    def test_run_benchmarks(self):
+        # The working directory must be shared by all ranks.
+        directory = MPI_COMM.bcast(self.get_temporary_file_path('benchmarks'))
+        cases = OrderedDict([('small', CASES['small'])])
+        results = run_benchmarks(directory, names=['apply', 'apply-partitioned'], cases=cases, repeat=2)
+
+        self.assertEqual(results['metadata']['mpi_size'], MPI_SIZE)
+        self.assertEqual([r['benchmark'] for r in results['results']], ['apply', 'apply-partitioned'])
+        for result in results['results']:
+            self.assertEqual(len(result['times']), 2)
+            self.assertEqual(result['best'], min(result['times']))
+            if MPI_RANK == 0:
+                self.assertIn('apply', result['phases'])
+
+        if MPI_RANK == 0:
+            with self.nc_scope(os.path.join(directory, 'small', 'out_apply.nc')) as ds:
+                actual = ds.variables['pr'][:]
+            with self.nc_scope(os.path.join(directory, 'small', 'out_apply-partitioned.nc')) as ds:
+                self.assertNumpyAllClose(ds.variables['pr'][:], actual)
+
+            path = os.path.join(directory, 'results.json')
+            write_results(path, results)
+            loaded = load_results(path)
+            self.assertEqual(loaded['results'][0]['parameters'], CASES['small'])
+            comparison = compare_results(loaded, results)
+            self.assertEqual([c['ratio'] for c in comparison], [1.0, 1.0])
+
+    def test_create_inputs(self):
+        params = CASES['small'].copy()
+        params.update(ncol=4, nrow=3, nparts=2)
+        inputs = create_inputs(self.get_temporary_file_path('small'), params)
+
+        with self.nc_scope(inputs['weights']) as ds:
+            self.assertEqual(len(ds.dimensions['n_b']), 12)
+        uids = []
+        for path in inputs['part_meshes']:
+            with self.nc_scope(path) as ds:
+                uids += ds.variables['GRIDCODE'][:].tolist()
+        self.assertEqual(uids, range(1, 13))
+
+    def test_compare_results(self):
+        baseline = {'results': [{'benchmark': 'apply', 'case': 'small', 'best': 1.0},
+                                {'benchmark': 'merge', 'case': 'small', 'best': 1.0}]}
+        current = {'results': [{'benchmark': 'apply', 'case': 'small', 'best': 1.5},
+                               {'benchmark': 'merge', 'case': 'small', 'best': 1.05},
+                               {'benchmark': 'convert', 'case': 'small', 'best': 1.0}]}
+        actual = compare_results(baseline, current, tolerance=0.1)
+        self.assertEqual([(c['benchmark'], c['regression']) for c in actual], [('apply', True), ('merge', False)])
+        self.assertAlmostEqual(actual[0]['ratio'], 1.5)
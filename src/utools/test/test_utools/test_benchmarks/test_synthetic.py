@@ -0,0 +1,64 @@
+import fiona
+import numpy as np
+from shapely.geometry import box
+from shapely.ops import cascaded_union
+
+from utools.benchmarks.synthetic import get_tessellated_polygons, write_shapefile, create_source_grid, \
+    create_weights, write_esmf_mesh, DEFAULT_BBOX
+from utools.io.esmf_mesh import EsmfMesh
+from utools.test.base import AbstractUToolsTest
+
+
+class Test(AbstractUToolsTest):
+    def test_get_tessellated_polygons(self):
+        geoms = get_tessellated_polygons(8, 6, node_count=24, hole_fraction=0.5, multipart_fraction=0.25, seed=2)
+        self.assertEqual(len(geoms), 48)
+        self.assertTrue(all([g.is_valid for g in geoms]))
+        # Four corners and five nodes per edge. The ring is closed.
+        self.assertEqual(len(get_tessellated_polygons(2, 2, node_count=24)[0].exterior.coords), 25)
+
+        multiparts = [g for g in geoms if g.geom_type == 'MultiPolygon']
+        holes = [g for g in geoms if g.geom_type == 'Polygon' and len(g.interiors) > 0]
+        self.assertGreater(len(multiparts), 0)
+        self.assertGreater(len(holes), 0)
+
+        # Polygons do not overlap and cover the extent.
+        union = cascaded_union(geoms)
+        self.assertAlmostEqual(sum([g.area for g in geoms]), union.area)
+        self.assertTrue(union.envelope.equals(box(*DEFAULT_BBOX)))
+
+        # Inputs are reproducible.
+        other = get_tessellated_polygons(8, 6, node_count=24, hole_fraction=0.5, multipart_fraction=0.25, seed=2)
+        self.assertTrue(all([g.equals_exact(o, 0) for g, o in zip(geoms, other)]))
+
+    def test_write_shapefile_and_esmf_mesh(self):
+        geoms = get_tessellated_polygons(3, 2, hole_fraction=1., multipart_fraction=0.5)
+        path_shp = self.get_temporary_file_path('synthetic.shp')
+        write_shapefile(path_shp, geoms, start=10)
+        with fiona.open(path_shp) as source:
+            self.assertEqual([r['properties']['GRIDCODE'] for r in source], range(10, 16))
+
+        path_nc = self.get_temporary_file_path('synthetic_esmf.nc')
+        write_esmf_mesh(path_nc, geoms, start=10)
+        with EsmfMesh(path_nc) as mesh:
+            self.assertEqual(len(mesh), 6)
+            self.assertEqual(mesh.variables['GRIDCODE'][:].tolist(), range(10, 16))
+
+    def test_create_weights(self):
+        path_source = self.get_temporary_file_path('source.nc')
+        src_grid_dims = create_source_grid(path_source, 1., 2, variable_name='pr')
+        self.assertEqual(src_grid_dims, (10, 10))
+        with self.nc_scope(path_source) as ds:
+            self.assertEqual(ds.variables['pr'].shape, (2, 10, 10))
+
+        path_weights = self.get_temporary_file_path('weights.nc')
+        create_weights(path_weights, 7, src_grid_dims, nnz=3)
+        with self.nc_scope(path_weights) as ds:
+            row = ds.variables['row'][:]
+            col = ds.variables['col'][:]
+            S = ds.variables['S'][:]
+            self.assertEqual(ds.variables['src_grid_dims'][:].tolist(), [10, 10])
+        self.assertEqual(row.tolist(), np.repeat(np.arange(1, 8), 3).tolist())
+        self.assertGreaterEqual(col.min(), 1)
+        self.assertLessEqual(col.max(), 100)
+        self.assertNumpyAllClose(np.bincount(row, weights=S)[1:], np.ones(7))
@@ -0,0 +1,102 @@
+import json
+
+import numpy as np
+
+from utools.cost_model import CostModel, Sample, fit_power, get_part_counts, get_samples_from_timing_data, \
+    get_samples_from_benchmarks, get_samples_from_instrumentation
+from utools.test.base import AbstractUToolsTest
+
+
+class TestCostModel(AbstractUToolsTest):
+    def test_fit_power(self):
+        x = np.array([100., 1000., 5000., 10000., 20000.])
+        c0, a, b = fit_power(x, 0.5 + 1e-8 * x ** 2.5)
+        self.assertAlmostEqual(c0, 0.5, places=6)
+        self.assertAlmostEqual(a, 1e-8, places=12)
+        self.assertAlmostEqual(b, 2.5)
+
+        # Negative intercepts are not allowed.
+        c0, a, b = fit_power(x, 2e-3 * x)
+        self.assertGreaterEqual(c0, 0.)
+        self.assertAlmostEqual(b, 1.)
+
+    def test_fit_and_predict(self):
+        samples = [Sample('weights', n, None, 1. + 1e-8 * n ** 2.5, 1) for n in [500, 2000, 8000, 16000]]
+        samples += [Sample('convert', n, None, 10 * (0.01 + 1e-5 * n), 10) for n in [100, 1000, 10000]]
+        samples += [Sample('apply', 4, area, 0.2 * area * 5, 5) for area in [1., 2., 4.]]
+        model = CostModel().fit(samples)
+        self.assertEqual(model.coefficients.keys(), ['convert', 'weights', 'apply'])
+
+        actual = model.predict('weights', [8000.])
+        self.assertAlmostEqual(actual[0], 1. + 1e-8 * 8000 ** 2.5, places=4)
+        # Splitting a large element into two parts halves the super-linear cost and doubles the fixed cost.
+        actual = model.predict('weights', [8000.], node_threshold=4000)
+        self.assertAlmostEqual(actual[0], 2 * (1. + 1e-8 * 4000 ** 2.5), places=4)
+
+        prediction = model.predict_vpu([8000., 100.], areas=[1., 1.])
+        self.assertEqual(prediction.keys(), ['convert', 'weights', 'apply', 'total'])
+        self.assertAlmostEqual(prediction['apply'], 0.4)
+        self.assertAlmostEqual(prediction['total'], sum([prediction[k] for k in model.coefficients.keys()]))
+        self.assertNotIn('apply', model.predict_vpu([100.]))
+
+        with self.assertRaises(ValueError):
+            CostModel().predict('weights', [1.])
+
+    def test_recommend_node_threshold(self):
+        model = CostModel(coefficients={'weights': (1., 1e-8, 2.5)})
+        node_counts = [20000., 15000., 3000., 200.]
+        threshold = model.recommend_node_threshold(node_counts)
+        # The continuous optimum is (c0 / ((b - 1) * a)) ** (1 / b).
+        self.assertTrue(1000 < threshold < 3000)
+        self.assertLess(model.predict_vpu(node_counts, node_threshold=threshold)['total'],
+                        model.predict_vpu(node_counts)['total'])
+
+        # A linear cost is never improved by splitting.
+        model = CostModel(coefficients={'weights': (1., 1e-3, 1.)})
+        self.assertIsNone(model.recommend_node_threshold(node_counts))
+
+    def test_dump_load(self):
+        path = self.get_temporary_file_path('model.json')
+        model = CostModel(coefficients={'weights': (1., 1e-8, 2.5)})
+        model.dump(path)
+        actual = CostModel.load(path)
+        self.assertEqual(actual.coefficients, model.coefficients)
+
+    def test_get_part_counts(self):
+        actual = get_part_counts([10, 100, 101, 0], 100)
+        self.assertEqual(actual.tolist(), [1, 1, 2, 1])
+
+    def test_samples(self):
+        samples = get_samples_from_timing_data()
+        self.assertGreater(len(samples), 100)
+        model = CostModel().fit(samples)
+        c0, a, b = model.coefficients['weights']
+        self.assertGreater(b, 1.5)
+        threshold = model.recommend_node_threshold([s.node_count for s in samples])
+        self.assertLess(threshold, 5000)
+
+        results = {'results': [{'benchmark': 'convert', 'parameters': {'ncol': 10, 'nrow': 10, 'node_count': 20},
+                                'best': 2.},
+                               {'benchmark': 'merge', 'parameters': {'ncol': 10, 'nrow': 10, 'node_count': 20},
+                                'best': 1.}]}
+        samples = get_samples_from_benchmarks(results)
+        self.assertEqual(len(samples), 1)
+        self.assertEqual(samples[0].stage, 'convert')
+        self.assertEqual(samples[0].count, 100)
+        self.assertAlmostEqual(samples[0].area, 1.)
+
+        path = self.get_temporary_file_path('phases.jsonl')
+        with open(path, 'w') as f:
+            for name, wall in [('read', 1.), ('split', 0.5), ('write', 2.), ('apply', 3.)]:
+                f.write(json.dumps({'phase': name, 'wall': wall}) + '\n')
+            f.write(json.dumps({'summary': {}}) + '\n')
+        samples = get_samples_from_instrumentation(path, 50., 10)
+        self.assertEqual([(s.stage, s.time) for s in samples], [('convert', 3.), ('apply', 3.)])
+
+        # Test nested phases are not counted twice. Inner phases are recorded before the phase containing them.
+        path = self.get_temporary_file_path('phases-nested.jsonl')
+        with open(path, 'w') as f:
+            for name, wall in [('split', 0.25), ('connectivity', 0.5), ('read', 2.), ('write', 1.)]:
+                f.write(json.dumps({'phase': name, 'wall': wall}) + '\n')
+        samples = get_samples_from_instrumentation(path, 50., 10)
+        self.assertEqual([(s.stage, s.time) for s in samples], [('convert', 3.)])
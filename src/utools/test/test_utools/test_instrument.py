@@ -0,0 +1,98 @@
+import json
+
+from utools.instrument import phase, PhaseRecorder, PhaseAccumulator, get_peak_rss, get_current_phase
+from utools.io.mpi import MPI_RANK, MPI_SIZE
+from utools.logging import log_entry_exit
+from utools.test.base import AbstractUToolsTest, attr
+
+
+class TestPhase(AbstractUToolsTest):
+    def test_context_manager(self):
+        path = self.get_temporary_file_path('phases.jsonl')
+        recorder = PhaseRecorder(path=path)
+        for _ in range(2):
+            with phase('read', recorder=recorder):
+                with open(path, 'a') as f:
+                    f.write('')
+        with phase('split', io=False, recorder=recorder):
+            pass
+
+        self.assertEqual(recorder.totals.keys(), ['read', 'split'])
+        self.assertEqual(recorder.totals['read']['count'], 2)
+        self.assertGreaterEqual(recorder.totals['read']['wall'], 0)
+        self.assertGreater(recorder.totals['read']['peak_rss'], 0)
+        self.assertEqual(recorder.totals['split']['read_bytes'], 0)
+
+        with open(path) as f:
+            records = [json.loads(line) for line in f if len(line.strip()) > 0]
+        self.assertEqual([r['phase'] for r in records], ['read', 'read', 'split'])
+        self.assertIsNone(records[-1]['read_bytes'])
+        self.assertEqual(set(records[0].keys()), {'phase', 'rank', 'time', 'wall', 'cpu', 'peak_rss', 'read_bytes',
+                                                  'write_bytes'})
+
+    def test_accumulator(self):
+        path = self.get_temporary_file_path('phases.jsonl')
+        recorder = PhaseRecorder(path=path)
+        split = PhaseAccumulator('split', recorder=recorder)
+        split.record()
+        self.assertEqual(recorder.totals, {})
+
+        for _ in range(3):
+            with split:
+                self.assertEqual(get_current_phase(), 'split')
+        self.assertIsNone(get_current_phase())
+        split.record()
+        with split:
+            pass
+        split.record()
+
+        self.assertEqual(recorder.totals['split']['count'], 4)
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r['count'] for r in records], [3, 1])
+        self.assertIsNone(records[0]['read_bytes'])
+
+    def test_decorator(self):
+        recorder = PhaseRecorder()
+
+        @phase('apply', recorder=recorder)
+        def apply(value):
+            return value + 1
+
+        self.assertEqual(apply(1), 2)
+        self.assertIsInstance(apply, log_entry_exit)
+        self.assertEqual(apply.__name__, 'apply')
+        self.assertEqual(recorder.totals['apply']['count'], 1)
+
+        # Test instance methods.
+        class Applier(object):
+            @phase('apply', recorder=recorder)
+            def apply(self, value):
+                return value + 2
+
+        self.assertEqual(Applier().apply(1), 3)
+        self.assertEqual(recorder.totals['apply']['count'], 2)
+
+    def test_get_peak_rss(self):
+        self.assertGreater(get_peak_rss(), 1024 * 1024)
+
+    @attr('mpi')
+    def test_get_summary(self):
+        recorder = PhaseRecorder()
+        record = {'phase': 'apply', 'wall': float(MPI_RANK + 1), 'cpu': 1.0, 'peak_rss': 10, 'read_bytes': None,
+                  'write_bytes': 5}
+        recorder.add(record)
+        if MPI_RANK == 0:
+            recorder.add(dict(record, phase='write-output'))
+
+        actual = recorder.log_summary()
+        if MPI_RANK == 0:
+            self.assertEqual(actual.keys(), ['apply', 'write-output'])
+            wall = actual['apply']['wall']
+            self.assertEqual(wall['min'], 1.0)
+            self.assertEqual(wall['max'], float(MPI_SIZE))
+            self.assertAlmostEqual(wall['mean'], (MPI_SIZE + 1) / 2.0)
+            self.assertAlmostEqual(wall['imbalance'], MPI_SIZE / ((MPI_SIZE + 1) / 2.0))
+            self.assertEqual(actual['write-output']['wall']['min'], 0 if MPI_SIZE > 1 else 1.0)
+        else:
+            self.assertIsNone(actual)
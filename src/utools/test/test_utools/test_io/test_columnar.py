@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+from osgeo import osr
+from shapely.geometry import Polygon, MultiPolygon, box
+
+from utools.helpers import get_iter
+from utools.io.columnar import ColumnarGeometries, read_columnar
+from utools.io.geom_cabinet import GeomCabinetIterator
+from utools.profile.crs_transform import DEST_CRS_WKT
+from utools.test.base import AbstractUToolsTest
+
+
+def get_rings(geom):
+    """
+    :returns: Ring coordinate arrays in columnar order (parts in order with the exterior first).
+    :rtype: list
+    """
+
+    ret = []
+    for element in get_iter(geom, dtype=Polygon):
+        ret.append(np.array(element.exterior.coords)[:, 0:2])
+        ret += [np.array(interior.coords)[:, 0:2] for interior in element.interiors]
+    return ret
+
+
+class TestColumnarGeometries(AbstractUToolsTest):
+    @property
+    def path_nhd_catchments_texas(self):
+        return os.path.join(self.path_bin, 'nhd_catchments_texas', 'nhd_catchments_texas.shp')
+
+    def assertColumnarEqual(self, columnar, records):
+        geoms = [r['geom'] for r in records]
+        self.assertEqual(len(columnar), len(geoms))
+
+        # Test offsets against the shapely parts and rings.
+        parts = [list(get_iter(g, dtype=Polygon)) for g in geoms]
+        self.assertEqual(columnar.get_part_counts().tolist(), [len(p) for p in parts])
+        self.assertEqual(np.diff(columnar.part_offsets).tolist(),
+                         [len(element.interiors) + 1 for p in parts for element in p])
+        rings = [ring for g in geoms for ring in get_rings(g)]
+        self.assertEqual(columnar.ring_lengths.tolist(), [r.shape[0] for r in rings])
+        self.assertEqual(columnar.coordinates.shape, (sum([r.shape[0] for r in rings]), 2))
+        self.assertTrue(np.allclose(columnar.coordinates, np.concatenate(rings), rtol=0, atol=1e-4))
+
+        for idx, geom in enumerate(geoms):
+            actual = columnar.get_geometry(idx)
+            self.assertEqual(type(actual), type(geom))
+            self.assertAlmostEqual(actual.area, geom.area, places=4)
+
+    def test_from_shapely(self):
+        multipart = MultiPolygon([self.polygon_with_hole, box(10, 10, 11, 11)])
+        geoms = [box(0, 0, 1, 1), self.polygon_with_hole, multipart]
+        columnar = ColumnarGeometries.from_shapely(geoms, properties={'UID': np.array([1, 2, 3])})
+        self.assertColumnarEqual(columnar, [{'geom': g} for g in geoms])
+        self.assertEqual(columnar.geometry_offsets.tolist(), [0, 1, 2, 4])
+        self.assertEqual(columnar.part_offsets.tolist(), [0, 1, 3, 5, 6])
+        self.assertEqual(columnar.ring_offsets.tolist(), [0, 5, 10, 15, 20, 25, 30])
+        self.assertEqual(columnar.ring_is_interior.tolist(), [False, False, True, False, True, False])
+        self.assertEqual(columnar.ring_geometry_index.tolist(), [0, 1, 1, 2, 2, 2])
+
+        self.assertEqual(columnar.get_part_counts().tolist(), [1, 1, 2])
+        self.assertEqual(columnar.get_hole_counts().tolist(), [0, 1, 1])
+        self.assertEqual(columnar.get_node_counts().tolist(), [5, 5, 10])
+        self.assertEqual(columnar.get_node_counts(exterior_only=False).tolist(), [5, 10, 15])
+        areas, _ = columnar.get_areas_and_centroids()
+        self.assertNumpyAllClose(areas, np.array([g.area for g in geoms]))
+
+        with self.assertRaises(ValueError):
+            columnar.transform(3857)
+
+    def test_read_columnar(self):
+        records = list(GeomCabinetIterator(path=self.path_nhd_catchments_texas))
+        columnar = read_columnar(self.path_nhd_catchments_texas)
+        self.assertColumnarEqual(columnar, records)
+        self.assertEqual(columnar.properties.keys(), records[0]['properties'].keys())
+        for key, values in columnar.properties.items():
+            self.assertEqual(values.tolist(), [r['properties'][key] for r in records])
+        self.assertIn('GEOGCS', columnar.crs)
+
+        # Test selecting fields and features.
+        columnar = read_columnar(self.path_nhd_catchments_texas, fields=['GRIDCODE'],
+                                 select_sql_where='GRIDCODE = {}'.format(records[1]['properties']['GRIDCODE']))
+        self.assertEqual(columnar.properties.keys(), ['GRIDCODE'])
+        self.assertColumnarEqual(columnar, records[1:2])
+
+    def test_read_columnar_dest_crs(self):
+        dest_crs = osr.SpatialReference()
+        dest_crs.ImportFromWkt(DEST_CRS_WKT)
+        records = list(GeomCabinetIterator(path=self.path_nhd_catchments_texas, dest_crs=dest_crs))
+        for n_workers in [None, 2]:
+            columnar = read_columnar(self.path_nhd_catchments_texas, fields=[], dest_crs=dest_crs,
+                                     n_workers=n_workers)
+            self.assertColumnarEqual(columnar, records)
+            self.assertIn('Lambert_Conformal_Conic', columnar.crs)
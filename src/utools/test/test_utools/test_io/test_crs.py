@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+from nose.plugins.skip import SkipTest
+from osgeo import ogr, osr
+
+from utools.io import crs
+from utools.io.columnar import get_ogr_polygon_parts
+from utools.io.crs import get_crs_wkt, get_transformer, BulkTransformer
+from utools.profile.crs_transform import DEST_CRS_WKT, get_point_count, run_per_feature, run_bulk
+from utools.test.base import AbstractUToolsTest
+
+
+class TestCrs(AbstractUToolsTest):
+    @property
+    def path_nhd_catchments_texas(self):
+        return os.path.join(self.path_bin, 'nhd_catchments_texas', 'nhd_catchments_texas.shp')
+
+    def get_coordinates(self, dest_crs_wkt):
+        """
+        :returns: Source coordinates of all rings and the same coordinates transformed per feature with
+         ``TransformTo``.
+        :rtype: tuple
+        """
+
+        dest_sr = osr.SpatialReference()
+        dest_sr.ImportFromWkt(dest_crs_wkt)
+        if hasattr(dest_sr, 'SetAxisMappingStrategy'):
+            dest_sr.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+        src = []
+        dst = []
+        ds = ogr.Open(self.path_nhd_catchments_texas)
+        try:
+            layer = ds.GetLayerByIndex(0)
+            src_wkt = layer.GetSpatialRef().ExportToWkt()
+            for feature in layer:
+                ogr_geom = feature.GetGeometryRef()
+                src += [ring for part in get_ogr_polygon_parts(ogr_geom) for ring in part]
+                ogr_geom.TransformTo(dest_sr)
+                dst += [ring for part in get_ogr_polygon_parts(ogr_geom) for ring in part]
+        finally:
+            ds = None
+        return src_wkt, np.concatenate(src), np.concatenate(dst)
+
+    def test_get_crs_wkt(self):
+        self.assertEqual(get_crs_wkt(DEST_CRS_WKT), DEST_CRS_WKT)
+
+        sr = osr.SpatialReference()
+        sr.ImportFromEPSG(4326)
+        self.assertEqual(get_crs_wkt(4326), sr.ExportToWkt())
+        self.assertEqual(get_crs_wkt(sr), sr.ExportToWkt())
+
+        # Test objects with a spatial reference attribute (i.e. ocgis coordinate systems).
+        class WithSpatialReference(object):
+            pass
+
+        crs_object = WithSpatialReference()
+        crs_object.sr = sr
+        self.assertEqual(get_crs_wkt(crs_object), sr.ExportToWkt())
+
+        # Test objects with only a PROJ.4 string.
+        crs_object = WithSpatialReference()
+        crs_object.sr = None
+        crs_object.proj4 = sr.ExportToProj4()
+        self.assertIn('WGS', get_crs_wkt(crs_object))
+
+    def test_get_transformer(self):
+        actual = get_transformer(4326, DEST_CRS_WKT, use_pyproj=False)
+        self.assertFalse(actual.use_pyproj)
+        self.assertEqual(actual.dst_wkt, DEST_CRS_WKT)
+        # Test transformers are cached.
+        self.assertIs(get_transformer(4326, DEST_CRS_WKT, use_pyproj=False), actual)
+
+        if crs.pyproj is None:
+            self.assertFalse(get_transformer(4326, DEST_CRS_WKT).use_pyproj)
+            with self.assertRaises(ValueError):
+                BulkTransformer(actual.src_wkt, actual.dst_wkt, use_pyproj=True)
+
+    def test_transform(self):
+        src_wkt, src, desired = self.get_coordinates(DEST_CRS_WKT)
+
+        for use_pyproj in [False, True]:
+            if use_pyproj and crs.pyproj is None:
+                continue
+            # Test chunked transformations.
+            transformer = BulkTransformer(src_wkt, DEST_CRS_WKT, use_pyproj=use_pyproj, chunk_size=7)
+            for n_workers in [None, 2]:
+                actual = transformer.transform_coordinates(src, n_workers=n_workers)
+                self.assertEqual(actual.shape, desired.shape)
+                self.assertTrue(np.allclose(actual, desired, rtol=0, atol=1e-4))
+
+        # Test the transformer may be used after it is copied to worker processes.
+        x, y = transformer.transform(src[:, 0], src[:, 1], n_workers=2)
+        self.assertTrue(np.allclose(x, desired[:, 0], rtol=0, atol=1e-4))
+
+    def test_transform_pyproj(self):
+        if crs.pyproj is None:
+            raise SkipTest('"pyproj" is not installed.')
+
+        src_wkt, src, _ = self.get_coordinates(DEST_CRS_WKT)
+        osr_transformer = BulkTransformer(src_wkt, DEST_CRS_WKT, use_pyproj=False)
+        pyproj_transformer = BulkTransformer(src_wkt, DEST_CRS_WKT, use_pyproj=True)
+        self.assertTrue(np.allclose(pyproj_transformer.transform_coordinates(src),
+                                    osr_transformer.transform_coordinates(src), rtol=0, atol=1e-4))
+
+    def test_transform_axis_order(self):
+        # Test longitude stays first for geographic coordinate systems with latitude-first authority axis order.
+        transformer = BulkTransformer(get_crs_wkt(4326), get_crs_wkt(3857), use_pyproj=False)
+        x, y = transformer.transform(np.array([-97.]), np.array([30.]))
+        self.assertAlmostEqual(x[0], -10797990.166, places=2)
+        self.assertGreater(y[0], 3000000.)
+
+    def test_get_point_count(self):
+        wkt = 'MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)), ((2 2, 4 2, 4 4, 2 4, 2 2), (3 3, 3.5 3, 3.5 3.5, 3 3)))'
+        self.assertEqual(get_point_count(ogr.CreateGeometryFromWkt(wkt)), 13)
+        self.assertEqual(get_point_count(ogr.CreateGeometryFromWkt('POLYGON ((0 0, 1 0, 1 1, 0 0))')), 4)
+
+        # Test per-feature and bulk transformations count the same coordinates.
+        dest_sr = osr.SpatialReference()
+        dest_sr.ImportFromWkt(DEST_CRS_WKT)
+        self.assertEqual(run_per_feature(self.path_nhd_catchments_texas, dest_sr),
+                         run_bulk(self.path_nhd_catchments_texas, dest_sr))
@@ -0,0 +1,91 @@
+import os
+
+import netCDF4 as nc
+import numpy as np
+from shapely.geometry import shape
+
+from utools.constants import UgridToolsConstants
+from utools.io.esmf_mesh import EsmfMesh, get_classic_variable_offsets, get_indexed_rows
+from utools.io.helpers import iter_records, get_split_array
+from utools.test.base import AbstractUToolsTest
+
+
+class TestEsmfMesh(AbstractUToolsTest):
+    @property
+    def path_esmf_format(self):
+        return os.path.join(self.path_bin, 'test_esmf_format.nc')
+
+    def get_desired_geometries(self):
+        with nc.Dataset(self.path_esmf_format) as ds:
+            element_conn = ds.variables['elementConn'][:]
+            num_element_conn = ds.variables['numElementConn'][:]
+            nodes = ds.variables['nodeCoords'][:]
+        faces = np.array(np.split(element_conn, np.cumsum(num_element_conn)[:-1]), dtype=object)
+        return [shape(r['geometry']) for r in iter_records(faces, nodes[:, 0], nodes[:, 1],
+                                                           polygon_break_value=UgridToolsConstants.POLYGON_BREAK_VALUE)]
+
+    def test_get_classic_variable_offsets(self):
+        offsets = get_classic_variable_offsets(self.path_esmf_format)
+        with nc.Dataset(self.path_esmf_format) as ds:
+            self.assertEqual(set(offsets.keys()), set(ds.variables.keys()))
+            desired = ds.variables['nodeCoords'][0:3]
+        actual = np.memmap(self.path_esmf_format, dtype='>f8', mode='r', offset=offsets['nodeCoords'], shape=(3, 2))
+        self.assertNumpyAll(np.asarray(actual, dtype=np.float64), np.asarray(desired))
+
+    def test_get_element_geometry(self):
+        desired = self.get_desired_geometries()
+        for use_mmap in [True, False]:
+            with EsmfMesh(self.path_esmf_format, use_mmap=use_mmap) as mesh:
+                self.assertEqual(all(mesh.is_memory_mapped.values()), use_mmap)
+                self.assertEqual(len(mesh), len(desired))
+                self.assertEqual(mesh.element_offsets[-1], mesh.element_conn.shape[0])
+                for idx in [0, 9, len(desired) - 1, 21]:
+                    self.assertTrue(mesh.get_element_geometry(idx).almost_equals(desired[idx]))
+
+    def test_get_element_coordinates(self):
+        with EsmfMesh(self.path_esmf_format) as mesh:
+            conn = mesh.get_element_connectivity(9)
+            parts = get_split_array(conn, mesh.polygon_break_value)
+            actual = mesh.get_element_coordinates(9)
+            self.assertEqual(len(actual), len(parts))
+            for part, coords in zip(parts, actual):
+                self.assertNumpyAll(np.asarray(coords), np.asarray(mesh.node_coords[part]))
+                # Sequential node indices are returned as views.
+                self.assertTrue(np.may_share_memory(coords, mesh.node_coords))
+
+    def test_iter_records(self):
+        with EsmfMesh(self.path_esmf_format) as mesh:
+            records = list(mesh.iter_records(data_variables=['GRIDCODE'], indices_to_load=[2, 5]))
+            gridcode = mesh.variables['GRIDCODE'][:]
+        self.assertEqual([r['id'] for r in records], [2, 5])
+        self.assertEqual([r['properties']['GRIDCODE'] for r in records], gridcode[[2, 5]].tolist())
+        self.assertEqual(records[0]['geometry']['type'], 'Polygon')
+
+    def test_get_indexed_rows(self):
+        class RecordingVariable(object):
+            def __init__(self, var):
+                self.var = var
+                self.keys = []
+
+            def __getitem__(self, key):
+                self.keys.append(key)
+                return self.var[key]
+
+        desired = np.arange(40000).reshape(20000, 2)
+        path = self.get_temporary_file_path('rows.nc')
+        with nc.Dataset(path, 'w') as ds:
+            ds.createDimension('n', 20000)
+            ds.createDimension('two', 2)
+            ds.createVariable('values', int, ('n', 'two'))[:] = desired
+
+        indices = np.array([15001, 3, 15000, 3, 19999, 10])
+        with nc.Dataset(path) as ds:
+            var = RecordingVariable(ds.variables['values'])
+            actual = get_indexed_rows(var, indices)
+            self.assertNumpyAll(np.asarray(actual), desired[indices])
+            # Test sparse rows are read in runs.
+            self.assertEqual([(k.start, k.stop) for k in var.keys], [(3, 11), (15000, 15002), (19999, 20000)])
+
+            var = RecordingVariable(ds.variables['values'])
+            self.assertNumpyAll(np.asarray(get_indexed_rows(var, indices[1:2])), desired[[3]])
+            self.assertEqual(len(var.keys), 1)
@@ -0,0 +1,82 @@
+import numpy as np
+from shapely.geometry import box, MultiPolygon, Polygon
+
+from utools.io.esmf_mesh import EsmfMesh
+from utools.io.esmf_stream import EsmfStreamWriter, merge_esmf_files
+from utools.test.base import AbstractUToolsTest
+
+
+class TestEsmfStreamWriter(AbstractUToolsTest):
+    @property
+    def geoms(self):
+        clockwise = Polygon(list(box(5, 5, 6, 7).exterior.coords)[::-1])
+        multi = MultiPolygon([box(10, 10, 11, 11), box(12, 10, 13, 11)])
+        return [box(0, 0, 1, 1), self.polygon_with_hole, clockwise, multi, box(20, 20, 22, 21)]
+
+    def write(self, path, geoms, uids, batch_size=2):
+        with EsmfStreamWriter(path, face_uid_name='UID', batch_size=batch_size, geodesic_area=True) as writer:
+            for uid, geom in zip(uids, geoms):
+                writer.add(uid, geom)
+        return writer
+
+    def assertMeshEqual(self, path, geoms, uids):
+        with EsmfMesh(path) as mesh:
+            self.assertEqual(len(mesh), len(geoms))
+            self.assertEqual(mesh.variables['UID'][:].tolist(), uids)
+            areas = mesh.variables['elementArea'][:]
+            for idx, geom in enumerate(geoms):
+                # Holes are not stored in the connectivity.
+                exteriors = [Polygon(p.exterior) for p in getattr(geom, 'geoms', [geom])]
+                actual = mesh.get_element_geometry(idx)
+                self.assertAlmostEqual(actual.area, sum([e.area for e in exteriors]))
+                self.assertAlmostEqual(areas[idx], geom.area)
+                # Exteriors are counter-clockwise.
+                for part in getattr(actual, 'geoms', [actual]):
+                    self.assertTrue(part.exterior.is_ccw)
+
+    def test_add(self):
+        path = self.get_temporary_file_path('out.nc')
+        geoms = self.geoms
+        uids = [10, 11, 12, 13, 14]
+        writer = self.write(path, geoms, uids)
+        self.assertEqual(writer.n_elements, 5)
+        self.assertMeshEqual(path, geoms, uids)
+
+        with self.nc_scope(path) as ds:
+            self.assertEqual(len(ds.dimensions['nodeCount']), writer.n_nodes)
+            self.assertEqual(ds.variables['elementConn'].polygon_break_value, -8)
+            self.assertEqual(ds.gridType, 'unstructured')
+            self.assertEqual(ds.variables['elementAreaGeodesic'].shape, (5,))
+            self.assertNumpyAllClose(np.asarray(ds.variables['centerCoords'][0]), np.array([0.5, 0.5]))
+
+    def test_uid_dtype(self):
+        # Test 64-bit unique identifiers are not truncated.
+        path = self.get_temporary_file_path('uid64.nc')
+        uids = [2 ** 40 + ii for ii in range(5)]
+        self.write(path, self.geoms, uids)
+        with self.nc_scope(path) as ds:
+            self.assertEqual(ds.variables['UID'].dtype, np.array(uids).dtype)
+            self.assertEqual(ds.variables['UID'][:].tolist(), uids)
+
+        path = self.get_temporary_file_path('uid32.nc')
+        with EsmfStreamWriter(path, face_uid_name='UID', uid_dtype=np.int32) as writer:
+            writer.add(1, box(0, 0, 1, 1))
+        with self.nc_scope(path) as ds:
+            self.assertEqual(ds.variables['UID'].dtype, np.int32)
+
+        # Test a file without elements has a unique identifier variable.
+        path = self.get_temporary_file_path('empty.nc')
+        with EsmfStreamWriter(path, face_uid_name='UID'):
+            pass
+        with self.nc_scope(path) as ds:
+            self.assertEqual(ds.variables['UID'].shape, (0,))
+
+    def test_merge_esmf_files(self):
+        geoms = self.geoms
+        paths = [self.get_temporary_file_path('rank-0.nc'), self.get_temporary_file_path('rank-1.nc')]
+        self.write(paths[0], geoms[0:3], [1, 2, 3])
+        self.write(paths[1], geoms[3:], [4, 5], batch_size=1)
+
+        path = self.get_temporary_file_path('merged.nc')
+        merge_esmf_files(paths, path, face_uid_name='UID', batch_size=3, geodesic_area=True)
+        self.assertMeshEqual(path, geoms, [1, 2, 3, 4, 5])
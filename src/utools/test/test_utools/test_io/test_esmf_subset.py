@@ -0,0 +1,67 @@
+import os
+
+import netCDF4 as nc
+import numpy as np
+from shapely.geometry import box
+
+from utools.io.esmf_mesh import EsmfMesh
+from utools.io.esmf_subset import subset_esmf_mesh, get_subset_indices
+from utools.test.base import AbstractUToolsTest
+
+
+class TestEsmfSubset(AbstractUToolsTest):
+    @property
+    def path_esmf_format(self):
+        return os.path.join(self.path_bin, 'test_esmf_format.nc')
+
+    def test_get_element_bounds(self):
+        with EsmfMesh(self.path_esmf_format, chunk_size=7) as mesh:
+            actual = mesh.get_element_bounds()
+            for idx in [0, 12, 42]:
+                self.assertNumpyAllClose(actual[idx], np.array(mesh.get_element_geometry(idx).bounds))
+
+    def test_get_subset_indices(self):
+        with EsmfMesh(self.path_esmf_format) as mesh:
+            bounds = mesh.get_element_bounds()
+            bbox = tuple(bounds[5])
+            actual = get_subset_indices(mesh, bbox=bbox)
+            self.assertIn(5, actual.tolist())
+            geom_actual = get_subset_indices(mesh, geom=box(*bbox))
+            self.assertTrue(set(geom_actual.tolist()).issubset(actual.tolist()))
+
+            uids = mesh.variables['GRIDCODE'][[3, 1]]
+            actual = get_subset_indices(mesh, uids=uids, face_uid_name='GRIDCODE')
+            self.assertEqual(actual.tolist(), [1, 3])
+            actual = get_subset_indices(mesh, uids=uids, face_uid_name='GRIDCODE', bbox=bbox)
+            self.assertEqual(actual.tolist(), sorted(set([1, 3]).intersection(geom_actual.tolist())))
+
+            with self.assertRaises(ValueError):
+                get_subset_indices(mesh, uids=[-999], face_uid_name='GRIDCODE')
+            with self.assertRaises(ValueError):
+                get_subset_indices(mesh)
+
+    def test_subset_esmf_mesh(self):
+        path = self.get_temporary_file_path('subset.nc')
+        indices = [2, 17, 40]
+        with nc.Dataset(self.path_esmf_format) as ds:
+            uids = ds.variables['GRIDCODE'][indices]
+        actual = subset_esmf_mesh(self.path_esmf_format, path, uids=uids, face_uid_name='GRIDCODE')
+        self.assertEqual(actual.tolist(), indices)
+
+        with EsmfMesh(self.path_esmf_format) as source, EsmfMesh(path) as mesh:
+            self.assertEqual(len(mesh), 3)
+            self.assertEqual(mesh.attrs, source.attrs)
+            # Only referenced nodes are kept.
+            conn = np.asarray(mesh.element_conn[:])
+            nodes = conn[conn != mesh.polygon_break_value] - mesh.start_index
+            self.assertEqual(np.unique(nodes).tolist(), range(mesh.node_coords.shape[0]))
+            for idx_new, idx_source in enumerate(indices):
+                self.assertTrue(mesh.get_element_geometry(idx_new).equals(source.get_element_geometry(idx_source)))
+                for name in ['GRIDCODE', 'centerCoords', 'numElementConn']:
+                    self.assertNumpyAll(np.asarray(mesh.variables[name][idx_new]),
+                                        np.asarray(source.variables[name][idx_source]))
+            self.assertEqual(mesh.variables['elementConn'].polygon_break_value,
+                             source.variables['elementConn'].polygon_break_value)
+
+        with self.assertRaises(ValueError):
+            subset_esmf_mesh(self.path_esmf_format, path, bbox=(1e6, 1e6, 1e6 + 1, 1e6 + 1))
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+
+from utools.io.geom_cabinet import DatasetPool, GeomCabinet, GeomCabinetIterator, DATASET_POOL, UidIndex
+from utools.test.base import AbstractUToolsTest
+
+
+class TestDatasetPool(AbstractUToolsTest):
+    @property
+    def path_three_polygons(self):
+        return os.path.join(self.path_bin, 'three_polygons', 'three_polygons.shp')
+
+    def test_checkout(self):
+        pool = DatasetPool(max_size=1)
+        ds1 = pool.checkout(self.path_three_polygons)
+        # A checked out handle is not shared.
+        ds2 = pool.checkout(self.path_three_polygons)
+        self.assertNotEqual(id(ds1), id(ds2))
+        pool.release(self.path_three_polygons, ds1)
+        pool.release(self.path_three_polygons, ds2)
+        self.assertEqual(len(pool), 1)
+
+        # Idle handles are reused.
+        with pool.open(self.path_three_polygons) as ds:
+            self.assertEqual(id(ds), id(ds2))
+            self.assertEqual(len(pool), 0)
+        self.assertEqual(len(pool), 1)
+
+        pool.clear()
+        self.assertEqual(len(pool), 0)
+
+    def test_system_iter_geoms(self):
+        DATASET_POOL.clear()
+        gci = GeomCabinetIterator(path=self.path_three_polygons)
+        for _ in range(2):
+            self.assertEqual(len(list(gci)), 3)
+            self.assertEqual(len(DATASET_POOL), 1)
+
+        # Test nested iteration over the same file.
+        for record in gci:
+            inner = GeomCabinetIterator(path=self.path_three_polygons, uid='SPECIAL', select_uid=[101])
+            self.assertEqual(len(list(inner)), 1)
+        self.assertEqual(len(DATASET_POOL), 2)
+
+
+class TestGeomCabinet(AbstractUToolsTest):
+    def test_keys(self):
+        gc = GeomCabinet(path=self.path_bin)
+        keys = gc.keys()
+        self.assertIn('three_polygons', keys)
+        self.assertEqual(gc.get_shp_path('three_polygons'),
+                         os.path.join(self.path_bin, 'three_polygons', 'three_polygons.shp'))
+        with self.assertRaises(ValueError):
+            gc.get_shp_path('does_not_exist')
+
+    def test_get_meta(self):
+        gc = GeomCabinet()
+        path = os.path.join(self.path_bin, 'three_polygons', 'three_polygons.shp')
+        meta = gc.get_meta(path=path)
+        meta['schema']['properties']['foo'] = 'int'
+        # The cached metadata is not modified.
+        self.assertNotIn('foo', gc.get_meta(path=path)['schema']['properties'])
+
+    def test_get_geoms_by_uid(self):
+        gc = GeomCabinet()
+        path = os.path.join(self.path_bin, 'three_polygons', 'three_polygons.shp')
+        store = {}
+        actual = gc.get_geoms_by_uid([102, 100], 'SPECIAL', path=path, store=store)
+        self.assertEqual(actual.keys(), [102, 100])
+        self.assertEqual(actual[102]['properties']['SPECIAL'], 102)
+        self.assertEqual(len(store), 2)
+
+        desired = list(GeomCabinetIterator(path=path, uid='SPECIAL', select_uid=[102]))[0]
+        self.assertTrue(actual[102]['geom'].equals(desired['geom']))
+
+        sets = gc.get_geoms_by_uid_sets([[100, 101], [101]], 'SPECIAL', path=path, store=store)
+        self.assertEqual([[r['properties']['SPECIAL'] for r in s] for s in sets], [[100, 101], [101]])
+        self.assertEqual(len(store), 3)
+
+        with self.assertRaises(ValueError):
+            gc.get_geoms_by_uid([5], 'SPECIAL', path=path)
+
+
+class TestUidIndex(AbstractUToolsTest):
+    def test_get_fids(self):
+        index = UidIndex(np.array([30, 10, 20]), np.array([0, 1, 2]))
+        self.assertEqual(index.get_fids([20, 30]).tolist(), [2, 0])
+        self.assertEqual(index.get_fids([20, 40], strict=False).tolist(), [2])
+        with self.assertRaises(ValueError):
+            index.get_fids([40])
+        with self.assertRaises(ValueError):
+            UidIndex(np.array([1, 1]), np.array([0, 1]))
@@ -1,12 +1,16 @@
+import json
 import os
 
 from osgeo import osr
 from shapely.geometry import MultiPolygon
 from shapely.geometry import Polygon
 
+from utools import env
 from utools.io.core import get_flexible_mesh
+from utools.io.geom_cabinet import GeomCabinetIterator, clear_feature_count_cache, _FEATURE_COUNTS
 from utools.io.geom_manager import GeometryManager
 from utools.io.helpers import convert_collection_to_esmf_format
+from utools.profiler import Sampler, set_uid
 from utools.test.base import AbstractUToolsTest
 
 
@@ -54,6 +58,23 @@ class TestGeomManager(AbstractUToolsTest):
                 break
             self.assertIsInstance(row['geom'], (Polygon, MultiPolygon))
 
+    def test_get_length(self):
+        clear_feature_count_cache()
+        gm = GeometryManager('GRIDCODE', path=self.path_nhd_catchments_texas)
+        desired = len(list(GeomCabinetIterator(path=self.path_nhd_catchments_texas)))
+        self.assertEqual(gm.get_length(), desired)
+        self.assertEqual(len(gm), desired)
+        self.assertEqual(len(_FEATURE_COUNTS), 1)
+
+        # Test a count using a SQL filter is cached separately.
+        gci = GeomCabinetIterator(path=self.path_nhd_catchments_texas, select_sql_where='GRIDCODE < 0')
+        self.assertEqual(len(gci), 0)
+        self.assertEqual(len(_FEATURE_COUNTS), 2)
+
+        # Test slices are not counted from the source.
+        gm = GeometryManager('GRIDCODE', path=self.path_nhd_catchments_texas, slc=[2, 5])
+        self.assertEqual(gm.get_length(), 3)
+
     def test_iter_records(self):
         # Test interior splitting is performed if requested.
         records = [{'geom': self.polygon_with_hole, 'properties': {'GRIDCODE': 81}}]
@@ -61,3 +82,33 @@ class TestGeomManager(AbstractUToolsTest):
         records = list(gm.iter_records())
         self.assertEqual(len(records), 1)
         self.assertEqual(len(records[0]['geom']), 4)
+
+    def test_iter_records_nested(self):
+        # Test nested iteration (e.g. neighbor queries) does not change the profiled feature.
+        records = [{'geom': Polygon([(0, 0), (1, 0), (1, 1)]), 'properties': {'GRIDCODE': ii}} for ii in range(3)]
+        gm = GeometryManager('GRIDCODE', records=records)
+        with Sampler(interval=1.0) as sampler:
+            for uid, record in gm.iter_records(return_uid=True):
+                set_uid(uid)
+                neighbors = [r['properties']['GRIDCODE'] for r in gm.iter_records(select_uid=[0, 1, 2])]
+                self.assertEqual(neighbors, [0, 1, 2])
+                self.assertEqual(sampler.uid, uid)
+
+    def test_iter_records_progress(self):
+        records = [{'geom': Polygon([(0, 0), (1, 0), (1, 1)]), 'properties': {'GRIDCODE': ii}} for ii in range(3)]
+        gm = GeometryManager('GRIDCODE', records=records)
+        env.PROGRESS = 'json'
+        env.PROGRESS_DIR = self.path_current_tmp
+        env.PROGRESS_INTERVAL = 3600.
+        try:
+            for _ in gm.iter_records(progress=True):
+                # Test nested iteration does not report progress.
+                list(gm.iter_records())
+        finally:
+            env.reset()
+        paths = [p for p in os.listdir(self.path_current_tmp) if '-progress-' in p]
+        self.assertEqual(len(paths), 1)
+        with open(os.path.join(self.path_current_tmp, paths[0])) as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['done'], 3)
@@ -0,0 +1,70 @@
+import numpy as np
+from shapely.geometry import box, Polygon, MultiPolygon, Point
+
+from utools.io.geom_metrics import get_face_metrics, get_ring_buffer, get_points_in_faces, \
+    get_face_areas_and_centroids
+from utools.io.helpers import get_interior_coordinates_list
+from utools.test.base import AbstractUToolsTest
+
+
+class TestGeomMetrics(AbstractUToolsTest):
+    def get_ring_arguments(self, geoms):
+        rings = []
+        ring_face = []
+        ring_is_interior = []
+        for ctr, geom in enumerate(geoms):
+            itr = [geom] if isinstance(geom, Polygon) else list(geom)
+            for element in itr:
+                rings.append(np.array(element.exterior.coords)[0:-1, :])
+                ring_face.append(ctr)
+                ring_is_interior.append(False)
+            for interior in get_interior_coordinates_list(geom):
+                rings.append(interior)
+                ring_face.append(ctr)
+                ring_is_interior.append(True)
+        return rings, ring_face, ring_is_interior
+
+    @property
+    def geoms(self):
+        c_shape = Polygon([(0, 0), (3, 0), (3, 1), (1, 1), (1, 2), (3, 2), (3, 3), (0, 3)])
+        multi = MultiPolygon([box(10, 10, 11, 11), box(12, 10, 13, 11)])
+        clockwise = Polygon(list(box(-5, -5, -4, -3).exterior.coords)[::-1])
+        return [box(0, 0, 1, 1), self.polygon_with_hole, c_shape, multi, clockwise]
+
+    def test_get_face_metrics(self):
+        geoms = self.geoms
+        rings, ring_face, ring_is_interior = self.get_ring_arguments(geoms)
+        areas, centers, areas_geodesic = get_face_metrics(rings, ring_face, ring_is_interior, len(geoms))
+
+        self.assertIsNone(areas_geodesic)
+        self.assertNumpyAllClose(areas, np.array([g.area for g in geoms]))
+
+        for idx, geom in enumerate(geoms):
+            self.assertTrue(geom.contains(Point(centers[idx])))
+            # Convex faces use the centroid.
+            if idx in (0, 1, 4):
+                self.assertNumpyAllClose(centers[idx], np.array(geom.centroid))
+
+    def test_get_face_metrics_geodesic(self):
+        # A one degree cell at the equator on the WGS84 ellipsoid. The desired value is from the closed-form zone area.
+        geoms = [box(0, 0, 1, 1), box(0, 60, 1, 61)]
+        rings, ring_face, ring_is_interior = self.get_ring_arguments(geoms)
+        _, _, areas_geodesic = get_face_metrics(rings, ring_face, ring_is_interior, len(geoms), geodesic_area=True)
+        self.assertAlmostEqual(areas_geodesic[0] / 12308463893.975204, 1.0, places=8)
+        self.assertLess(areas_geodesic[1], areas_geodesic[0])
+
+    def test_get_face_areas_and_centroids_closed_rings(self):
+        # Repeating the first coordinate does not change the results.
+        geoms = self.geoms
+        rings = [np.array(g.exterior.coords) for g in [geoms[0], geoms[2]]]
+        coordinates, ring_starts = get_ring_buffer(rings)
+        areas, centroids = get_face_areas_and_centroids(coordinates, ring_starts, np.array([0, 1]), 2)
+        self.assertNumpyAllClose(areas, np.array([geoms[0].area, geoms[2].area]))
+        self.assertNumpyAllClose(centroids[1], np.array(geoms[2].centroid))
+
+    def test_get_points_in_faces(self):
+        rings, ring_face, _ = self.get_ring_arguments([box(0, 0, 1, 1), box(5, 5, 6, 6)])
+        coordinates, ring_starts = get_ring_buffer(rings)
+        points = np.array([[0.5, 0.5], [0.5, 0.5]])
+        actual = get_points_in_faces(points, coordinates, ring_starts, np.array(ring_face))
+        self.assertEqual(actual.tolist(), [True, False])
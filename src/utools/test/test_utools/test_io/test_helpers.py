@@ -0,0 +1,72 @@
+import os
+from collections import namedtuple
+
+import fiona
+import netCDF4 as nc
+import numpy as np
+from shapely.geometry import shape, Polygon, MultiPolygon
+
+from utools.constants import UgridToolsConstants
+from utools.io.helpers import iter_records, flexible_mesh_to_fiona, get_face_ragged_arrays, get_split_array
+from utools.test.base import AbstractUToolsTest
+
+Variable = namedtuple('Variable', ['name', 'data'])
+
+
+class TestIterRecords(AbstractUToolsTest):
+    def get_esmf_faces(self):
+        with nc.Dataset(os.path.join(self.path_bin, 'test_esmf_format.nc')) as ds:
+            element_conn = ds.variables['elementConn'][:]
+            num_element_conn = ds.variables['numElementConn'][:]
+            nodes = ds.variables['nodeCoords'][:]
+            uid = ds.variables['GRIDCODE'][:]
+        faces = np.array(np.split(element_conn, np.cumsum(num_element_conn)[:-1]), dtype=object)
+        return faces, nodes, Variable('GRIDCODE', uid)
+
+    def test_get_face_ragged_arrays(self):
+        face_nodes = np.ma.array([[0, 1, 2, -8, 3, 4, 5], [6, 7, 8, 9, 0, 0, 0]],
+                                 mask=[[0, 0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 1, 1, 1]])
+        node_x = np.arange(10, dtype=float)
+        coordinates, ring_offsets, geometry_offsets = get_face_ragged_arrays(face_nodes, node_x, node_x * 2,
+                                                                             np.array([0, 1]), polygon_break_value=-8)
+        self.assertEqual(ring_offsets.tolist(), [0, 4, 8, 13])
+        self.assertEqual(geometry_offsets.tolist(), [0, 2, 3])
+        self.assertEqual(coordinates[:, 0].tolist(), [0, 1, 2, 0, 3, 4, 5, 3, 6, 7, 8, 9, 6])
+        self.assertNumpyAll(coordinates[:, 1], coordinates[:, 0] * 2)
+
+    def test_iter_records(self):
+        faces, nodes, _ = self.get_esmf_faces()
+        break_value = UgridToolsConstants.POLYGON_BREAK_VALUE
+        indices_to_load = [9, 0, 21]
+        for shapely_only in [False, True]:
+            records = list(iter_records(faces, nodes[:, 0], nodes[:, 1], polygon_break_value=break_value,
+                                        indices_to_load=indices_to_load, shapely_only=shapely_only, batch_size=2))
+            self.assertEqual([r['id'] for r in records], indices_to_load)
+            for record in records:
+                parts = get_split_array(faces[record['id']], break_value)
+                desired = [Polygon(nodes[p]) for p in parts]
+                if len(desired) == 1:
+                    desired = desired[0]
+                else:
+                    desired = MultiPolygon(desired)
+                if shapely_only:
+                    actual = record['geom']
+                else:
+                    actual = shape(record['geometry'])
+                self.assertEqual(actual.geom_type, desired.geom_type)
+                self.assertTrue(actual.equals(desired))
+
+    def test_flexible_mesh_to_fiona(self):
+        faces, nodes, uid = self.get_esmf_faces()
+        path = self.get_temporary_file_path('out.shp')
+        flexible_mesh_to_fiona(path, faces, nodes[:, 0], nodes[:, 1], face_uid=uid, batch_size=10)
+        with fiona.open(path) as source:
+            records = list(source)
+        self.assertEqual(len(records), faces.shape[0])
+        self.assertEqual([r['properties']['GRIDCODE'] for r in records], uid.data.tolist())
+
+        # Test without a unique identifier.
+        path = self.get_temporary_file_path('out_no_uid.shp')
+        flexible_mesh_to_fiona(path, faces, nodes[:, 0], nodes[:, 1], indices_to_load=[1, 2])
+        with fiona.open(path) as source:
+            self.assertEqual(len(source), 2)
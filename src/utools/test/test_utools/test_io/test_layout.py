@@ -0,0 +1,54 @@
+import netCDF4 as nc
+import numpy as np
+
+from utools.io.layout import get_layout, OutputLayout, LAYOUTS
+from utools.test.base import AbstractUToolsTest
+
+
+class TestOutputLayout(AbstractUToolsTest):
+    def create_dataset(self, layout):
+        path = self.get_temporary_file_path('{}.nc'.format(layout.name))
+        ds = nc.Dataset(path, 'w', **layout.get_dataset_kwargs())
+        ds.createDimension('nodeCount', 10)
+        ds.createDimension('coordDim', 2)
+        ds.createDimension('connectionCount', None)
+        node_coords = layout.create_variable(ds, 'nodeCoords', np.float64, ('nodeCount', 'coordDim'))
+        node_coords[:] = np.arange(20, dtype=float).reshape(10, 2)
+        element_conn = layout.create_variable(ds, 'elementConn', np.int32, ('connectionCount',))
+        element_conn[0:5] = np.arange(5)
+        return ds
+
+    def test_create_variable(self):
+        ds = self.create_dataset(get_layout('quantized'))
+        try:
+            node_coords = ds.variables['nodeCoords']
+            self.assertEqual(node_coords.dtype, np.float32)
+            self.assertEqual(node_coords.chunking(), [10, 2])
+            self.assertTrue(node_coords.filters()['zlib'])
+            self.assertTrue(node_coords.filters()['shuffle'])
+            self.assertEqual(ds.variables['elementConn'].dtype, np.int32)
+        finally:
+            ds.close()
+
+        ds = self.create_dataset(get_layout('contiguous'))
+        try:
+            self.assertEqual(ds.variables['nodeCoords'].chunking(), 'contiguous')
+            self.assertEqual(ds.variables['nodeCoords'].dtype, np.float64)
+            # Unlimited dimensions require chunking.
+            self.assertEqual(ds.variables['elementConn'].chunking(), [LAYOUTS['contiguous'].chunk_length])
+            self.assertFalse(ds.variables['elementConn'].filters()['zlib'])
+        finally:
+            ds.close()
+
+    def test_get_dataset_kwargs(self):
+        self.assertEqual(get_layout(None).get_dataset_kwargs(), {})
+        self.assertEqual(get_layout('chunked').get_dataset_kwargs(), {'format': 'NETCDF4'})
+        self.assertEqual(get_layout('chunked').get_dataset_kwargs({'format': 'NETCDF4_CLASSIC'}),
+                         {'format': 'NETCDF4_CLASSIC'})
+
+    def test_get_layout(self):
+        layout = OutputLayout('custom', file_format='NETCDF4', chunk_length=5)
+        self.assertIs(get_layout(layout), layout)
+        self.assertIs(get_layout('default'), LAYOUTS['default'])
+        with self.assertRaises(ValueError):
+            get_layout('unknown')
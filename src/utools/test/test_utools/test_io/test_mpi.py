@@ -0,0 +1,53 @@
+import numpy as np
+
+from utools.io.mpi import MPI_RANK, MPI_SIZE, get_displacements, get_global_offset, gatherv_array, \
+    allgatherv_array, scatterv_array, gatherv_csr, create_sections
+from utools.test.base import AbstractUToolsTest, attr
+
+
+class TestCollectives(AbstractUToolsTest):
+    def test_get_displacements(self):
+        self.assertEqual(get_displacements([3, 0, 2]).tolist(), [0, 3, 3])
+
+    @attr('mpi')
+    def test_get_global_offset(self):
+        actual = get_global_offset(MPI_RANK + 1)
+        self.assertEqual(actual, sum(range(1, MPI_RANK + 1)))
+
+    @attr('mpi')
+    def test_gatherv_array(self):
+        # Rank sizes differ and the last rank may be empty.
+        n = MPI_RANK if MPI_RANK < MPI_SIZE - 1 or MPI_SIZE == 1 else 0
+        local = np.arange(n * 2, dtype=np.float64).reshape(n, 2) + MPI_RANK * 100
+        desired = [np.arange(r * 2, dtype=np.float64).reshape(r, 2) + r * 100 for r in range(MPI_SIZE)]
+        if MPI_SIZE > 1:
+            desired[-1] = desired[-1][0:0]
+        desired = np.vstack(desired)
+
+        actual = gatherv_array(local)
+        if MPI_RANK == 0:
+            self.assertNumpyAll(actual, desired)
+        else:
+            self.assertIsNone(actual)
+        self.assertNumpyAll(allgatherv_array(local), desired)
+
+    @attr('mpi')
+    def test_scatterv_array(self):
+        arr = np.arange(30, dtype=np.int32).reshape(10, 3) if MPI_RANK == 0 else None
+        actual = scatterv_array(arr)
+        start, stop = create_sections(10)[MPI_RANK]
+        self.assertNumpyAll(actual, np.arange(30, dtype=np.int32).reshape(10, 3)[start:stop])
+
+    @attr('mpi')
+    def test_gatherv_csr(self):
+        values = np.array([MPI_RANK] * (MPI_RANK + 2), dtype=np.int32)
+        offsets = np.array([0, 1, MPI_RANK + 2])
+        actual = gatherv_csr(values, offsets)
+        if MPI_RANK == 0:
+            values, offsets = actual
+            self.assertEqual(offsets.shape[0], MPI_SIZE * 2 + 1)
+            for rank in range(MPI_SIZE):
+                row = values[offsets[rank * 2 + 1]:offsets[rank * 2 + 2]]
+                self.assertEqual(row.tolist(), [rank] * (rank + 1))
+        else:
+            self.assertIsNone(actual)
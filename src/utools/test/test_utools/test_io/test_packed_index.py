@@ -0,0 +1,36 @@
+import numpy as np
+
+from utools.io.packed_index import PackedIndex, get_hilbert_codes
+from utools.test.base import AbstractUToolsTest
+
+
+class TestPackedIndex(AbstractUToolsTest):
+    def test_get_hilbert_codes(self):
+        x, y = np.meshgrid(np.arange(4), np.arange(4))
+        codes = get_hilbert_codes(x.ravel(), y.ravel(), order=2)
+        self.assertEqual(sorted(codes.tolist()), range(16))
+        # Consecutive cells along the curve are adjacent.
+        order = np.argsort(codes)
+        steps = np.abs(np.diff(x.ravel()[order])) + np.abs(np.diff(y.ravel()[order]))
+        self.assertTrue(np.all(steps == 1))
+
+    def test_query(self):
+        rs = np.random.RandomState(1)
+        mins = rs.uniform(0, 100, size=(1000, 2))
+        bounds = np.hstack([mins, mins + rs.uniform(0, 5, size=(1000, 2))])
+        index = PackedIndex(bounds, node_size=4)
+        self.assertEqual(len(index), 1000)
+        self.assertNumpyAllClose(np.array(index.bounds), np.hstack([bounds[:, :2].min(axis=0),
+                                                                    bounds[:, 2:].max(axis=0)]))
+
+        for bbox in [(10, 10, 20, 30), (-5, -5, 0, 0), (200, 200, 300, 300), tuple(bounds[7])]:
+            desired = np.where((bounds[:, 0] <= bbox[2]) & (bounds[:, 2] >= bbox[0]) & (bounds[:, 1] <= bbox[3]) &
+                               (bounds[:, 3] >= bbox[1]))[0]
+            self.assertEqual(index.query(bbox).tolist(), desired.tolist())
+
+    def test_query_empty(self):
+        index = PackedIndex(np.zeros((0, 4)))
+        self.assertIsNone(index.bounds)
+        self.assertEqual(index.query((0, 0, 1, 1)).tolist(), [])
+        index = PackedIndex([[0, 0, 1, 1]])
+        self.assertEqual(index.query((1, 1, 2, 2)).tolist(), [0])
@@ -1,7 +1,11 @@
 import os
+from StringIO import StringIO
 
-from utools import env
-from utools.logging import log
+from logbook import Logger
+
+from utools.instrument import phase, PhaseRecorder
+from utools.io.mpi import MPI_COMM, MPI_RANK, MPI_SIZE
+from utools.logging import log, formatter, BufferedHandler, RankAggregatingHandler
 from utools.test.base import AbstractUToolsTest, attr
 
 
@@ -16,3 +20,106 @@ class Test(AbstractUToolsTest):
             log.exception('test log exception')
 
         log.info('test passed')
+
+    def test_buffered_handler(self):
+        stream = StringIO()
+        handler = BufferedHandler(stream, flush_interval=60., capacity=3)
+        handler.formatter = formatter
+        logger = Logger('test')
+        logger.handlers.append(handler)
+        try:
+            logger.info('first={}', 1)
+            logger.debug('second')
+            # Records are buffered until the writer thread or a full buffer flushes them.
+            self.assertEqual(stream.getvalue(), '')
+            logger.info('third')
+            lines = stream.getvalue().splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertIn('INFO (rank={}'.format(MPI_RANK), lines[0])
+            self.assertTrue(lines[0].endswith(': first=1'))
+
+            logger.warn('fourth')
+            handler.close()
+            self.assertTrue(stream.getvalue().splitlines()[-1].endswith('fourth'))
+        finally:
+            handler.close()
+
+    def test_buffered_handler_filtered(self):
+        class Unformattable(object):
+            def __format__(self, spec):
+                raise AssertionError('formatted a filtered record')
+
+        stream = StringIO()
+        handler = BufferedHandler(stream, flush_interval=60.)
+        logger = Logger('test', level='INFO')
+        logger.handlers.append(handler)
+        logger.debug('value={}', Unformattable())
+        handler.close()
+        self.assertEqual(stream.getvalue(), '')
+
+    @attr('mpi')
+    def test_rank_aggregating_handler(self):
+        directory = MPI_COMM.bcast(self.path_current_tmp, root=0)
+        path = os.path.join(directory, 'aggregated.log')
+        path_rank = os.path.join(directory, 'rank-{}.log'.format(MPI_RANK))
+        handler = RankAggregatingHandler(path, path_rank, mode='w')
+        handler.formatter = formatter
+        logger = Logger('test')
+        logger.handlers.append(handler)
+
+        for ii in range(2):
+            logger.info('rank={}, index={}', MPI_RANK, ii)
+            handler.gather()
+        logger.info('not gathered')
+        handler.close()
+        MPI_COMM.Barrier()
+
+        if MPI_RANK == 0:
+            with open(path) as f:
+                lines = f.read().splitlines()
+            desired = ['rank={}, index={}'.format(rank, ii) for ii in range(2) for rank in range(MPI_SIZE)]
+            self.assertEqual([l.split(': ')[-1] for l in lines], desired)
+        with open(path_rank) as f:
+            self.assertTrue(f.read().strip().endswith('not gathered'))
+        self.assertEqual(handler.records, [])
+        MPI_COMM.Barrier()
+
+    def test_rank_aggregating_handler_capacity(self):
+        path = os.path.join(self.path_current_tmp, 'aggregated.log')
+        path_rank = os.path.join(self.path_current_tmp, 'rank.log')
+        handler = RankAggregatingHandler(path, path_rank, mode='w', capacity=2)
+        logger = Logger('test')
+        logger.handlers.append(handler)
+        for ii in range(3):
+            logger.info('index={}', ii)
+        # Records exceeding the capacity are written to the per-rank file.
+        self.assertEqual(len(handler.records), 1)
+        with open(path_rank) as f:
+            self.assertEqual(len(f.read().splitlines()), 2)
+        handler.close()
+        self.assertFalse(os.path.exists(path))
+
+    @attr('mpi')
+    def test_rank_aggregating_handler_phase(self):
+        directory = MPI_COMM.bcast(self.path_current_tmp, root=0)
+        path = os.path.join(directory, 'aggregated-phase.log')
+        path_rank = os.path.join(directory, 'rank-phase-{}.log'.format(MPI_RANK))
+        handler = RankAggregatingHandler(path, path_rank, mode='w')
+        logger = Logger('test')
+        logger.handlers.append(handler)
+        log.handlers.append(handler)
+        try:
+            # Test records are gathered on exit from a collective phase.
+            with phase('read', recorder=PhaseRecorder(), comm=MPI_COMM):
+                logger.info('rank={}', MPI_RANK)
+            self.assertEqual(handler.records, [])
+        finally:
+            log.handlers.remove(handler)
+            handler.close()
+        MPI_COMM.Barrier()
+
+        if MPI_RANK == 0:
+            with open(path) as f:
+                self.assertEqual(len(f.read().splitlines()), MPI_SIZE)
+        self.assertFalse(os.path.exists(path_rank))
+        MPI_COMM.Barrier()
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+import numpy as np
+from nose.plugins.skip import SkipTest
+
+from utools.cost_model import CostModel
+from utools.prep.job_preparation import get_wall_time, order_jobs, assign_jobs, get_jobs_from_results
+from utools.test.base import AbstractUToolsTest
+
+
+class TestJobPreparation(AbstractUToolsTest):
+    def test_get_wall_time(self):
+        self.assertEqual(get_wall_time(3.), '00:06')
+        self.assertEqual(get_wall_time(50.), '00:53')
+        self.assertEqual(get_wall_time(62.), '01:05')
+
+    def test_order_jobs(self):
+        model = CostModel(coefficients={'weights': (1., 1e-8, 2.5)})
+        jobs = {'small': ([100.] * 10, None), 'large': ([20000.], None), 'medium': ([5000.] * 3, None)}
+        actual = order_jobs(jobs, model)
+        self.assertEqual([a[0] for a in actual], ['large', 'medium', 'small'])
+        self.assertAlmostEqual(actual[-1][1], 10 * (1. + 1e-8 * 100 ** 2.5))
+
+        split = order_jobs(jobs, model, node_threshold=2000)
+        self.assertLess(dict(split)['large'], dict(actual)['large'])
+
+    def test_assign_jobs(self):
+        predictions = [('a', 2.), ('b', 7.), ('c', 4.), ('d', 5.), ('e', 3.)]
+        assignments, loads = assign_jobs(predictions, 2)
+        self.assertEqual(assignments, [['b', 'e'], ['d', 'c', 'a']])
+        self.assertEqual(loads, [10., 11.])
+
+    def test_get_jobs_from_results(self):
+        try:
+            from utools.analysis import results
+        except ImportError:
+            raise SkipTest('SQLAlchemy is not installed.')
+
+        engine = results.connect(self.get_temporary_file_path('results.sqlite'))
+        try:
+            for vpu_name, node_counts in [('03N', [100, 200]), ('03S', [20000])]:
+                statistics = OrderedDict([('gridcode', np.arange(len(node_counts))),
+                                          ('node_count', np.array(node_counts))])
+                for key in ['hole_count', 'part_count', 'area']:
+                    statistics[key] = np.ones(len(node_counts))
+                results.add_catchments(vpu_name, statistics, bind=engine)
+            jobs = get_jobs_from_results(bind=engine)
+        finally:
+            engine.dispose()
+        self.assertEqual(jobs['03N'][0].tolist(), [100, 200])
+        model = CostModel(coefficients={'weights': (1., 1e-8, 2.5)})
+        self.assertEqual([j[0] for j in order_jobs(jobs, model)], ['03S', '03N'])
@@ -38,6 +38,31 @@ class Test(AbstractUToolsTest):
                 self.assertEqual(len(ds.variables[name_uid]), len(GeometryManager(name_uid, path=self.path_in_shp)))
                 # shutil.copy2(path_out_nc, '/tmp/my.nc')
 
+    @attr('mpi')
+    def test_convert_to_esmf_format_stream(self):
+        name_uid = 'GRIDCODE'
+        if MPI_RANK == 0:
+            path_out_nc = self.get_temporary_file_path('out.nc')
+            path_out_nc_stream = self.get_temporary_file_path('out_stream.nc')
+        else:
+            path_out_nc = None
+            path_out_nc_stream = None
+        path_out_nc = MPI_COMM.bcast(path_out_nc)
+        path_out_nc_stream = MPI_COMM.bcast(path_out_nc_stream)
+
+        convert_to_esmf_format(path_out_nc, self.path_in_shp, name_uid)
+        convert_to_esmf_format(path_out_nc_stream, self.path_in_shp, name_uid, stream=True, batch_size=5)
+
+        if MPI_RANK == 0:
+            with self.nc_scope(path_out_nc) as desired:
+                with self.nc_scope(path_out_nc_stream) as actual:
+                    self.assertEqual(actual.file_format, 'NETCDF4')
+                    for name in ['nodeCoords', 'elementConn', 'numElementConn', 'centerCoords', name_uid,
+                                 'elementArea']:
+                        self.assertNumpyAllClose(np.asarray(actual.variables[name][:]),
+                                                 np.asarray(desired.variables[name][:]))
+        MPI_COMM.Barrier()
+
     @attr('mpi')
     def test_convert_to_esmf_format_node_threshold(self):
         """Test conversion with a node threshold for the elements."""
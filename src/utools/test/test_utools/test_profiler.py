@@ -0,0 +1,55 @@
+import json
+
+from utools.instrument import phase, PhaseRecorder, get_current_phase
+from utools.io.mpi import MPI_RANK
+from utools.profiler import Sampler, set_uid, get_sampler, NO_PHASE
+from utools.test.base import AbstractUToolsTest
+
+
+def busy(n):
+    ret = 0
+    for ii in xrange(n):
+        ret += ii % 7
+    return ret
+
+
+class TestSampler(AbstractUToolsTest):
+    def test(self):
+        recorder = PhaseRecorder()
+        self.assertIsNone(get_sampler())
+        with Sampler(interval=0.001) as sampler:
+            self.assertIs(get_sampler(), sampler)
+            with phase('split', recorder=recorder):
+                self.assertEqual(get_current_phase(), 'split')
+                set_uid(10)
+                busy(200000)
+                set_uid(20)
+                busy(600000)
+            self.assertIsNone(get_current_phase())
+            set_uid(None)
+            busy(200000)
+        self.assertIsNone(get_sampler())
+        self.assertFalse(sampler.is_running)
+
+        self.assertEqual(sampler.get_phases(), sorted(['split', NO_PHASE]))
+        uid_counts = sampler.get_uid_counts()
+        self.assertEqual(uid_counts.keys(), [20, 10])
+
+        collapsed = sampler.get_collapsed(phase='split', uid=20)
+        hottest = max(collapsed.items(), key=lambda x: x[1])[0]
+        self.assertTrue(hottest.split(';')[-1].startswith('busy:test_profiler.py'))
+        self.assertEqual(sum(sampler.get_collapsed(uid=20).values()), uid_counts[20])
+
+        paths = sampler.dump(directory=self.path_current_tmp)
+        self.assertEqual(len(paths), 3)
+        self.assertTrue(paths[-1].endswith('-profile-uids-rank-{}.json'.format(MPI_RANK)))
+        with open(paths[-1]) as f:
+            self.assertEqual([u['uid'] for u in json.load(f)['uids']], [20, 10])
+        with open([p for p in paths if '-split-' in p][0]) as f:
+            lines = f.readlines()
+        self.assertEqual(sum([int(line.rsplit(' ', 1)[1]) for line in lines]),
+                         sum(sampler.get_collapsed(phase='split').values()))
+
+    def test_set_uid_without_sampler(self):
+        set_uid(1)
+        self.assertIsNone(get_sampler())
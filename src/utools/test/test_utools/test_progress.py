@@ -0,0 +1,100 @@
+import json
+import os
+from StringIO import StringIO
+
+from utools import env
+from utools.io.mpi import MPI_COMM, MPI_RANK, MPI_SIZE
+from utools.progress import Progress, StderrSink, JSONSink, get_progress, format_event
+from utools.test.base import AbstractUToolsTest, attr
+
+
+class ListSink(object):
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+class TestProgress(AbstractUToolsTest):
+    def test(self):
+        sink = ListSink()
+        progress = Progress('records', total=4, work_unit='nodes', interval=0., sink=sink)
+        for _ in range(4):
+            progress.update(work=10)
+        progress.close()
+        progress.close()
+
+        self.assertEqual(len(sink.events), 5)
+        self.assertEqual([e['done'] for e in sink.events], [1, 2, 3, 4, 4])
+        final = sink.events[-1]
+        self.assertTrue(final['final'])
+        self.assertEqual(final['total'], 4)
+        self.assertEqual(final['fraction'], 1.)
+        self.assertEqual(final['work'], 40)
+        self.assertEqual(final['eta'], 0.)
+        self.assertEqual(final['lag'], 0.)
+        self.assertEqual(final['rank'], MPI_RANK)
+        self.assertTrue(sink.events[1]['eta'] >= 0.)
+
+    def test_interval(self):
+        sink = ListSink()
+        progress = Progress('records', interval=3600., sink=sink)
+        for _ in range(100):
+            progress.update()
+        self.assertEqual(sink.events, [])
+        progress.close()
+        self.assertEqual(len(sink.events), 1)
+        self.assertIsNone(sink.events[0]['total'])
+        self.assertIsNone(sink.events[0]['eta'])
+
+    def test_get_progress(self):
+        self.assertIsNone(get_progress('records'))
+        env.PROGRESS = 'log'
+        try:
+            self.assertIsInstance(get_progress('records'), Progress)
+            env.PROGRESS = 'unknown'
+            with self.assertRaises(ValueError):
+                get_progress('records')
+        finally:
+            env.reset()
+
+    def test_sinks(self):
+        stream = StringIO()
+        progress = Progress('apply', total=2, unit='nonzeros', interval=0., sink=StderrSink(stream))
+        progress.update(count=2)
+        progress.close()
+        lines = stream.getvalue().split('\r')
+        self.assertTrue(lines[-1].startswith('[{}] apply: 2/2 nonzeros (100.0%)'.format('#' * 30)))
+        self.assertTrue(lines[-1].endswith('\n'))
+
+        path = os.path.join(self.path_current_tmp, 'progress.jsonl')
+        progress = Progress('merge', total=1, unit='files', sink=JSONSink(path))
+        progress.update()
+        progress.close()
+        with open(path) as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['name'], 'merge')
+        self.assertIn('merge: 1/1 files', format_event(events[0]))
+
+    @attr('mpi')
+    def test_reduce(self):
+        sink = ListSink()
+        total = MPI_RANK + 1
+        progress = Progress('records', total=total, comm=MPI_COMM, interval=0., sink=sink)
+        for _ in range(total):
+            progress.update()
+        progress.close()
+
+        if MPI_RANK == 0:
+            final = sink.events[-1]
+            self.assertEqual(final['ranks'], MPI_SIZE)
+            self.assertEqual(final['done'], sum(range(1, MPI_SIZE + 1)))
+            self.assertEqual(final['total'], final['done'])
+            self.assertEqual(final['lag'], 0.)
+            if MPI_SIZE > 1:
+                self.assertIsNone(final['rank'])
+        else:
+            self.assertEqual(sink.events, [])
+        MPI_COMM.Barrier()
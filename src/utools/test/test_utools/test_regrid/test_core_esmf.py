@@ -7,7 +7,8 @@ from utools import env
 from utools.io.mpi import MPI_RANK, MPI_COMM
 from utools.prep.create_netcdf_data import create_source_netcdf_data, get_exact_field
 from utools.prep.prep_shapefiles import convert_to_esmf_format
-from utools.regrid.core_esmf import create_weights_file, create_weighted_output, validate_weighted_output
+from utools.regrid.core_esmf import create_weights_file, create_weighted_output, validate_weighted_output, \
+    get_weights_block, search_sorted_variable, get_contiguous_blocks, get_output_chunksizes, apply_weights
 from utools.test.base import AbstractUToolsTest, attr
 
 
@@ -49,6 +50,75 @@ class Test(AbstractUToolsTest):
 
         MPI_COMM.Barrier()
 
+    @attr('mpi')
+    def test_create_weighted_output_partitioned(self):
+        path_esmf_format = os.path.join(self.path_bin, 'test_esmf_format.nc')
+        path_weights_nc = os.path.join(self.path_bin, 'test_weights.nc')
+
+        if MPI_RANK == 0:
+            path_src = self.get_temporary_file_path('exact.nc')
+            row = np.arange(32.0012, 32.4288 + 0.01, 0.01)
+            col = np.arange(-95.0477, -94.7965 + 0.01, 0.01)
+            ttime = np.array([100, 200, 300], dtype=np.float32)
+            create_source_netcdf_data(path_src, col, row, ttime)
+            paths = [self.get_temporary_file_path(fn) for fn in ['desired.nc', 'actual.nc', 'actual_threads.nc']]
+        else:
+            path_src = None
+            paths = None
+        path_src = MPI_COMM.bcast(path_src)
+        paths = MPI_COMM.bcast(paths)
+
+        create_weighted_output(path_esmf_format, path_src, path_weights_nc, paths[0], 'exact')
+        create_weighted_output(path_esmf_format, path_src, path_weights_nc, paths[1], 'exact', partitioned=True,
+                               time_batch_size=2)
+        create_weighted_output(path_esmf_format, path_src, path_weights_nc, paths[2], 'exact', time_batch_size=1,
+                               threads=3)
+
+        if MPI_RANK == 0:
+            with self.nc_scope(paths[0]) as desired:
+                for path in paths[1:]:
+                    with self.nc_scope(path) as actual:
+                        self.assertNumpyAllClose(np.asarray(actual.variables['exact'][:]),
+                                                 np.asarray(desired.variables['exact'][:]))
+        MPI_COMM.Barrier()
+
+    def test_apply_weights(self):
+        values = np.arange(8, dtype=float).reshape(2, 4)
+        idx_src = np.array([0, 1, 3, 2])
+        S = np.array([0.5, 0.5, 1.0, 0.25])
+        idx_dst = np.array([0, 0, 2, 3])
+        starts = np.array([0, 2, 3])
+        out = np.zeros((2, 4))
+        apply_weights(values, idx_src, S, idx_dst, starts, out, [1, 3])
+        self.assertEqual(out.tolist(), [[0., 0., 3., 0.5], [0., 0., 7., 1.5]])
+        apply_weights(values, idx_src, S, idx_dst, starts, out, [0, 1])
+        self.assertEqual(out[:, 0].tolist(), [0.5, 4.5])
+
+    def test_get_contiguous_blocks(self):
+        value = np.arange(12).reshape(2, 6)
+        blocks = [([4, 6], value[:, 4:6]), ([0, 2], value[:, 0:2]), ([2, 3], value[:, 2:3]), ([6, 6], value[:, 6:6])]
+        actual = get_contiguous_blocks(blocks)
+        self.assertEqual([(a[0], a[1]) for a in actual], [(0, 3), (4, 6)])
+        self.assertNumpyAll(actual[0][2], value[:, 0:3])
+        self.assertNumpyAll(actual[1][2], value[:, 4:6])
+
+    def test_get_output_chunksizes(self):
+        self.assertEqual(get_output_chunksizes(10, 43, size=4, chunk_values=30), (2, 11))
+        self.assertEqual(get_output_chunksizes(3, 43, size=1, chunk_values=1000), (3, 43))
+        self.assertEqual(get_output_chunksizes(3, 100, size=1, chunk_values=10), (1, 100))
+
+    def test_get_weights_block(self):
+        path_weights_nc = os.path.join(self.path_bin, 'test_weights.nc')
+        with self.nc_scope(path_weights_nc) as ds:
+            row = ds.variables['row'][:]
+            self.assertEqual(search_sorted_variable(ds.variables['row'], 5, chunk_size=7),
+                             np.searchsorted(row, 5))
+            desired = np.where((row >= 11) & (row < 21))[0]
+            for sorted_rows in [True, False]:
+                actual = get_weights_block(ds, [10, 20], sorted_rows=sorted_rows, chunk_size=100)
+                self.assertNumpyAll(actual[0], row[desired])
+                self.assertNumpyAll(actual[1], ds.variables['col'][desired])
+
     def test_weighted_output(self):
         path_in_shp = os.path.join(self.path_bin, 'nhd_catchments_texas', 'nhd_catchments_texas.shp')
         name_uid = 'GRIDCODE'
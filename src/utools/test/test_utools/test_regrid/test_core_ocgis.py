@@ -1,9 +1,10 @@
 import os
 from unittest import SkipTest
 
+import fiona
 import numpy as np
 
-from utools.regrid.core_ocgis import create_merged_weights
+from utools.regrid.core_ocgis import create_merged_weights, create_linked_shapefile
 from utools.test.base import AbstractUToolsTest
 
 
@@ -30,3 +31,49 @@ class Test(AbstractUToolsTest):
             self.assertTrue(np.all(ds.variables['row'][:] < 87))
             # The maximum index should be greater than the element count in the original file.
             self.assertTrue(np.any(ds.variables['row'][:] > 43))
+
+    def test_create_linked_shapefile(self):
+        path_in_shp = os.path.join(self.path_bin, 'three_polygons', 'three_polygons.shp')
+        path_output_data = self.get_temporary_file_path('weighted.nc')
+        with self.nc_scope(path_output_data, 'w') as ds:
+            ds.createDimension('time')
+            ds.createDimension('elementCount', 3)
+            uid = ds.createVariable('SPECIAL', int, dimensions=('elementCount',))
+            # Element order differs from the shapefile record order.
+            uid[:] = [102, 100, 101]
+            pr = ds.createVariable('pr', float, dimensions=('time', 'elementCount'))
+            pr[:] = [[2., 0., 1.], [12., 10., 11.]]
+            tas = ds.createVariable('tas', float, dimensions=('time', 'elementCount'))
+            tas[:] = [[-2., 0., -1.], [-12., -10., -11.]]
+
+        path_linked_shp = self.get_temporary_file_path('linked.shp')
+        create_linked_shapefile('SPECIAL', 'pr', path_in_shp, path_linked_shp, path_output_data)
+        with fiona.open(path_linked_shp) as source:
+            actual = [r['properties']['pr'] for r in source]
+        self.assertEqual(actual, [0., 1., 2.])
+
+        path_linked_shp = self.get_temporary_file_path('linked_times.shp')
+        create_linked_shapefile('SPECIAL', ['pr', 'tas'], path_in_shp, path_linked_shp, path_output_data,
+                                time_indices=[0, 1], batch_size=2)
+        with fiona.open(path_linked_shp) as source:
+            records = [r['properties'] for r in source]
+        self.assertEqual([r['pr_1'] for r in records], [10., 11., 12.])
+        self.assertEqual([r['tas_0'] for r in records], [0., -1., -2.])
+
+        # Test a shapefile unique identifier missing from the output.
+        with self.nc_scope(path_output_data, 'a') as ds:
+            ds.variables['SPECIAL'][0] = 103
+        with self.assertRaises(ValueError):
+            create_linked_shapefile('SPECIAL', 'pr', path_in_shp, self.get_temporary_file_path('bad.shp'),
+                                    path_output_data)
+
+        # Test a weighted output without elements.
+        path_output_data = self.get_temporary_file_path('weighted_empty.nc')
+        with self.nc_scope(path_output_data, 'w') as ds:
+            ds.createDimension('time', 1)
+            ds.createDimension('elementCount', 0)
+            ds.createVariable('SPECIAL', int, dimensions=('elementCount',))
+            ds.createVariable('pr', float, dimensions=('time', 'elementCount'))
+        with self.assertRaises(ValueError):
+            create_linked_shapefile('SPECIAL', 'pr', path_in_shp, self.get_temporary_file_path('empty.shp'),
+                                    path_output_data)
@@ -1,10 +1,14 @@
+import json
+import os
 import traceback
 from ConfigParser import SafeConfigParser
 
 from click.testing import CliRunner
 
-from utools.test.base import AbstractUToolsTest
-from utools_cli import convert
+from utools.benchmarks import suite
+from utools.io.mpi import MPI_COMM, MPI_RANK
+from utools.test.base import AbstractUToolsTest, attr
+from utools_cli import utools_cli, convert, subset
 
 
 class Test(AbstractUToolsTest):
@@ -44,3 +48,39 @@ class Test(AbstractUToolsTest):
                 # Test coordinates are no longer spherical lat/lon, but have a converted coordinate system.
                 actual_coords = actual.variables['nodeCoords'][:]
                 self.assertGreater(actual_coords.mean(), 360.)
+
+    def test_subset(self):
+        source = os.path.join(self.path_bin, 'test_esmf_format.nc')
+        out_file = self.get_temporary_file_path('subset.nc')
+        with self.nc_scope(source) as ds:
+            uids = ds.variables['GRIDCODE'][[0, 5]].tolist()
+
+        runner = CliRunner()
+        cli_args = ['-e', source, '-o', out_file, '--uid', ','.join([str(u) for u in uids]), '-u', 'GRIDCODE']
+        result = runner.invoke(subset, cli_args)
+        self.assertEqual(result.exit_code, 0)
+        with self.nc_scope(out_file) as actual:
+            self.assertEqual(actual.variables['GRIDCODE'][:].tolist(), uids)
+
+    @attr('mpi')
+    def test_bench_regression(self):
+        directory = MPI_COMM.bcast(self.path_current_tmp, root=0)
+        baseline = os.path.join(directory, 'baseline.json')
+        if MPI_RANK == 0:
+            with open(baseline, 'w') as f:
+                json.dump({'results': [{'benchmark': 'merge', 'case': 'small', 'best': 1e-12}]}, f)
+        MPI_COMM.Barrier()
+
+        # Test every rank fails when rank 0 finds a regression. Benchmarks are replaced with a slower result.
+        run_benchmarks = suite.run_benchmarks
+        suite.run_benchmarks = lambda *args, **kwargs: {'results': [{'benchmark': 'merge', 'case': 'small',
+                                                                     'best': 1.}]}
+        try:
+            cli_args = ['bench', '-d', directory, '-o', os.path.join(directory, 'results.json'), '-b', 'merge',
+                        '--compare', baseline]
+            result = CliRunner().invoke(utools_cli, cli_args)
+        finally:
+            suite.run_benchmarks = run_benchmarks
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('benchmark regression', result.output)
+        MPI_COMM.Barrier()
@@ -2,21 +2,55 @@
 
 import os
 from ConfigParser import SafeConfigParser
-import numpy as np
 
 import click
-import osgeo
 
 from utools import UgridToolsConstants
-from utools.logging import log_entry, log
 
-# HACK: On Yellowstone, we need to import numpy here. There is something about the CLI invoker that causes path issues.
-#       Importing before it is invoked allows everything to link nicely.
-assert np is not None
+# Subcommand dependencies (numpy, GDAL, Shapely, netCDF4, and MPI) are imported when a subcommand runs. Help and
+# argument parsing stay fast, and MPI is not initialized until it is needed.
+
 
 @click.group()
-def utools_cli():
-    pass
+@click.option('--profile/--no-profile', default=None,
+              help='If "--profile", sample call stacks on each process and write collapsed stacks per phase and sample '
+                   'counts per feature unique identifier. Defaults to the UTOOLS_PROFILE environment variable. Output '
+                   'is written to UTOOLS_PROFILE_DIR.')
+@click.option('--progress', type=click.Choice(['stderr', 'json', 'log', 'none']), default=None,
+              help='Report progress and throughput of long loops with an ETA. "json" writes JSON lines to '
+                   'UTOOLS_PROGRESS_DIR. Defaults to the UTOOLS_PROGRESS environment variable.')
+def utools_cli(profile, progress):
+    # HACK: On Yellowstone, we need to import numpy here. There is something about the CLI invoker that causes path
+    #       issues. Importing before the subcommand imports allows everything to link nicely.
+    import numpy as np
+    from utools import env
+
+    assert np is not None
+
+    if progress is not None:
+        env.PROGRESS = progress
+    if profile is None:
+        profile = env.PROFILE
+    if profile:
+        from utools.profiler import Sampler
+
+        Sampler().start()
+
+
+@utools_cli.resultcallback()
+def log_phase_summary(*args, **kwargs):
+    from utools.instrument import RECORDER
+    from utools.logging import flush_logs
+    from utools.profiler import get_sampler
+
+    sampler = get_sampler()
+    if sampler is not None:
+        sampler.stop()
+        sampler.dump()
+
+    # Reduce per-rank phase timings and memory across ranks after every command.
+    RECORDER.log_summary()
+    flush_logs()
 
 
 @utools_cli.command(help='Create ESMF unstructured NetCDF files from supported geometry containers (ESRI Shapefile, '
@@ -41,9 +75,24 @@ def utools_cli():
 @click.option('--split/--no-split', required=False, default=True,
               help='If "--split" (enabled by default), any polygon with holes or interiors will be split such that '
                    'each polygon part has no holes/interiors.')
+@click.option('--geodesic-area/--no-geodesic-area', required=False, default=False,
+              help='If "--geodesic-area", also write element areas on the WGS84 ellipsoid in square meters to the '
+                   '"elementAreaGeodesic" variable. Element coordinates must be longitude/latitude.')
+@click.option('--stream/--no-stream', required=False, default=False,
+              help='If "--stream", convert and write elements in batches to bound memory use. The output uses '
+                   'NetCDF-4 unlimited dimensions.')
+@click.option('--batch-size', type=int, default=10000,
+              help='(default=10000) Number of elements buffered before writing when streaming.')
+@click.option('--layout', type=click.Choice(['default', 'contiguous', 'chunked', 'quantized']), default='default',
+              help='(default=default) Output storage layout. "contiguous" allows memory-mapped reads through h5py '
+                   '(the output is NetCDF-4/HDF5). "chunked" applies deflate and shuffle filters. "quantized" is '
+                   '"chunked" with single precision coordinates.')
 @click.option('--debug/--no-debug', required=False, default=False,
               help='If "--debug", execute in debug mode converting only the first record of the geometry container.')
-def convert(source_uid, source, esmf_format, feature_class, config_path, dest_crs_index, node_threshold, split, debug):
+def convert(source_uid, source, esmf_format, feature_class, config_path, dest_crs_index, node_threshold, split,
+            geodesic_area, stream, batch_size, layout, debug):
+    from osgeo import osr
+    from utools.logging import log_entry, log
     from utools.prep.prep_shapefiles import convert_to_esmf_format
 
     log_entry('info', 'Started converting to ESMF format: {}'.format(source), rank=0)
@@ -66,16 +115,58 @@ def convert(source_uid, source, esmf_format, feature_class, config_path, dest_cr
         sp = SafeConfigParser()
         sp.read(config_path)
         crs_wkt = sp.get(crs_section, crs_option)
-        dest_crs = osgeo.osr.SpatialReference()
+        dest_crs = osr.SpatialReference()
         dest_crs.ImportFromWkt(crs_wkt)
     else:
         dest_crs = None
 
     convert_to_esmf_format(esmf_format, source, source_uid, node_threshold=node_threshold, driver_kwargs=driver_kwargs,
-                           debug=debug, dest_crs=dest_crs, split_interiors=split)
+                           debug=debug, dest_crs=dest_crs, split_interiors=split, geodesic_area=geodesic_area,
+                           stream=stream, batch_size=batch_size, layout=layout)
     log_entry('info', 'Finished converting to ESMF format: {}'.format(source), rank=0)
 
 
+@utools_cli.command(help='Subset an ESMF unstructured NetCDF file by bounding box, polygon, or unique identifiers. '
+                         'If more than one selection is provided, elements must satisfy all of them.')
+@click.option('-e', '--esmf_format', type=click.Path(exists=True), required=True,
+              help='Path to the source ESMF unstructured NetCDF file.')
+@click.option('-o', '--output', type=click.Path(writable=True), required=True,
+              help='Path to the output ESMF unstructured NetCDF file.')
+@click.option('--bbox', type=float, nargs=4, required=False, default=None,
+              help='Select elements whose bounds intersect the bounding box "minx miny maxx maxy".')
+@click.option('--wkt', type=str, required=False,
+              help='Select elements intersecting the polygon in Well-Known Text format.')
+@click.option('--uid', type=str, required=False,
+              help='Comma-separated unique identifiers of elements to select. Requires "--uid-name".')
+@click.option('--uid-path', type=click.Path(exists=True), required=False,
+              help='Path to a text file with one unique identifier per line. Requires "--uid-name".')
+@click.option('-u', '--uid-name', type=str, required=False,
+              help='Name of the element unique identifier variable in the ESMF unstructured file.')
+@click.option('--layout', type=click.Choice(['default', 'contiguous', 'chunked', 'quantized']), default='default',
+              help='(default=default) Output storage layout. See the "convert" command.')
+def subset(esmf_format, output, bbox, wkt, uid, uid_path, uid_name, layout):
+    from shapely import wkt as shapely_wkt
+    from utools.io.esmf_subset import subset_esmf_mesh
+    from utools.logging import log_entry
+
+    if bbox is not None and len(bbox) == 0:
+        bbox = None
+    geom = None if wkt is None else shapely_wkt.loads(wkt)
+    uids = None
+    if uid is not None or uid_path is not None:
+        uids = []
+        if uid is not None:
+            uids += [u.strip() for u in uid.split(',') if len(u.strip()) > 0]
+        if uid_path is not None:
+            with open(uid_path) as f:
+                uids += [line.strip() for line in f if len(line.strip()) > 0]
+
+    log_entry('info', 'Started subsetting ESMF format: {}'.format(esmf_format), rank=0)
+    indices = subset_esmf_mesh(esmf_format, output, bbox=bbox, geom=geom, uids=uids, face_uid_name=uid_name,
+                               layout=layout)
+    log_entry('info', 'Finished subsetting ESMF format. Element count: {}'.format(indices.shape[0]), rank=0)
+
+
 @utools_cli.command(help='Create a merged ESMF weights file.')
 @click.option('-c', '--catchment-directory', required=True,
               help='Path to the directory containing the ESMF unstructured files.')
@@ -84,6 +175,7 @@ def convert(source_uid, source, esmf_format, feature_class, config_path, dest_cr
 @click.option('-m', '--master-path', type=click.Path(writable=True), required=True,
               help='Path to the output merged weight file.')
 def merge(catchment_directory, weight_directory, master_path):
+    from utools.logging import log_entry
     from utools.regrid.core_ocgis import create_merged_weights
 
     weight_files = []
@@ -114,13 +206,135 @@ def merge(catchment_directory, weight_directory, master_path):
               help='Path to ESMF unstructured NetCDF file.')
 @click.option('-o', '--output', type=click.Path(writable=True), required=True,
               help='Path to the output file.')
-def apply(source, name, weights, esmf_format, output):
+@click.option('--partitioned/--no-partitioned', required=False, default=False,
+              help='If "--partitioned", each process reads only the weights and source hyperslab for its destination '
+                   'elements. Memory use per process decreases with the number of processes.')
+@click.option('--threads', type=int, required=False, default=None,
+              help='Number of threads per process weighting destination elements. Threads share the weights and '
+                   'source buffers. Use with one process per node (e.g. "mpirun --map-by ppr:1:node"). More than one '
+                   'thread enables "--partitioned". Defaults to the UTOOLS_THREADS environment variable or 1.')
+def apply(source, name, weights, esmf_format, output, partitioned, threads):
+    from utools.logging import log_entry
     from utools.regrid.core_esmf import create_weighted_output
 
     log_entry('info', 'Starting weight application for "weights": {}'.format(weights), rank=0)
-    create_weighted_output(esmf_format, source, weights, output, name)
+    create_weighted_output(esmf_format, source, weights, output, name, partitioned=partitioned, threads=threads)
     log_entry('info', 'Finished weight application for "weights": {}'.format(weights), rank=0)
 
 
+@utools_cli.command(help='Run benchmarks on synthetic inputs and write the results to JSON. Inputs are generated once '
+                         'in the working directory and reused.')
+@click.option('-d', '--directory', type=click.Path(file_okay=False, writable=True), required=True,
+              help='Path to the working directory for synthetic inputs and outputs. Must be shared by all processes.')
+@click.option('-o', '--output', type=click.Path(writable=True), required=True,
+              help='Path to the output JSON results file.')
+@click.option('-b', '--benchmark', multiple=True,
+              type=click.Choice(['convert', 'connectivity', 'merge', 'apply', 'apply-partitioned']),
+              help='Benchmark to run. May be repeated. Defaults to all benchmarks.')
+@click.option('-c', '--case', type=click.Choice(['small', 'medium', 'large']), multiple=True,
+              help='Benchmark case to run. May be repeated. Defaults to "small".')
+@click.option('--repeat', type=int, default=3, help='(default=3) Number of timed runs per benchmark and case.')
+@click.option('--compare', type=click.Path(exists=True), required=False,
+              help='Path to a baseline JSON results file. Fails if any benchmark is slower than the tolerance.')
+@click.option('--tolerance', type=float, default=0.1,
+              help='(default=0.1) Relative slowdown allowed before a benchmark is a regression.')
+@click.option('--startup/--no-startup', default=False,
+              help='If "--startup", also time command line startup and module imports. Fails if a command exceeds its '
+                   'startup budget.')
+def bench(directory, output, benchmark, case, repeat, compare, tolerance, startup):
+    from collections import OrderedDict
+    from utools.benchmarks.suite import CASES, run_benchmarks, write_results, load_results, compare_results, \
+        log_comparison
+    from utools.io.mpi import MPI_COMM, MPI_RANK
+    from utools.logging import log_entry
+
+    cases = OrderedDict([(c, CASES[c]) for c in (case or ['small'])])
+    results = run_benchmarks(directory, names=list(benchmark) or None, cases=cases, repeat=repeat)
+    errors = []
+    if MPI_RANK == 0:
+        if startup:
+            from utools.benchmarks.startup import run_startup_benchmarks
+
+            results['startup'] = run_startup_benchmarks(repeat=repeat)
+        write_results(output, results)
+        log_entry('info', 'Wrote benchmark results: {}'.format(output), rank=0)
+        if startup:
+            over_budget = [c['command'] for c in results['startup']['commands'] if not c['within_budget']]
+            if len(over_budget) > 0:
+                errors.append('Startup time over budget: {}'.format(', '.join(over_budget)))
+        if compare is not None:
+            comparison = compare_results(load_results(compare), results, tolerance=tolerance)
+            log_comparison(comparison)
+            regressions = [c for c in comparison if c['regression']]
+            if len(regressions) > 0:
+                errors.append('{} benchmark regression(s) relative to: {}'.format(len(regressions), compare))
+    # All ranks raise so every rank skips the collective summary in the result callback.
+    errors = MPI_COMM.bcast(errors, root=0)
+    if len(errors) > 0:
+        raise click.ClickException('; '.join(errors))
+
+
+@utools_cli.command(name='bench-scaling',
+                    help='Run a strong or weak scaling study for a pipeline stage. Each process count is launched as '
+                         'a separate MPI job. Do not run this command with "mpirun". Uses synthetic inputs unless '
+                         'input paths are provided.')
+@click.option('-s', '--stage', type=click.Choice(['convert', 'connectivity', 'apply', 'apply-partitioned']),
+              required=True, help='The pipeline stage to benchmark.')
+@click.option('-d', '--directory', type=click.Path(file_okay=False, writable=True), required=True,
+              help='Path to the working directory for inputs, outputs, and per-job results.')
+@click.option('-o', '--output', type=click.Path(writable=True), required=True,
+              help='Path to the output JSON scaling results file.')
+@click.option('-n', '--processes', type=int, multiple=True,
+              help='Number of processes for a job. May be repeated. Defaults to powers of two up to '
+                   '"--max-processes".')
+@click.option('--max-processes', type=int, default=4, help='(default=4) Maximum number of processes.')
+@click.option('--mode', type=click.Choice(['strong', 'weak']), default='strong',
+              help='(default=strong) "weak" scales the synthetic mesh with the number of processes.')
+@click.option('-c', '--case', type=click.Choice(['small', 'medium', 'large']), default='small',
+              help='(default=small) The synthetic benchmark case.')
+@click.option('--repeat', type=int, default=1, help='(default=1) Number of timed runs per job.')
+@click.option('--mpirun', type=str, default='mpirun',
+              help='(default=mpirun) MPI launcher command with any arguments. Use "none" to run a single process '
+                   'without a launcher.')
+@click.option('--shapefile', type=click.Path(exists=True), required=False,
+              help='Path to an input geometry container for conversion stages. Requires "--source-uid".')
+@click.option('--source-uid', type=str, required=False,
+              help='Name of unique identifier in the input geometry container.')
+@click.option('--esmf-format', type=click.Path(exists=True), required=False,
+              help='Path to an ESMF unstructured NetCDF file for weight application stages.')
+@click.option('--source', type=click.Path(exists=True), required=False,
+              help='Path to a source NetCDF file for weight application stages. Requires "--name".')
+@click.option('--name', type=str, required=False, help='Name of the variable in the source NetCDF file to weight.')
+@click.option('--weights', type=click.Path(exists=True), required=False,
+              help='Path to a weights NetCDF file for weight application stages.')
+def bench_scaling(stage, directory, output, processes, max_processes, mode, case, repeat, mpirun, shapefile, source_uid,
+                  esmf_format, source, name, weights):
+    from utools.benchmarks.scaling import run_scaling, get_process_counts, get_scaling_table, log_scaling_table
+    from utools.benchmarks.suite import write_results
+    from utools.logging import log_entry
+
+    inputs = None
+    params = {}
+    if stage in ('convert', 'connectivity') and shapefile is not None:
+        inputs = {'shapefile': shapefile}
+        params['name_uid'] = source_uid
+    elif stage in ('apply', 'apply-partitioned') and esmf_format is not None:
+        inputs = {'mesh': esmf_format, 'source': source, 'weights': weights}
+        params['variable_name'] = name
+    if inputs is not None and (None in inputs.values() or None in params.values()):
+        raise click.UsageError('Incomplete input paths or names for stage: {}'.format(stage))
+
+    if mpirun.lower() == 'none':
+        mpirun = None
+    processes = list(processes) or get_process_counts(max_processes)
+
+    log_entry('info', 'Started scaling study: {}'.format(stage), rank=0)
+    results = run_scaling(stage, directory, process_counts=processes, mode=mode, case=case, inputs=inputs,
+                          params=params, repeat=repeat, mpirun=mpirun)
+    write_results(output, results)
+    log_scaling_table(get_scaling_table(results), mode=mode)
+    log_entry('info', 'Finished scaling study. Wrote results: {}'.format(output), rank=0)
+
+
 if __name__ == '__main__':
     utools_cli()